@@ -7,7 +7,7 @@ with open("README.rst", "r") as readme:
 
 
 INSTALL_REQUIRES = [
-    "conftool>=6.0.0",
+    "conftool>=6.1.0",
     "cumin>=3.0.2",
     "dnspython~=2.3.0; python_version=='3.11'",  # frozen to the version available on debian bookworm
     "dnspython~=2.7.0; python_version>'3.11'",  # frozen to the version available on debian trixie
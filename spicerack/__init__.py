@@ -35,18 +35,18 @@ from spicerack.elasticsearch_cluster import ElasticsearchClusters, create_elasti
 from spicerack.exceptions import RunCookbookError, SpicerackError
 from spicerack.ganeti import Ganeti
 from spicerack.hosts import Host
-from spicerack.icinga import ICINGA_DOMAIN, IcingaHosts
+from spicerack.icinga import ICINGA_DOMAIN, IcingaHosts, StatusCache
 from spicerack.ipmi import Ipmi
 from spicerack.k8s import Kubernetes
 from spicerack.kafka import Kafka
 from spicerack.locking import COOKBOOKS_CUSTOM_PREFIX, SPICERACK_PREFIX, Lock, NoLock, get_lock_instance
 from spicerack.mediawiki import MediaWiki
 from spicerack.mysql import Mysql
-from spicerack.netbox import MANAGEMENT_IFACE_NAME, Netbox, NetboxServer
+from spicerack.netbox import MANAGEMENT_IFACE_NAME, SERVER_ROLE_SLUG, Netbox, NetboxError, NetboxServer
 from spicerack.orchestrator import Orchestrator
 from spicerack.peeringdb import PeeringDB
 from spicerack.puppet import PuppetHosts, PuppetServer, get_ca_via_srv_record
-from spicerack.redfish import Redfish, RedfishDell, RedfishSupermicro
+from spicerack.redfish import Redfish, RedfishDell, RedfishFleet, RedfishSupermicro
 from spicerack.redis_cluster import RedisCluster
 from spicerack.remote import Remote, RemoteError, RemoteHosts
 from spicerack.reposync import RepoSync
@@ -134,6 +134,7 @@ class Spicerack:  # pylint: disable=too-many-instance-attributes
         self._sal_logger = sal_logger
         self._confctl: Optional[Confctl] = None
         self._service_catalog: Optional[Catalog] = None
+        self._icinga_status_caches: dict[str, StatusCache] = {}
         self._management_password: str = ""
         self._actions = ActionsDict()
         self._authdns_servers: dict[str, str] = {}
@@ -392,15 +393,21 @@ class Spicerack:  # pylint: disable=too-many-instance-attributes
         """
         return Host(name, self, netbox_read_write=netbox_read_write)
 
-    def remote(self, installer: bool = False) -> Remote:
+    def remote(self, installer: bool = False, cache_ttl: float = 0.0) -> Remote:
         """Get a Remote instance.
 
         Arguments:
             installer: whether to use the special configuration to connect to a Debian installer or freshly re-imaged
                 host prior to its first Puppet run.
+            cache_ttl: the time to live in seconds of the cached results of the Cumin queries, see
+                :py:class:`spicerack.remote.Remote`. Disabled by default.
 
         """
-        return Remote(self._cumin_installer_config if installer else self._cumin_config, dry_run=self._dry_run)
+        return Remote(
+            self._cumin_installer_config if installer else self._cumin_config,
+            dry_run=self._dry_run,
+            cache_ttl=cache_ttl,
+        )
 
     def confctl(self, entity_name: str) -> ConftoolEntity:
         """Get a Conftool specific entity instance.
@@ -561,8 +568,18 @@ class Spicerack:  # pylint: disable=too-many-instance-attributes
                 default, consider the given target hosts as FQDNs and extract their hostnames to be used in Icinga.
 
         """
+        icinga_host = self.icinga_master_host()
+        # Share the status cache among all the instances for the same Icinga server for the duration of the run
+        identifier = str(icinga_host)
+        if identifier not in self._icinga_status_caches:
+            self._icinga_status_caches[identifier] = StatusCache(icinga_host)
+
         return IcingaHosts(
-            self.icinga_master_host(), target_hosts, verbatim_hosts=verbatim_hosts, dry_run=self._dry_run
+            icinga_host,
+            target_hosts,
+            verbatim_hosts=verbatim_hosts,
+            dry_run=self._dry_run,
+            status_cache=self._icinga_status_caches[identifier],
         )
 
     def puppet(self, remote_hosts: RemoteHosts) -> PuppetHosts:
@@ -754,14 +771,95 @@ class Spicerack:  # pylint: disable=too-many-instance-attributes
         netbox_ip = netbox.api.ipam.ip_addresses.get(device=hostname, interface=MANAGEMENT_IFACE_NAME)
 
         manufacturer = server_metadata.as_dict()["device_type"]["manufacturer"]["slug"]
-        if manufacturer == "dell":
-            redfish_class: type[Redfish] = RedfishDell
-        elif manufacturer == "supermicro":
-            redfish_class = RedfishSupermicro
-        else:
-            raise SpicerackError(f"The manufacturer {manufacturer} set in Netbox for {hostname} is not supported.")
+        redfish_class = self._get_redfish_class(hostname, manufacturer)
         return redfish_class(hostname, ip_interface(netbox_ip.address), username, password, dry_run=self._dry_run)
 
+    def redfish_fleet(
+        self, hostnames: Sequence[str], username: str = "root", password: str = "", *, max_workers: int = 10
+    ) -> RedfishFleet:  # nosec
+        """Get an instance to talk concurrently to the Redfish API of multiple physical servers.
+
+        The management IPs and manufacturers of all the hosts are resolved with bulk Netbox queries.
+
+        Arguments:
+            hostnames: the hostnames (not FQDN) of the physical servers to manage.
+            username: the username for the management consoles.
+            password: the password for the management consoles for the given user. If empty or not provided would use
+                the production management password and ask the user for it if not already in memory.
+            max_workers: the maximum number of hosts to operate on concurrently.
+
+        Raises:
+            spicerack.netbox.NetboxError: if any device doesn't have the server role.
+            spicerack.exceptions.SpicerackError: if any host is not a physical server, has an unsupported manufacturer
+            or the management IP is not found.
+
+        """
+        if not password:
+            password = self.management_password()
+
+        names = list(dict.fromkeys(hostnames))  # Remove duplicates preserving the order
+        api = self.netbox().api
+        devices = {}
+        netbox_ips = {}
+        batch_size = 50  # Limit the number of hostnames per query to keep the URL length reasonable
+        for start in range(0, len(names), batch_size):
+            batch = names[start : start + batch_size]
+            devices.update({device.name: device for device in api.dcim.devices.filter(name=batch)})
+            netbox_ips.update(
+                {
+                    netbox_ip.assigned_object.device.name: netbox_ip
+                    for netbox_ip in api.ipam.ip_addresses.filter(device=batch, interface=MANAGEMENT_IFACE_NAME)
+                }
+            )
+
+        missing = [hostname for hostname in names if hostname not in devices]
+        if missing:
+            raise SpicerackError(
+                f"Hosts not found in Netbox as Physical servers, Redfish is not supported: {', '.join(missing)}"
+            )
+
+        invalid = [
+            f"{hostname} ({devices[hostname].role.slug})"
+            for hostname in names
+            if devices[hostname].role.slug != SERVER_ROLE_SLUG
+        ]
+        if invalid:
+            raise NetboxError(f"Devices with invalid role, only {SERVER_ROLE_SLUG} is allowed: {', '.join(invalid)}")
+
+        missing = [hostname for hostname in names if hostname not in netbox_ips]
+        if missing:
+            raise SpicerackError(f"Unable to find the management IP in Netbox for hosts: {', '.join(missing)}")
+
+        redfishes = []
+        for hostname in names:
+            redfish_class = self._get_redfish_class(hostname, devices[hostname].device_type.manufacturer.slug)
+            redfishes.append(
+                redfish_class(
+                    hostname, ip_interface(netbox_ips[hostname].address), username, password, dry_run=self._dry_run
+                )
+            )
+
+        return RedfishFleet(redfishes, max_workers=max_workers)
+
+    @staticmethod
+    def _get_redfish_class(hostname: str, manufacturer: str) -> type[Redfish]:
+        """Get the Redfish class to use for the given manufacturer.
+
+        Arguments:
+            hostname: the hostname (not FQDN) of the physical server, used in the error message.
+            manufacturer: the manufacturer slug as set in Netbox.
+
+        Raises:
+            spicerack.exceptions.SpicerackError: if the manufacturer is not supported.
+
+        """
+        if manufacturer == "dell":
+            return RedfishDell
+        if manufacturer == "supermicro":
+            return RedfishSupermicro
+
+        raise SpicerackError(f"The manufacturer {manufacturer} set in Netbox for {hostname} is not supported.")
+
     def alertmanager_hosts(
         self, target_hosts: TypeHosts, *, instance_name: str = "", verbatim_hosts: bool = False
     ) -> AlertmanagerHosts:
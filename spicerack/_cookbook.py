@@ -2,10 +2,12 @@
 
 import argparse
 import importlib
+import json
 import logging
 import os
 import sys
 from collections.abc import Callable, Sequence
+from functools import cached_property
 from pathlib import Path
 from typing import Optional, cast
 
@@ -22,6 +24,128 @@ class CookbookError(SpicerackError):
     """Custom exception class for errors of this module."""
 
 
+class CookbooksIndex:
+    """On-disk index of the cookbooks metadata, to build the menus without importing all the cookbooks modules.
+
+    The index keeps, for each cookbook module file, the metadata of its cookbooks and the modification time of the
+    file. An entry is considered valid only while the modification time of its file is unchanged. The cookbooks that
+    failed to be loaded are indexed with their error, so that it's reported on each run like on a fresh scan.
+
+    The whole index is discarded when any of the support modules of the cookbooks changes, see
+    :py:meth:`spicerack._cookbook.CookbooksIndex.check_support_files`. Changes to modules imported by the cookbooks
+    from outside the cookbooks directories, to another cookbook module imported by a cookbook, or to non-Python files
+    in the cookbooks directories are not detected.
+    """
+
+    version: int = 2
+    """The version of the index format, an index with a different version is discarded."""
+
+    def __init__(self, path: Path) -> None:
+        """Initialize the instance loading the existing index, if any.
+
+        Arguments:
+            path: the path of the JSON file where the index is stored.
+
+        """
+        self.path = path
+        self._support_files: dict[str, int] = {}
+        self._modules: dict[str, dict] = self._load()
+        self._changed = False
+
+    def check_support_files(self, support_files: dict[str, int]) -> None:
+        """Discard all the entries if any of the files the cookbooks might depend on has changed.
+
+        Arguments:
+            support_files: the modification times of the Python modules in the cookbooks directories that are not
+                cookbooks modules, that is the packages ``__init__.py`` files and the private helper modules, keyed by
+                their absolute path.
+
+        """
+        if support_files == self._support_files:
+            return
+
+        if self._modules:
+            logger.debug("Discarding the cookbooks index %s, the cookbooks support files have changed", self.path)
+
+        self._modules = {}
+        self._support_files = support_files
+        self._changed = True
+
+    def get(self, filepath: Path) -> Optional[list[dict]]:
+        """Get the metadata of the cookbooks in the given file, if present and up to date.
+
+        Arguments:
+            filepath: the path of the cookbook module file.
+
+        Returns:
+            The list of metadata dictionaries of the cookbooks defined in the file, :py:data:`None` if the file is
+            not indexed or its entry is outdated.
+
+        """
+        entry = self._modules.get(str(filepath.absolute()))
+        if entry is None or entry["mtime"] != filepath.stat().st_mtime_ns:
+            return None
+
+        return entry["cookbooks"]
+
+    def set(self, filepath: Path, cookbooks: list[dict]) -> None:
+        """Set the metadata of the cookbooks in the given file.
+
+        Arguments:
+            filepath: the path of the cookbook module file.
+            cookbooks: the list of metadata dictionaries of the cookbooks defined in the file.
+
+        """
+        self._modules[str(filepath.absolute())] = {"mtime": filepath.stat().st_mtime_ns, "cookbooks": cookbooks}
+        self._changed = True
+
+    def save(self) -> None:
+        """Save the index to disk if it was modified, dropping the entries of the files that don't exist anymore.
+
+        Failures are only logged as the index is just an optimization.
+        """
+        removed = [filepath for filepath in self._modules if not Path(filepath).exists()]
+        for filepath in removed:
+            del self._modules[filepath]
+
+        if not self._changed and not removed:
+            return
+
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            index = {"version": self.version, "support_files": self._support_files, "modules": self._modules}
+            tmp_path.write_text(json.dumps(index), encoding="utf-8")
+            tmp_path.replace(self.path)  # Atomic replace to not leave a partially written index
+        except OSError as e:
+            logger.warning("Unable to save the cookbooks index to %s: %s", self.path, e)
+            return
+
+        self._changed = False
+
+    def _load(self) -> dict[str, dict]:
+        """Load the index from disk.
+
+        Returns:
+            The indexed modules, or an empty dictionary if the index is missing, invalid or of a different version.
+
+        """
+        try:
+            index = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring invalid cookbooks index %s: %s", self.path, e)
+            return {}
+
+        if not isinstance(index, dict) or index.get("version") != self.version:
+            logger.debug("Ignoring cookbooks index %s with a different version", self.path)
+            return {}
+
+        self._support_files = index["support_files"]
+        return index["modules"]
+
+
 class CookbookCollection:
     """Collect and represent available cookbooks."""
 
@@ -34,6 +158,7 @@ class CookbookCollection:
         args: Sequence[str],
         spicerack: Spicerack,
         path_filter: str = "",
+        index_file: Optional[Path] = None,
     ) -> None:
         """Initialize the class and collect all the cookbook menu items.
 
@@ -43,18 +168,27 @@ class CookbookCollection:
             spicerack: the initialized instance of the library.
             path_filter: an optional relative module path to filter for. If set, only cookbooks that are part of this
                 subtree will be collected.
+            index_file: an optional path to a cookbooks metadata index file. If set, the cookbooks modules that have
+                an up to date entry in the index are not imported to build the menu, but only when the cookbook is
+                actually run. The index is created and updated as needed.
 
         """
         self.base_dirs = [base_dir / self.cookbooks_module_prefix for base_dir in base_dirs]
         self.args = args
         self.spicerack = spicerack
         self.path_filter = path_filter
+        self._index = CookbooksIndex(index_file) if index_file is not None else None
+        if self._index is not None:
+            self._index.check_support_files(self._get_support_files())
 
         module = import_module(self.cookbooks_module_prefix)
         self.menu = TreeItem(module, self.args, self.spicerack, self.cookbooks_module_prefix)
         for base_dir in self.base_dirs:
             self._collect(base_dir)
 
+        if self._index is not None:
+            self._index.save()
+
     def get_item(self, path: str) -> Optional[BaseItem]:
         """Retrieve the item for a given path.
 
@@ -156,30 +290,59 @@ class CookbookCollection:
                 continue
 
             for filepath in dirpath.glob("[!_]*.py"):  # Excludes files starting with an underscore, like __init__.py
+                # Avoid importing modules that can't contain any cookbook matching the filter
+                if self._should_filter(f"{prefix}.{filepath.stem}" if prefix else filepath.stem):
+                    continue
+
                 module_name = f"{module_prefix}.{filepath.stem}"
-                self._collect_filename(module_name, menu)
+                self._collect_filename(module_name, menu, filepath=filepath)
 
-    def _collect_filename(self, module_name: str, menu: TreeItem) -> None:
+    def _collect_filename(self, module_name: str, menu: TreeItem, *, filepath: Optional[Path] = None) -> None:
         """Collect all the available cookbooks in the given module and add them to the menu.
 
         Arguments:
             module_name: the Python module to load.
             menu: the menu to append the collected cookbook to.
+            filepath: the path of the module file, used to look up and update the cookbooks index, if any.
 
         """
-        try:
-            classes = self._collect_module_cookbooks(import_module(module_name))
-        except CookbookError as e:
-            logger.error(e)
-            return
+        index_entries: Optional[list[dict]] = None
+        if self._index is not None and filepath is not None:
+            index_entries = self._index.get(filepath)
+
+        if index_entries is not None:
+            classes = []
+            for entry in index_entries:
+                if "error" in entry:  # Report again the error of the cookbooks that failed to load
+                    logger.error(entry["error"])
+                else:
+                    classes.append(self._get_lazy_cookbook_class(module_name, entry))
+        else:
+            try:
+                classes = self._collect_module_cookbooks(import_module(module_name))
+            except CookbookError as e:
+                logger.error(e)
+                return
 
+        new_entries: list[dict] = []
         for class_obj in classes:
             try:
                 cookbook_item = CookbookItem(class_obj, self.args, self.spicerack)
             except MenuError as e:
                 logger.error(e)
+                new_entries.append({"class_name": class_obj.__name__, "error": str(e)})
                 continue
 
+            new_entries.append(
+                {
+                    "class_name": class_obj.__name__,
+                    "spicerack_path": cookbook_item.path,
+                    "spicerack_name": cookbook_item.name,
+                    "title": cookbook_item.title,
+                    "owner_team": cookbook_item.owner_team,
+                }
+            )
+
             # Use the parent owner_team if set
             default_owner = cookbook.CookbookBase.owner_team
             if menu.owner_team != default_owner and cookbook_item.owner_team == default_owner:
@@ -190,6 +353,64 @@ class CookbookCollection:
 
             menu.append(cookbook_item)
 
+        if self._index is not None and filepath is not None and index_entries is None:
+            self._index.set(filepath, new_entries)
+
+    def _get_support_files(self) -> dict[str, int]:
+        """Get the modification times of the Python modules in the cookbooks directories that are not cookbooks.
+
+        Only the modules starting with an underscore, like ``__init__.py``, are looked up in the directories where
+        the cookbooks are collected from, without checking any other file.
+
+        Returns:
+            The modification times in nanoseconds keyed by the absolute path of the modules.
+
+        """
+        support_files = {}
+        for base_dir in self.base_dirs:
+            for dirpath in base_dir.rglob(""):  # Selects only directories, as in _collect()
+                if dirpath.name == "__pycache__":
+                    continue
+
+                for filepath in dirpath.glob("_*.py"):
+                    support_files[str(filepath.absolute())] = filepath.stat().st_mtime_ns
+
+        return support_files
+
+    def _get_lazy_cookbook_class(self, module_name: str, entry: dict) -> type[cookbook.CookbookBase]:
+        """Get a cookbook class from its index entry that imports the actual cookbook module only when needed.
+
+        Arguments:
+            module_name: the Python module of the cookbook.
+            entry: the cookbook metadata from the index.
+
+        Returns:
+            type: a dynamically generated class derived from :py:class:`spicerack.cookbook.CookbookBase` that
+            delegates the argument parser and the runner to the actual cookbook class.
+
+        """
+        def load(instance: cookbook.CookbookBase) -> cookbook.CookbookBase:
+            """Import the cookbook module and instantiate the actual cookbook, cached once per instance."""
+            for class_obj in self._collect_module_cookbooks(import_module(module_name)):
+                if class_obj.spicerack_name == entry["spicerack_name"]:
+                    return class_obj(instance.spicerack)
+
+            raise CookbookError(f"Unable to find cookbook {entry['spicerack_name']} in module {module_name}")
+
+        attributes = {
+            "__module__": module_name,
+            "__name__": entry["class_name"],
+            "owner_team": entry["owner_team"],
+            "spicerack_name": entry["spicerack_name"],
+            "spicerack_path": entry["spicerack_path"],
+            "title": entry["title"],
+            "_cookbook": cached_property(load),
+            "argument_parser": lambda self: self._cookbook.argument_parser(),
+            "get_runner": lambda self, args: self._cookbook.get_runner(args),
+        }
+
+        return type(entry["class_name"], (cookbook.CookbookBase,), attributes)
+
     def _should_filter(self, name: str) -> bool:
         """Check if a given path or full name should be skipped because not matching the current filter.
 
@@ -300,7 +521,7 @@ class CookbookCollection:
             "spicerack_name": name,
             "spicerack_path": module_name.split(".", 1)[1] if "." in module_name else "",
             "title": title,
-            "get_runner": lambda _, args: runner(args, self.spicerack),
+            "get_runner": lambda instance, args: runner(args, instance.spicerack),
         }
 
         try:
@@ -432,8 +653,20 @@ def _import_extender_class(extender_class_param: str) -> SpicerackExtenderBase:
 
 def get_cookbook_callback(
     cookbooks_base_dirs: list[Path],
+    index_file: Optional[Path] = None,
 ) -> Callable[["Spicerack", str, Sequence[str]], Optional["BaseItem"]]:
-    """Returns the cookbook callback function needed to load a cookbook from another cookbook."""
+    """Returns the cookbook callback function needed to load a cookbook from another cookbook.
+
+    The cookbooks found are memoized for the lifetime of the returned callback, so that calling the same cookbook
+    multiple times, for example once per host, doesn't collect it again each time.
+
+    Arguments:
+        cookbooks_base_dirs: the list of base directories from where to start looking for cookbooks.
+        index_file: an optional path to a cookbooks metadata index file, see
+            :py:class:`spicerack._cookbook.CookbookCollection`.
+
+    """
+    collected: dict[str, CookbookItem] = {}
 
     def get_cookbook(spicerack: Spicerack, cookbook_path: str, cookbook_args: Sequence[str] = ()) -> Optional[BaseItem]:
         """Get a cookbook item if it exists.
@@ -447,13 +680,26 @@ def get_cookbook_callback(
             :py:data:`None` if there is no cookbook found, the cookbook item otherwise.
 
         """
-        cookbooks = CookbookCollection(
-            base_dirs=cookbooks_base_dirs,
-            args=cookbook_args,
-            spicerack=spicerack,
-            path_filter=cookbook_path,
-        )
-        return cookbooks.get_item(cookbook_path)
+        item = collected.get(cookbook_path)
+        if item is None:
+            cookbooks = CookbookCollection(
+                base_dirs=cookbooks_base_dirs,
+                args=cookbook_args,
+                spicerack=spicerack,
+                path_filter=cookbook_path,
+                index_file=index_file,
+            )
+            found = cookbooks.get_item(cookbook_path)
+            if not isinstance(found, CookbookItem):  # Menus and missing cookbooks are not memoized
+                return found
+
+            collected[cookbook_path] = found
+            item = found
+
+        # Return a new item each time to not share the arguments and the execution status across calls
+        new_item = CookbookItem(type(item.instance), cookbook_args, spicerack)
+        new_item.instance.owner_team = item.owner_team  # Preserve the owner team inherited from the parent menu
+        return new_item
 
     return get_cookbook
 
@@ -490,7 +736,9 @@ def main(argv: Optional[Sequence[str]] = None) -> Optional[int]:
         sys.path.append(str(Path(config["external_modules_dir"]).expanduser()))
 
     params = config.get("instance_params", {})
-    get_cookbook = get_cookbook_callback(cookbooks_base_dirs)
+    index_file = config.get("cookbooks_index_file")
+    index_file_path = Path(index_file).expanduser() if index_file else None
+    get_cookbook = get_cookbook_callback(cookbooks_base_dirs, index_file=index_file_path)
     params.update({"verbose": args.verbose, "dry_run": args.dry_run, "get_cookbook_callback": get_cookbook})
     if "extender_class" in params:
         try:
@@ -509,7 +757,11 @@ def main(argv: Optional[Sequence[str]] = None) -> Optional[int]:
         return 1
 
     cookbooks = CookbookCollection(
-        base_dirs=cookbooks_base_dirs, args=args.cookbook_args, spicerack=spicerack, path_filter=args.cookbook
+        base_dirs=cookbooks_base_dirs,
+        args=args.cookbook_args,
+        spicerack=spicerack,
+        path_filter=args.cookbook,
+        index_file=index_file_path,
     )
     if args.list:
         print(cookbooks.menu.get_tree(), end="")
@@ -1,17 +1,26 @@
 """Confctl module to abstract Conftool."""
 
+import json
 import logging
 import re
+import threading
 from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Union
+from copy import copy
+from typing import Any, Optional, Union
 
+import etcd
 from conftool import kvobject
 from conftool.cli import ConftoolClient
-from conftool.drivers import BackendError
+from conftool.drivers import BackendError, ObjectWireMetadata, ObjectWireRepresentation
 
 from spicerack.exceptions import SpicerackError
 
+UPDATE_MAX_WORKERS: int = 10
+"""The maximum number of concurrent etcd writes when updating multiple Conftool objects."""
+SNAPSHOT_WATCH_TIMEOUT: int = 30
+"""How many seconds each etcd watch request of a Conftool entity snapshot waits for changes before being renewed."""
 logger = logging.getLogger(__name__)
 
 
@@ -19,6 +28,22 @@ class ConfctlError(SpicerackError):
     """Custom exception class for errors of this module."""
 
 
+class ConfctlUpdateError(ConfctlError):
+    """Custom exception class for collecting the errors updating multiple Conftool objects."""
+
+    def __init__(self, failures: list[tuple[kvobject.Entity, ConfctlError]], total: int):
+        """Override the parent constructor to add the failures as attribute.
+
+        Arguments:
+            failures: the list of objects that failed to be updated and the related exception.
+            total: the total number of objects that were updated.
+
+        """
+        details = "; ".join(f"{obj.pprint()}: {exc}" for obj, exc in failures)
+        super().__init__(f"Failed to update {len(failures)} of {total} conftool objects: {details}")
+        self.failures = failures
+
+
 class Confctl:
     """Confctl class to abstract conftool operations."""
 
@@ -43,29 +68,237 @@ class Confctl:
         # the value of a key that was just written.
         self._client = ConftoolClient(configfile=config, schemafile=schema, irc_logging=False, read_only=dry_run)
 
-    def entity(self, entity_name: str) -> "ConftoolEntity":
+    def entity(self, entity_name: str, *, cache: bool = False) -> "ConftoolEntity":
         """Get the Conftool specific entity class.
 
+        Examples:
+            ::
+
+                >>> with confctl.entity("discovery", cache=True) as discovery:
+                ...     for obj in discovery.get(dnsdisc="appservers-.*"):
+                ...         print(obj.pooled)
+
         Arguments:
             entity_name: the name of the entity..
+            cache: whether to answer the selections from an in-memory snapshot of the entity, see
+                :py:class:`spicerack.confctl.EntitySnapshot`. The snapshot is kept up to date by a background thread
+                until the entity is closed, use it as a context manager or call its ``close()`` method when done.
+
+        """
+        return ConftoolEntity(self._client.get(entity_name), dry_run=self._dry_run, cache=cache)
+
+
+class EntitySnapshot:
+    """In-memory snapshot of all the objects of a Conftool entity, kept up to date with an etcd watch.
+
+    The whole entity tree is loaded with a single recursive read on first access. A background thread then watches
+    the tree from the etcd index of that read and applies the changes to the snapshot. Changes older than the last
+    known modified index of an object are discarded, so the objects updated through :py:meth:`updated` are not
+    reverted by the watch. If the watch fails, for example because the etcd events history was cleared, the
+    snapshot is reloaded at the next access.
+
+    The objects in the snapshot are never modified in place, they are replaced, and the selections return copies of
+    them, so that the callers can modify and write them without racing with the watch.
+    """
+
+    def __init__(self, entity: type[kvobject.Entity]) -> None:
+        """Initialize the instance.
+
+        Arguments:
+            entity: the Conftool entity class.
+
+        """
+        self._entity = entity
+        self._driver = entity.backend.driver
+        self._path = self._driver.abspath(entity.base_path())
+        self._objects: dict[str, kvobject.Entity] = {}
+        self._index = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    def query(self, selectors: dict[str, re.Pattern]) -> list[kvobject.Entity]:
+        """Get a copy of all the objects matching the selectors, with the same semantic of Conftool's Entity.query().
+
+        Arguments:
+            selectors: dictionary with tag: compiled regex pairs of Conftool selectors.
+
+        Raises:
+            spicerack.confctl.ConfctlError: on etcd errors while loading the snapshot.
+            ValueError: if the selectors include non-existent tags.
+
+        """
+        tags = [*self._entity._tags, "name"]  # pylint: disable=protected-access
+        non_existent = set(selectors.keys()) - set(tags)
+        if non_existent:
+            raise ValueError(f"The query includes non-existent tags: {','.join(non_existent)}")
+
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            objects = list(self._objects.values())
+
+        return [
+            copy(obj)
+            for obj in objects
+            if all(
+                selectors[tag].match(label)
+                for tag, label in zip(tags, [*obj.tags.values(), obj.name], strict=True)
+                if tag in selectors
+            )
+        ]
+
+    def updated(self, obj: kvobject.Entity, modified_index: int) -> None:
+        """Store a copy of an object just written, to make the write visible to the following selections.
+
+        The modified index of the write is recorded in the copy, to not revert it with older changes from the watch.
+
+        Arguments:
+            obj: the object that was written.
+            modified_index: the etcd modified index of the write.
+
+        """
+        written = copy(obj)
+        written.revision_id = modified_index
+        key = self._driver.abspath(obj.key)
+        with self._lock:
+            current = self._objects.get(key)
+            if current is None or current.revision_id < modified_index:
+                self._objects[key] = written
+
+    def close(self) -> None:
+        """Stop watching for changes, the snapshot will not be updated anymore."""
+        self._closed.set()
+
+    def _load(self) -> None:
+        """Load all the objects with a single recursive read and start the watch. Must be called with the lock held.
+
+        Raises:
+            spicerack.confctl.ConfctlError: on etcd errors.
+
+        """
+        try:
+            result = self._driver.client.read(self._path, recursive=True)
+        except etcd.EtcdKeyNotFound:
+            result = None
+        except etcd.EtcdException as e:
+            raise ConfctlError(f"Error reading {self._path} from etcd") from e
+
+        self._objects = {}
+        if result is not None:
+            for leaf in result.leaves:
+                obj = self._get_object(leaf)
+                if obj is not None:
+                    self._objects[leaf.key] = obj
+            self._index = result.etcd_index
+
+        self._loaded = True
+        logger.debug("Loaded %d objects from %s at etcd index %d", len(self._objects), self._path, self._index)
+        if not self._closed.is_set() and (self._watcher is None or not self._watcher.is_alive()):
+            self._watcher = threading.Thread(target=self._watch, name="conftool-snapshot", daemon=True)
+            self._watcher.start()
+
+    def _watch(self) -> None:
+        """Watch the entity tree for changes and apply them, until closed or on errors."""
+        while not self._closed.is_set():
+            try:
+                event = self._driver.client.read(
+                    self._path,
+                    recursive=True,
+                    wait=True,
+                    waitIndex=self._index + 1,
+                    timeout=SNAPSHOT_WATCH_TIMEOUT,
+                )
+            except etcd.EtcdWatchTimedOut:
+                event = None  # No changes, renew the watch
+            except etcd.EtcdException as e:  # Includes the events history being cleared
+                logger.debug("Failed to watch %s, the snapshot will be reloaded: %s", self._path, e)
+                with self._lock:
+                    self._loaded = False
+                return
+
+            if event is not None:
+                with self._lock:
+                    self._apply(event)
+
+    def _apply(self, event: etcd.EtcdResult) -> None:
+        """Apply a change from the watch to the snapshot. Must be called with the lock held.
+
+        Arguments:
+            event: the etcd watch result.
+
+        """
+        self._index = max(self._index, event.modifiedIndex)
+        deleted = event.action in ("delete", "expire", "compareAndDelete")
+        if event.dir:
+            if deleted:  # Drop the whole sub-tree
+                prefix = event.key.rstrip("/") + "/"
+                for key in [key for key in self._objects if key.startswith(prefix)]:
+                    del self._objects[key]
+            return
+
+        current = self._objects.get(event.key)
+        if current is not None and event.modifiedIndex <= current.revision_id:
+            return  # Already up to date
+
+        if deleted:
+            self._objects.pop(event.key, None)
+            return
+
+        obj = self._get_object(event)
+        if obj is not None:
+            self._objects[event.key] = obj
+
+    def _get_object(self, node: etcd.EtcdResult) -> Optional[kvobject.Entity]:
+        """Get the Conftool object from an etcd node, skipping directories and invalid nodes.
+
+        Arguments:
+            node: the etcd node.
 
         """
-        return ConftoolEntity(self._client.get(entity_name), dry_run=self._dry_run)
+        if node.dir or node.key == self._path or node.value is None:
+            return None
+
+        labels = node.key[len(self._path) + 1 :].replace("//", "/").split("/")
+        try:
+            wire = ObjectWireRepresentation(json.loads(node.value), ObjectWireMetadata(node.modifiedIndex))
+            return self._entity(*labels, wire=wire)
+        except ValueError as e:
+            logger.warning("Skipping invalid Conftool object %s: %s", node.key, e)
+            return None
 
 
 class ConftoolEntity:
     """ConftoolEntity class to perform operations on a specific Conftool entity."""
 
-    def __init__(self, entity: kvobject.Entity, dry_run: bool = True) -> None:
+    def __init__(self, entity: kvobject.Entity, dry_run: bool = True, *, cache: bool = False) -> None:
         """Initialize the instance.
 
         Arguments:
             entity: an instance of Conftool entity.
             dry_run: whether this is a DRY-RUN.
+            cache: whether to answer the selections from an in-memory snapshot of the entity kept up to date with an
+                etcd watch, see :py:class:`spicerack.confctl.EntitySnapshot`. The objects updated through this
+                instance are immediately visible to the following selections.
 
         """
         self._entity = entity
         self._dry_run = dry_run
+        self._snapshot: Optional[EntitySnapshot] = EntitySnapshot(entity) if cache else None
+
+    def __enter__(self) -> "ConftoolEntity":
+        """Allow to use the instance as a context manager that closes it on exit."""
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        """Stop keeping the snapshot up to date, if the cache is enabled."""
+        self.close()
+
+    def close(self) -> None:
+        """Stop keeping the snapshot up to date, if the cache is enabled."""
+        if self._snapshot is not None:
+            self._snapshot.close()
 
     def _select(self, tags: dict[str, str]) -> Iterator[kvobject.Entity]:
         """Generator that yields the selected objects based on the provided tags.
@@ -84,8 +317,13 @@ class ConftoolEntity:
         for tag, expr in tags.items():
             selectors[tag] = re.compile(f"^{expr}$")
 
+        if self._snapshot is None:
+            objects = self._entity.query(selectors)
+        else:
+            objects = self._snapshot.query(selectors)
+
         obj = None
-        for obj in self._entity.query(selectors):  # pylint: disable=use-yield-from; False positive obj is checked
+        for obj in objects:  # pylint: disable=use-yield-from; False positive obj is checked
             yield obj
 
         if obj is None:
@@ -135,12 +373,7 @@ class ConftoolEntity:
 
         """
         logger.info("Setting %s=%s for tags: %s", key, value, tags)
-        self.update({key: value}, **tags)
-
-        for obj in self.get(**tags):  # Verify the changes were applied
-            new = getattr(obj, key)
-            if new != value and not self._dry_run:
-                raise ConfctlError(f"Conftool key {key} has value '{new}', expecting '{value}' for tags: {tags}")
+        self.update_objects({key: value}, self._select(tags), verify=True)
 
     def filter_objects(
         self, filter_expr: dict[str, Union[bool, str, int, float]], **tags: str
@@ -176,19 +409,27 @@ class ConftoolEntity:
         self,
         changed: dict[str, Union[bool, str, int, float]],
         objects: Iterable[kvobject.Entity],
+        *,
+        verify: bool = False,
+        max_workers: int = UPDATE_MAX_WORKERS,
     ) -> None:
         """Updates the value of the provided conftool objects.
 
+        The objects are written concurrently and all of them are attempted also if some fail.
+
         Examples:
             >>> inactive = confctl.filter_objects({'pooled': 'inactive'}, service='appservers-.*', name='eqiad')
             >>> confctl.update_objects({'pooled': 'no'}, inactive)
 
         Arguments:
             changed: the new values to set for the selected objects.
-            query: an iterator of conftool objects.
+            objects: an iterator of conftool objects.
+            verify: whether to verify that each object has the new values, as returned by its etcd write.
+            max_workers: the maximum number of concurrent writes.
 
         Raises:
-            spicerack.confctl.ConfctlError: on etcd or Conftool errors.
+            spicerack.confctl.ConfctlUpdateError: on etcd or Conftool errors or failing to verify the changes, with
+                the objects that failed to be updated.
 
         """
         # TODO: make the api nicer by returning an EntitiesCollection from filter_objects so we can allow to write
@@ -198,17 +439,94 @@ class ConftoolEntity:
         else:
             message_prefix = "Updating conftool"
 
+        objects = list(objects)
         for obj in objects:
             logger.debug("%s: %s -> %s", message_prefix, obj, changed)
-            if self._dry_run:
-                continue
 
-            try:
-                obj.update(changed)
-            except BackendError as e:
-                raise ConfctlError("Error writing to etcd") from e
-            except Exception as e:
-                raise ConfctlError("Generic error in conftool") from e
+        if self._dry_run or not objects:
+            return
+
+        failures: list[tuple[kvobject.Entity, ConfctlError]] = []
+        with ThreadPoolExecutor(
+            max_workers=min(max_workers, len(objects)), thread_name_prefix="conftool-update"
+        ) as executor:
+            futures = [(obj, executor.submit(self._update_object, obj, changed, verify=verify)) for obj in objects]
+            for obj, future in futures:
+                try:
+                    future.result()
+                except ConfctlError as e:
+                    logger.error("Failed to update conftool object %s: %s", obj, e)
+                    failures.append((obj, e))
+
+        if failures:
+            raise ConfctlUpdateError(failures, len(objects))
+
+    def _update_object(
+        self, obj: kvobject.Entity, changed: dict[str, Union[bool, str, int, float]], *, verify: bool
+    ) -> None:
+        """Update a single conftool object and optionally verify the written values.
+
+        Arguments:
+            obj: the conftool object to update.
+            changed: the new values to set.
+            verify: whether to verify the new values in the object returned by the etcd write.
+
+        Raises:
+            spicerack.confctl.ConfctlError: on etcd or Conftool errors or failing to verify the changes.
+
+        """
+        try:
+            written = ConftoolEntity._update_and_write(obj, changed)
+        except BackendError as e:
+            raise ConfctlError("Error writing to etcd") from e
+        except Exception as e:
+            raise ConfctlError("Generic error in conftool") from e
+
+        if not verify and self._snapshot is None:
+            return
+
+        if written is None:  # The driver doesn't return the result when creating a new key
+            raise ConfctlError(f"No result from etcd for the write of {obj.key}")
+
+        if self._snapshot is not None:
+            self._snapshot.updated(obj, written.metadata.revision_id)
+
+        if verify:
+            for key, value in changed.items():
+                if written.data.get(key) != value:
+                    raise ConfctlError(f"Conftool key {key} has value '{written.data.get(key)}', expecting '{value}'")
+
+    @staticmethod
+    def _update_and_write(
+        obj: kvobject.Entity, values: dict[str, Union[bool, str, int, float]]
+    ) -> Optional[ObjectWireRepresentation]:
+        """Update the object like :py:meth:`conftool.kvobject.Entity.update` does, returning the write result.
+
+        Conftool's ``update()`` discards the result of ``write()``, that carries the object as stored in etcd and its
+        revision. This mirrors its implementation as of conftool 6.1.0 through the private ``_schema`` and
+        ``_set_value()``, the equivalence is pinned by the tests. If those are not available, it falls back to the
+        public ``update()`` followed by a read of the object from the backend, whose revision might include other
+        concurrent writes.
+
+        Arguments:
+            obj: the conftool object to update.
+            values: the new values to set, the keys not in the object schema are ignored.
+
+        Returns:
+            The result of the write, :py:data:`None` if the driver doesn't return it.
+
+        """
+        # pylint: disable=protected-access
+        if not hasattr(obj, "_schema") or not hasattr(obj, "_set_value"):
+            logger.debug("Conftool Entity internals not available, falling back to update() and read()")
+            obj.update(values)
+            return obj.backend.driver.read(obj.key)
+
+        for key, value in values.items():
+            if key in obj._schema:
+                obj._set_value(key, obj._schema[key], {key: value}, set_defaults=False)
+
+        return obj.write()
 
     @contextmanager
     def change_and_revert(
@@ -216,7 +534,9 @@ class ConftoolEntity:
     ) -> Iterator[Iterable[kvobject.Entity]]:
         """Context manager to perform actions with a changed value in conftool.
 
-        This method will only act on objects that had the original value.
+        This method will only act on objects that had the original value. If some of the objects fail to be changed,
+        the ones that were changed are reverted to the original value and the code within the context manager is not
+        executed.
 
         Warning:
             If the code executed within the contextmanager raises an unhandled
@@ -231,8 +551,20 @@ class ConftoolEntity:
         Yields:
             generator: conftool.kvObject.Entity the objects that were acted upon.
 
+        Raises:
+            spicerack.confctl.ConfctlUpdateError: if unable to change some of the objects.
+
         """
         objects = list(self.filter_objects({field: original}, **tags))
-        self.update_objects({field: changed}, objects)
+        try:
+            self.update_objects({field: changed}, objects)
+        except ConfctlUpdateError as e:
+            failed = {id(obj) for obj, _ in e.failures}
+            written = [obj for obj in objects if id(obj) not in failed]
+            if written:
+                logger.error("Reverting %s to %s on the %d changed conftool objects", field, original, len(written))
+                self.update_objects({field: original}, written)
+            raise
+
         yield objects
         self.update_objects({field: original}, objects)
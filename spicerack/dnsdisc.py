@@ -2,9 +2,10 @@
 
 import logging
 from collections import defaultdict
-from collections.abc import Iterator
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from ipaddress import IPv4Address, IPv6Address, ip_address
-from typing import Optional, Union
+from typing import Any, Optional, Union
 
 import dns
 
@@ -16,6 +17,11 @@ from spicerack.confctl import ConftoolEntity
 from spicerack.decorators import retry
 from spicerack.exceptions import SpicerackCheckError, SpicerackError
 
+RESOLVE_MAX_WORKERS: int = 20
+"""The maximum number of DNS queries sent concurrently to the authoritative nameservers."""
+QUERY_TIMEOUT: float = 2.0
+"""The default number of seconds to wait for each DNS query with a client IP to the authoritative nameservers."""
+
 logger = logging.getLogger(__name__)
 
 
@@ -143,9 +149,12 @@ class Discovery:
         """
         logger.debug("Checking that TTL=%d for %s discovery.wmnet records", ttl, self._records)
 
-        for record in self.resolve():
-            if record.ttl != ttl:
-                raise DiscoveryCheckError(f"Expected TTL '{ttl}', got '{record.ttl}' for record {record[0].address}")
+        for nameserver, answers in self.resolve_all().items():
+            for record, answer in answers.items():
+                if answer.ttl != ttl:
+                    raise DiscoveryCheckError(
+                        f"Expected TTL '{ttl}', got '{answer.ttl}' for record {record} from {nameserver}"
+                    )
         if len(self._records) == 1:
             logger.info("%s.discovery.wmnet TTL is correct.", self._records[0])
         else:
@@ -186,14 +195,16 @@ class Discovery:
         )
 
         failed = False
-        for record in self.resolve(name=name):
-            if not self._dry_run and record[0].address != expected_address:
+        for nameserver, answers in self.resolve_all([name]).items():
+            address = answers[name][0].address
+            if not self._dry_run and address != expected_address:
                 failed = True
                 logger.error(
-                    "Expected IP '%s', got '%s' for record %s",
+                    "Expected IP '%s', got '%s' for record %s from %s",
                     expected_address,
-                    record[0].address,
+                    address,
                     name,
+                    nameserver,
                 )
 
         if failed:
@@ -204,6 +215,9 @@ class Discovery:
     def resolve(self, name: Optional[str] = None) -> Iterator[resolver.Answer]:
         """Generator that yields the resolved records.
 
+        All the queries are performed concurrently via :py:meth:`spicerack.dnsdisc.Discovery.resolve_all` before
+        yielding the first answer.
+
         Todo:
             move a more generalized version of this into a DNS resolver module.
 
@@ -217,27 +231,47 @@ class Discovery:
             spicerack.dnsdic.DiscoveryError: if unable to resolve the address.
 
         """
-        if name is not None:
-            records = [name]
-        else:
+        records = [name] if name is not None else None
+        for answers in self.resolve_all(records).values():
+            yield from answers.values()
+
+    def resolve_all(
+        self, records: Optional[list[str]] = None, *, timeout: Optional[float] = None
+    ) -> dict[str, dict[str, resolver.Answer]]:
+        """Resolve the records on all the authoritative nameservers concurrently.
+
+        Examples:
+            ::
+
+                >>> answers = discovery.resolve_all()
+                >>> answers["authdns1001.wikimedia.org"]["servicename"].ttl
+                300
+
+        Arguments:
+            records: the record names to resolve instead of self.records.
+            timeout: the number of seconds to wait for each DNS query before it times out. If None the default
+                lifetime of the resolvers is used, as in :py:meth:`spicerack.dnsdisc.Discovery.resolve`.
+
+        Returns:
+            A matrix of the DNS responses, keyed by nameserver and record name, in the same order of the nameservers
+            and records.
+
+        Raises:
+            spicerack.dnsdisc.DiscoveryError: if unable to resolve any of the records, reporting all the failures.
+
+        """
+        if records is None:
             records = self._records
 
-        for nameserver, dns_resolver in self._resolvers.items():
-            for record in records:
-                try:
-                    record_name = f"{record}.discovery.wmnet"
-                    answer = dns_resolver.query(record_name)
-                except DNSException as e:
-                    raise DiscoveryError(f"Unable to resolve {record_name} from {nameserver}") from e
+        queries = [(nameserver, record) for nameserver in self._resolvers for record in records]
+        results = self._run_queries(lambda nameserver, record: self._query(nameserver, record, timeout), queries)
 
-                logger.debug(
-                    "[%s] %s -> %s TTL %d",
-                    nameserver,
-                    record,
-                    answer[0].address,
-                    answer.ttl,
-                )
-                yield answer
+        answers: dict[str, dict[str, resolver.Answer]] = {nameserver: {} for nameserver in self._resolvers}
+        for (nameserver, record), answer in zip(queries, results, strict=True):
+            logger.debug("[%s] %s -> %s TTL %d", nameserver, record, answer[0].address, answer.ttl)
+            answers[nameserver][record] = answer
+
+        return answers
 
     def pool(self, datacenter: str) -> None:
         """Set the records as pooled in the given datacenter.
@@ -285,7 +319,7 @@ class Discovery:
         self,
         record: str,
         client_ip: Union[IPv4Address, IPv6Address],
-        timeout: Optional[float] = 2.0,
+        timeout: Optional[float] = QUERY_TIMEOUT,
     ) -> dict[str, Union[IPv4Address, IPv6Address]]:
         """Resolves a discovery record with a specific client IP and returns the resolved address grouped by nameserver.
 
@@ -299,10 +333,111 @@ class Discovery:
             spicerack.discovery.DiscoveryError: if unable to resolve the address.
 
         """
-        ips_by_ns: dict[str, Union[IPv4Address, IPv6Address]] = {}
-        if record not in self._records:
-            raise DiscoveryError(f"Record '{record}' not found")
+        label = str(client_ip)
+        return self.resolve_with_client_ips({record: {label: client_ip}}, timeout=timeout)[record][label]
+
+    def resolve_with_client_ips(
+        self,
+        queries: dict[str, dict[str, Union[IPv4Address, IPv6Address]]],
+        *,
+        timeout: Optional[float] = QUERY_TIMEOUT,
+        failures: Optional[dict[str, list[str]]] = None,
+    ) -> dict[str, dict[str, dict[str, Union[IPv4Address, IPv6Address]]]]:
+        """Resolve discovery records with multiple client IPs on all the authoritative nameservers concurrently.
+
+        Examples:
+            ::
+
+                >>> client_ips = {"eqiad": ip_address("10.64.0.1"), "codfw": ip_address("10.192.0.1")}
+                >>> matrix = discovery.resolve_with_client_ips({"servicename": client_ips})
+                >>> matrix["servicename"]["codfw"]["authdns1001.wikimedia.org"]
+                IPv4Address('10.2.1.1')
+
+        Arguments:
+            queries: a dictionary with the record names as keys and as values a dictionary of arbitrary labels (e.g.
+                the datacenter names) to the IP address to be used in EDNS client subnet.
+            timeout: the number of seconds to wait before each underlying DNS query times out, or None. If None, no
+                timeout is applied, and the queries will wait forever.
+            failures: if set, the failed queries are not raised but collected in this dictionary, keyed by record
+                name, and the records with any failed query are left out of the returned matrix. This allows the
+                caller to retry only the affected records.
+
+        Returns:
+            A matrix of the resolved addresses, keyed by record name, label and nameserver.
+
+        Raises:
+            spicerack.discovery.DiscoveryError: if any record is not managed by this instance or, when ``failures`` is
+            not set, if unable to resolve any of the queries, reporting all the failures.
+
+        """
+        missing = [record for record in queries if record not in self._records]
+        if missing:
+            raise DiscoveryError(
+                "Record{} {} not found".format("s" if len(missing) > 1 else "", ", ".join(f"'{r}'" for r in missing))
+            )
+
+        matrix: list[tuple[str, str, str, Union[IPv4Address, IPv6Address]]] = [
+            (record, label, nameserver, client_ip)
+            for record, client_ips in queries.items()
+            for label, client_ip in client_ips.items()
+            for nameserver in self._resolvers
+        ]
+        results = self._run_queries(
+            lambda record, _label, nameserver, client_ip: self._query_with_client_ip(
+                nameserver, record, client_ip, timeout
+            ),
+            matrix,
+            raise_on_failure=failures is None,
+        )
+
+        ips: dict[str, dict[str, dict[str, Union[IPv4Address, IPv6Address]]]] = {
+            record: {label: {} for label in client_ips} for record, client_ips in queries.items()
+        }
+        for (record, label, nameserver, _), result in zip(matrix, results, strict=True):
+            if failures is not None and isinstance(result, DiscoveryError):
+                failures.setdefault(record, []).append(str(result))
+            else:
+                ips[record][label][nameserver] = result
+
+        return {record: labels for record, labels in ips.items() if failures is None or record not in failures}
+
+    def _query(self, nameserver: str, record: str, timeout: Optional[float]) -> resolver.Answer:
+        """Resolve a discovery record on the given authoritative nameserver.
+
+        Arguments:
+            nameserver: the hostname of the authoritative nameserver to query.
+            record: the record name to resolve.
+            timeout: the number of seconds to wait for the DNS query, or None to use the resolver's lifetime.
+
+        Raises:
+            spicerack.dnsdisc.DiscoveryError: if unable to resolve the address.
+
+        """
+        record_name = f"{record}.discovery.wmnet"
+        try:
+            return self._resolvers[nameserver].query(record_name, lifetime=timeout)
+        except DNSException as e:
+            raise DiscoveryError(f"Unable to resolve {record_name} from {nameserver}") from e
+
+    def _query_with_client_ip(
+        self,
+        nameserver: str,
+        record: str,
+        client_ip: Union[IPv4Address, IPv6Address],
+        timeout: Optional[float],
+    ) -> Union[IPv4Address, IPv6Address]:
+        """Resolve a discovery record on the given authoritative nameserver with a specific client IP.
+
+        Arguments:
+            nameserver: the hostname of the authoritative nameserver to query.
+            record: the record name to resolve.
+            client_ip: IP address to be used in EDNS client subnet.
+            timeout: the number of seconds to wait before the DNS query times out, or None to wait forever.
 
+        Raises:
+            spicerack.discovery.DiscoveryError: if unable to resolve the address.
+
+        """
         # Craft a query message
         record_name = f"{record}.discovery.wmnet"
         ecs_option = dns.edns.ECSOption(str(client_ip))
@@ -310,25 +445,65 @@ class Discovery:
         query = dns.message.make_query(record_name, rdata_a)
         query.use_edns(options=[ecs_option])
 
-        for nameserver, dns_resolver in self._resolvers.items():
-            # Make the query. We catch generic exceptions as
-            # dns.query.udp can raise many exceptions.
-            try:
-                query_response, _ = dns.query.udp_with_fallback(
-                    query, str(dns_resolver.nameservers[0]), port=dns_resolver.port, timeout=timeout
-                )
-            except Exception as exc:
-                raise DiscoveryError(f"Unable to resolve {record_name} from {nameserver}") from exc
-            # Build an Answer instance as a Stub Resolver would
-            try:
-                # Pick the first IN A response or raises a StopIteration if there is none
-                response_address = next(
-                    item.address
-                    for answer in query_response.answer
-                    if answer.rdtype == rdata_a and answer.rdclass == dns.rdatatype.from_text("A")
-                    for item in answer
-                )
-                ips_by_ns[nameserver] = ip_address(response_address)
-            except (DNSException, IndexError, StopIteration) as exc:
-                raise DiscoveryError(f"Unable to resolve {record_name} from {nameserver}: {exc}") from exc
-        return ips_by_ns
+        dns_resolver = self._resolvers[nameserver]
+        # Make the query. We catch generic exceptions as
+        # dns.query.udp can raise many exceptions.
+        try:
+            query_response, _ = dns.query.udp_with_fallback(
+                query, str(dns_resolver.nameservers[0]), port=dns_resolver.port, timeout=timeout
+            )
+        except Exception as exc:
+            raise DiscoveryError(f"Unable to resolve {record_name} from {nameserver}") from exc
+        # Build an Answer instance as a Stub Resolver would
+        try:
+            # Pick the first IN A response or raises a StopIteration if there is none
+            response_address = next(
+                item.address
+                for answer in query_response.answer
+                if answer.rdtype == rdata_a and answer.rdclass == dns.rdatatype.from_text("A")
+                for item in answer
+            )
+            return ip_address(response_address)
+        except (DNSException, IndexError, StopIteration) as exc:
+            raise DiscoveryError(f"Unable to resolve {record_name} from {nameserver}: {exc}") from exc
+
+    @staticmethod
+    def _run_queries(func: Callable[..., Any], queries: list[tuple], *, raise_on_failure: bool = True) -> list[Any]:
+        """Run all the queries concurrently and return their results in the same order.
+
+        Arguments:
+            func: the callable that performs a single query, called with each query's items as positional arguments.
+                It must raise :py:class:`spicerack.dnsdisc.DiscoveryError` on failure.
+            queries: the list of queries to perform.
+            raise_on_failure: whether to raise if any query failed. If False the exception of each failed query is
+                returned in place of its result.
+
+        Raises:
+            spicerack.dnsdisc.DiscoveryError: if any of the queries failed and ``raise_on_failure`` is True, after all
+            of them have completed.
+
+        """
+        if not queries:
+            return []
+
+        results = []
+        failures: list[DiscoveryError] = []
+        workers = min(RESOLVE_MAX_WORKERS, len(queries))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="spicerack-dnsdisc") as executor:
+            futures = [executor.submit(func, *query) for query in queries]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except DiscoveryError as e:
+                    failures.append(e)
+                    if not raise_on_failure:
+                        results.append(e)
+
+        if failures and raise_on_failure:
+            if len(failures) == 1:
+                raise failures[0]
+
+            messages = "; ".join(str(failure) for failure in failures)
+            raise DiscoveryError(f"Failed {len(failures)} of {len(queries)} DNS queries: {messages}") from failures[0]
+
+        return results
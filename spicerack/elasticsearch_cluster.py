@@ -1,14 +1,16 @@
 """ElasticsearchCluster module."""
 
 import logging
+import threading
 from collections import defaultdict
-from collections.abc import Iterable, Iterator, Sequence
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import Future, wait
 from contextlib import ExitStack, contextmanager
 from datetime import UTC, datetime, timedelta
 from enum import Enum
 from math import floor
 from random import shuffle
-from typing import Optional
+from typing import Optional, TypeVar
 
 from wmflib.prometheus import Prometheus
 from wmflib.requests import http_session
@@ -19,7 +21,16 @@ from spicerack.decorators import retry
 from spicerack.exceptions import SpicerackCheckError, SpicerackError
 from spicerack.remote import Remote, RemoteHosts, RemoteHostsAdapter
 
+CLUSTER_CHECK_TIMEOUT: timedelta = timedelta(seconds=60)
+"""The maximum time to wait for each cluster to reply to a concurrent check, twice the HTTP timeout of the calls."""
+REROUTE_BATCH_SIZE: int = 50
+"""The maximum number of commands to send in a single reroute call when forcing the allocation of shards."""
+DISK_WATERMARK_PERCENT: float = 85.0
+"""The disk usage percentage above which a node is not considered for shards allocation, Elasticsearch's low
+watermark."""
+
 logger = logging.getLogger(__name__)
+_T = TypeVar("_T")
 
 
 class ElasticsearchClusterError(SpicerackError):
@@ -180,6 +191,7 @@ class ElasticsearchClusters:
         self._prometheus = prometheus
         self._write_queue_datacenters = write_queue_datacenters
         self._dry_run = dry_run
+        self._pending: dict[int, Future] = {}  # Calls that timed out and are still running, indexed by cluster
 
     def __str__(self) -> str:
         """Class string method."""
@@ -192,13 +204,11 @@ class ElasticsearchClusters:
             timeout: timedelta object for elasticsearch request timeout.
 
         """
-        for cluster in self._clusters:
-            cluster.flush_markers(timeout)
+        self._run_on_clusters(lambda cluster: cluster.flush_markers(timeout))
 
     def force_allocation_of_all_unassigned_shards(self) -> None:
         """Force allocation of unassigned shards on all clusters."""
-        for cluster in self._clusters:
-            cluster.force_allocation_of_all_unassigned_shards()
+        self._run_on_clusters(lambda cluster: cluster.force_allocation_of_all_unassigned_shards())
 
     @contextmanager
     def frozen_writes(self, reason: Reason) -> Iterator[list[None]]:
@@ -245,8 +255,11 @@ class ElasticsearchClusters:
             exceptions=(ElasticsearchClusterCheckError,),
         )
         def inner_wait() -> None:
-            for cluster in self._clusters:
-                cluster.check_green()
+            self._run_on_clusters(
+                lambda cluster: cluster.check_green(),
+                timeout=CLUSTER_CHECK_TIMEOUT,
+                exception_class=ElasticsearchClusterCheckError,
+            )
 
         inner_wait()
 
@@ -269,8 +282,11 @@ class ElasticsearchClusters:
             exceptions=(ElasticsearchClusterCheckError,),
         )
         def inner_wait() -> None:
-            for cluster in self._clusters:
-                cluster.check_yellow_w_no_moving_shards()
+            self._run_on_clusters(
+                lambda cluster: cluster.check_yellow_w_no_moving_shards(),
+                timeout=CLUSTER_CHECK_TIMEOUT,
+                exception_class=ElasticsearchClusterCheckError,
+            )
 
         inner_wait()
 
@@ -335,8 +351,9 @@ class ElasticsearchClusters:
     def _get_nodes_group(self) -> Iterable["NodesGroup"]:
         """Get merged nodes_group for each nodes."""
         nodes_group: dict[str, NodesGroup] = {}
-        for cluster in self._clusters:
-            for json_node in cluster.get_nodes().values():
+        clusters_nodes = self._run_on_clusters(lambda cluster: cluster.get_nodes(), timeout=CLUSTER_CHECK_TIMEOUT)
+        for cluster, nodes in zip(self._clusters, clusters_nodes, strict=True):
+            for json_node in nodes.values():
                 node_name = json_node["attributes"]["hostname"]
                 if node_name not in nodes_group:
                     nodes_group[node_name] = NodesGroup(json_node, cluster)
@@ -344,6 +361,106 @@ class ElasticsearchClusters:
                     nodes_group[node_name].accumulate(json_node, cluster)
         return nodes_group.values()
 
+    def _run_on_clusters(
+        self,
+        func: Callable[["ElasticsearchCluster"], _T],
+        *,
+        timeout: Optional[timedelta] = None,
+        exception_class: type[SpicerackError] = ElasticsearchClusterError,
+    ) -> list[_T]:
+        """Run the given function concurrently on all the clusters, one thread per cluster.
+
+        A slow cluster doesn't delay the others, the overall latency is the one of the slowest cluster. All the
+        clusters are always waited for, and their failures are reported together. A cluster with a call that
+        previously timed out and is still running is not called again until that call completes, so that retry loops
+        don't pile up threads on an unresponsive cluster. The calls run in daemon threads, so that a call stuck on an
+        unresponsive cluster doesn't prevent the process from exiting.
+
+        Arguments:
+            func: the function to call, it receives the cluster instance as its only argument.
+            timeout: how long to wait for each cluster. If :py:data:`None` waits until all the calls have completed.
+                The calls still pending at the timeout are left running in the background and considered failed.
+            exception_class: the exception class to use for the timed out clusters and to aggregate the failures.
+
+        Returns:
+            The return values of the function, in the same order of the clusters.
+
+        Raises:
+            spicerack.exceptions.SpicerackError: if the function failed on any cluster. When a single cluster failed
+            its exception is re-raised as is. When multiple clusters failed an ``exception_class`` exception is raised
+            if all the failures were of that type,
+            :py:class:`spicerack.elasticsearch_cluster.ElasticsearchClusterError` otherwise.
+
+        """
+        busy = {index for index, future in self._pending.items() if not future.done()}
+        futures = {
+            index: ElasticsearchClusters._start_call(func, cluster, name=f"elasticsearch-{index}")
+            for index, cluster in enumerate(self._clusters)
+            if index not in busy
+        }
+        wait(futures.values(), timeout=timeout.total_seconds() if timeout is not None else None)
+        timed_out = {index for index, future in futures.items() if not future.done()}
+        self._pending = {index: self._pending[index] for index in busy}
+        self._pending.update({index: futures[index] for index in timed_out})
+
+        results: list[_T] = []
+        errors: list[tuple[ElasticsearchCluster, BaseException]] = []
+        for index, cluster in enumerate(self._clusters):
+            if index in busy:
+                errors.append((cluster, exception_class(f"A previous timed out call is still running on {cluster}")))
+                continue
+
+            if index in timed_out:
+                errors.append((cluster, exception_class(f"Timed out after {timeout} waiting for {cluster}")))
+                continue
+
+            future = futures[index]
+            error = future.exception()
+            if error is not None:
+                errors.append((cluster, error))
+            else:
+                results.append(future.result())
+
+        if not errors:
+            return results
+
+        if len(errors) == 1:
+            raise errors[0][1]
+
+        message = f"Failed on {len(errors)} clusters: " + "; ".join(f"{cluster}: {error}" for cluster, error in errors)
+        if all(isinstance(error, exception_class) for _, error in errors):
+            raise exception_class(message) from errors[0][1]
+
+        raise ElasticsearchClusterError(message) from errors[0][1]
+
+    @staticmethod
+    def _start_call(
+        func: Callable[["ElasticsearchCluster"], _T], cluster: "ElasticsearchCluster", *, name: str
+    ) -> Future:
+        """Call the function on the cluster in a new daemon thread.
+
+        Arguments:
+            func: the function to call, it receives the cluster instance as its only argument.
+            cluster: the cluster to pass to the function.
+            name: the name of the thread.
+
+        Returns:
+            The future that gets the result of the call.
+
+        """
+        future: Future = Future()
+
+        def run() -> None:
+            """Run the function setting its outcome in the future."""
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(func(cluster))
+            except BaseException as e:  # pylint: disable=broad-except
+                future.set_exception(e)
+
+        threading.Thread(target=run, name=name, daemon=True).start()
+        return future
+
     @staticmethod
     def _to_rows(nodes: Sequence["NodesGroup"]) -> defaultdict[str, list["NodesGroup"]]:
         """Arrange nodes in rows, so each node belongs in their respective row.
@@ -661,17 +778,135 @@ class ElasticsearchCluster:
             logger.warning("Not all shards were synced flushed on %s.", self)
 
     def force_allocation_of_all_unassigned_shards(self) -> None:
-        """Manual allocation of unassigned shards."""
-        cluster_nodes_names = [node["name"] for node in self.get_nodes().values()]
-        unassigned_shards = self._get_unassigned_shards()
-        for unassigned_shard in unassigned_shards:
-            self._force_allocation_of_shard(unassigned_shard, cluster_nodes_names)
-
-    def _get_unassigned_shards(self) -> list[dict]:
-        """Fetch unassigned shards from the cluster."""
-        params = {"format": "json", "h": "index,shard,state"}
-        shard_response = self.make_api_call("/_cat/shards", params, "GET", {}, 30)
-        return [s for s in shard_response if s["state"] == "UNASSIGNED"]
+        """Manual allocation of unassigned shards.
+
+        The allocation of all the unassigned replica shards is planned upfront with
+        :py:meth:`spicerack.elasticsearch_cluster.ElasticsearchCluster.plan_allocation_of_unassigned_shards` and
+        submitted in batches of :py:data:`spicerack.elasticsearch_cluster.REROUTE_BATCH_SIZE` commands per reroute
+        call. If a batch is rejected, its shards are allocated one by one trying all the nodes. In DRY-RUN mode the
+        plan is only logged.
+        """
+        shards = self._get_shards()
+        nodes_allocation = self._get_nodes_allocation()
+        plan = self._plan_shards_allocation(shards, nodes_allocation)
+        self._log_allocation_plan(plan)
+        if not plan or self._dry_run:
+            return
+
+        nodes_names = list(nodes_allocation.keys())
+        for start in range(0, len(plan), REROUTE_BATCH_SIZE):
+            batch = plan[start : start + REROUTE_BATCH_SIZE]
+            try:
+                self.make_api_call(
+                    route="/_cluster/reroute",
+                    params={"retry_failed": True},
+                    http_method="POST",
+                    body={"commands": batch},
+                    timeout=30,
+                )
+                logger.info("Successfully allocated %d shards on %s", len(batch), self)
+            except (APIClientError, APIClientResponseError) as e:
+                logger.warning(
+                    "Could not allocate a batch of %d shards on %s, falling back to one shard at a time: %s",
+                    len(batch),
+                    self,
+                    e,
+                )
+                for command in batch:
+                    self._force_allocation_of_shard(command["allocate_replica"], nodes_names)
+
+    def plan_allocation_of_unassigned_shards(self) -> list[dict]:
+        """Compute a balanced allocation of the unassigned replica shards, without applying it.
+
+        Each shard is assigned to the data node with the fewest shards, then the lowest disk usage, that doesn't
+        already hold a copy of the same shard and that is below
+        :py:data:`spicerack.elasticsearch_cluster.DISK_WATERMARK_PERCENT` disk usage. The shards assigned by the plan
+        are taken into account when assigning the following ones.
+
+        Returns:
+            The list of ``allocate_replica`` commands to submit to the ``/_cluster/reroute`` API, for example::
+
+                [{'allocate_replica': {'index': 'index1', 'shard': 2, 'node': 'el1-alpha'}}]
+
+        """
+        return self._plan_shards_allocation(self._get_shards(), self._get_nodes_allocation())
+
+    def _get_shards(self) -> list[dict]:
+        """Fetch all the shards of the cluster with their state and the node they are allocated to, if any."""
+        params = {"format": "json", "h": "index,shard,prirep,state,node"}
+        return self.make_api_call("/_cat/shards", params, "GET", {}, 30)  # type: ignore[return-value]
+
+    def _get_nodes_allocation(self) -> dict[str, tuple[int, float]]:
+        """Fetch the number of shards and the disk usage percentage of each data node of the cluster.
+
+        Returns:
+            A dictionary with the node names as keys and a tuple with the number of shards and the disk usage
+            percentage as values.
+
+        """
+        params = {"format": "json", "h": "node,shards,disk.percent"}
+        response = self.make_api_call("/_cat/allocation", params, "GET", {}, 30)
+        return {
+            row["node"]: (int(row["shards"] or 0), float(row["disk.percent"] or 0))
+            for row in response
+            if row["node"] != "UNASSIGNED"  # The pseudo-node that counts the unassigned shards
+        }
+
+    def _plan_shards_allocation(self, shards: list[dict], nodes_allocation: dict[str, tuple[int, float]]) -> list[dict]:
+        """Plan the allocation of the unassigned replica shards on the given nodes.
+
+        Arguments:
+            shards: all the shards of the cluster, as returned by the ``_cat/shards`` API.
+            nodes_allocation: the current shards count and disk usage of the data nodes.
+
+        Returns:
+            The list of ``allocate_replica`` reroute commands.
+
+        """
+        nodes_shards = {node: shards_count for node, (shards_count, _) in nodes_allocation.items()}
+        copies: defaultdict[tuple[str, str], set[str]] = defaultdict(set)
+        for shard in shards:
+            if shard["node"]:
+                copies[(shard["index"], str(shard["shard"]))].add(shard["node"])
+
+        plan = []
+        for shard in shards:
+            if shard["state"] != "UNASSIGNED":
+                continue
+
+            if shard["prirep"] != "r":
+                logger.warning("Unassigned primary shard [%s:%s] can't be allocated", shard["index"], shard["shard"])
+                continue
+
+            key = (shard["index"], str(shard["shard"]))
+            candidates = [
+                node
+                for node, (_, disk_percent) in nodes_allocation.items()
+                if node not in copies[key] and disk_percent < DISK_WATERMARK_PERCENT
+            ]
+            if not candidates:
+                logger.warning("Could not find any node to allocate shard [%s:%s] on %s", key[0], key[1], self)
+                continue
+
+            node = min(candidates, key=lambda name: (nodes_shards[name], nodes_allocation[name][1], name))
+            nodes_shards[node] += 1
+            copies[key].add(node)
+            plan.append({"allocate_replica": {"index": shard["index"], "shard": shard["shard"], "node": node}})
+
+        return plan
+
+    def _log_allocation_plan(self, plan: list[dict]) -> None:
+        """Log the given shards allocation plan.
+
+        Arguments:
+            plan: the list of ``allocate_replica`` reroute commands.
+
+        """
+        prefix = "Would allocate" if self._dry_run else "Allocating"
+        logger.info("%s %d unassigned shards on %s", prefix, len(plan), self)
+        for command in plan:
+            params = command["allocate_replica"]
+            logger.debug("%s [%s:%s] on [%s]", prefix, params["index"], params["shard"], params["node"])
 
     def _force_allocation_of_shard(self, shard: dict, nodes: list[str]) -> None:
         """Force allocation of shard.
@@ -4,6 +4,7 @@ import json
 import logging
 import re
 import shlex
+import threading
 import time
 from collections import UserDict
 from collections.abc import Iterator, Mapping, Sequence
@@ -25,6 +26,12 @@ ICINGA_DOMAIN: str = "icinga.wikimedia.org"
 """The Icinga website FQDN."""
 MIN_DOWNTIME_SECONDS: int = 60
 """Minimum time in seconds the downtime can be set to."""
+STATUS_CACHE_TTL: timedelta = timedelta(seconds=5)
+"""Maximum age of the Icinga status of a host that can be shared across :py:class:`spicerack.icinga.IcingaHosts`
+instances for the same Icinga server."""
+MAX_COMMANDS_WRITE_SIZE: int = 100_000
+"""Maximum size in bytes of a single remote command writing to the Icinga command file, to stay below the 128KiB
+limit of the Linux kernel for a single argument, as the whole command is passed to ``bash -c``."""
 logger = logging.getLogger(__name__)
 
 
@@ -247,11 +254,192 @@ class HostStatus:
         return [service["name"] for service in self.services if service.downtimed]
 
 
+class StatusCache:
+    """Short-lived cache of the Icinga status of hosts, shared by all the users of the same Icinga server.
+
+    The instance is owned by :py:class:`spicerack.Spicerack`, that shares it among all the
+    :py:class:`spicerack.icinga.IcingaHosts` instances of the same Icinga server for the duration of the run.
+
+    Each status fetch gets an increasing sequence number. Callers that poll the status pass the sequence number of
+    the status they got last time, so that they never get the same status twice, while a status fetched in the
+    meanwhile by another caller can be re-used. New callers start from the current sequence number, hence they never
+    get a status fetched before they were created. When a fetch is needed, the status of all the hosts requested by
+    any caller in the last TTL is fetched too, so that many callers polling different sets of hosts at the same time
+    end up sharing the same fetch. The fetch from the Icinga server is performed without holding the lock, so that
+    the callers that can use the cached status are not blocked by it.
+    """
+
+    def __init__(self, icinga_host: RemoteHosts, *, ttl: timedelta = STATUS_CACHE_TTL) -> None:
+        """Initialize the instance.
+
+        Arguments:
+            icinga_host: the Icinga host instance.
+            ttl: the maximum age of the cached status of a host.
+
+        """
+        self._icinga_host = icinga_host
+        self._ttl = ttl.total_seconds()
+        self._lock = threading.Lock()
+        self._sequence = 0
+        # The sequence number at which the status of each host was last invalidated
+        self._invalidated: dict[str, int] = {}
+        # The cached status per (verbatim_hosts, service_re), as hostname: (sequence, fetch time, status)
+        self._entries: dict[tuple[bool, str], dict[str, tuple[int, float, HostStatus]]] = {}
+        # When the status of each host was last requested per (verbatim_hosts, service_re)
+        self._requested: dict[tuple[bool, str], dict[str, float]] = {}
+
+    @property
+    def sequence(self) -> int:
+        """The current sequence number, to be passed as ``newer_than`` to not get any status fetched until now."""
+        with self._lock:
+            return self._sequence
+
+    def get_status(
+        self, hosts: NodeSet, *, verbatim_hosts: bool = False, service_re: str = "", newer_than: int = 0
+    ) -> tuple[HostsStatus, int]:
+        """Get the status of the given hosts, fetching from the Icinga server only the missing or outdated ones.
+
+        Arguments:
+            hosts: the hosts to get the status for.
+            verbatim_hosts: whether the hosts are passed verbatim to icinga-status.
+            service_re: if non-empty, the regular expression matching service names.
+            newer_than: consider outdated the status with a sequence number less than or equal to this value.
+
+        Returns:
+            A tuple with the status of the hosts and the highest sequence number among them, to be passed as
+            ``newer_than`` when polling.
+
+        Raises:
+            spicerack.icinga.IcingaError: if unable to get the status.
+            spicerack.icinga.IcingaStatusParseError: when failing to parse the status.
+            spicerack.icinga.IcingaStatusNotFoundError: if a host is not found in the Icinga status.
+
+        """
+        key = (verbatim_hosts, service_re)
+        with self._lock:
+            now = time.monotonic()
+            entries = self._entries.setdefault(key, {})
+            requested = self._requested.setdefault(key, {})
+            requested.update(dict.fromkeys(hosts, now))
+
+            def is_fresh(hostname: str) -> bool:
+                """Check if the cached status of the host can be used."""
+                return (
+                    hostname in entries
+                    and entries[hostname][0] > newer_than
+                    and now - entries[hostname][1] <= self._ttl
+                )
+
+            status = HostsStatus({hostname: entries[hostname][2] for hostname in hosts if is_fresh(hostname)})
+            if len(status) == len(hosts):
+                logger.debug("Using the cached Icinga status for hosts %s", hosts)
+                return status, max(entries[hostname][0] for hostname in status)
+
+            # Fetch also the hosts recently requested by others, to share the fetch with them
+            others = NodeSet.fromlist(
+                [
+                    hostname
+                    for hostname, requested_at in requested.items()
+                    if hostname not in hosts and now - requested_at <= self._ttl
+                ]
+            )
+            to_fetch = NodeSet.fromlist([hostname for hostname in hosts if hostname not in status]) | others
+            self._sequence += 1
+            sequence = self._sequence
+
+        fetched, missing = self._fetch(to_fetch, verbatim_hosts=verbatim_hosts, service_re=service_re)
+
+        with self._lock:
+            for hostname in list(fetched) + missing:
+                # Don't overwrite the status from a newer fetch nor store it if invalidated while fetching
+                newer = hostname in entries and entries[hostname][0] > sequence
+                if newer or self._invalidated.get(hostname, 0) > sequence:
+                    continue
+
+                if hostname in fetched:
+                    entries[hostname] = (sequence, now, fetched[hostname])
+                else:
+                    entries.pop(hostname, None)
+
+        missing_hosts = [hostname for hostname in missing if hostname not in others]
+        if missing_hosts:
+            raise IcingaStatusNotFoundError(missing_hosts)
+
+        status.update({hostname: fetched[hostname] for hostname in fetched if hostname not in others})
+        return status, sequence
+
+    def invalidate(self, hosts: NodeSet) -> int:
+        """Remove the cached status of the given hosts, for example after sending commands that change it.
+
+        The status of the given hosts from the fetches still in progress is not cached either.
+
+        Arguments:
+            hosts: the hosts to invalidate.
+
+        Returns:
+            The new sequence number, to be passed as ``newer_than`` to get only the status fetched after the
+            invalidation.
+
+        """
+        with self._lock:
+            self._sequence += 1
+            for hostname in hosts:
+                self._invalidated[hostname] = self._sequence
+            for entries in self._entries.values():
+                for hostname in hosts:
+                    entries.pop(hostname, None)
+
+            return self._sequence
+
+    def _fetch(
+        self, hosts: NodeSet, *, verbatim_hosts: bool, service_re: str
+    ) -> tuple[dict[str, HostStatus], list[str]]:
+        """Fetch the status of the given hosts from the Icinga server.
+
+        Arguments:
+            hosts: the hosts to get the status for.
+            verbatim_hosts: whether the hosts are passed verbatim to icinga-status.
+            service_re: if non-empty, the regular expression matching service names.
+
+        Returns:
+            A tuple with the status of the hosts found and the list of hosts not found in Icinga.
+
+        """
+        # icinga-status exits with non-zero exit code on missing and non-optimal hosts.
+        verbatim = " --verbatim-hosts" if verbatim_hosts else ""
+        services = (" --services " + shlex.quote(service_re)) if service_re else ""
+        command = Command(f'/usr/local/bin/icinga-status -j{verbatim}{services} "{hosts}"', ok_codes=[])
+        for _, output in self._icinga_host.run_sync(
+            command, is_safe=True, print_output=False, print_progress_bars=False
+        ):  # icinga-status is a read-only script
+            json_status = output.message().decode()
+            break
+        else:
+            raise IcingaError("Unable to get the status for the given hosts, no output from icinga-status")
+
+        try:
+            status = json.loads(json_status)
+        except json.JSONDecodeError as e:
+            raise IcingaStatusParseError("Unable to parse Icinga status") from e
+
+        missing = [hostname for hostname, host_status in status.items() if host_status is None]
+        fetched = {
+            hostname: HostStatus(**host_status) for hostname, host_status in status.items() if host_status is not None
+        }
+        return fetched, missing
+
+
 class IcingaHosts:
     """Class to manage the Icinga checks of a given set of hosts."""
 
     def __init__(
-        self, icinga_host: RemoteHosts, target_hosts: TypeHosts, *, verbatim_hosts: bool = False, dry_run: bool = True
+        self,
+        icinga_host: RemoteHosts,
+        target_hosts: TypeHosts,
+        *,
+        verbatim_hosts: bool = False,
+        dry_run: bool = True,
+        status_cache: Optional[StatusCache] = None,
     ) -> None:
         """Initialize the instance.
 
@@ -261,6 +449,8 @@ class IcingaHosts:
             verbatim_hosts: if :py:data:`True` use the hosts passed verbatim as is, if instead :py:data:`False`, the
                 default, consider the given target hosts as FQDNs and extract their hostnames to be used in Icinga.
             dry_run: whether this is a DRY-RUN.
+            status_cache: the status cache of the same Icinga server to share with other instances. If not set, a
+                new one is used, only by this instance.
 
         """
         if not verbatim_hosts:
@@ -275,6 +465,9 @@ class IcingaHosts:
             raise IcingaError("Got empty target hosts list.")
 
         self._command_file = CommandFile(icinga_host)  # This validates also that icinga_host matches a single server.
+        self._status_cache = status_cache if status_cache is not None else StatusCache(icinga_host)
+        # The sequence number of the last status got from the cache, start from the current one to get a new status
+        self._status_sequence = self._status_cache.sequence
         self._icinga_host = icinga_host
         self._verbatim_hosts = verbatim_hosts
         self._dry_run = dry_run
@@ -334,8 +527,7 @@ class IcingaHosts:
         #  SCHEDULE_HOST_SVC_DOWNTIME also downtimes the host itself, not just the services. But if it does so, that's
         #  an undocumented extra feature. For now we're keeping this call for consistency with the older icinga-downtime
         #  script, even though it may be redundant, and in the future we can evaluate whether it's unnecessary.
-        self.run_icinga_command(
-            "SCHEDULE_HOST_DOWNTIME",
+        args = (
             start_time,
             end_time,
             "1",  # Start at the start_time and end at the end_time.
@@ -344,15 +536,9 @@ class IcingaHosts:
             reason.owner,
             reason.reason,
         )
-        self.run_icinga_command(
-            "SCHEDULE_HOST_SVC_DOWNTIME",
-            start_time,
-            end_time,
-            "1",  # Start at the start_time and end at the end_time.
-            "0",  # Not triggered by another downtime.
-            str(duration_seconds),
-            reason.owner,
-            reason.reason,
+        self._write_commands(
+            self._get_hosts_commands("SCHEDULE_HOST_DOWNTIME", *args)
+            + self._get_hosts_commands("SCHEDULE_HOST_SVC_DOWNTIME", *args)
         )
         try:  # Best effort attempt to ensure the downtime was applied. See T309447.
             self.wait_for_downtimed()
@@ -469,7 +655,7 @@ class IcingaHosts:
             for service in host_status.services:
                 logger.debug('Downtiming "%s" on %s', service["name"], hostname)
                 commands.append(
-                    self._get_command_string(
+                    self._get_command_line(
                         "SCHEDULE_SVC_DOWNTIME",
                         hostname,
                         service["name"],
@@ -482,12 +668,14 @@ class IcingaHosts:
                         reason.reason,
                     )
                 )
-        self._icinga_host.run_sync(*commands, print_output=False, print_progress_bars=False)
+        self._write_commands(commands)
 
     def recheck_all_services(self) -> None:
         """Force recheck of all services associated with a set of hosts."""
-        self.run_icinga_command("SCHEDULE_FORCED_HOST_SVC_CHECKS", str(int(time.time())))
-        self.run_icinga_command("SCHEDULE_FORCED_HOST_CHECK", str(int(time.time())))
+        self._write_commands(
+            self._get_hosts_commands("SCHEDULE_FORCED_HOST_SVC_CHECKS", str(int(time.time())))
+            + self._get_hosts_commands("SCHEDULE_FORCED_HOST_CHECK", str(int(time.time())))
+        )
 
     def recheck_failed_services(self) -> None:
         """Force recheck of all failed associated with a set of hosts."""
@@ -496,10 +684,8 @@ class IcingaHosts:
         if status.optimal:
             return
 
-        self.run_icinga_command("SCHEDULE_FORCED_HOST_CHECK", str(int(time.time())))
-
         commands = [
-            self._get_command_string("SCHEDULE_FORCED_SVC_CHECK", hostname, service_name, str(int(time.time())))
+            self._get_command_line("SCHEDULE_FORCED_SVC_CHECK", hostname, service_name, str(int(time.time())))
             for hostname, failed in status.failed_services.items()
             for service_name in failed
         ]
@@ -508,9 +694,8 @@ class IcingaHosts:
             logger.debug(
                 "Status not optimal, with no failed service, for hosts: %s, status: %s", self._target_hosts, status
             )
-            return
 
-        self._icinga_host.run_sync(*commands, print_output=False, print_progress_bars=False)
+        self._write_commands(self._get_hosts_commands("SCHEDULE_FORCED_HOST_CHECK", str(int(time.time()))) + commands)
 
     def remove_downtime(self) -> None:
         """Remove a downtime from a set of hosts."""
@@ -549,9 +734,9 @@ class IcingaHosts:
                     continue
                 logger.debug('Removing downtime for "%s" on %s', service["name"], hostname)
                 # DEL_DOWNTIME_BY_HOST_NAME is misleadingly named -- it also accepts an optional service name argument.
-                commands.append(self._get_command_string("DEL_DOWNTIME_BY_HOST_NAME", hostname, service["name"]))
+                commands.append(self._get_command_line("DEL_DOWNTIME_BY_HOST_NAME", hostname, service["name"]))
         if commands:
-            self._icinga_host.run_sync(*commands, print_output=False, print_progress_bars=False)
+            self._write_commands(commands)
         else:
             logger.info("No services downtimed, nothing to do.")
 
@@ -571,8 +756,7 @@ class IcingaHosts:
             https://icinga.com/docs/icinga1/latest/en/extcommands2.html
 
         """
-        commands = [self._get_command_string(command, target_host, *args) for target_host in self._target_hosts]
-        self._icinga_host.run_sync(*commands, print_output=False, print_progress_bars=False)
+        self._write_commands(self._get_hosts_commands(command, *args))
 
     def get_status(self, service_re: str = "") -> HostsStatus:
         """Get the current status of the given hosts from Icinga.
@@ -591,31 +775,13 @@ class IcingaHosts:
             # Compile the regex and ignore the result, in order to raise re.error if it's malformed.
             re.compile(service_re)
 
-        # icinga-status exits with non-zero exit code on missing and non-optimal hosts.
-        verbatim = " --verbatim-hosts" if self._verbatim_hosts else ""
-        services = (" --services " + shlex.quote(service_re)) if service_re else ""
-        command = Command(
-            f'/usr/local/bin/icinga-status -j{verbatim}{services} "{self._target_hosts}"',
-            ok_codes=[],
+        status, self._status_sequence = self._status_cache.get_status(
+            self._target_hosts,
+            verbatim_hosts=self._verbatim_hosts,
+            service_re=service_re,
+            newer_than=self._status_sequence,
         )
-        for _, output in self._icinga_host.run_sync(
-            command, is_safe=True, print_output=False, print_progress_bars=False
-        ):  # icinga-status is a read-only script
-            json_status = output.message().decode()
-            break
-        else:
-            raise IcingaError("Unable to get the status for the given hosts, no output from icinga-status")
-
-        try:
-            status = json.loads(json_status)
-        except json.JSONDecodeError as e:
-            raise IcingaStatusParseError("Unable to parse Icinga status") from e
-
-        missing_hosts = [hostname for hostname, host_status in status.items() if host_status is None]
-        if missing_hosts:
-            raise IcingaStatusNotFoundError(missing_hosts)
-
-        return HostsStatus({hostname: HostStatus(**host_status) for hostname, host_status in status.items()})
+        return status
 
     def wait_for_optimal(self, *, skip_acked: bool = False, skip_downtimed: bool = False) -> None:
         """Waits for an icinga optimal status, else raises an exception.
@@ -669,13 +835,76 @@ class IcingaHosts:
         self.recheck_failed_services()
         check()
 
-    def _get_command_string(self, *args: str) -> str:
-        """Get the Icinga command to execute given the current arguments.
+    def _get_hosts_commands(self, command: str, *args: str) -> list[str]:
+        """Get the Icinga command lines to execute the given command for all the current hosts.
+
+        Arguments:
+            command: the Icinga command to execute.
+            *args: optional positional arguments to pass to the command after the hostname.
+
+        """
+        return [self._get_command_line(command, target_host, *args) for target_host in self._target_hosts]
+
+    @staticmethod
+    def _get_command_line(*args: str) -> str:
+        """Get the Icinga command line to write into the command file given the current arguments.
 
         Arguments:
-            *args: positional arguments to use to compose the Icinga command string.
+            *args: positional arguments to use to compose the Icinga command line.
 
         """
         args_str = ";".join(args)
-        bash_cmd = f'echo -n "[{int(time.time())}] {args_str}" > {self._command_file} '
-        return "bash -c " + shlex.quote(bash_cmd)
+        return f"[{int(time.time())}] {args_str}"
+
+    def _write_commands(self, lines: Sequence[str]) -> None:
+        """Write the given Icinga command lines into the command file with as few remote executions as possible.
+
+        All the lines are written by a single shell opening the command file once. Each line is written with a separate
+        ``printf`` call and hence a separate write, that is atomic on the command file pipe, so that they can't be
+        interleaved with commands written by other processes. The lines are split into multiple remote commands, run
+        sequentially, only if they exceed :py:const:`spicerack.icinga.MAX_COMMANDS_WRITE_SIZE`. Nothing is executed if
+        there are no lines to write.
+
+        Arguments:
+            lines: the Icinga command lines to write, as returned by :py:meth:`_get_command_line`.
+
+        """
+        if not lines:
+            logger.debug("No Icinga commands to write to the command file on %s", self._icinga_host)
+            return
+
+        commands = []
+        batch: list[str] = []
+        batch_size = 0
+        for line in lines:
+            printf = f'printf "%s\\n" {shlex.quote(line)}; '
+            if batch and batch_size + len(printf) > MAX_COMMANDS_WRITE_SIZE:
+                commands.append(self._get_write_command(batch))
+                batch = []
+                batch_size = 0
+
+            batch.append(printf)
+            batch_size += len(printf)
+
+        if batch:
+            commands.append(self._get_write_command(batch))
+
+        logger.info(
+            "Writing %d Icinga commands (%d bytes) to the command file on %s with %d remote command%s",
+            len(lines),
+            sum(len(line.encode()) + 1 for line in lines),  # Including the newline
+            self._icinga_host,
+            len(commands),
+            "" if len(commands) == 1 else "s",
+        )
+        self._icinga_host.run_sync(*commands, print_output=False, print_progress_bars=False)
+        self._status_sequence = self._status_cache.invalidate(self._target_hosts)
+
+    def _get_write_command(self, printfs: list[str]) -> str:
+        """Get the remote command to write the given command lines into the command file.
+
+        Arguments:
+            printfs: the printf shell commands that write each command line.
+
+        """
+        return "bash -c " + shlex.quote(f"{{ {''.join(printfs)}}} > {self._command_file}")
@@ -1,14 +1,19 @@
 """Kubernetes module."""
 
 import logging
+import math
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from http import HTTPStatus
 from pathlib import Path
 from typing import Any, ClassVar, Optional
 
 import kubernetes  # mypy: no-type
-from kubernetes import client, config  # mypy: no-type
+from kubernetes import client, config, watch  # mypy: no-type
 from kubernetes.client.models import V1Taint
+from wmflib.decorators import RetryParams
 
 try:
     from kubernetes.client import V1beta1Eviction as V1Eviction
@@ -18,6 +23,12 @@ except ImportError:
 from spicerack.decorators import retry
 from spicerack.exceptions import SpicerackCheckError, SpicerackError
 
+TERMINATED_POD_PHASES: tuple[str, ...] = ("Succeeded", "Failed")
+"""The phases of a pod that has terminated."""
+DRAIN_WAIT_MARGIN: int = 120
+"""How many seconds to wait for the evicted pods to terminate on top of their highest termination grace period."""
+MAX_EVICTION_RETRY_AFTER: int = 60
+"""The maximum number of seconds to honour from the Retry-After header of a refused eviction."""
 logger = logging.getLogger(__name__)
 
 
@@ -53,6 +64,10 @@ class Kubernetes:
         self.api = KubernetesApiFactory(cluster)
         self.dry_run = dry_run
 
+    def close(self) -> None:
+        """Close the connections to the kubernetes API, see :py:meth:`spicerack.k8s.KubernetesApiFactory.close`."""
+        self.api.close()
+
     def get_node(self, name: str) -> "KubernetesNode":
         """Get a kubernetes node.
 
@@ -96,6 +111,8 @@ class KubernetesApiFactory:
         """
         self.cluster = cluster
         self._configurations: dict[str, client.Configuration] = {}
+        self._api_clients: dict[str, client.ApiClient] = {}
+        self._api_clients_lock = threading.Lock()
 
     def configuration(self, user: str) -> client.Configuration:
         """Get the configuration for a specific user.
@@ -120,6 +137,35 @@ class KubernetesApiFactory:
                 raise KubernetesError(e) from e
         return self._configurations[user]
 
+    def api_client(self, user: str) -> client.ApiClient:
+        """Get the API client for a specific user, shared by all the APIs of this cluster for the same user.
+
+        The API client is created only once per user and reused, so that its pool of keep-alive connections to the
+        kubernetes API is reused across calls.
+
+        Arguments:
+            user: the user to fetch the API client for.
+
+        Raises:
+            spicerack.k8s.KubernetesError: if the user or the configuration are invalid.
+
+        """
+        with self._api_clients_lock:
+            if user not in self._api_clients:
+                self._api_clients[user] = client.ApiClient(configuration=self.configuration(user))
+
+            return self._api_clients[user]
+
+    def close(self) -> None:
+        """Close all the API clients and their pooled connections. New API clients are created if used again."""
+        with self._api_clients_lock:
+            api_clients = list(self._api_clients.values())
+            self._api_clients.clear()
+
+        for api_client in api_clients:
+            api_client.close()
+            api_client.rest_client.pool_manager.clear()
+
     def core(self, *, user: str = "admin") -> kubernetes.client.CoreV1Api:
         """Return an instance of the core api correctly configured.
 
@@ -127,8 +173,7 @@ class KubernetesApiFactory:
             user: the user to use for authentication.
 
         """
-        conf = self.configuration(user)
-        return self.API_CLASSES["core"](client.ApiClient(configuration=conf))
+        return self.API_CLASSES["core"](self.api_client(user))
 
     def batch(self, *, user: str = "admin") -> kubernetes.client.BatchV1Api:
         """Return an instance of the batch api correctly configured.
@@ -137,8 +182,7 @@ class KubernetesApiFactory:
             user: the user to use for authentication.
 
         """
-        conf = self.configuration(user)
-        return self.API_CLASSES["batch"](client.ApiClient(configuration=conf))
+        return self.API_CLASSES["batch"](self.api_client(user))
 
     def _config_file_path(self, user: str) -> Path:
         """Returns the path on the configuration file for the given cluster and user."""
@@ -236,29 +280,47 @@ class KubernetesNode:
         if not self.is_schedulable():
             raise KubernetesCheckError(f"Node {self} is not schedulable after trying to uncordon it.")
 
-    def drain(self) -> None:
+    def drain(self, *, max_workers: int = 10, timeout: Optional[int] = None) -> None:
         """Drains the node, analogous to `kubectl drain`.
 
+        The pods are evicted concurrently. Each eviction refused because of a PodDisruptionBudget or an API rate limit
+        is retried with exponential backoff, see :py:meth:`spicerack.k8s.KubernetesPod.evict`. Then the node's pods
+        are watched until all the evicted ones are terminated or deleted.
+
+        Arguments:
+            max_workers: the maximum number of concurrent evictions.
+            timeout: how many seconds to wait for the evicted pods to terminate. If not set, the highest termination
+                grace period of the evicted pods plus :py:data:`spicerack.k8s.DRAIN_WAIT_MARGIN` seconds.
+
         Raises:
+            spicerack.k8s.KubernetesError: if max_workers is not positive.
             spicerack.k8s.KubernetesCheckError: if we can't evict all pods.
 
         """
+        if max_workers < 1:
+            raise KubernetesError(f"The max_workers must be a positive integer, got {max_workers}")
+
         unevictable: list["KubernetesPod"] = []
         failed: list[tuple["KubernetesPod", KubernetesApiError]] = []
+        evicted: list["KubernetesPod"] = []
         self.cordon()
-        max_grace_period = 0
-        for pod in self.get_pods():
-            try:
-                # Dry run is passed to the pods, so if we're in dry-run mode nothing will actually be evicted.
-                pod.evict()
-            except KubernetesError:
-                # pod.evict raises a KubernetesError if the pod is unevictable
-                unevictable.append(pod)
-            except KubernetesApiError as e:
-                failed.append((pod, e))
-            # Update the max grace period.
-            if not pod.is_terminated() and pod.spec.termination_grace_period_seconds > max_grace_period:
-                max_grace_period = pod.spec.termination_grace_period_seconds
+        pods = self.get_pods()
+        with ThreadPoolExecutor(
+            max_workers=max(min(max_workers, len(pods)), 1), thread_name_prefix="k8s-drain"
+        ) as executor:
+            # Dry run is passed to the pods, so if we're in dry-run mode nothing will actually be evicted.
+            futures = [(pod, executor.submit(pod.evict)) for pod in pods]
+            for pod, future in futures:
+                try:
+                    future.result()
+                except KubernetesError:
+                    # pod.evict raises a KubernetesError if the pod is unevictable
+                    unevictable.append(pod)
+                except KubernetesApiError as e:
+                    failed.append((pod, e))
+                else:
+                    if not pod.is_terminated():
+                        evicted.append(pod)
 
         if len(failed) > 0:
             for p, exc in failed:
@@ -266,7 +328,11 @@ class KubernetesNode:
 
             raise KubernetesCheckError(f"Could not evict all pods from node {self}")
 
-        self._wait_for_empty(len(unevictable), max_grace_period)
+        if timeout is None:
+            grace_periods = [pod.spec.termination_grace_period_seconds or 0 for pod in evicted]
+            timeout = max(grace_periods, default=0) + DRAIN_WAIT_MARGIN
+
+        self._wait_for_evicted(evicted, timeout)
 
     def refresh(self) -> None:
         """Refresh the api object from the kubernetes api server."""
@@ -305,14 +371,20 @@ class KubernetesNode:
 
     def get_pods(self) -> list["KubernetesPod"]:
         """Get the pods running on this node."""
-        pods = []
+        return [
+            KubernetesPod(obj.metadata.namespace, obj.metadata.name, self._api, dry_run=self._dry_run, init_obj=obj)
+            for obj in self._list_pods().items
+        ]
+
+    def _list_pods(self) -> kubernetes.client.models.v1_pod_list.V1PodList:
+        """Get the list of pod api objects running on this node.
+
+        Raises:
+            spicerack.k8s.KubernetesApiError: if the API call fails.
+
+        """
         try:
-            for obj in self._api.core().list_pod_for_all_namespaces(field_selector=f"spec.nodeName={self.name}").items:
-                p = KubernetesPod(
-                    obj.metadata.namespace, obj.metadata.name, self._api, dry_run=self._dry_run, init_obj=obj
-                )
-                pods.append(p)
-            return pods
+            return self._api.core().list_pod_for_all_namespaces(field_selector=f"spec.nodeName={self.name}")
         except kubernetes.client.exceptions.ApiException as exc:
             raise KubernetesApiError(f"Failed to find pods running on node {self.name}: {exc}") from exc
 
@@ -325,43 +397,76 @@ class KubernetesNode:
         """
         return f"Node({self._fqdn})"
 
-    def _wait_for_empty(self, expected: int, max_grace_period: int) -> None:
-        """Wait for all pods to be evicted.
+    def _wait_for_evicted(self, pods: list["KubernetesPod"], timeout: int) -> None:
+        """Wait for all the given evicted pods to be terminated or deleted, watching the node's pods.
 
         Arguments:
-            expected: the number of expected pods.
-            max_grace_period: how many seconds to sleep before starting to check.
+            pods: the evicted pods to wait for.
+            timeout: how many seconds to wait at most.
+
+        Raises:
+            spicerack.k8s.KubernetesCheckError: if any of the pods is still running after the timeout.
+            spicerack.k8s.KubernetesApiError: if the API calls fail.
 
         """
         if self._dry_run:
             logger.info("Would have waited for node %s to be empty", self.name)
             return
 
-        def num_pods() -> int:
-            return len([p for p in self.get_pods() if not p.is_terminated()])
+        pending = {(pod.namespace, pod.name) for pod in pods}
+        deadline = time.monotonic() + timeout
+        while True:
+            # (Re)start from a fresh list, the watch might have ended early or its resource version might be expired
+            pod_list = self._list_pods()
+            pending &= {
+                (obj.metadata.namespace, obj.metadata.name)
+                for obj in pod_list.items
+                if obj.status.phase not in TERMINATED_POD_PHASES
+            }
+            if not pending:
+                return
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                names = ", ".join(f"{namespace}/{name}" for namespace, name in sorted(pending))
+                raise KubernetesCheckError(f"Node {self.name} still has {len(pending)} evicted pods running: {names}")
+
+            logger.debug("Watching %d evicted pods on node %s for up to %.0f seconds", len(pending), self, remaining)
+            self._watch_pods(pending, pod_list.metadata.resource_version, math.ceil(remaining))
+
+    def _watch_pods(self, pending: set[tuple[str, str]], resource_version: str, timeout: int) -> None:
+        """Watch the node's pods, removing from pending the ones that are terminated or deleted.
 
-        @retry(
-            tries=5,
-            backoff_mode="exponential",
-            exceptions=(KubernetesCheckError,),
-            failure_message="Waiting for pods to be evicted",
-        )
-        def wait() -> None:
-            """Poll the number of pods to check if they match the expected ones."""
-            npods = num_pods()
-            if npods > expected:
-                raise KubernetesCheckError(f"Node {self.name} still has {npods} pods, expected {expected}")
-
-        # Wait for max grace period first, then retry 5 times with exponential backoff as pods need some time
-        # to actually terminate and API needs some time to catch up. Especially for nodes with a large number
-        # of pods.
-        #
-        # Please note that waiting for the max grace period is absolutely arbitrary and just what looks like
-        # a reasonable time to wait for the api to conform its view of the node to reality.
-        if num_pods() > expected:
-            logger.debug("Waiting %d seconds before checking evictions again", max_grace_period)
-            time.sleep(max_grace_period)
-            wait()
+        Arguments:
+            pending: the set of (namespace, name) tuples of the pods to wait for, modified in place.
+            resource_version: the resource version of the pods list to start watching from.
+            timeout: how many seconds to watch at most.
+
+        Raises:
+            spicerack.k8s.KubernetesApiError: if the API call fails.
+
+        """
+        watcher = watch.Watch()
+        try:
+            for event in watcher.stream(
+                self._api.core().list_pod_for_all_namespaces,
+                field_selector=f"spec.nodeName={self.name}",
+                resource_version=resource_version,
+                timeout_seconds=timeout,
+            ):
+                obj = event["object"]
+                if event["type"] == "DELETED" or obj.status.phase in TERMINATED_POD_PHASES:
+                    pending.discard((obj.metadata.namespace, obj.metadata.name))
+
+                if not pending:
+                    break
+        except kubernetes.client.exceptions.ApiException as exc:
+            if exc.status != HTTPStatus.GONE:
+                raise KubernetesApiError(f"Failed to watch pods running on node {self.name}: {exc}") from exc
+
+            logger.debug("Watch of the pods on node %s expired, restarting it: %s", self, exc)
+        finally:
+            watcher.stop()
 
 
 class KubernetesPod:
@@ -417,7 +522,7 @@ class KubernetesPod:
 
     def is_terminated(self) -> bool:
         """Checks if the pod is terminated."""
-        return self._pod.status.phase in ["Succeeded", "Failed"]
+        return self._pod.status.phase in TERMINATED_POD_PHASES
 
     def is_mirror(self) -> bool:
         """Check if the pod is a mirror pod."""
@@ -466,12 +571,20 @@ class KubernetesPod:
             return
         logger.debug("Evicting pod %s", self)
         body = V1Eviction(metadata=client.V1ObjectMeta(name=self.name, namespace=self.namespace))
+        delay = timedelta(seconds=3)
+        retry_params: list[RetryParams] = []
+
+        def keep_retry_params(params: RetryParams, *_: Any) -> None:
+            """Keep a reference to the retry parameters to make the next backoff honour the Retry-After header."""
+            retry_params.append(params)
 
         @retry(
             tries=5,
+            delay=delay,
             backoff_mode="exponential",
             exceptions=(KubernetesApiTooManyRequests,),
             failure_message=f"Retrying eviction of {self}. API error was",
+            dynamic_params_callbacks=(keep_retry_params,),
         )
         def retry_evict() -> None:
             """Evict the pod."""
@@ -483,11 +596,38 @@ class KubernetesPod:
                 # In both cases we should retry the eviction.
                 if e.status == HTTPStatus.TOO_MANY_REQUESTS:
                     logger.info("Failed to evict pod %s - HTTP response body: %s", self, e.body)
+                    retry_after = self._get_retry_after(e)
+                    if retry_after:  # Honour the server's hint instead of the exponential backoff
+                        logger.debug("Waiting %d seconds before retrying eviction of %s", retry_after, self)
+                        retry_params[-1].backoff_mode = "constant"
+                        retry_params[-1].delay = timedelta(seconds=retry_after)
+                    else:
+                        retry_params[-1].backoff_mode = "exponential"
+                        retry_params[-1].delay = delay
                     raise KubernetesApiTooManyRequests(e) from e
                 raise KubernetesApiError(e) from e
 
         retry_evict()
 
+    @staticmethod
+    def _get_retry_after(exc: kubernetes.client.exceptions.ApiException) -> int:
+        """Get the number of seconds to wait from the Retry-After header of an API error, if any.
+
+        Arguments:
+            exc: the API exception.
+
+        Returns:
+            The number of seconds to wait, capped to :py:data:`spicerack.k8s.MAX_EVICTION_RETRY_AFTER`, or zero if
+            the header is missing or invalid.
+
+        """
+        try:
+            retry_after = int((exc.headers or {}).get("Retry-After", 0))
+        except (TypeError, ValueError):
+            return 0
+
+        return min(max(retry_after, 0), MAX_EVICTION_RETRY_AFTER)
+
     def _get(self) -> kubernetes.client.models.v1_pod.V1Pod:
         """Get the object from the api."""
         try:
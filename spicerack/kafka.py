@@ -4,7 +4,7 @@ import logging
 import ssl
 from dataclasses import dataclass
 from datetime import timedelta
-from typing import Any
+from typing import Any, Optional
 
 from kafka import KafkaConsumer, OffsetAndMetadata, TopicPartition
 from kafka.admin import KafkaAdminClient
@@ -47,6 +47,7 @@ class KafkaClient:
 
     _consumer: KafkaConsumer
     _site: str
+    _admin: Optional[KafkaAdminClient]
 
     def __init__(
         self,
@@ -78,6 +79,10 @@ class KafkaClient:
             consumer_definition.site,
         )
         brokers = kafka_config[consumer_definition.cluster][consumer_definition.site]["brokers"]["ssl_string"]
+        self._brokers = brokers
+        self._ssl_context = context
+        self._consumer_group = consumer_definition.consumer_group
+        self._admin = None
         self._consumer = KafkaConsumer(
             bootstrap_servers=brokers,
             enable_auto_commit=False,
@@ -111,6 +116,42 @@ class KafkaClient:
 
         return committed_offset
 
+    def get_committed_offsets(self, topic_partitions: list[TopicPartition]) -> dict[TopicPartition, int]:
+        """Retrieve the last committed offsets for all the given TopicPartitions with a single request.
+
+        Arguments:
+            topic_partitions: non-localized topic partitions.
+
+        Raises:
+            spicerack.kafka.KafkaError: if any of the offsets couldn't be located.
+
+        """
+        localized_tps = {self._get_localized_tp(tp): tp for tp in topic_partitions}
+        committed = self._get_admin().list_consumer_group_offsets(self._consumer_group, partitions=list(localized_tps))
+        offsets = {}
+        for localized_tp, tp in localized_tps.items():
+            offset_metadata = committed.get(localized_tp)
+            # Partitions without a committed offset are returned with offset -1
+            if offset_metadata is None or offset_metadata.offset < 0:
+                raise KafkaError(
+                    f"Offset not found for topic {localized_tp.topic}, partition {localized_tp.partition}."
+                )
+            offsets[tp] = offset_metadata.offset
+
+        return offsets
+
+    def _get_admin(self) -> KafkaAdminClient:
+        """Get the admin client for the same cluster and site, creating it on first use."""
+        if self._admin is None:
+            self._admin = KafkaAdminClient(
+                bootstrap_servers=self._brokers,
+                request_timeout_ms=TIMEOUT_MS,
+                security_protocol="SSL",
+                ssl_context=self._ssl_context,
+            )
+
+        return self._admin
+
     def _get_localized_tp(self, topic_partition: TopicPartition) -> TopicPartition:
         """Translate provided TopicPartition into the one local to the cluster.
 
@@ -134,6 +175,40 @@ class KafkaClient:
             raise KafkaError(f"Offset not found for topic {localized_tp.topic}, partition {localized_tp.partition}.")
         return msg.timestamp
 
+    def get_next_timestamps(self, topic_partitions: list[TopicPartition]) -> dict[TopicPartition, int]:
+        """Retrieve the timestamps of the messages about to be processed for all the given TopicPartitions.
+
+        All the partitions are assigned at once and each one is paused as soon as its first message is consumed.
+
+        Arguments:
+            topic_partitions: non-localized topic partitions.
+
+        Raises:
+            spicerack.kafka.KafkaError: if there was no message to get the timestamp from for any of the partitions.
+
+        """
+        localized_tps = {self._get_localized_tp(tp): tp for tp in topic_partitions}
+        self._consumer.assign(list(localized_tps))
+        timestamps: dict[TopicPartition, int] = {}
+        while len(timestamps) < len(localized_tps):
+            msg = next(self._consumer, None)
+            if msg is None:
+                break
+
+            localized_tp = TopicPartition(msg.topic, msg.partition)
+            tp = localized_tps.get(localized_tp)
+            if tp is not None and tp not in timestamps:
+                timestamps[tp] = msg.timestamp
+                self._consumer.pause(localized_tp)
+
+        for localized_tp, tp in localized_tps.items():
+            if tp not in timestamps:
+                raise KafkaError(
+                    f"Offset not found for topic {localized_tp.topic}, partition {localized_tp.partition}."
+                )
+
+        return timestamps
+
     def partitions_for_topic(self, topic_name: str) -> set[int]:
         """Get partitions for a localized provided topic.
 
@@ -167,6 +242,51 @@ class KafkaClient:
             self._consumer.assign([local_tp])
             self._consumer.commit({local_tp: OffsetAndMetadata(offset, None)})
 
+    def seek_offsets(self, offsets: dict[TopicPartition, int]) -> None:
+        """Seek all the provided partitions for a configured consumer group to specific offsets with a single commit.
+
+        Arguments:
+            offsets: mapping of non-localized topic partitions to their desired offsets.
+
+        """
+        local_offsets = {self._get_localized_tp(tp): OffsetAndMetadata(offset, None) for tp, offset in offsets.items()}
+        if self._dry_run:
+            for local_tp, offset_metadata in local_offsets.items():
+                logger.debug(
+                    "dry_run mode: Attempted to commit on %s:%s to offset %s.",
+                    local_tp.topic,
+                    local_tp.partition,
+                    offset_metadata.offset,
+                )
+        else:
+            self._consumer.assign(list(local_offsets))
+            self._consumer.commit(local_offsets)
+
+    def find_offsets_for_timestamps(self, timestamps: dict[TopicPartition, int]) -> dict[TopicPartition, int]:
+        """Find the offsets of all the given partitions by approximating them with the provided timestamps.
+
+        Arguments:
+            timestamps: mapping of non-localized topic partitions to the timestamps for offset approximation.
+
+        Raises:
+            spicerack.kafka.KafkaError: if any of the offsets couldn't be located.
+
+        """
+        localized = {self._get_localized_tp(tp): (tp, timestamp) for tp, timestamp in timestamps.items()}
+        offsets_timestamps = self._consumer.offsets_for_times(
+            {local_tp: timestamp - DELTA for local_tp, (_, timestamp) in localized.items()}
+        )
+        offsets = {}
+        for local_tp, (tp, timestamp) in localized.items():
+            if not offsets_timestamps or not offsets_timestamps.get(local_tp):
+                raise KafkaError(
+                    f"Offset not found for topic {local_tp.topic}, partition {local_tp.partition}, "
+                    f"when seeking by timestamp {timestamp}."
+                )
+            offsets[tp] = offsets_timestamps[local_tp].offset
+
+        return offsets
+
     def find_offset_for_timestamp(self, topic_partition: TopicPartition, timestamp: int) -> int:
         """Find offset by approximating it with the provided timestamp.
 
@@ -190,8 +310,10 @@ class KafkaClient:
         return self
 
     def __exit__(self, *_: Any) -> None:
-        """Close KafkaConsumer."""
+        """Close KafkaConsumer and the KafkaAdminClient, if used."""
         self._consumer.close(autocommit=False)
+        if self._admin is not None:
+            self._admin.close()
 
 
 class Kafka:
@@ -251,11 +373,7 @@ class Kafka:
             spicerack.kafka.KafkaError: When local offset couldn't be located (e.g. because of no messages).
 
         """
-        topic_partitions = {}
-        for tp in Kafka._get_topic_partitions(client=client, topics=topics):
-            committed_offset = client.get_committed_offset(tp)
-            topic_partitions[tp] = committed_offset
-        return topic_partitions
+        return client.get_committed_offsets(Kafka._get_topic_partitions(client=client, topics=topics))
 
     @staticmethod
     def _get_timestamps(client: KafkaClient, topics: list[str]) -> dict[TopicPartition, int]:
@@ -269,10 +387,7 @@ class Kafka:
             spicerack.kafka.KafkaError: When there was no message to get timestamp from.
 
         """
-        topic_partitions = {}
-        for tp in Kafka._get_topic_partitions(client=client, topics=topics):
-            topic_partitions[tp] = client.get_next_timestamp(tp)
-        return topic_partitions
+        return client.get_next_timestamps(Kafka._get_topic_partitions(client=client, topics=topics))
 
     @staticmethod
     def _get_topic_partitions(client: KafkaClient, topics: list[str]) -> list[TopicPartition]:
@@ -298,8 +413,7 @@ class Kafka:
             offset_data: mapping of topic partitions to their timestamps for a given consumer.
 
         """
-        for tp, offset in offset_data.items():
-            client.seek_offset(tp, offset)
+        client.seek_offsets(offset_data)
 
     def _set_timestamps_for_topics(self, *, client: KafkaClient, timestamps: dict[str, int]) -> None:
         """Sets topic partitions offsets, based on timestamps (minus :py:const:`spicerack.kafka.DELTA`) and topic names.
@@ -328,9 +442,7 @@ class Kafka:
             spicerack.kafka.KafkaError: When local offset couldn't be located (e.g. because of no messages).
 
         """
-        for tp, timestamp in timestamps.items():
-            offset = client.find_offset_for_timestamp(tp, timestamp)
-            client.seek_offset(tp, offset)
+        client.seek_offsets(client.find_offsets_for_timestamps(timestamps))
 
     def transfer_consumer_position(
         self, topics: list[str], source_consumer: ConsumerDefinition, target_consumer: ConsumerDefinition
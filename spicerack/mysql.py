@@ -1,21 +1,25 @@
 """MySQL shell module."""
 
 import logging
-from collections.abc import Generator, Iterator
+import re
+import threading
+from collections import defaultdict
+from collections.abc import Generator, Iterator, Sequence
 from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
 from decimal import Decimal
 from enum import Enum
 from pathlib import Path
-from time import sleep
+from time import monotonic, sleep
 from typing import Any, Optional, Union
 
 from ClusterShell.MsgTree import MsgTreeElem
 from cumin import NodeSet
 from cumin.transports import Command
 from pymysql.connections import Connection
-from pymysql.cursors import DictCursor
+from pymysql.cursors import Cursor, DictCursor
+from pymysql.err import MySQLError
 from wmflib.constants import CORE_DATACENTERS
 from wmflib.interactive import ask_confirmation
 
@@ -46,6 +50,15 @@ They are ordered from less impactful if anything goes wrong to most impactful.
 # Note that adding/removing core sections will require updating tests/unit/test_mysql.py
 # to reflect the newly expected number of sections.
 
+INSTANCE_OUTPUT_MARKER: str = "### spicerack-mysql-instance:"
+"""Marker printed before the output of each instance when running a query on all the instances of the hosts."""
+INSTANCE_ERROR_MARKER: str = "### spicerack-mysql-error:"
+"""Marker printed when the query fails on an instance when running a query on all the instances of the hosts."""
+BATCH_ESCAPES: dict[str, str] = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a", "\\": "\\"}
+"""The escape sequences used by MySQL in batch mode output."""
+COM_RESET_CONNECTION: int = 0x1F
+"""The MySQL protocol command to reset the session state of a connection, not defined in pymysql's constants."""
+
 logger = logging.getLogger(__name__)
 
 
@@ -100,14 +113,25 @@ class MysqlClient:
 
     """
 
-    def __init__(self, *, dry_run: bool = True) -> None:
+    def __init__(self, *, dry_run: bool = True, pool: bool = False, max_idle: float = 300.0) -> None:
         """Initialize the instance.
 
         Arguments:
             dry_run: whether this is a DRY-RUN.
+            pool: whether to keep the connections open after use, to reuse them in the following calls to
+                :py:meth:`spicerack.mysql.MysqlClient.connect` with the same parameters. The pooled connections are
+                partitioned by their connection parameters and read-only mode and are checked for liveness before being
+                reused. The session of a connection is reset when it's returned to the pool, see
+                :py:meth:`spicerack.mysql.MysqlClient.connect` for the details. The caller should call
+                :py:meth:`spicerack.mysql.MysqlClient.close` once done to close them.
+            max_idle: the maximum number of seconds a pooled connection can stay idle before being closed.
 
         """
         self._dry_run = dry_run
+        self._pool = pool
+        self._max_idle = max_idle
+        self._idle_connections: dict[str, list[tuple[float, Connection]]] = defaultdict(list)
+        self._pool_lock = threading.Lock()
 
     @contextmanager
     def connect(self, *, read_only: bool = False, **kwargs: Any) -> Generator:
@@ -119,6 +143,13 @@ class MysqlClient:
         Important:
             * By default autocommit is off and the commit of changes is the caller's responsibility.
             * The caller should also take care of rolling back transactions on error as appropriate.
+            * With connection pooling enabled the same connection is reused by the following callers. Before returning
+              it to the pool its session is reset with ``COM_RESET_CONNECTION``: any uncommitted transaction is rolled
+              back and session variables (e.g. ``sql_log_bin``), user variables, temporary tables and locks are
+              cleared. The session is then initialized again as for a new connection: character set and collation,
+              ``sql_mode``, ``init_command``, autocommit mode and read-only transactions. The database selected with
+              ``USE`` is set back to the one passed as ``database``, if any. If the reset fails or a database different
+              from the one passed is left selected, the connection is closed instead of being pooled.
 
         Arguments:
             read_only: True if this connection should use read-only transactions. **Note**: This parameter has no
@@ -151,15 +182,14 @@ class MysqlClient:
             "ssl": {"ca": WMF_CA_BUNDLE_PATH},
         }
         params.update(kwargs)
+        read_only = read_only or self._dry_run
 
-        conn = Connection(**params)
-
-        if read_only or self._dry_run:
-            # FIXME: read-only support is limited to DML sql statements.
-            # https://phabricator.wikimedia.org/T254756 is needed to do this better.
-            with conn.cursor() as cursor:
-                _ = cursor.execute("SET SESSION TRANSACTION READ ONLY")
+        if self._pool:
+            with self._pooled_connection(params, read_only=read_only) as conn:
+                yield conn
+            return
 
+        conn = MysqlClient._new_connection(params, read_only=read_only)
         try:
             yield conn
         # Not catching exceptions and rolling back, as that restricts the client code
@@ -167,16 +197,203 @@ class MysqlClient:
         finally:
             conn.close()
 
+    def close(self) -> None:
+        """Close all the idle pooled connections."""
+        with self._pool_lock:
+            pools = list(self._idle_connections.values())
+            self._idle_connections.clear()
+
+        for pool in pools:
+            for _, conn in pool:
+                MysqlClient._close_quietly(conn)
+
+    @contextmanager
+    def _pooled_connection(self, params: dict[str, Any], *, read_only: bool) -> Generator:
+        """Context-manager to get a pooled connection, reusing an idle one with the same parameters if available.
+
+        Arguments:
+            params: the parameters to pass to :py:class:`pymysql.connections.Connection`.
+            read_only: whether the connection should use read-only transactions.
+
+        Yields:
+            :py:class:`pymysql.connections.Connection`: a mysql connection, returned to the pool on exit.
+
+        """
+        key = repr((read_only, sorted(params.items(), key=lambda item: item[0])))
+        conn = self._get_idle_connection(key)
+        if conn is None:
+            conn = MysqlClient._new_connection(params, read_only=read_only)
+
+        try:
+            yield conn
+        except BaseException:
+            MysqlClient._close_quietly(conn)
+            raise
+
+        try:  # Do not leak the session state to the next user of the connection
+            reusable = MysqlClient._reset_session(conn, params, read_only=read_only)
+        except MySQLError as e:
+            logger.debug("Failed to reset the MySQL session, not pooling the connection: %s", e)
+            reusable = False
+
+        if not reusable:
+            MysqlClient._close_quietly(conn)
+            return
+
+        with self._pool_lock:
+            self._idle_connections[key].append((monotonic(), conn))
+
+    def _get_idle_connection(self, key: str) -> Optional[Connection]:
+        """Get a live idle connection from the pool, closing any expired or dead one found.
+
+        Arguments:
+            key: the key that identifies the connection parameters.
+
+        Returns:
+            the idle connection if any, :py:data:`None` otherwise.
+
+        """
+        while True:
+            with self._pool_lock:
+                pool = self._idle_connections[key]
+                if not pool:
+                    return None
+                last_used, conn = pool.pop()
+
+            if monotonic() - last_used > self._max_idle:
+                MysqlClient._close_quietly(conn)
+                continue
+
+            try:
+                conn.ping(reconnect=False)
+            except MySQLError:
+                MysqlClient._close_quietly(conn)
+                continue
+
+            return conn
+
+    @staticmethod
+    def _new_connection(params: dict[str, Any], *, read_only: bool) -> Connection:
+        """Open a new connection.
+
+        Arguments:
+            params: the parameters to pass to :py:class:`pymysql.connections.Connection`.
+            read_only: whether the connection should use read-only transactions.
+
+        Returns:
+            the new connection.
+
+        """
+        conn = Connection(**params)  # Initializes the session, see _init_session()
+        if read_only:
+            MysqlClient._set_read_only(conn)
+
+        return conn
+
+    @staticmethod
+    def _init_session(conn: Connection) -> None:
+        """Initialize the session of the connection as pymysql does when opening a new connection.
+
+        Arguments:
+            conn: the connection to initialize.
+
+        """
+        conn.set_character_set(conn.charset, conn.collation)
+        if conn.sql_mode is not None:
+            with conn.cursor(Cursor) as cursor:
+                cursor.execute("SET sql_mode=%s", (conn.sql_mode,))
+
+        if conn.init_command is not None:
+            with conn.cursor(Cursor) as cursor:
+                cursor.execute(conn.init_command)
+
+        if conn.autocommit_mode is not None:
+            conn.autocommit(conn.autocommit_mode)
+
+    @staticmethod
+    def _set_read_only(conn: Connection) -> None:
+        """Set the session of the connection to use read-only transactions.
+
+        Arguments:
+            conn: the connection to set as read-only.
+
+        """
+        # FIXME: read-only support is limited to DML sql statements.
+        # https://phabricator.wikimedia.org/T254756 is needed to do this better.
+        with conn.cursor() as cursor:
+            _ = cursor.execute("SET SESSION TRANSACTION READ ONLY")
+
+    @staticmethod
+    def _reset_session(conn: Connection, params: dict[str, Any], *, read_only: bool) -> bool:
+        """Reset the session state of a connection to the one of a newly opened connection with the same parameters.
+
+        Pymysql doesn't expose the reset of the connection, hence the COM_RESET_CONNECTION command is sent directly
+        through its private API. If that API is not available, the connection is reported as not reusable, so that
+        it's closed instead of being pooled. The reset sets all the session variables back to their global values,
+        hence the session is initialized again with the settings of the connection.
+
+        Arguments:
+            conn: the connection to reset.
+            params: the parameters the connection was opened with.
+            read_only: whether the connection should use read-only transactions.
+
+        Returns:
+            :py:data:`True` if the connection can be safely reused, :py:data:`False` otherwise.
+
+        Raises:
+            pymysql.err.MySQLError: if unable to reset the connection.
+
+        """
+        # pylint: disable=protected-access
+        try:
+            conn._execute_command(COM_RESET_CONNECTION, b"")  # type: ignore[attr-defined]
+            conn._read_ok_packet()  # type: ignore[attr-defined]
+        except AttributeError as e:  # Private pymysql API, might change in any release
+            logger.warning("Unable to reset the MySQL session, not pooling the connection: %s", e)
+            return False
+
+        MysqlClient._init_session(conn)
+        if read_only:
+            MysqlClient._set_read_only(conn)
+
+        database = params.get("database", params.get("db"))
+        if database:
+            conn.select_db(database)
+            return True
+
+        with conn.cursor(Cursor) as cursor:
+            cursor.execute("SELECT DATABASE()")
+            row = cursor.fetchone()
+
+        return row is None or row[0] is None
+
+    @staticmethod
+    def _close_quietly(conn: Connection) -> None:
+        """Close a connection ignoring any error, as it might be already broken.
+
+        Arguments:
+            conn: the connection to close.
+
+        """
+        try:
+            conn.close()
+        except MySQLError as e:
+            logger.debug("Failed to close the MySQL connection: %s", e)
+
 
 class Instance:
     """Class to manage MariaDB single intances and multiinstances."""
 
-    def __init__(self, host: RemoteHosts, *, name: str = "") -> None:
+    def __init__(self, host: RemoteHosts, *, name: str = "", pool: bool = False) -> None:
         """Initialize the instance.
 
         Arguments:
             host: the RemoteHosts instance that contains this MariaDB SingleInstance.
             name: the name of the instance in a multiinstance context. Leave it empty for single instances.
+            pool: whether to reuse the native MySQL connections across calls, useful when polling the instance
+                repeatedly, for example with :py:meth:`spicerack.mysql.Instance.wait_for_replication`. See
+                :py:class:`spicerack.mysql.MysqlClient` for the details. Call
+                :py:meth:`spicerack.mysql.Instance.close` once done to close the pooled connections.
 
         """
         if len(host) > 1:
@@ -184,7 +401,7 @@ class Instance:
 
         self.host = host
         self.name = name
-        self._mysql = MysqlClient(dry_run=host.dry_run)
+        self._mysql = MysqlClient(dry_run=host.dry_run, pool=pool)
         self._primary = ""
         self._mysql_bin = "/usr/local/bin/mysql"
 
@@ -256,6 +473,10 @@ class Instance:
         with self._mysql.connect(**kwargs) as connection, connection.cursor() as cursor:
             yield connection, cursor
 
+    def close(self) -> None:
+        """Close any pooled native MySQL connection to the instance, if pooling was enabled."""
+        self._mysql.close()
+
     def check_warnings(self, cursor: DictCursor) -> None:
         """It will check if there is any warning in the cursor for the last query and ask the user what to do.
 
@@ -776,11 +997,131 @@ class MysqlRemoteHosts(RemoteHostsAdapter):
         kwargs.setdefault("print_output", False)
         return self._remote_hosts.run_sync(command, **kwargs)
 
-    def list_hosts_instances(self, *, group: bool = False) -> list[Instance]:
+    def run_query_on_instances(
+        self, query: str, database: str = "", **kwargs: Any
+    ) -> dict[tuple[str, str], list[dict[str, Optional[str]]]]:
+        """Execute the query on all the running MariaDB instances of all the hosts with a single parallel execution.
+
+        The running instances are detected from their sockets and the query is executed in batch mode, that escapes
+        special characters and allows to safely parse multi-line values, unlike the vertical output parsed by
+        :py:meth:`spicerack.mysql.Instance.run_vertical_query`.
+
+        Examples:
+            ::
+
+                >>> results = mysql_remote_hosts.run_query_on_instances("SHOW SLAVE STATUS", is_safe=True)
+                >>> results[("db1001.eqiad.wmnet", "s1")]
+                [{'Slave_IO_Running': 'Yes', 'Seconds_Behind_Master': '0', 'Last_Error': '', ...}]
+
+        Arguments:
+            query: the mysql query to be executed. Double quotes must be already escaped.
+            database: an optional MySQL database to connect to before executing the query.
+            **kwargs: any additional argument is passed to :py:meth:`spicerack.remote.RemoteHosts.run_sync`. By default
+                the ``print_progress_bars`` and ``print_output`` arguments are set to :py:data:`False`.
+
+        Returns:
+            A dictionary with 2-element tuples of hostname and instance name (empty string for single instances) as
+            keys and the list of returned rows as values. Each row is a dictionary with the column names as keys and
+            the column values as values, with :py:data:`None` for ``NULL`` values. The hosts without any running
+            instance are not present and are logged as a warning.
+
+        Raises:
+            spicerack.remote.RemoteExecutionError: if the Cumin execution returns a non-zero exit code.
+            spicerack.mysql.MysqlError: if the query failed on any instance.
+
+        """
+        mysql_command = f'/usr/local/bin/mysql --socket "${{sock}}" --batch -e "{query}" {database}'.strip()
+        command = (
+            "for sock in /run/mysqld/mysqld*.sock; do "
+            '[ -S "${sock}" ] || continue; '
+            f'echo "{INSTANCE_OUTPUT_MARKER} ${{sock}}"; '
+            f'{mysql_command} || echo "{INSTANCE_ERROR_MARKER} $?"; '
+            "done"
+        )
+        kwargs.setdefault("print_progress_bars", False)
+        kwargs.setdefault("print_output", False)
+
+        results: dict[tuple[str, str], list[dict[str, Optional[str]]]] = {}
+        failures = []
+        no_instances = NodeSet(self._remote_hosts.hosts)
+        for nodeset, output in self._remote_hosts.run_sync(command, **kwargs):
+            no_instances.difference_update(nodeset)
+            for name, rows, failed in MysqlRemoteHosts._parse_instances_output(output.message().decode()):
+                for host in nodeset:
+                    if failed:
+                        failures.append(f"{host} ({name or 'single-instance'})")
+                    else:
+                        results[(host, name)] = [row.copy() for row in rows]
+
+        if no_instances:
+            logger.warning("No running MariaDB instances found on %d hosts: %s", len(no_instances), no_instances)
+
+        if failures:
+            raise MysqlError(f"Failed to run '{query}' on instances: {', '.join(failures)}")
+
+        return results
+
+    @staticmethod
+    def _parse_instances_output(output: str) -> Iterator[tuple[str, list[dict[str, Optional[str]]], bool]]:
+        """Parse the batch output of a query executed on multiple instances.
+
+        Arguments:
+            output: the output of the command executed by
+                :py:meth:`spicerack.mysql.MysqlRemoteHosts.run_query_on_instances`.
+
+        Yields:
+            A 3-element tuple for each instance with the instance name, its parsed rows and whether the query failed.
+
+        """
+        name = None
+        lines: list[str] = []
+        failed = False
+        for line in [*output.splitlines(), f"{INSTANCE_OUTPUT_MARKER} "]:
+            if line.startswith(INSTANCE_ERROR_MARKER):
+                failed = True
+                continue
+
+            if not line.startswith(INSTANCE_OUTPUT_MARKER):
+                lines.append(line)
+                continue
+
+            if name is not None:
+                rows = []
+                if lines and not failed:
+                    columns = [MysqlRemoteHosts._unescape_batch_value(column) for column in lines[0].split("\t")]
+                    for row in lines[1:]:
+                        values = [
+                            None if value == "NULL" else MysqlRemoteHosts._unescape_batch_value(value)
+                            for value in row.split("\t")
+                        ]
+                        rows.append(dict(zip(columns, values, strict=False)))
+                yield name, rows, failed
+
+            socket = line[len(INSTANCE_OUTPUT_MARKER) :].strip()
+            name = Path(socket).name.removeprefix("mysqld").removesuffix(".sock").strip(".")
+            lines = []
+            failed = False
+
+    @staticmethod
+    def _unescape_batch_value(value: str) -> str:
+        """Unescape a value from the MySQL batch output.
+
+        Arguments:
+            value: the escaped value.
+
+        Returns:
+            the unescaped value.
+
+        """
+        return re.sub(r"\\(.)", lambda match: BATCH_ESCAPES.get(match.group(1), match.group(1)), value)
+
+    def list_hosts_instances(self, *, group: bool = False, pool: bool = False) -> list[Instance]:
         """List MariaDB instances on the host.
 
         Arguments:
             group: not yet implemented feature to allow parallelization.
+            pool: whether the returned instances should reuse their native MySQL connections across calls, see
+                :py:class:`spicerack.mysql.Instance`. The caller should close the instances once done.
 
         Raises:
             spicerack.remote.RemoteExecutionError: if the Cumin execution returns a non-zero exit code.
@@ -796,11 +1137,14 @@ class MysqlRemoteHosts(RemoteHostsAdapter):
             # we could use this method to parallelize stuff on instances as well.
             raise NotImplementedError("Grouping and parallelization are not supported at this time.")
 
-        return self._list_host_instances()
+        return self._list_host_instances(pool=pool)
 
-    def _list_host_instances(self) -> list[Instance]:
+    def _list_host_instances(self, *, pool: bool = False) -> list[Instance]:
         """List MariaDB instances on the host.
 
+        Arguments:
+            pool: whether the returned instances should reuse their native MySQL connections across calls.
+
         Raises:
             spicerack.remote.RemoteExecutionError: if the Cumin execution returns a non-zero exit code.
 
@@ -820,7 +1164,7 @@ class MysqlRemoteHosts(RemoteHostsAdapter):
         )
         if conf_files:  # Multi-instance
             for conf_file in conf_files[0][1].message().decode().splitlines():
-                instances.append(Instance(self._remote_hosts, name=conf_file[:-4]))  # Remove .cnf extension
+                instances.append(Instance(self._remote_hosts, name=conf_file[:-4], pool=pool))  # Remove .cnf
         else:  # Check for single instance
             try:
                 self._remote_hosts.run_sync(
@@ -829,7 +1173,7 @@ class MysqlRemoteHosts(RemoteHostsAdapter):
                     print_output=False,
                     print_progress_bars=False,
                 )
-                instances.append(Instance(self._remote_hosts))
+                instances.append(Instance(self._remote_hosts, pool=pool))
             except RemoteExecutionError:  # No my.cnf or no mysqld section found - no instances present
                 pass
 
@@ -846,6 +1190,12 @@ class Mysql:
     )
     """Query pattern to check the heartbeat for a given datacenter and section."""
 
+    sections_heartbeat_query: str = (
+        "SELECT shard, MAX(ts) FROM heartbeat.heartbeat WHERE datacenter = '{dc}' AND shard IN ({sections}) "
+        "GROUP BY shard"
+    )
+    """Query pattern to check the heartbeats for a given datacenter and multiple sections at once."""
+
     def __init__(self, remote: Remote, dry_run: bool = True) -> None:
         """Initialize the instance.
 
@@ -1088,6 +1438,238 @@ class Mysql:
                 f"{local_heartbeat} <= {parent_heartbeat} (delta={delta})"
             )
 
+    def check_core_masters_in_sync_parallel(self, dc_from: str, dc_to: str) -> None:
+        """Check that all core masters in dc_to are in sync with the core masters in dc_from, querying them in parallel.
+
+        Same as :py:meth:`spicerack.mysql.Mysql.check_core_masters_in_sync` but the heartbeats of all the sections are
+        gathered with a single parallel execution and only the sections not yet in sync are polled again.
+
+        Arguments:
+            dc_from: the name of the datacenter from where to get the master positions.
+            dc_to: the name of the datacenter where to check that they are in sync.
+
+        Raises:
+            spicerack.mysql.MysqlError: on failure to gather the heartbeats or if not in sync after all the retries.
+
+        """
+        logger.debug("Waiting for the core DB masters in %s to catch up", dc_to)
+        heartbeats = self.get_core_masters_heartbeats_parallel(dc_from, dc_from)
+        self.check_core_masters_heartbeats_parallel(dc_to, dc_from, heartbeats)
+
+    def get_core_masters_heartbeats_parallel(self, datacenter: str, heartbeat_dc: str) -> dict[str, datetime]:
+        """Get the current heartbeat values from all core DB masters in DC with a single parallel execution.
+
+        Same as :py:meth:`spicerack.mysql.Mysql.get_core_masters_heartbeats` but querying all the core masters in
+        parallel with a single execution.
+
+        Arguments:
+            datacenter: the name of the datacenter from where to get the heartbeat values.
+            heartbeat_dc: the name of the datacenter for which to filter the heartbeat query.
+
+        Returns:
+            A dictionary with the section name :py:class:`str` as keys and their heartbeat
+            :py:class:`datetime.datetime` as values.
+
+        Raises:
+            spicerack.mysql.MysqlError: on failure to gather the heartbeats or convert them into a datetime.
+
+        """
+        _, _, heartbeats = self._get_core_masters_heartbeats(datacenter, heartbeat_dc, CORE_SECTIONS)
+        return heartbeats
+
+    def check_core_masters_heartbeats_parallel(
+        self, datacenter: str, heartbeat_dc: str, heartbeats: dict[str, datetime]
+    ) -> None:
+        """Check the heartbeat values in the core DB masters in DC are in sync with the provided heartbeats.
+
+        Same as :py:meth:`spicerack.mysql.Mysql.check_core_masters_heartbeats` but querying the masters of the given
+        sections in parallel and retrying only on the masters of the sections that are not yet in sync. The masters
+        are resolved with the first check and reused for the following ones.
+
+        Arguments:
+            datacenter: the name of the datacenter from where to get the heartbeat values.
+            heartbeat_dc: the name of the datacenter for which to filter the heartbeat query.
+            heartbeats: a dictionary with the section name :py:class:`str` as keys and heartbeat
+                :py:class:`datetime.datetime` for each core section as values.
+
+        Raises:
+            spicerack.mysql.MysqlError: on failure to gather the heartbeats or if not in sync after all the retries.
+
+        """
+        invalid = [section for section in heartbeats if section not in CORE_SECTIONS]
+        if invalid:
+            raise MysqlError(f"Got invalid sections {invalid}, accepted values are: {CORE_SECTIONS}")
+
+        if not heartbeats:
+            return
+
+        masters, hosts_sections, local_heartbeats = self._get_core_masters_heartbeats(
+            datacenter, heartbeat_dc, tuple(heartbeats)
+        )
+        pending = dict(heartbeats)
+        if Mysql._remove_in_sync(pending, local_heartbeats):
+            self._wait_core_masters_in_sync(masters, hosts_sections, heartbeat_dc, pending)
+
+    def _get_core_masters_heartbeats(
+        self, datacenter: str, heartbeat_dc: str, sections: Sequence[str]
+    ) -> tuple[MysqlRemoteHosts, dict[str, str], dict[str, datetime]]:
+        """Resolve the core DB masters in DC of the given sections and get their heartbeats with a single execution.
+
+        The section of each master is the one it is resolved for, as in
+        :py:meth:`spicerack.mysql.Mysql.get_core_dbs`.
+
+        Arguments:
+            datacenter: the name of the datacenter where to look for the masters.
+            heartbeat_dc: the name of the datacenter for which to filter the heartbeat query.
+            sections: the names of the sections whose masters should be queried.
+
+        Returns:
+            A 3-element tuple with the instance to act on all the masters as first item, a dictionary with the
+            hostname of each master :py:class:`str` as keys and its section name as values as second item and a
+            dictionary with the section name :py:class:`str` as keys and their heartbeat
+            :py:class:`datetime.datetime` as values as third item.
+
+        Raises:
+            spicerack.mysql.MysqlError: on unexpected matching hosts or failure to gather the heartbeats or convert
+            them into a datetime.
+
+        """
+        hosts_sections: dict[str, str] = {}
+        for section in sections:
+            section_masters = self.get_core_dbs(datacenter=datacenter, section=section, replication_role="master")
+            hosts_sections.update(dict.fromkeys(section_masters.remote_hosts.hosts, section))
+
+        masters = MysqlRemoteHosts(self._remote.query(f"D{{{NodeSet.fromlist(hosts_sections)}}}"))
+        heartbeats = Mysql._get_sections_heartbeats(masters, hosts_sections, heartbeat_dc)
+        return masters, hosts_sections, heartbeats
+
+    @retry(exceptions=(MysqlError,))
+    def _wait_core_masters_in_sync(
+        self,
+        masters: MysqlRemoteHosts,
+        hosts_sections: dict[str, str],
+        heartbeat_dc: str,
+        pending: dict[str, datetime],
+    ) -> None:
+        """Check and retry that the heartbeats of the core DB masters are in sync with the provided heartbeats.
+
+        Arguments:
+            masters: the instance to act on all the masters to check.
+            hosts_sections: a dictionary with the hostname of each master as keys and its section name as values.
+            heartbeat_dc: the name of the datacenter for which to filter the heartbeat query.
+            pending: a dictionary with the section name :py:class:`str` as keys and the reference heartbeat
+                :py:class:`datetime.datetime` as values, for the sections not yet in sync. The sections found in sync
+                are removed from it, so that only the remaining ones are polled again at each retry.
+
+        Raises:
+            spicerack.mysql.MysqlError: on failure to gather the heartbeats or if any section is not yet in sync.
+
+        """
+        pending_hosts = [host for host, section in hosts_sections.items() if section in pending]
+        targets = MysqlRemoteHosts(masters.remote_hosts.get_subset(NodeSet.fromlist(pending_hosts)))
+        local_heartbeats = Mysql._get_sections_heartbeats(
+            targets, {host: hosts_sections[host] for host in pending_hosts}, heartbeat_dc
+        )
+        not_in_sync = Mysql._remove_in_sync(pending, local_heartbeats)
+        if not_in_sync:
+            raise MysqlError(f"Heartbeat from core masters not yet in sync for sections: {', '.join(not_in_sync)}")
+
+    @staticmethod
+    def _remove_in_sync(pending: dict[str, datetime], local_heartbeats: dict[str, datetime]) -> list[str]:
+        """Remove from the pending sections the ones whose local heartbeat is in sync with the reference one.
+
+        Arguments:
+            pending: a dictionary with the section name :py:class:`str` as keys and the reference heartbeat
+                :py:class:`datetime.datetime` as values, modified in place.
+            local_heartbeats: a dictionary with the section name :py:class:`str` as keys and the local heartbeat
+                :py:class:`datetime.datetime` as values.
+
+        Returns:
+            The description of the sections not yet in sync, empty if all of them are in sync.
+
+        """
+        not_in_sync = []
+        # See _check_core_master_in_sync() for why the local heartbeat must be strictly greater than the parent one.
+        for section in list(pending):
+            local_heartbeat = local_heartbeats[section]
+            if local_heartbeat > pending[section]:
+                del pending[section]
+            else:
+                delta = (local_heartbeat - pending[section]).total_seconds()
+                not_in_sync.append(f"{section}: {local_heartbeat} <= {pending[section]} (delta={delta})")
+
+        return not_in_sync
+
+    @staticmethod
+    def _get_sections_heartbeats(
+        mysql_hosts: MysqlRemoteHosts, hosts_sections: dict[str, str], heartbeat_dc: str
+    ) -> dict[str, datetime]:
+        """Get the heartbeats for a given DC from the masters of multiple sections with a single parallel execution.
+
+        Arguments:
+            mysql_hosts: the instance for the target DBs to query.
+            hosts_sections: a dictionary with the hostname of each master as keys and its section name as values.
+            heartbeat_dc: the name of the datacenter for which to filter the heartbeat query.
+
+        Returns:
+            A dictionary with the section name :py:class:`str` as keys and their heartbeat
+            :py:class:`datetime.datetime` as values.
+
+        Raises:
+            spicerack.mysql.MysqlError: on failure to gather the heartbeats or convert them into a datetime.
+
+        """
+        sections = sorted(set(hosts_sections.values()))
+        query = Mysql.sections_heartbeat_query.format(
+            dc=heartbeat_dc, sections=", ".join(f"'{section}'" for section in sections)
+        )
+
+        heartbeats = {}
+        for nodeset, output in mysql_hosts.run_query(query, is_safe=True):
+            rows = Mysql._parse_heartbeat_rows(output)
+            for host in nodeset:
+                section = hosts_sections[host]
+                if section in rows:
+                    heartbeats[section] = Mysql._parse_heartbeat(rows[section], section)
+
+        missing = [section for section in sections if section not in heartbeats]
+        if missing:
+            raise MysqlError(f"Unable to get heartbeat from masters {mysql_hosts} for sections: {', '.join(missing)}")
+
+        return heartbeats
+
+    @staticmethod
+    def _parse_heartbeat_rows(output: MsgTreeElem) -> dict[str, str]:
+        """Parse the output of the sections heartbeat query.
+
+        Arguments:
+            output: the output of :py:attr:`spicerack.mysql.Mysql.sections_heartbeat_query` for a host.
+
+        Returns:
+            A dictionary with the section name :py:class:`str` as keys and its heartbeat :py:class:`str` as values.
+
+        """
+        return dict(line.split("\t", 1) for line in output.message().decode().splitlines() if "\t" in line)
+
+    @staticmethod
+    def _parse_heartbeat(heartbeat_str: str, section: str) -> datetime:
+        """Convert a heartbeat returned by the sections heartbeat query into a datetime.
+
+        Arguments:
+            heartbeat_str: the heartbeat to convert.
+            section: the section of the heartbeat.
+
+        Raises:
+            spicerack.mysql.MysqlError: on failure to convert the heartbeat into a datetime.
+
+        """
+        try:
+            return datetime.strptime(heartbeat_str, "%Y-%m-%dT%H:%M:%S.%f").replace(tzinfo=UTC)
+        except (TypeError, ValueError) as e:
+            raise MysqlError(
+                f"Unable to convert heartbeat '{heartbeat_str}' for section {section} into datetime"
+            ) from e
+
     @staticmethod
     def _get_heartbeat(mysql_hosts: MysqlRemoteHosts, section: str, heartbeat_dc: str) -> datetime:
         """Get the heartbeat from the remote host for a given DC.
@@ -2,22 +2,49 @@
 
 import json
 import logging
-from collections.abc import Iterator
+import re
+import shlex
+import time
+from collections import deque
+from collections.abc import Callable, Iterator, Sequence
 from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
+from statistics import median
 from typing import Optional, Union
 
+from ClusterShell.MsgTree import MsgTreeElem
 from cumin import NodeSet, nodeset
 from cumin.transports import Command
 from wmflib.dns import Dns
+from wmflib.prometheus import Prometheus, PrometheusError
 
 from spicerack.administrative import Reason
 from spicerack.decorators import retry
 from spicerack.exceptions import SpicerackCheckError, SpicerackError
-from spicerack.remote import RemoteExecutionError, RemoteHosts, RemoteHostsAdapter
+from spicerack.remote import (
+    RemoteClusterExecutionError,
+    RemoteExecutionError,
+    RemoteHosts,
+    RemoteHostsAdapter,
+    run_sliding_window,
+)
 
 PUPPET_COMMON_SCRIPT: str = "/usr/local/share/bash/puppet-common.sh"
 """The absolute path of the puppet-common script shipped by Puppet with useful functions."""
+PUPPETSERVER_JRUBY_LOAD_QUERY: str = (
+    "max(1 - puppetserver_jruby_num_free_jrubies / puppetserver_jruby_num_jrubies)"
+    " or max(puppetserver_jruby_queue_requested_instances / puppetserver_jruby_num_jrubies)"
+)
+"""The default Prometheus query to get the load of the puppetservers, as the ratio of busy JRuby instances."""
+HIERA_LOOKUP_MARKER: str = "@@spicerack-hiera-lookup {index} {return_code}@@"
+"""The marker that separates the results of the batched Hiera lookups in the output."""
+HIERA_LOOKUP_MARKER_PATTERN: re.Pattern = re.compile(r"\n?@@spicerack-hiera-lookup (\d+) (\d*)@@\n?")
+"""The pattern to split the output of the batched Hiera lookups, capturing the index and return code of each one."""
+HIERA_LOOKUP_MAX_PARALLEL: int = 4
+"""The default maximum number of hosts whose Hiera lookups run in parallel, each one compiles its own catalog."""
+HIERA_LOOKUP_MAX_HOSTS: int = 50
+"""The maximum number of hosts whose Hiera lookups are run in a single execution on the Puppet server."""
 logger = logging.getLogger(__name__)
 
 
@@ -49,6 +76,191 @@ class PuppetServerCheckError(SpicerackCheckError):
     """Custom exception class for check errors in the PuppetServer class."""
 
 
+@dataclass(frozen=True)
+class AdaptiveConcurrency:
+    """Configuration of the adaptive concurrency for :py:meth:`spicerack.puppet.PuppetHosts.run_adaptive`.
+
+    The concurrency is adapted each time as many Puppet runs as the current concurrency have completed, considering
+    only the runs started after the last change:
+
+    * It's halved if the ratio of failed runs is above ``max_failure_rate``.
+    * It's halved if the median duration of the successful runs is more than ``slowdown_factor`` times the median
+      duration of the last ``history`` successful runs before them. Comparing medians makes a single slow host, or
+      hosts of a role with longer Puppet runs, not enough to reduce the concurrency.
+    * It's halved if the puppetservers load is at or above ``max_load``.
+    * Otherwise it's increased by ``increase``.
+
+    It's always kept between ``floor`` and ``ceiling``.
+
+    Arguments:
+        floor: the minimum number of concurrent Puppet runs.
+        ceiling: the maximum number of concurrent Puppet runs.
+        initial: the initial number of concurrent Puppet runs.
+        increase: how many concurrent Puppet runs to add after enough successful runs.
+        slowdown_factor: how much slower than the previous runs the runs can be before reducing the concurrency.
+        load: an optional callable that returns the current load of the puppetservers as a ratio between 0 and 1,
+            see :py:class:`spicerack.puppet.PuppetserverLoad`.
+        max_load: the load of the puppetservers at or above which the concurrency is reduced.
+        max_failure_rate: the ratio of failed Puppet runs above which the concurrency is reduced.
+        history: how many of the last successful Puppet runs to compare the duration of the new runs with.
+
+    """
+
+    floor: int = 5
+    ceiling: int = 50
+    initial: int = 10
+    increase: int = 5
+    slowdown_factor: float = 1.5
+    load: Optional[Callable[[], float]] = None
+    max_load: float = 0.8
+    max_failure_rate: float = 0.2
+    history: int = 50
+
+    def __post_init__(self) -> None:
+        """According to Python's dataclass API to validate the arguments.
+
+        See Also:
+            https://docs.python.org/3/library/dataclasses.html#post-init-processing
+
+        """
+        if not 0 < self.floor <= self.initial <= self.ceiling:
+            raise PuppetHostsError(
+                f"Invalid adaptive concurrency, must be 0 < floor <= initial <= ceiling, got floor={self.floor}, "
+                f"initial={self.initial}, ceiling={self.ceiling}"
+            )
+
+        if self.increase < 1 or self.slowdown_factor < 1.0:
+            raise PuppetHostsError(
+                f"Invalid adaptive concurrency, increase must be >= 1 and slowdown_factor >= 1.0, got "
+                f"increase={self.increase}, slowdown_factor={self.slowdown_factor}"
+            )
+
+        if not 0.0 <= self.max_failure_rate <= 1.0 or self.history < 1:
+            raise PuppetHostsError(
+                f"Invalid adaptive concurrency, max_failure_rate must be 0.0 <= x <= 1.0 and history >= 1, got "
+                f"max_failure_rate={self.max_failure_rate}, history={self.history}"
+            )
+
+
+class _AdaptiveWindow:
+    """Adapt the number of concurrent Puppet runs to their outcome, see :py:class:`AdaptiveConcurrency`."""
+
+    def __init__(self, concurrency: AdaptiveConcurrency) -> None:
+        """Initialize the instance.
+
+        Arguments:
+            concurrency: the adaptive concurrency configuration.
+
+        """
+        self._concurrency = concurrency
+        self.size = concurrency.initial
+        self.sizes = [self.size]
+        self._history: deque[float] = deque(maxlen=concurrency.history)
+        self._durations: list[float] = []
+        self._failed = 0
+        self._changed_at = time.monotonic()
+
+    def completed(self, started_at: float, duration: float, *, failed: bool) -> None:
+        """Update the number of concurrent runs with the outcome of a completed Puppet run.
+
+        Arguments:
+            started_at: the monotonic time at which the Puppet run started.
+            duration: the duration in seconds of the Puppet run.
+            failed: whether the Puppet run failed.
+
+        """
+        if started_at < self._changed_at:  # Not representative of the current concurrency
+            return
+
+        if failed:  # A failed run might have been fast just because it failed early, don't consider its duration
+            self._failed += 1
+        else:
+            self._durations.append(duration)
+
+        completed = self._failed + len(self._durations)
+        if completed < self.size:
+            return
+
+        if self._failed / completed > self._concurrency.max_failure_rate:
+            self._resize(self.size // 2, f"{self._failed} of {completed} Puppet runs failed")
+            return
+
+        if self._durations and self._history:
+            current = median(self._durations)
+            previous = median(self._history)
+            if current > previous * self._concurrency.slowdown_factor:
+                self._resize(
+                    self.size // 2, f"Puppet runs took {current:.1f} seconds (median), previously {previous:.1f}"
+                )
+                return
+
+        if self._concurrency.load is not None:
+            load = self._concurrency.load()
+            if load >= self._concurrency.max_load:
+                self._resize(self.size // 2, f"Puppetservers load is {load:.2f}")
+                return
+
+        self._resize(self.size + self._concurrency.increase, f"{completed} Puppet runs completed")
+
+    def _resize(self, size: int, reason: str) -> None:
+        """Change the number of concurrent runs within the limits and start a new observation window.
+
+        Arguments:
+            size: the new number of concurrent runs, before applying the limits.
+            reason: the reason for the change, for logging purposes.
+
+        """
+        size = min(self._concurrency.ceiling, max(self._concurrency.floor, size))
+        if size != self.size:
+            logger.info("%s, changing the Puppet runs concurrency from %d to %d", reason, self.size, size)
+            self.size = size
+            self.sizes.append(size)
+
+        self._history.extend(self._durations)
+        self._durations = []
+        self._failed = 0
+        self._changed_at = time.monotonic()
+
+
+class PuppetserverLoad:
+    """Callable to get the current load of the puppetservers from Prometheus."""
+
+    def __init__(
+        self, prometheus: Prometheus, sites: Sequence[str], *, query: str = PUPPETSERVER_JRUBY_LOAD_QUERY
+    ) -> None:
+        """Initialize the instance.
+
+        Arguments:
+            prometheus: the Prometheus instance to use.
+            sites: the datacenters of the puppetservers to check.
+            query: the Prometheus query that returns the load of the puppetservers as a ratio between 0 and 1.
+
+        """
+        self._prometheus = prometheus
+        self._sites = sites
+        self._query = query
+
+    def __call__(self) -> float:
+        """Get the current load of the puppetservers.
+
+        Returns:
+            The highest load among all the sites, or zero if there are no metrics or Prometheus is not available, in
+            order to not block the Puppet runs.
+
+        """
+        loads = [0.0]
+        for site in self._sites:
+            try:
+                results = self._prometheus.query(self._query, site)
+            except PrometheusError as e:
+                logger.warning("Unable to get the puppetservers load in %s from Prometheus: %s", site, e)
+                continue
+
+            loads += [float(result["value"][1]) for result in results]
+
+        return max(loads)
+
+
 class PuppetHosts(RemoteHostsAdapter):
     """Class to manage Puppet on the target hosts."""
 
@@ -204,6 +416,124 @@ class PuppetHosts(RemoteHostsAdapter):
                 Puppet masters.
 
         """
+        args_string = self._get_run_args(
+            enable_reason=enable_reason, quiet=quiet, failed_only=failed_only, force=force, attempts=attempts
+        )
+        command = f"run-puppet-agent {args_string}".strip()
+        logger.info("Running Puppet with args '%s' on %d hosts: %s", args_string, len(self), self)
+        self._remote_hosts.run_sync(Command(command, timeout=timeout), batch_size=batch_size)
+
+    def run_adaptive(  # pylint: disable=too-many-arguments,too-many-locals
+        self,
+        *,
+        timeout: int = 300,
+        enable_reason: Optional[Reason] = None,
+        quiet: bool = False,
+        failed_only: bool = False,
+        force: bool = False,
+        attempts: int = 0,
+        concurrency: Optional[AdaptiveConcurrency] = None,
+        max_failures: int = 0,
+    ) -> list[int]:
+        """Run Puppet in a sliding window, adapting the number of concurrent runs to the observed load.
+
+        Instead of a fixed batch size like :py:meth:`spicerack.puppet.PuppetHosts.run`, Puppet is run separately on
+        each host, keeping up to the current concurrency runs in flight and starting a new one as soon as any run
+        completes, see :py:func:`spicerack.remote.run_sliding_window`. The concurrency is adapted based on the
+        duration and the failure rate of the completed runs and optionally the load of the puppetservers, see
+        :py:class:`spicerack.puppet.AdaptiveConcurrency`. As the runs are concurrent, Cumin's output and progress bars
+        are not printed.
+
+        Examples:
+            ::
+
+                >>> puppet_hosts = spicerack.puppet(spicerack.remote().query("A:all"))
+                >>> load = puppet.PuppetserverLoad(spicerack.prometheus(), ["eqiad", "codfw"])
+                >>> used = puppet_hosts.run_adaptive(concurrency=puppet.AdaptiveConcurrency(ceiling=100, load=load))
+
+        Arguments:
+            timeout: the timeout in seconds to set in Cumin for the execution of the command.
+            enable_reason: the reason to use to contextually re-enable Puppet if it was disabled.
+            quiet: suppress Puppet output if True.
+            failed_only: run Puppet only if the last run failed.
+            force: forcely re-enable Puppet if it was disabled with ANY message.
+            attempts: override the default number of attempts waiting that an in-flight Puppet run completes before
+                timing out as set in run-puppet-agent.
+            concurrency: the adaptive concurrency configuration, if not set the default one is used.
+            max_failures: the maximum number of hosts that can fail before stopping to start new Puppet runs, the
+                runs already in flight are waited for.
+
+        Returns:
+            The number of concurrent Puppet runs used, in order, starting with the initial one.
+
+        Raises:
+            spicerack.remote.RemoteClusterExecutionError: if the Puppet run failed on any host.
+
+        """
+        if concurrency is None:
+            concurrency = AdaptiveConcurrency()
+
+        args_string = self._get_run_args(
+            enable_reason=enable_reason, quiet=quiet, failed_only=failed_only, force=force, attempts=attempts
+        )
+        command = f"run-puppet-agent {args_string}".strip()
+        logger.info(
+            "Running Puppet with args '%s' and adaptive concurrency on %d hosts: %s", args_string, len(self), self
+        )
+        window = _AdaptiveWindow(concurrency)
+        results: list[tuple[NodeSet, MsgTreeElem]] = []
+        failures: list[RemoteExecutionError] = []
+
+        def run_on_host(
+            host: str,
+        ) -> tuple[float, float, list[tuple[NodeSet, MsgTreeElem]], Optional[RemoteExecutionError]]:
+            """Run Puppet on the host, returning its start time, duration, results and failure, if any."""
+            start = time.monotonic()
+            try:
+                host_results = self._remote_hosts.get_subset(NodeSet(host)).run_sync(
+                    Command(command, timeout=timeout), print_output=False, print_progress_bars=False
+                )
+                return start, time.monotonic() - start, list(host_results), None
+            except RemoteExecutionError as e:
+                logger.error("Puppet run failed on %s", host)
+                return start, time.monotonic() - start, list(e.results), e
+
+        def completed(
+            outcome: tuple[float, float, list[tuple[NodeSet, MsgTreeElem]], Optional[RemoteExecutionError]],
+        ) -> bool:
+            """Collect the outcome of a Puppet run and adapt the concurrency, returning whether to start new runs."""
+            start, duration, host_results, failure = outcome
+            results.extend(host_results)
+            window.completed(start, duration, failed=failure is not None)
+            if failure is None:
+                return True
+
+            failures.append(failure)
+            if len(failures) == max_failures + 1:
+                logger.error("Too many failed hosts (%d), not starting any other Puppet run", len(failures))
+
+            return len(failures) <= max_failures
+
+        run_sliding_window(
+            run_on_host,
+            self._remote_hosts.hosts,
+            size=lambda: window.size,
+            completed=completed,
+            max_workers=concurrency.ceiling,
+            thread_name_prefix="puppet-adaptive",
+        )
+
+        logger.info("Puppet runs performed with concurrency: %s", window.sizes)
+        if failures:
+            raise RemoteClusterExecutionError(results, failures)
+
+        return window.sizes
+
+    @staticmethod
+    def _get_run_args(
+        *, enable_reason: Optional[Reason], quiet: bool, failed_only: bool, force: bool, attempts: int
+    ) -> str:
+        """Get the arguments to run Puppet with the given options, see :py:meth:`spicerack.puppet.PuppetHosts.run`."""
         args = []
         if enable_reason is not None:
             args += ["--enable", enable_reason.quoted()]
@@ -216,10 +546,7 @@ class PuppetHosts(RemoteHostsAdapter):
         if attempts:
             args += ["--attempts", str(attempts)]
 
-        args_string = " ".join(args)
-        command = f"run-puppet-agent {args_string}".strip()
-        logger.info("Running Puppet with args '%s' on %d hosts: %s", args_string, len(self), self)
-        self._remote_hosts.run_sync(Command(command, timeout=timeout), batch_size=batch_size)
+        return " ".join(args)
 
     def first_run(self, has_systemd: bool = True) -> Iterator[tuple]:
         """Perform the first Puppet run on a clean host without using custom wrappers.
@@ -383,6 +710,15 @@ class PuppetServer(RemoteHostsAdapter):
                 f"The server_host instance must target only one host, got {len(server_host)}: {server_host}"
             )
         super().__init__(server_host)
+        self._hiera_cache: dict[tuple[str, str, str], str] = {}  # Hiera lookups results by node, key and format
+
+    def clear_hiera_cache(self) -> None:
+        """Forget the cached results of :py:meth:`spicerack.puppet.PuppetServer.hiera_lookups`.
+
+        The following lookups will get the current values, for example after a change to the Hiera data has been
+        deployed to the Puppet server.
+        """
+        self._hiera_cache.clear()
 
     def delete(self, hostname: str) -> None:
         """Remove the host from the Puppet server and PuppetDB.
@@ -538,6 +874,160 @@ class PuppetServer(RemoteHostsAdapter):
 
         return metadata
 
+    def get_certificates_metadata(self, hostnames: Sequence[str]) -> dict[str, dict]:
+        """Return the metadata of the certificates of the given hostnames in the Puppet CA with a single listing.
+
+        Arguments:
+            hostnames: the FQDNs of the hosts for which to get the certificates.
+
+        Returns:
+            A dictionary with the hostnames as keys and the metadata of their certificate as values, in the same format
+            of :py:meth:`spicerack.puppet.PuppetServer.get_certificate_metadata`. The hostnames without a certificate
+            or CSR are not included.
+
+        Raises:
+            spicerack.puppet.PuppetServerError: if unable to get or parse the certificates list.
+
+        """
+        response = self._run_json_command("puppetserver ca list --all --format json")
+        if not isinstance(response, dict):
+            raise PuppetServerError(f"Expected a dict from Puppet CA, got: {response}")
+
+        wanted = set(hostnames)
+        certificates: dict[str, dict] = {}
+        for key, entries in response.items():
+            if key == "missing":
+                continue
+
+            for metadata in entries:
+                if metadata["name"] in wanted:
+                    certificates[metadata["name"]] = metadata
+
+        return certificates
+
+    def delete_hosts(self, hostnames: Sequence[str]) -> None:
+        """Remove multiple hosts from the Puppet server and PuppetDB with a single command per action.
+
+        See :py:meth:`spicerack.puppet.PuppetServer.delete` for the details.
+
+        Arguments:
+            hostnames: the FQDNs of the hosts to remove.
+
+        """
+        if not hostnames:
+            return
+
+        names = " ".join(hostnames)
+        commands = [f"puppet node {action} {names}" for action in ("clean", "deactivate")]
+        self._remote_hosts.run_sync(*commands, print_progress_bars=False)
+
+    def destroy_certificates(self, hostnames: Sequence[str]) -> None:
+        """Remove the certificates for multiple hosts, see :py:meth:`spicerack.puppet.PuppetServer.destroy`.
+
+        The existing certificates are found with a single listing and cleaned with a single command.
+
+        Arguments:
+            hostnames: the FQDNs of the hosts for which to remove the certificate.
+
+        Raises:
+            spicerack.remote.RemoteExecutionError: if unable to destroy the certificates.
+
+        """
+        certificates = self.get_certificates_metadata(hostnames)
+        missing = [hostname for hostname in hostnames if hostname not in certificates]
+        if missing:
+            logger.info("The certificates for %s do not exist, nothing to do for them.", ", ".join(missing))
+
+        to_clean = [hostname for hostname in hostnames if hostname in certificates]
+        if not to_clean:
+            return
+
+        self._remote_hosts.run_sync(
+            f"puppetserver ca clean --certname {','.join(to_clean)}", print_progress_bars=False
+        )
+
+    def sign_certificates(self, fingerprints: dict[str, str]) -> None:
+        """Sign the CSRs on the Puppet CA for multiple hosts, see :py:meth:`spicerack.puppet.PuppetServer.sign`.
+
+        The state of the CSRs is checked with a single listing before signing all of them with a single command and
+        verified with another single listing afterwards.
+
+        Arguments:
+            fingerprints: the fingerprints of the CSRs generated on the clients to verify them, with the FQDNs of the
+                hosts as keys.
+
+        Raises:
+            spicerack.puppet.PuppetServerError: if any certificate is in an unexpected state.
+
+        """
+        if not fingerprints:
+            return
+
+        certificates = self.get_certificates_metadata(list(fingerprints))
+        errors = []
+        for hostname, fingerprint in fingerprints.items():
+            cert = certificates.get(hostname)
+            if cert is None:
+                errors.append(f"no CSR found for {hostname}")
+            elif cert["state"] != PuppetServer.PUPPET_CERT_STATE_REQUESTED:
+                errors.append(f"certificate for {hostname} not in requested state, got: {cert['state']}")
+            elif cert["fingerprint"] != fingerprint:
+                errors.append(
+                    f"CSR fingerprint {cert['fingerprint']} for {hostname} does not match provided fingerprint "
+                    f"{fingerprint}"
+                )
+
+        if errors:
+            raise PuppetServerError(f"Unable to sign the certificates: {'; '.join(errors)}")
+
+        logger.info("Signing CSRs for %d hosts: %s", len(fingerprints), ", ".join(fingerprints))
+        command = f"puppetserver ca sign --certname {','.join(fingerprints)}"
+        executed = self._remote_hosts.run_sync(command, print_output=False, print_progress_bars=False)
+
+        certificates = self.get_certificates_metadata(list(fingerprints))
+        not_signed = {
+            hostname: certificates[hostname]["state"] if hostname in certificates else "missing"
+            for hostname in fingerprints
+            if certificates.get(hostname, {}).get("state") != PuppetServer.PUPPET_CERT_STATE_SIGNED
+        }
+        if not_signed:
+            for _, output in executed:
+                logger.error(output.message().decode())
+
+            raise PuppetServerError(f"Expected certificates to be signed, got: {not_signed}")
+
+    @retry(
+        tries=10,
+        delay=timedelta(seconds=5),
+        backoff_mode="power",
+        exceptions=(PuppetServerCheckError,),
+    )
+    def wait_for_csrs(self, hostnames: Sequence[str]) -> None:
+        """Poll until the CSRs appear for all the given hostnames or the timeout is reached.
+
+        Each poll checks all the hosts with a single listing, see :py:meth:`spicerack.puppet.PuppetServer.wait_for_csr`.
+
+        Arguments:
+            hostnames: the FQDNs of the hosts for which to check a CSR.
+
+        Raises:
+            spicerack.puppet.PuppetServerError: if any certificate is in an unexpected state.
+            spicerack.puppet.PuppetServerCheckError: if within the timeout not all CSRs are found.
+
+        """
+        certificates = self.get_certificates_metadata(hostnames)
+        unexpected = {
+            hostname: metadata["state"]
+            for hostname, metadata in certificates.items()
+            if metadata["state"] != PuppetServer.PUPPET_CERT_STATE_REQUESTED
+        }
+        if unexpected:
+            raise PuppetServerError(f"Expected certificates in requested state, got: {unexpected}")
+
+        missing = [hostname for hostname in hostnames if hostname not in certificates]
+        if missing:
+            raise PuppetServerCheckError(f"The puppet server has no CSR for {', '.join(missing)}")
+
     def _run_json_command(self, command: str) -> Union[dict, list]:
         """Execute and parse a Puppet CLI command that output JSON format.
 
@@ -577,6 +1067,9 @@ class PuppetServer(RemoteHostsAdapter):
     def hiera_lookup(self, fqdn: str, key: str, *, fmt: str = "s") -> str:
         """Lookup a hiera value for a specific host.
 
+        The value is always looked up again, it's not cached like in
+        :py:meth:`spicerack.puppet.PuppetServer.hiera_lookups`.
+
         Arguments:
             fqdn: the fqdn whose values we are looking up
             key: the hiera key to lookup
@@ -587,3 +1080,110 @@ class PuppetServer(RemoteHostsAdapter):
         result = self._remote_hosts.run_sync(command, is_safe=True, print_output=False, print_progress_bars=False)
         _, output = next(result)
         return output.message().decode()
+
+    def hiera_lookups(
+        self,
+        fqdns: Sequence[str],
+        keys: Sequence[str],
+        *,
+        fmt: str = "s",
+        max_parallel: int = HIERA_LOOKUP_MAX_PARALLEL,
+    ) -> dict[str, dict[str, str]]:
+        """Lookup multiple hiera values for multiple hosts with as few executions as possible on the Puppet server.
+
+        The lookups of each host are run sequentially in a dedicated process and up to ``max_parallel`` hosts are
+        looked up in parallel. The hosts are split in multiple executions of up to
+        :py:const:`spicerack.puppet.HIERA_LOOKUP_MAX_HOSTS` hosts each. The results are cached in this instance by host,
+        key and format, only the missing ones are looked up, see also
+        :py:meth:`spicerack.puppet.PuppetServer.clear_hiera_cache`.
+
+        Examples:
+            ::
+
+                >>> values = puppet_server.hiera_lookups(["host1.example.com", "host2.example.com"], ["cluster"])
+                >>> values["host1.example.com"]["cluster"]
+                'misc'
+
+        Arguments:
+            fqdns: the fqdns whose values we are looking up.
+            keys: the hiera keys to lookup for each host.
+            fmt: how Puppet will render the objects: 's' (PSON, default), 'json', 'yaml'.
+            max_parallel: the maximum number of hosts to lookup in parallel, as each lookup compiles the host's
+                catalog on the Puppet server.
+
+        Returns:
+            A dictionary with the FQDNs as keys and a dictionary of the looked up hiera keys and values as values.
+
+        Raises:
+            spicerack.puppet.PuppetServerError: if ``max_parallel`` is not positive or any of the lookups fails, with
+                the error output of the failed lookups.
+
+        """
+        if max_parallel < 1:
+            raise PuppetServerError(f"The max_parallel of the Hiera lookups must be positive, got {max_parallel}")
+
+        lookups = [(fqdn, key) for fqdn in fqdns for key in keys if (fqdn, key, fmt) not in self._hiera_cache]
+        hosts = list(dict.fromkeys(fqdn for fqdn, _ in lookups))
+        for start in range(0, len(hosts), HIERA_LOOKUP_MAX_HOSTS):
+            chunk_hosts = set(hosts[start : start + HIERA_LOOKUP_MAX_HOSTS])
+            chunk = [(fqdn, key) for fqdn, key in lookups if fqdn in chunk_hosts]
+            values = self._run_hiera_lookups(chunk, fmt=fmt, max_parallel=max_parallel)
+            for (fqdn, key), value in zip(chunk, values, strict=True):
+                self._hiera_cache[(fqdn, key, fmt)] = value
+
+        return {fqdn: {key: self._hiera_cache[(fqdn, key, fmt)] for key in keys} for fqdn in fqdns}
+
+    def _run_hiera_lookups(self, lookups: list[tuple[str, str]], *, fmt: str, max_parallel: int) -> list[str]:
+        """Run the given Hiera lookups in a single command on the Puppet server, one process per host.
+
+        Arguments:
+            lookups: the list of (fqdn, key) tuples to lookup.
+            fmt: how Puppet will render the objects.
+            max_parallel: the maximum number of processes to run in parallel.
+
+        Returns:
+            The list of values in the same order of the given lookups.
+
+        Raises:
+            spicerack.puppet.PuppetServerError: if any of the lookups fails, with their error output.
+
+        """
+        per_host: dict[str, list[str]] = {}
+        for index, (fqdn, key) in enumerate(lookups):
+            per_host.setdefault(fqdn, []).append(
+                f"puppet lookup --render-as {shlex.quote(fmt)} --compile --node {shlex.quote(fqdn)} {shlex.quote(key)} "
+                f'> "$d/{index}" 2> "$d/{index}.err"; echo $? > "$d/{index}.rc"'
+            )
+
+        # Before starting a new process wait for any of the running ones to complete if there are too many
+        processes = "".join(f"throttle; ( {'; '.join(commands)} ) 2>/dev/null & " for commands in per_host.values())
+        marker = HIERA_LOOKUP_MARKER.format(index="$i", return_code="$rc")
+        # Output the value of the successful lookups and the error output of the failed ones
+        script = (
+            "d=$(mktemp -d) || exit 1; trap 'rm -rf \"$d\"' EXIT; "
+            f'throttle() {{ while [ "$(jobs -pr | wc -l)" -ge {max_parallel} ]; do wait -n; done; }}; '
+            f"{processes}wait; "
+            f'for i in $(seq 0 {len(lookups) - 1}); do rc=$(cat "$d/$i.rc"); printf \'\\n%s\\n\' "{marker}"; '
+            'if [ "$rc" = "0" ]; then cat "$d/$i"; else cat "$d/$i.err"; fi; done'
+        )
+        command = "bash -c " + shlex.quote(script)
+        logger.debug("Running %d Hiera lookups for %d hosts on %s", len(lookups), len(per_host), self._remote_hosts)
+        result = self._remote_hosts.run_sync(command, is_safe=True, print_output=False, print_progress_bars=False)
+        _, output = next(result)
+        parts = HIERA_LOOKUP_MARKER_PATTERN.split(output.message().decode())
+        values: dict[int, str] = {}
+        failed = []
+        for index, return_code, value in zip(parts[1::3], parts[2::3], parts[3::3], strict=True):
+            if return_code != "0":
+                fqdn, key = lookups[int(index)]
+                error = value.strip() or "no error output"
+                failed.append(f"{key} on {fqdn} (rc: {return_code or 'unknown'}): {error}")
+            values[int(index)] = value.removesuffix("\n")
+
+        if failed:
+            raise PuppetServerError(f"Failed Hiera lookups: {'; '.join(failed)}")
+
+        if len(values) != len(lookups):
+            raise PuppetServerError(f"Expected {len(lookups)} Hiera lookups results, got {len(values)}")
+
+        return [values[index] for index in range(len(lookups))]
@@ -6,6 +6,10 @@ import logging
 import re
 import time
 from abc import abstractmethod
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
 from enum import Enum
 from io import BufferedReader
@@ -28,6 +32,12 @@ from spicerack.apiclient import APIClient, APIClientError, APIClientResponseErro
 from spicerack.decorators import retry
 from spicerack.exceptions import SpicerackError
 
+LOG_QUERY_SUPPORT: dict[tuple[str, str], bool] = {}
+"""Whether the log entries endpoint honors the ``$filter`` query parameter, cached per class and management console
+firmware version as it is a property of the firmware and not of the single host."""
+LOG_QUERY_MAX_PAGES: int = 5
+"""The maximum number of pages of filtered log entries to fetch before falling back to scan the most recent ones."""
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 logger = logging.getLogger(__name__)
 
@@ -160,6 +170,9 @@ class Redfish:
         self._oob_info: dict = {}
         self._system_info: dict = {}
         self._updateservice_info: dict = {}
+        self._log_cursor: Optional[datetime] = None
+        self._log_cursor_ids: set[str] = set()
+        self._last_reboot = datetime.fromisoformat("1970-01-01T00:00:00-00:00")
 
     def __str__(self) -> str:
         """String representation of the instance.
@@ -336,19 +349,115 @@ class Redfish:
         return sorted(members, key=sorter)[-1]
 
     def last_reboot(self) -> datetime:
-        """Get the the last reboot time."""
-        # TODO: we can possibly use filter once all OOB's are updated.  e.g.
-        # Lclog/Entries?$filter=MessageId eq 'reboot_code'
-        # currently we get the following on some older models
-        # Message=Querying is not supported by the implementation, MessageArgs=$filter"
-        last_reboot = datetime.fromisoformat("1970-01-01T00:00:00-00:00")
-        results = self.request("get", self.log_entries).json()
-        # use ends with as sometimes there is an additional string prefix to the code e.g. IDRAC.2.7.RAC0182
-        members = [m for m in results["Members"] if m["MessageId"].endswith(self.reboot_message_id)]
+        """Get the the last reboot time.
+
+        The first call scans the most recent log entries. If the management console supports querying the log
+        entries, the following calls fetch only the entries created since the most recent one already seen,
+        otherwise they scan again the most recent log entries. The result is the most recent reboot ever seen by
+        this instance.
+
+        """
+        members = None
+        if self._log_cursor is not None and self._supports_log_query(self._log_cursor):
+            members = self._get_log_entries_since(self._log_cursor)
+
+        if members is None:
+            members = self.request("get", self.log_entries).json()["Members"]
+
+        # The query includes the entries created in the same second of the cursor, skip those already seen
+        members = [m for m in members if m["Id"] not in self._log_cursor_ids]
         if members:
-            last_reboot = datetime.fromisoformat(self.most_recent_member(members, "Created")["Created"])
-        logger.debug("%s: last reboot %s", self._hostname, last_reboot)
-        return last_reboot
+            newest = datetime.fromisoformat(self.most_recent_member(members, "Created")["Created"])
+            newest_ids = {m["Id"] for m in members if datetime.fromisoformat(m["Created"]) == newest}
+            if self._log_cursor is None or newest > self._log_cursor:
+                self._log_cursor = newest
+                self._log_cursor_ids = newest_ids
+            elif newest == self._log_cursor:
+                self._log_cursor_ids.update(newest_ids)
+
+        # use ends with as sometimes there is an additional string prefix to the code e.g. IDRAC.2.7.RAC0182
+        reboots = [m for m in members if m["MessageId"].endswith(self.reboot_message_id)]
+        if reboots:
+            last_reboot = datetime.fromisoformat(self.most_recent_member(reboots, "Created")["Created"])
+            self._last_reboot = max(self._last_reboot, last_reboot)
+
+        logger.debug("%s: last reboot %s", self._hostname, self._last_reboot)
+        return self._last_reboot
+
+    def _supports_log_query(self, known: datetime) -> bool:
+        """Check if the log entries endpoint supports the ``$filter`` query parameter.
+
+        Some older models reply with "Querying is not supported by the implementation", others silently ignore the
+        filter. The probe first filters on a datetime in the future, that must return no entries, and then on the
+        creation datetime of the most recent entries already seen, that must return at least one of them, so that a
+        filter that is ignored or that never matches is not mistaken for a supported one. The result is cached in
+        :py:data:`spicerack.redfish.LOG_QUERY_SUPPORT` so that hosts with the same firmware are probed only once.
+
+        Arguments:
+            known: the creation datetime of the most recent log entries already seen.
+
+        Returns:
+            :py:data:`True` if the query parameter is supported, :py:data:`False` otherwise.
+
+        """
+        key = (self.__class__.__name__, str(self.firmware_version))
+        if key not in LOG_QUERY_SUPPORT:
+            future = (datetime.now(tz=UTC) + timedelta(days=3650)).replace(microsecond=0)
+            try:
+                # Use the API client directly as a failure is expected on some models and should not be logged
+                response = self._api_client.request(
+                    "get", self.log_entries, params={"$filter": f"Created ge '{future.isoformat()}'"}
+                )
+                supported = not response.json().get("Members", [])
+                if supported:
+                    response = self._api_client.request(
+                        "get", self.log_entries, params={"$filter": f"Created ge '{known.isoformat()}'"}
+                    )
+                    members = response.json().get("Members", [])
+                    supported = any(member.get("Id") in self._log_cursor_ids for member in members)
+
+                LOG_QUERY_SUPPORT[key] = supported
+            except (APIClientError, ValueError) as e:
+                logger.debug("%s: log entries query not supported: %s", self._hostname, e)
+                LOG_QUERY_SUPPORT[key] = False
+
+        return LOG_QUERY_SUPPORT[key]
+
+    def _get_log_entries_since(self, since: datetime) -> Optional[list[dict]]:
+        """Get all the log entries created since the given datetime, following the pagination.
+
+        The entries created in the same second of the given datetime are included too, as the ``Created`` field has
+        a one second resolution. If more than :py:data:`spicerack.redfish.LOG_QUERY_MAX_PAGES` pages are returned
+        the filter is most likely not honored, the query is marked as not supported for this firmware and
+        :py:data:`None` is returned to let the caller fall back to scan the most recent log entries.
+
+        Arguments:
+            since: the datetime since when the log entries must have been created.
+
+        Returns:
+            The list of log entries or :py:data:`None` if there are too many pages.
+
+        """
+        members: list[dict] = []
+        uri = self.log_entries
+        params: Optional[dict] = {"$filter": f"Created ge '{since.isoformat()}'"}
+        for _ in range(LOG_QUERY_MAX_PAGES):
+            results = self.request("get", uri, params=params).json()
+            members.extend(results["Members"])
+            if "Members@odata.nextLink" not in results:
+                return members
+
+            uri = results["Members@odata.nextLink"]
+            params = None  # The next link already includes the query parameters
+
+        logger.debug(
+            "%s: more than %d pages of log entries since %s, disabling log entries query",
+            self._hostname,
+            LOG_QUERY_MAX_PAGES,
+            since,
+        )
+        LOG_QUERY_SUPPORT[(self.__class__.__name__, str(self.firmware_version))] = False
+        return None
 
     @retry(
         tries=240,
@@ -811,6 +920,10 @@ class DellSCP:
         self._allow_new_attributes = allow_new_attributes
         # Track if the Components property have been emptied, allowing the creation of new components
         self._emptied_components = False
+        # Index of the components and their attributes by name, built lazily, see _get_index()
+        self._index: Optional[dict[str, tuple[dict, dict[str, dict]]]] = None
+        # The attributes changed by set(), in the same format of the components property
+        self._changes: dict[str, dict[str, str]] = {}
 
     @property
     def config(self) -> dict:
@@ -909,54 +1022,53 @@ class DellSCP:
             )
             return attribute
 
-        for component in self._config["SystemConfiguration"]["Components"]:
-            if component["FQDD"] != component_name:
-                continue
-
-            for i in range(len(component["Attributes"])):
-                attribute = component["Attributes"][i]
-                if attribute["Name"] != attribute_name:
-                    continue
-
-                # Attribute found, update it if different, consider comma-separated lists identical with both ',' and
-                # ', ' as separators.
-                if attribute["Value"].replace(", ", ",") == attribute_value.replace(", ", ","):
-                    logger.info(
-                        "Skipped set of attribute %s -> %s, has already the correct value: %s",
-                        component_name,
-                        attribute_name,
-                        attribute["Value"],
-                    )
-                    return False
+        index = self._get_index()
+        if component_name not in index:  # Component not found, add it or raise
+            if not self._emptied_components:
+                raise RedfishError(f"Unable to find component {component_name}")
 
-                logger.info(
-                    "Updated value for attribute %s -> %s%s: %s => %s",
-                    component_name,
-                    attribute_name,
-                    " (marked Set On Import to True)" if attribute["Set On Import"] == "False" else "",
-                    attribute["Value"],
-                    attribute_value,
-                )
-                attribute["Value"] = attribute_value
-                attribute["Set On Import"] = "True"
-
-                return True
+            attribute = new_attribute()
+            new_component = {"FQDD": component_name, "Attributes": [attribute]}
+            self._config["SystemConfiguration"]["Components"].append(new_component)
+            index[component_name] = (new_component, {attribute_name: attribute})
+            self._changes.setdefault(component_name, {})[attribute_name] = attribute_value
+            return True
 
-            # Attribute not found, add it or raise
-            if self._allow_new_attributes or self._emptied_components:
-                component["Attributes"].append(new_attribute())
-                return True
+        component, attributes = index[component_name]
+        if attribute_name not in attributes:  # Attribute not found, add it or raise
+            if not (self._allow_new_attributes or self._emptied_components):
+                raise RedfishError(f"Unable to find attribute {component_name} -> {attribute_name}")
 
-            raise RedfishError(f"Unable to find attribute {component_name} -> {attribute_name}")
+            attribute = new_attribute()
+            component["Attributes"].append(attribute)
+            attributes[attribute_name] = attribute
+            self._changes.setdefault(component_name, {})[attribute_name] = attribute_value
+            return True
 
-        # Component not found, add it or raise
-        if self._emptied_components:
-            self._config["SystemConfiguration"]["Components"].append(
-                {"FQDD": component_name, "Attributes": [new_attribute()]}
+        # Attribute found, update it if different
+        attribute = attributes[attribute_name]
+        if self._same_value(attribute["Value"], attribute_value):
+            logger.info(
+                "Skipped set of attribute %s -> %s, has already the correct value: %s",
+                component_name,
+                attribute_name,
+                attribute["Value"],
             )
-            return True
+            return False
+
+        logger.info(
+            "Updated value for attribute %s -> %s%s: %s => %s",
+            component_name,
+            attribute_name,
+            " (marked Set On Import to True)" if attribute["Set On Import"] == "False" else "",
+            attribute["Value"],
+            attribute_value,
+        )
+        attribute["Value"] = attribute_value
+        attribute["Set On Import"] = "True"
+        self._changes.setdefault(component_name, {})[attribute_name] = attribute_value
 
-        raise RedfishError(f"Unable to find component {component_name}")
+        return True
 
     def update(self, changes: dict[str, dict[str, str]]) -> bool:
         """Bulk update the current configuration with the set of changes provided.
@@ -992,6 +1104,100 @@ class DellSCP:
         """
         self._config["SystemConfiguration"]["Components"] = []
         self._emptied_components = True
+        self._index = None
+        self._changes = {}
+
+    @property
+    def changes(self) -> dict[str, dict[str, str]]:
+        """Getter for the attributes changed or added by :py:meth:`spicerack.redfish.DellSCP.set`.
+
+        The returned dictionary has the same format of the one returned by
+        :py:meth:`spicerack.redfish.DellSCP.components`.
+
+        """
+        return {component: dict(sorted(self._changes[component].items())) for component in sorted(self._changes)}
+
+    def diff(self, desired: dict[str, dict[str, str]]) -> dict[str, dict[str, str]]:
+        """Compare the current configuration with the desired one, without modifying it.
+
+        Arguments:
+            desired: the desired configuration in the same format of the one returned by
+                :py:meth:`spicerack.redfish.DellSCP.components`, usually a subset of the whole configuration.
+
+        Returns:
+            The subset of the desired configuration that differs from the current one, including the components and
+            attributes not present in the current configuration.
+
+        """
+        index = self._get_index()
+        differences: dict[str, dict[str, str]] = {}
+        for component_name, attributes in desired.items():
+            current = index[component_name][1] if component_name in index else {}
+            for attribute_name, value in attributes.items():
+                if attribute_name not in current or not self._same_value(current[attribute_name]["Value"], value):
+                    differences.setdefault(component_name, {})[attribute_name] = value
+
+        return differences
+
+    def minimal(self) -> "DellSCP":
+        """Get a new configuration with only the attributes changed or added in this instance.
+
+        Only the attributes changed or added by :py:meth:`spicerack.redfish.DellSCP.set` are included, the other
+        sections of the configuration are preserved. Pushing it to the server instead of the whole configuration
+        reduces the payload size and the time the iDRAC takes to apply it.
+
+        Returns:
+            The minimal configuration, with the same target.
+
+        """
+        index = self._get_index()
+        components = [
+            {
+                "FQDD": component_name,
+                "Attributes": [deepcopy(index[component_name][1][name]) for name in sorted(attributes)],
+            }
+            for component_name, attributes in sorted(self._changes.items())
+        ]
+        system_configuration = {**self._config["SystemConfiguration"], "Components": components}
+        return DellSCP({**self._config, "SystemConfiguration": system_configuration}, self._target)
+
+    def _get_index(self) -> dict[str, tuple[dict, dict[str, dict]]]:
+        """Get the index of the configuration, building it on first use.
+
+        Returns:
+            A dictionary with the components names as keys and a tuple with the component itself and a dictionary of
+            its attributes by name as values. For duplicated names only the first occurrence is considered.
+
+        """
+        if self._index is None:
+            self._index = {}
+            for component in self._config["SystemConfiguration"].get("Components", []):
+                if component["FQDD"] in self._index:
+                    continue
+
+                attributes: dict[str, dict] = {}
+                for attribute in component.get("Attributes", []):
+                    attributes.setdefault(attribute["Name"], attribute)
+
+                self._index[component["FQDD"]] = (component, attributes)
+
+        return self._index
+
+    @staticmethod
+    def _same_value(current: str, new: str) -> bool:
+        """Check if two attribute values are the same.
+
+        Consider comma-separated lists identical with both ',' and ', ' as separators.
+
+        Arguments:
+            current: the current value.
+            new: the new value.
+
+        Returns:
+            :py:data:`True` if the values are the same, :py:data:`False` otherwise.
+
+        """
+        return current.replace(", ", ",") == new.replace(", ", ",")
 
 
 class RedfishSupermicro(Redfish):
@@ -1231,6 +1437,7 @@ class RedfishDell(Redfish):
         reboot: DellSCPRebootPolicy = DellSCPRebootPolicy.NO_REBOOT,
         power_state: DellSCPPowerStatePolicy = DellSCPPowerStatePolicy.ON,
         preview: bool = True,
+        only_changes: bool = False,
     ) -> dict:
         """Push the SCP (Server Configuration Profiles) configuration.
 
@@ -1243,9 +1450,12 @@ class RedfishDell(Redfish):
                 parses correctly and would not result in any writes. The comments will tell if the new configuration
                 would not produce any changes. Forces the reboot parameter to be
                 :py:const:`spicerack.redfish.DellSCPRebootPolicy.NO_REBOOT`.
+            only_changes: if :py:data:`True` push only the attributes changed in the configuration, see
+                :py:meth:`spicerack.redfish.DellSCP.minimal`. If there are no changes nothing is pushed.
 
         Returns:
-            The results of the push operation.
+            The results of the push operation, an empty dictionary if ``only_changes`` is :py:data:`True` and there
+            are no changes to push.
 
         Raises:
             spicerack.redfish.RedfishError: if the API call fail.
@@ -1258,6 +1468,13 @@ class RedfishDell(Redfish):
         else:
             uri = "ImportSystemConfiguration"
 
+        if only_changes:
+            if not scp.changes:
+                logger.info("%s: no changes in the SCP configuration, skipping the push", self._hostname)
+                return {}
+
+            scp = scp.minimal()
+
         # iDRAC 10 wants Target as a list
         target_value = [scp.target.value] if self.hw_model >= 10 else scp.target.value
         data: dict = {
@@ -1327,3 +1544,188 @@ class RedfishDell(Redfish):
             uri,
             json=efi_http_boot,
         )
+
+
+@dataclass(frozen=True)
+class RedfishFleetResult:
+    """The outcome of an operation performed on a single host of a :py:class:`spicerack.redfish.RedfishFleet`."""
+
+    hostname: str
+    """The hostname (not FQDN) of the host."""
+    result: Any = None
+    """The value returned by the operation, if successful."""
+    error: Optional[Exception] = None
+    """The exception raised by the operation, if failed."""
+
+    @property
+    def success(self) -> bool:
+        """Whether the operation was successful on the host."""
+        return self.error is None
+
+
+class RedfishFleet:
+    """Perform Redfish operations concurrently on multiple hosts, reporting the results per host.
+
+    A failure on a host doesn't stop the operation on the other hosts, all the operations return a dictionary with
+    the hostnames as keys and :py:class:`spicerack.redfish.RedfishFleetResult` instances as values.
+
+    Examples:
+        ::
+
+            >>> fleet = spicerack.redfish_fleet(["host1001", "host1002"])
+            >>> uploads = fleet.upload_file(Path("firmware.bin"))
+            >>> tasks = {hostname: upload.result for hostname, upload in uploads.items() if upload.success}
+            >>> results = fleet.poll_task(tasks)
+            >>> failed = [hostname for hostname, result in results.items() if not result.success]
+
+    """
+
+    def __init__(self, redfishes: Sequence[Redfish], *, max_workers: int = 10) -> None:
+        """Initialize the instance.
+
+        Arguments:
+            redfishes: the Redfish instances of the hosts to manage.
+            max_workers: the maximum number of hosts to operate on concurrently.
+
+        Raises:
+            spicerack.redfish.RedfishError: if the parameters are invalid.
+
+        """
+        if max_workers < 1:
+            raise RedfishError(f"The max_workers must be a positive integer, got {max_workers}")
+
+        self._redfishes = {redfish.hostname: redfish for redfish in redfishes}
+        if len(self._redfishes) != len(redfishes):
+            raise RedfishError("The Redfish instances must belong to different hosts")
+
+        self._max_workers = max_workers
+
+    def __len__(self) -> int:
+        """Return the number of hosts in the fleet."""
+        return len(self._redfishes)
+
+    def __getitem__(self, hostname: str) -> Redfish:
+        """Return the Redfish instance of the given host.
+
+        Arguments:
+            hostname: the hostname (not FQDN) of the host.
+
+        """
+        return self._redfishes[hostname]
+
+    @property
+    def hostnames(self) -> list[str]:
+        """The hostnames of the fleet."""
+        return list(self._redfishes.keys())
+
+    def run(
+        self, func: Callable[[Redfish], Any], *, hostnames: Optional[Sequence[str]] = None
+    ) -> dict[str, RedfishFleetResult]:
+        """Call the given function concurrently for each host, at most ``max_workers`` at a time.
+
+        Arguments:
+            func: the function to call, it receives the Redfish instance of the host as its only argument.
+            hostnames: the subset of hostnames of the fleet to run the function on, all of them if :py:data:`None`.
+
+        Returns:
+            The results for each host, in the same order of the hosts.
+
+        Raises:
+            spicerack.redfish.RedfishError: if any of the hostnames is not part of the fleet.
+
+        """
+        if hostnames is None:
+            hostnames = self.hostnames
+
+        unknown = [hostname for hostname in hostnames if hostname not in self._redfishes]
+        if unknown:
+            raise RedfishError(f"Hosts not part of the fleet: {', '.join(unknown)}")
+
+        def run_on_host(hostname: str) -> RedfishFleetResult:
+            """Run the function on the given host, catching any error."""
+            try:
+                return RedfishFleetResult(hostname=hostname, result=func(self._redfishes[hostname]))
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("Redfish operation failed on %s: %s", hostname, e)
+                return RedfishFleetResult(hostname=hostname, error=e)
+
+        with ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="redfish-fleet") as executor:
+            results = {result.hostname: result for result in executor.map(run_on_host, hostnames)}
+
+        failed = sum(1 for result in results.values() if not result.success)
+        logger.info("Redfish operation completed on %d/%d hosts", len(results) - failed, len(results))
+        return results
+
+    def upload_file(self, file_path: Path, reboot: bool = False) -> dict[str, RedfishFleetResult]:
+        """Upload a file to the firmware directory of all the hosts.
+
+        See :py:meth:`spicerack.redfish.Redfish.upload_file`.
+
+        Arguments:
+            file_path: the file path to upload.
+            reboot: if true immediately reboot the servers.
+
+        Returns:
+            The results for each host, with the job ID URI of the upload as result.
+
+        """
+        return self.run(lambda redfish: redfish.upload_file(file_path, reboot=reboot))
+
+    def poll_task(self, uris: dict[str, str]) -> dict[str, RedfishFleetResult]:
+        """Poll the given tasks until their results are available, see :py:meth:`spicerack.redfish.Redfish.poll_task`.
+
+        Arguments:
+            uris: the URIs of the tasks to poll, with the hostnames as keys.
+
+        Returns:
+            The results for each host in the given URIs, with the task results as result.
+
+        """
+        return self.run(lambda redfish: redfish.poll_task(uris[redfish.hostname]), hostnames=list(uris.keys()))
+
+    def scp_push(
+        self,
+        scp: Union[DellSCP, dict[str, DellSCP]],
+        *,
+        reboot: DellSCPRebootPolicy = DellSCPRebootPolicy.NO_REBOOT,
+        power_state: DellSCPPowerStatePolicy = DellSCPPowerStatePolicy.ON,
+        preview: bool = True,
+    ) -> dict[str, RedfishFleetResult]:
+        """Push the SCP configuration to the Dell hosts, see :py:meth:`spicerack.redfish.RedfishDell.scp_push`.
+
+        Arguments:
+            scp: either the same configuration to push to all the hosts or the configuration for each host with the
+                hostnames as keys, in which case only those hosts are targeted.
+            reboot: which reboot policy to use to apply the changes.
+            power_state: which final power state policy to use to apply to the hosts after the changes have been
+                applied.
+            preview: if :py:data:`True` perform only a test push of the SCP data.
+
+        Returns:
+            The results for each host, with the results of the push operation as result. Non-Dell hosts are reported
+            as failed.
+
+        """
+        hostnames = list(scp.keys()) if isinstance(scp, dict) else None
+
+        def push(redfish: Redfish) -> dict:
+            """Push the configuration to the given host."""
+            if not isinstance(redfish, RedfishDell):
+                raise RedfishError(f"SCP is supported only on Dell hosts, {redfish.hostname} is not")
+
+            host_scp = scp[redfish.hostname] if isinstance(scp, dict) else scp
+            return redfish.scp_push(host_scp, reboot=reboot, power_state=power_state, preview=preview)
+
+        return self.run(push, hostnames=hostnames)
+
+    def chassis_reset(self, action: ChassisResetPolicy) -> dict[str, RedfishFleetResult]:
+        """Reset the chassis power status of all the hosts, see :py:meth:`spicerack.redfish.Redfish.chassis_reset`.
+
+        Arguments:
+            action: the reset policy to use.
+
+        Returns:
+            The results for each host.
+
+        """
+        return self.run(lambda redfish: redfish.chassis_reset(action))
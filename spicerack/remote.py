@@ -2,22 +2,36 @@
 
 import logging
 import math
+import queue
+import re
+import threading
 import time
-from collections.abc import Callable, Iterator, Sequence
+from collections import defaultdict
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
-from typing import Any, Optional, Union
+from typing import Any, Optional, TypeVar, Union
 
 from ClusterShell.MsgTree import MsgTreeElem
+from ClusterShell.Task import task_terminate
 from cumin import Config, CuminError, NodeSet, query, transport, transports
 from cumin.cli import target_batch_size
 from cumin.transports import Command
-from cumin.transports.clustershell import NullReporter, TqdmReporter
+from cumin.transports.clustershell import AsyncEventHandler, NullReporter, TqdmReporter
 
 from spicerack.confctl import ConftoolEntity
 from spicerack.decorators import retry
 from spicerack.exceptions import SpicerackCheckError, SpicerackError
 
+CUMIN_QUOTED_VALUE_PATTERN: re.Pattern = re.compile(r"""("[^"]*"|'[^']*')""")
+"""The pattern to match the quoted values in a Cumin query, with a capturing group to keep them."""
+WHITESPACES_PATTERN: re.Pattern = re.compile(r"\s+")
+"""The pattern to match a sequence of whitespaces."""
+
 logger = logging.getLogger(__name__)
+_T = TypeVar("_T")
+_R = TypeVar("_R")
 
 
 class RemoteError(SpicerackError):
@@ -65,6 +79,178 @@ class RemoteClusterExecutionError(RemoteError):
         self.results = results
 
 
+@dataclass(frozen=True)
+class RemoteHostResult:
+    """The result of the execution of all the commands on a single host.
+
+    Arguments:
+        host: the name of the host.
+        exit_code: the exit code of the last command executed on the host or :py:data:`None` if it timed out.
+        output: the output of all the commands executed on the host, in the order of execution.
+
+    """
+
+    host: str
+    exit_code: Optional[int]
+    output: str
+
+    @property
+    def success(self) -> bool:
+        """Whether all the commands were executed successfully on the host."""
+        return self.exit_code == 0
+
+
+def run_sliding_window(  # pylint: disable=too-many-arguments
+    func: Callable[[_T], _R],
+    items: Iterable[_T],
+    *,
+    size: Callable[[], int],
+    completed: Callable[[_R], bool],
+    max_workers: int,
+    sleep: Optional[float] = None,
+    thread_name_prefix: str = "",
+) -> None:
+    """Call a function on each item from a thread pool, keeping up to a given number of calls in flight.
+
+    A new call is started as soon as any call completes, without waiting for the slower ones. The ClusterShell task
+    bound to each pool thread is released after each call, hence the function can execute Cumin commands.
+
+    Arguments:
+        func: the function to call, it receives the item as its only argument.
+        items: the items to call the function on, in order.
+        size: a callable that returns the current maximum number of calls in flight. It's checked again after each
+            completed call, allowing to adapt the window.
+        completed: a callable that is called in the calling thread with the return value of each call, in order of
+            completion. If it returns :py:data:`False` no new calls are started, the calls in flight are waited for.
+        max_workers: the number of threads of the pool, must be at least the largest value returned by ``size``.
+        sleep: the seconds to sleep before starting each call after the initial ones.
+        thread_name_prefix: the prefix of the name of the pool threads.
+
+    """
+
+    def call(item: _T) -> _R:
+        """Call the function releasing the ClusterShell task bound to the pool thread."""
+        try:
+            return func(item)
+        finally:
+            task_terminate()
+
+    pending = iter(items)
+    running: set[Future] = set()
+    scheduling = True
+    initial = True
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix) as executor:
+        while True:
+            while scheduling and len(running) < size():
+                try:
+                    item = next(pending)
+                except StopIteration:
+                    scheduling = False
+                    break
+
+                if sleep is not None and not initial:
+                    time.sleep(sleep)
+                running.add(executor.submit(call, item))
+
+            initial = False
+            if not running:
+                break
+
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                if not completed(future.result()):
+                    scheduling = False
+
+
+class _StreamingEventHandler(AsyncEventHandler):
+    """Cumin's async event handler that publishes the result of each host as soon as it completes.
+
+    The ``results`` class attribute must be set by subclassing, as Cumin instantiates the handler on its own.
+    Setting the ``stopped`` event prevents the scheduling of new hosts, while the ones already running complete.
+    The progress and the output of each host are tracked through the ClusterShell callbacks only, without relying on
+    the parent's internal state, that differs across Cumin versions.
+    """
+
+    results: "queue.Queue[Optional[RemoteHostResult]]"
+    stopped: threading.Event
+
+    def __init__(self, target: Any, commands: list[Command], *args: Any, **kwargs: Any) -> None:
+        """Initialize the instance, according to the parent class."""
+        super().__init__(target, commands, *args, **kwargs)
+        self._commands = list(commands)
+        self._streaming_lock = threading.Lock()
+        self._executed: dict[str, int] = defaultdict(int)
+        self._outputs: dict[str, list[bytes]] = defaultdict(list)
+        self._reported: set[str] = set()
+
+    def ev_read(self, worker: Any, node: str, sname: str, msg: bytes) -> None:
+        """Worker has data to read from a specific node, collect it for the host result.
+
+        :Parameters:
+            according to parent :py:meth:`cumin.transports.clustershell.AsyncEventHandler.ev_read`.
+        """
+        super().ev_read(worker, node, sname, msg)
+        if sname == "stdout":
+            with self._streaming_lock:
+                self._outputs[node].append(msg)
+
+    def ev_hup(self, worker: Any, node: str, rc: int) -> None:
+        """Command execution completed on a node, publish its result if it will not execute any other command.
+
+        :Parameters:
+            according to parent :py:meth:`cumin.transports.clustershell.AsyncEventHandler.ev_hup`.
+        """
+        super().ev_hup(worker, node, rc)
+        with self._streaming_lock:
+            ok_codes = self._commands[self._executed[node]].ok_codes
+            self._executed[node] += 1
+            completed = self._executed[node] == len(self._commands)
+
+        if completed or (ok_codes and rc not in ok_codes):
+            self._publish(node, rc)
+
+    def ev_close(self, worker: Any, timedout: bool) -> None:
+        """Worker has finished or timed out, publish the result of the hosts that timed out.
+
+        :Parameters:
+            according to parent :py:meth:`cumin.transports.clustershell.AsyncEventHandler.ev_close`.
+        """
+        super().ev_close(worker, timedout)
+        if not timedout:
+            return
+
+        for node in worker.task.iter_keys_timeout():
+            self._publish(node, None)
+
+    def ev_timer(self, timer: Any) -> None:
+        """Schedule the next host unless the consumer of the results has stopped the iteration.
+
+        :Parameters:
+            according to parent :py:meth:`cumin.transports.clustershell.AsyncEventHandler.ev_timer`.
+        """
+        if self.stopped.is_set():
+            logger.debug("Results consumer has stopped, not scheduling any more hosts")
+            return
+
+        super().ev_timer(timer)
+
+    def _publish(self, node: str, rc: Optional[int]) -> None:
+        """Publish the result of a host that has completed its execution, only once per host.
+
+        Arguments:
+            node: the name of the host.
+            rc: the return code of the last command or :py:data:`None` if it timed out.
+
+        """
+        with self._streaming_lock:
+            if node in self._reported:
+                return
+            self._reported.add(node)
+            output = b"\n".join(self._outputs.pop(node, []))
+
+        self.results.put(RemoteHostResult(host=node, exit_code=rc, output=output.decode()))
+
+
 class RemoteHostsAdapter:
     """Base adapter to write classes that expand the capabilities of RemoteHosts.
 
@@ -227,6 +413,114 @@ class LBRemoteCluster(RemoteHostsAdapter):
             raise RemoteClusterExecutionError(results, failures)
         return results
 
+    def run_rolling(  # pylint: disable=too-many-arguments,too-many-locals
+        self,
+        *commands: Union[str, Command],
+        svc_to_depool: list[str],
+        max_depooled: int = 1,
+        host_sleep: Optional[float] = None,
+        success_threshold: float = 1.0,
+        is_safe: bool = False,
+        print_output: Optional[bool] = None,
+        print_progress_bars: Optional[bool] = None,
+    ) -> list[tuple[NodeSet, MsgTreeElem]]:
+        """Run commands on one host at a time in a sliding window, keeping at most max_depooled hosts depooled.
+
+        Unlike :py:meth:`spicerack.remote.LBRemoteCluster.run`, that waits for the whole batch to be repooled before
+        depooling the next one, here each host is depooled, has the commands executed and is repooled independently
+        and a new host is started as soon as any other host has been repooled.
+
+        The scheduling of new hosts is stopped as soon as the ratio of failed hosts makes it impossible to meet the
+        success threshold, waiting for the hosts already in progress to complete. The failures within the success
+        threshold are logged and don't fail the execution.
+
+        Arguments:
+            *commands: Arbitrary number of commands to execute.
+            svc_to_depool: A list of services (in conftool) to depool.
+            max_depooled: the maximum number of hosts that can be depooled at the same time.
+            host_sleep: the sleep in seconds to wait after a host has been repooled before starting the next one.
+            success_threshold: to consider the execution successful, must be between 0.0 and 1.0.
+            is_safe: whether the command is safe to run also in dry-run mode because it's a read-only command that
+                doesn't modify the state.
+            print_output: whether to print Cumin's output to stdout. If not set it's enabled only when
+                ``max_depooled`` is 1, as the output of hosts run in parallel would be interleaved.
+            print_progress_bars: whether to print Cumin's progress bars to stderr. If not set it's enabled only when
+                ``max_depooled`` is 1, as the progress bars of hosts run in parallel would be interleaved.
+
+        Returns:
+            What :py:meth:`cumin.transports.BaseWorker.get_results` returns to allow to iterate over the results,
+            in order of completion of the hosts, including the ones of the failed hosts.
+
+        Raises:
+            spicerack.remote.RemoteError: if the arguments are not valid.
+            spicerack.remote.RemoteClusterExecutionError: if the ratio of failed hosts doesn't meet the success
+                threshold.
+
+        """
+        n_hosts = len(self._remote_hosts)
+        if max_depooled <= 0 or max_depooled >= n_hosts:
+            raise RemoteError(f"Values for max_depooled must be 0 < x < {n_hosts}, got {max_depooled}")
+        if not 0.0 <= success_threshold <= 1.0:
+            raise RemoteError(f"Values for success_threshold must be 0.0 <= x <= 1.0, got {success_threshold}")
+
+        if print_output is None:
+            print_output = max_depooled == 1
+        if print_progress_bars is None:
+            print_progress_bars = max_depooled == 1
+
+        max_failures = math.floor(round((1.0 - success_threshold) * n_hosts, 6))
+        results: list[tuple[NodeSet, MsgTreeElem]] = []
+        failures: list[RemoteExecutionError] = []
+
+        def run_on_host(
+            remote_host: RemoteHosts,
+        ) -> tuple[list[tuple[NodeSet, MsgTreeElem]], Optional[RemoteExecutionError]]:
+            """Depool the host, run the commands and repool it, returning the results and the failure, if any."""
+            with self._conftool.change_and_revert(
+                "pooled", "yes", "no", service="|".join(svc_to_depool), name=str(remote_host)
+            ):
+                try:
+                    host_results = remote_host.run_async(
+                        *commands,
+                        is_safe=is_safe,
+                        success_threshold=1.0,
+                        print_output=print_output,
+                        print_progress_bars=print_progress_bars,
+                    )
+                    return list(host_results), None
+                except RemoteExecutionError as e:
+                    # Catch the exception within the context manager to always repool the host
+                    return list(e.results), e
+
+        def completed(outcome: tuple[list[tuple[NodeSet, MsgTreeElem]], Optional[RemoteExecutionError]]) -> bool:
+            """Collect the outcome of a host, returning whether to keep scheduling new hosts."""
+            host_results, failure = outcome
+            results.extend(host_results)
+            if failure is None:
+                return True
+
+            failures.append(failure)
+            if len(failures) == max_failures + 1:
+                logger.error("Too many failed hosts (%d), not scheduling any other host", len(failures))
+
+            return len(failures) <= max_failures
+
+        run_sliding_window(
+            run_on_host,
+            self._remote_hosts,
+            size=lambda: max_depooled,
+            completed=completed,
+            max_workers=max_depooled,
+            sleep=host_sleep,
+            thread_name_prefix="lb-rolling",
+        )
+
+        if len(failures) > max_failures:
+            raise RemoteClusterExecutionError(results, failures)
+        if failures:
+            logger.warning("%d hosts have failed execution, within the success threshold", len(failures))
+        return results
+
     def restart_services(
         self,
         services: list[str],
@@ -340,31 +634,58 @@ class LBRemoteCluster(RemoteHostsAdapter):
 class Remote:
     """Remote class to interact with Cumin."""
 
-    def __init__(self, config: str, dry_run: bool = True) -> None:
+    def __init__(self, config: str, dry_run: bool = True, cache_ttl: float = 0.0) -> None:
         """Initialize the instance.
 
         Arguments:
             config: the path of Cumin's configuration file.
             dry_run: whether this is a DRY-RUN.
+            cache_ttl: the time to live in seconds of the cached results of the Cumin queries. When set to zero, the
+                default, the caching is disabled and each query is executed against the Cumin backend.
 
         """
         self._config = Config(config)
         self._dry_run = dry_run
+        self._cache_ttl = cache_ttl
+        self._cache: dict[str, tuple[float, NodeSet]] = {}
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+    @property
+    def cache_stats(self) -> dict[str, int]:
+        """Getter for the statistics of the queries cache.
+
+        Returns:
+            a dictionary with the number of cache ``hits`` and ``misses`` and the current ``size`` of the cache.
+
+        """
+        return {"hits": self._cache_hits, "misses": self._cache_misses, "size": len(self._cache)}
+
+    def invalidate_cache(self, query_string: Optional[str] = None) -> None:
+        """Invalidate the cached results of the Cumin queries.
+
+        Arguments:
+            query_string: the Cumin query string to invalidate. If not set the whole cache is invalidated.
+
+        """
+        if query_string is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(Remote._normalize_query(query_string), None)
 
     def query(self, query_string: str, use_sudo: bool = False) -> "RemoteHosts":
         """Execute a Cumin query and return the matching hosts.
 
+        If the cache is enabled, the hosts are returned from the cache when the same query, after whitespace
+        normalization, was already executed within the cache TTL.
+
         Arguments:
             query_string: the Cumin query string to execute.
             use_sudo: If True will prepend 'sudo -i' to every command.
 
         """
         # TODO: Revisit the current implementation of sudo once Cumin has native support for it.
-        try:
-            hosts = query.Query(self._config).execute(query_string)
-        except CuminError as e:
-            raise RemoteError("Failed to execute Cumin query") from e
-
+        hosts = self._cached_query(query_string) if self._cache_ttl > 0 else self._execute_query(query_string)
         return RemoteHosts(self._config, hosts, dry_run=self._dry_run, use_sudo=use_sudo)
 
     def query_confctl(self, conftool: ConftoolEntity, **tags: str) -> LBRemoteCluster:
@@ -391,6 +712,61 @@ class Remote:
             logger.warning("Hosts present in conftool but not in puppet: %s", ",".join(host_diff))
         return LBRemoteCluster(self._config, remote_hosts, conftool)
 
+    def _cached_query(self, query_string: str) -> NodeSet:
+        """Return the hosts matching the Cumin query from the cache, executing the query if not cached or expired.
+
+        Arguments:
+            query_string: the Cumin query string to execute.
+
+        Returns:
+            a copy of the matching hosts.
+
+        """
+        key = Remote._normalize_query(query_string)
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        if cached is not None and now - cached[0] < self._cache_ttl:
+            self._cache_hits += 1
+            logger.debug("Cumin query cache hit for: %s", key)
+            return cached[1].copy()
+
+        self._cache_misses += 1
+        hosts = self._execute_query(query_string)
+        self._cache[key] = (now, hosts.copy())
+        return hosts
+
+    def _execute_query(self, query_string: str) -> NodeSet:
+        """Execute a Cumin query against the backend.
+
+        Arguments:
+            query_string: the Cumin query string to execute.
+
+        Returns:
+            the matching hosts.
+
+        Raises:
+            spicerack.remote.RemoteError: if unable to execute the query.
+
+        """
+        try:
+            return query.Query(self._config).execute(query_string)
+        except CuminError as e:
+            raise RemoteError("Failed to execute Cumin query") from e
+
+    @staticmethod
+    def _normalize_query(query_string: str) -> str:
+        """Normalize the whitespaces of a Cumin query string to be used as cache key.
+
+        The whitespaces within quoted values are significant for Cumin and are left untouched.
+
+        Arguments:
+            query_string: the Cumin query string to normalize.
+
+        """
+        parts = CUMIN_QUOTED_VALUE_PATTERN.split(query_string)
+        # The quoted values are captured by the split pattern and are at the odd indexes
+        return "".join(part if i % 2 else WHITESPACES_PATTERN.sub(" ", part) for i, part in enumerate(parts)).strip()
+
 
 class RemoteHosts:
     """Class to execute remote commands on hosts. The instances are also iterable."""
@@ -564,6 +940,92 @@ class RemoteHosts:
             print_progress_bars=print_progress_bars,
         )
 
+    def stream_async(
+        self,
+        *commands: Union[str, Command],
+        success_threshold: float = 1.0,
+        batch_size: Optional[Union[int, str]] = None,
+        batch_sleep: Optional[float] = None,
+        is_safe: bool = False,
+        print_output: bool = True,
+        print_progress_bars: bool = True,
+    ) -> Iterator[RemoteHostResult]:
+        """Execute commands on hosts via Cumin in async mode and yield each host result as soon as it completes.
+
+        Unlike :py:meth:`spicerack.remote.RemoteHosts.run_async`, that returns the results only once the execution
+        has completed on all hosts, this allows to process the results incrementally. The execution runs in a
+        background thread. If the iteration is stopped early no new hosts will be scheduled, while the ones already
+        running will complete their execution before returning the control to the caller.
+
+        Examples:
+            ::
+
+                >>> for result in remote_hosts.stream_async("some-command", batch_size=10):
+                ...     if not result.success:
+                ...         break  # No new hosts will be scheduled
+                ...     process(result.host, result.output)
+
+        Arguments:
+            *commands: arbitrary number of commands to execute on the target hosts.
+            success_threshold: to consider the execution successful, must be between 0.0 and 1.0.
+            batch_size: the batch size for cumin, either as percentage (e.g. ``25%``) or absolute number (e.g. ``5``).
+            batch_sleep: the batch sleep in seconds to use in Cumin before scheduling the next host.
+            is_safe: whether the command is safe to run also in dry-run mode because it's a read-only command that
+                doesn't modify the state.
+            print_output: whether to print Cumin's output to stdout.
+            print_progress_bars: whether to print Cumin's progress bars to stderr.
+
+        Yields:
+            spicerack.remote.RemoteHostResult: the result of each host, in order of completion.
+
+        Raises:
+            spicerack.remote.RemoteExecutionError: if the Cumin execution returns a non-zero exit code, raised after
+            all the results have been yielded.
+
+        """
+        results: "queue.Queue[Optional[RemoteHostResult]]" = queue.Queue()
+        stopped = threading.Event()
+        handler = type("StreamingEventHandler", (_StreamingEventHandler,), {"results": results, "stopped": stopped})
+        worker_kwargs: dict[str, Any] = {
+            "handler": handler,
+            "success_threshold": success_threshold,
+            "batch_size": batch_size,
+            "batch_sleep": batch_sleep,
+            "print_output": print_output,
+            "print_progress_bars": print_progress_bars,
+        }
+        if self._dry_run and not is_safe:
+            self._get_worker(list(commands), **worker_kwargs)  # Logs the commands that would have been executed
+            return
+
+        outcome: dict[str, Any] = {}
+
+        def execute() -> None:
+            """Run the commands, to be called in a separate thread as ClusterShell binds its tasks to a thread."""
+            try:
+                outcome["worker"] = self._get_worker(list(commands), **worker_kwargs)
+                outcome["retcode"] = outcome["worker"].execute()
+            except BaseException as e:  # pylint: disable=broad-except
+                outcome["error"] = e
+            finally:
+                task_terminate()  # Release the ClusterShell task bound to this thread
+                results.put(None)  # Signal the end of the execution
+
+        thread = threading.Thread(target=execute, name=f"cumin-stream-{len(self._hosts)}-hosts", daemon=True)
+        thread.start()
+        try:
+            while (result := results.get()) is not None:
+                yield result
+        finally:
+            stopped.set()
+            thread.join()
+
+        if "error" in outcome:
+            raise RemoteError("Cumin streaming execution failed") from outcome["error"]
+
+        if outcome["retcode"] != 0 and not self._dry_run:
+            raise RemoteExecutionError(outcome["retcode"], "Cumin execution failed", outcome["worker"].get_results())
+
     def reboot(self, batch_size: int = 1, batch_sleep: Optional[float] = 180.0) -> None:
         """Reboot hosts.
 
@@ -722,6 +1184,52 @@ class RemoteHosts:
         Raises:
             spicerack.remote.RemoteExecutionError: if the Cumin execution returns a non-zero exit code.
 
+        """
+        worker = self._get_worker(
+            commands,
+            handler=mode,
+            success_threshold=success_threshold,
+            batch_size=batch_size,
+            batch_sleep=batch_sleep,
+            print_output=print_output,
+            print_progress_bars=print_progress_bars,
+        )
+        if self._dry_run and not is_safe:
+            return iter(())  # Empty generator
+
+        ret = worker.execute()
+
+        if ret != 0 and not self._dry_run:
+            raise RemoteExecutionError(ret, "Cumin execution failed", worker.get_results())
+
+        return worker.get_results()
+
+    def _get_worker(  # pylint: disable=too-many-arguments
+        self,
+        commands: Sequence[Union[str, Command]],
+        *,
+        handler: Union[str, type],
+        success_threshold: float,
+        batch_size: Optional[Union[int, str]],
+        batch_sleep: Optional[float],
+        print_output: bool,
+        print_progress_bars: bool,
+    ) -> transports.BaseWorker:
+        """Get a Cumin's worker ready to execute the commands on the target nodes.
+
+        Arguments:
+            commands: the list of commands to execute on the target hosts, either a list of commands or a list
+                of cumin.transports.Command instances.
+            handler: the Cumin's mode of execution (sync, async) or a custom event handler class.
+            success_threshold: to consider the execution successful, must be between 0.0 and 1.0.
+            batch_size: the batch size for cumin, either as percentage (e.g. ``25%``) or absolute number (e.g. ``5``).
+            batch_sleep: the batch sleep in seconds to use in Cumin before scheduling the next host.
+            print_output: whether to print Cumin's output to stdout.
+            print_progress_bars: whether to print Cumin's progress bars to stderr.
+
+        Returns:
+            the Cumin's worker instance.
+
         """
         if batch_size is None:
             parsed_batch_size = {"value": None, "ratio": None}
@@ -739,7 +1247,7 @@ class RemoteHosts:
         )
         worker = transport.Transport.new(self._config, target)
         worker.commands = commands
-        worker.handler = mode
+        worker.handler = handler
         worker.success_threshold = success_threshold
         worker.progress_bars = print_progress_bars
         if print_output:
@@ -754,12 +1262,4 @@ class RemoteHosts:
             str(target.hosts),
         )
 
-        if self._dry_run and not is_safe:
-            return iter(())  # Empty generator
-
-        ret = worker.execute()
-
-        if ret != 0 and not self._dry_run:
-            raise RemoteExecutionError(ret, "Cumin execution failed", worker.get_results())
-
-        return worker.get_results()
+        return worker
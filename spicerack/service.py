@@ -98,26 +98,51 @@ class ServiceDiscoveryRecord:
 
         """
         for datacenter in service_ips.sites:
-            is_pooled = self.is_pooled_in(datacenter)
-            local_ip = service_ips.get(datacenter)
             try:
                 ip_by_ns = self.instance.resolve_with_client_ip(self.dnsdisc, ip_per_dc_map[datacenter])
             except DiscoveryError as exc:
                 raise DiscoveryStateError(str(exc)) from exc
 
+            errors = self.get_state_errors(service_ips, {datacenter: ip_by_ns}, self.state)
+            if errors:
+                raise DiscoveryStateError(errors[0])
+
+    def get_state_errors(
+        self,
+        service_ips: "ServiceIPs",
+        ips_per_dc: dict[str, dict[str, Union[IPv4Address, IPv6Address]]],
+        pooled_in: set[str],
+    ) -> list[str]:
+        """Compare the addresses resolved by the authoritative nameservers with the pooled state of the record.
+
+        Arguments:
+            service_ips: An instance of service IPs related to this record.
+            ips_per_dc: the resolved addresses, keyed by the datacenter of the client IP and then by nameserver.
+            pooled_in: the names of the datacenters where the record is pooled in conftool.
+
+        Returns:
+            The list of the inconsistencies found, empty if the DNS responses match the conftool state.
+
+        """
+        errors = []
+        for datacenter, ip_by_ns in ips_per_dc.items():
+            is_pooled = datacenter in pooled_in
+            local_ip = service_ips.get(datacenter)
             for nameserver, actual_ip in ip_by_ns.items():
                 resolves_locally = ip_address(actual_ip) == local_ip
                 if is_pooled and not resolves_locally:
-                    raise DiscoveryStateError(
+                    errors.append(
                         f"Error checking auth dns for {self.fqdn} from {datacenter}: "
                         f"nameserver {nameserver} resolved to {actual_ip}, expected: {local_ip}"
                     )
                 if not is_pooled and resolves_locally:
-                    raise DiscoveryStateError(
+                    errors.append(
                         f"Error checking auth dns for {self.fqdn} in {datacenter}: "
                         f"resolved to {local_ip}, a different IP was expected."
                     )
 
+        return errors
+
 
 class ServiceDiscovery(abc.Iterable):
     """Represents the service Discovery records collection as list-like object with helper methods.
@@ -527,6 +552,26 @@ class Service:  # pylint: disable=too-many-instance-attributes
         self.discovery.get(record_name).check_service_ips(self.ip, ip_per_dc_map)
 
 
+@dataclass(frozen=True)
+class DiscoveryStateReport:
+    """Represent the outcome of the DNS Discovery state check of multiple services.
+
+    Arguments:
+        consistent: the FQDNs of the records whose DNS responses match their conftool state.
+        inconsistent: the FQDNs of the records still not matching their conftool state after all the tries, with the
+            list of the inconsistencies found at the last try for each of them.
+
+    """
+
+    consistent: list[str]
+    inconsistent: dict[str, list[str]]
+
+    @property
+    def is_consistent(self) -> bool:
+        """Whether all the checked records match their conftool state."""
+        return not self.inconsistent
+
+
 class Catalog:
     """Class to represent the service catalog of Puppet's hierdata ``service::catalog``.
 
@@ -633,3 +678,148 @@ class Catalog:
             params["lvs"] = ServiceLVS(**params["lvs"])
 
         return Service(**params)
+
+    def check_dns_state_all(
+        self,
+        ip_per_dc_map: dict[str, Union[IPv4Address, IPv6Address]],
+        *,
+        services: Optional[Sequence[str]] = None,
+        tries: int = 15,
+    ) -> DiscoveryStateReport:
+        """Check that the state of DNS Discovery is consistent for all the records of the catalog at once.
+
+        It is the bulk version of :py:meth:`spicerack.service.Service.check_dns_state`. The conftool state of all the
+        records is read only once, all the (record, datacenter, nameserver) combinations are resolved concurrently
+        and only the records still inconsistent are checked again on each retry. A record shared by multiple services
+        is checked only once, the services must have the same configuration for it.
+
+        Examples:
+            ::
+
+                >>> report = catalog.check_dns_state_all(ip_per_dc_map)
+                >>> if not report.is_consistent:
+                ...     for fqdn, errors in report.inconsistent.items():
+                ...         print(fqdn, errors)
+
+        Arguments:
+            ip_per_dc_map: mapping of datacenter -> client IP to use. Only the datacenters present in the mapping are
+                checked.
+            services: the names of the services to check, all the services of the catalog if not set.
+            tries: the number of attempts to make for each inconsistent record before giving up.
+
+        Returns:
+            The consolidated report of the check. It does not raise if some records are still inconsistent after all
+            the tries, the caller should inspect the report.
+
+        Raises:
+            ValueError: on invalid tries value.
+            spicerack.service.ServiceNotFoundError: if any of the services is not found.
+            spicerack.service.ServiceError: if multiple services share a record with a different configuration.
+
+        """
+        if tries <= 0:
+            raise ValueError("The tries argument must be a positive integer.")
+
+        names = self.service_names if services is None else services
+        checks: dict[str, tuple[ServiceDiscoveryRecord, ServiceIPs]] = {}
+        owners: dict[str, str] = {}
+        for service in (self.get(name) for name in names):
+            if service.discovery is None:
+                continue
+            for record in service.discovery:
+                if record.dnsdisc in checks:
+                    other, other_ips = checks[record.dnsdisc]
+                    if other_ips != service.ip or other.active_active != record.active_active:
+                        raise ServiceError(
+                            f"Services {owners[record.dnsdisc]} and {service.name} share the DNS Discovery record "
+                            f"{record.dnsdisc} with a different configuration"
+                        )
+                    continue
+
+                checks[record.dnsdisc] = (record, service.ip)
+                owners[record.dnsdisc] = service.name
+
+        if not checks:
+            return DiscoveryStateReport(consistent=[], inconsistent={})
+
+        discovery = Discovery(
+            conftool=self._confctl,
+            authdns_servers=self._authdns_servers,
+            records=sorted(checks),
+            dry_run=self._dry_run,
+        )
+        state = discovery.active_datacenters
+        pending = list(checks.values())
+        errors: dict[str, list[str]] = {}
+        try:
+            self._check_dns_records(discovery, pending, state, ip_per_dc_map, errors, tries=tries)
+        except DiscoveryStateError as exc:
+            logger.error("%s", exc)
+
+        fqdns = [record.fqdn for record, _ in checks.values()]
+        return DiscoveryStateReport(
+            consistent=[fqdn for fqdn in fqdns if fqdn not in errors],
+            inconsistent=errors,
+        )
+
+    @retry(backoff_mode="constant", exceptions=(DiscoveryStateError,), dynamic_params_callbacks=(set_tries,))
+    def _check_dns_records(  # pylint: disable=too-many-arguments
+        self,
+        discovery: Discovery,
+        pending: list[tuple[ServiceDiscoveryRecord, ServiceIPs]],
+        state: dict[str, list[str]],
+        ip_per_dc_map: dict[str, Union[IPv4Address, IPv6Address]],
+        errors: dict[str, list[str]],
+        tries: int = 15,  # noqa: ARG002 pylint: disable=unused-argument
+    ) -> None:
+        """Check the DNS Discovery records still pending, removing the consistent ones from the pending list.
+
+        A record that failed to resolve on any nameserver is kept pending with its resolution errors, without
+        affecting the check of the other records.
+
+        Arguments:
+            discovery: the instance to resolve all the records with.
+            pending: the records to check with their service IPs, modified in place to keep only the inconsistent ones.
+            state: the datacenters where each record is pooled in conftool.
+            ip_per_dc_map: mapping of datacenter -> client IP to use.
+            errors: the inconsistencies found for each record FQDN, reset and filled in place at each try.
+            tries: the number of retries to attempt before failing.
+
+        Raises:
+            spicerack.service.DiscoveryStateError: if any of the records is not consistent with its conftool state.
+
+        """
+        queries: dict[str, dict[str, Union[IPv4Address, IPv6Address]]] = {}
+        for record, service_ips in pending:
+            queries.setdefault(record.dnsdisc, {}).update(
+                {dc: ip_per_dc_map[dc] for dc in service_ips.sites if dc in ip_per_dc_map}
+            )
+
+        errors.clear()
+        failures: dict[str, list[str]] = {}
+        try:
+            matrix = discovery.resolve_with_client_ips(queries, failures=failures)
+        except DiscoveryError as exc:
+            for record, _ in pending:
+                errors[record.fqdn] = [str(exc)]
+            raise DiscoveryStateError(f"Unable to resolve {len(queries)} DNS Discovery records: {exc}") from exc
+
+        inconsistent = []
+        for record, service_ips in pending:
+            if record.dnsdisc in failures:
+                errors.setdefault(record.fqdn, []).extend(failures[record.dnsdisc])
+                inconsistent.append((record, service_ips))
+                continue
+
+            ips_per_dc = {dc: matrix[record.dnsdisc][dc] for dc in service_ips.sites if dc in ip_per_dc_map}
+            record_errors = record.get_state_errors(service_ips, ips_per_dc, set(state.get(record.dnsdisc, [])))
+            if record_errors:
+                errors.setdefault(record.fqdn, []).extend(record_errors)
+                inconsistent.append((record, service_ips))
+
+        pending[:] = inconsistent
+        if pending:
+            raise DiscoveryStateError(
+                f"{len(errors)} DNS Discovery records are not consistent with their conftool state: "
+                f"{', '.join(errors)}"
+            )
@@ -1,5 +1,6 @@
 """Cookbook module tests."""
 
+import json
 import logging
 import shutil
 from pathlib import Path
@@ -627,6 +628,24 @@ class TestCookbookCollection:
         for line in lines:
             assert line in caplog.text
 
+    def test_main_list_with_index(self, tmpdir, capsys):
+        """Calling main() with the -l/--list option and an index file should print the same cookbooks list."""
+        config = {
+            "cookbooks_base_dirs": COOKBOOKS_BASE_PATHS,
+            "cookbooks_index_file": str(Path(tmpdir.strpath) / "index.json"),
+            "logs_base_dir": tmpdir.strpath,
+            "instance_params": {**SPICERACK_TEST_PARAMS},  # Make a copy
+        }
+        for _ in range(2):  # The first run creates the index, the second one uses it
+            with mock.patch("spicerack._cookbook.load_yaml_config", return_value=config):
+                ret = _cookbook.main(["-l"])
+
+            out, _ = capsys.readouterr()
+            assert ret == 0
+            assert out == LIST_COOKBOOKS_ALL.format(external_cookbooks="")
+
+        assert (Path(tmpdir.strpath) / "index.json").exists()
+
     def test_cookbooks_menu_status(self, monkeypatch):
         """Calling status on a TreeItem should show the completed and total tasks."""
         monkeypatch.syspath_prepend(COOKBOOKS_BASE_PATH)
@@ -668,6 +687,216 @@ class TestCookbookCollection:
         with pytest.raises(_menu.MenuError, match="is not a subclass of CookbookBase"):
             _menu.CookbookItem(NotCookbookBaseSubclass, [], self.spicerack)
 
+    def test_cookbooks_filter_skips_import(self, monkeypatch):
+        """The modules that can't match the path filter should not be imported."""
+        monkeypatch.syspath_prepend(COOKBOOKS_BASE_PATH)
+        with mock.patch("spicerack._cookbook.import_module", wraps=_cookbook.import_module) as mocked_import:
+            cookbooks = _cookbook.CookbookCollection(
+                base_dirs=COOKBOOKS_BASE_PATHS, args=[], spicerack=self.spicerack, path_filter="group1.cookbook1"
+            )
+
+        assert cookbooks.get_item("group1.cookbook1") is not None
+        imported = [call.args[0] for call in mocked_import.call_args_list]
+        assert imported == ["cookbooks", "cookbooks.group1", "cookbooks.group1.cookbook1"]
+
+    def test_cookbooks_index(self, monkeypatch, tmp_path):
+        """With an up to date index the cookbooks modules should not be imported to build the menu."""
+        monkeypatch.syspath_prepend(COOKBOOKS_BASE_PATH)
+        index_file = tmp_path / "cache" / "index.json"
+        cookbooks = _cookbook.CookbookCollection(
+            base_dirs=COOKBOOKS_BASE_PATHS, args=[], spicerack=self.spicerack, index_file=index_file
+        )
+        assert cookbooks.menu.get_tree() == LIST_COOKBOOKS_ALL.format(external_cookbooks="")
+        assert index_file.exists()
+
+        with mock.patch("spicerack._cookbook.import_module", wraps=_cookbook.import_module) as mocked_import:
+            cookbooks = _cookbook.CookbookCollection(
+                base_dirs=COOKBOOKS_BASE_PATHS, args=[], spicerack=self.spicerack_verbose, index_file=index_file
+            )
+            assert cookbooks.menu.get_tree() == LIST_COOKBOOKS_ALL_VERBOSE
+
+        imported = {call.args[0] for call in mocked_import.call_args_list}
+        assert "cookbooks.group2.cookbook2" not in imported
+        assert "cookbooks.class_api.multiple" not in imported
+        assert "cookbooks.group3.invalid_syntax" in imported  # Not indexable, retried every time
+
+    def test_cookbooks_index_failed_cookbook(self, monkeypatch, tmp_path, caplog):
+        """A cookbook that failed to load should be indexed with its error and reported again on each run."""
+        monkeypatch.syspath_prepend(COOKBOOKS_BASE_PATH)
+        index_file = tmp_path / "index.json"
+        with mock.patch("spicerack._cookbook.CookbookItem", side_effect=_cookbook.MenuError("Invalid cookbook")):
+            _cookbook.CookbookCollection(
+                base_dirs=COOKBOOKS_BASE_PATHS,
+                args=[],
+                spicerack=self.spicerack,
+                path_filter="root",
+                index_file=index_file,
+            )
+
+        filepath = COOKBOOKS_BASE_PATH / "cookbooks" / "root.py"
+        assert _cookbook.CookbooksIndex(index_file).get(filepath) == [
+            {"class_name": "root", "error": "Invalid cookbook"}
+        ]
+        with (
+            mock.patch("spicerack._cookbook.import_module", wraps=_cookbook.import_module) as mocked_import,
+            caplog.at_level(logging.ERROR),
+        ):
+            cookbooks = _cookbook.CookbookCollection(
+                base_dirs=COOKBOOKS_BASE_PATHS,
+                args=[],
+                spicerack=self.spicerack,
+                path_filter="root",
+                index_file=index_file,
+            )
+
+        assert cookbooks.get_item("root") is None
+        assert "Invalid cookbook" in caplog.text
+        assert mock.call("cookbooks.root") not in mocked_import.call_args_list
+
+    def test_cookbooks_index_support_files_changed(self, monkeypatch, tmp_path):
+        """A change to any support module of the cookbooks, like an __init__.py, should discard the whole index."""
+        monkeypatch.syspath_prepend(COOKBOOKS_BASE_PATH)
+        index_file = tmp_path / "index.json"
+        _cookbook.CookbookCollection(
+            base_dirs=COOKBOOKS_BASE_PATHS,
+            args=[],
+            spicerack=self.spicerack,
+            path_filter="group1",
+            index_file=index_file,
+        )
+        init_file = str((COOKBOOKS_BASE_PATH / "cookbooks" / "group1" / "__init__.py").absolute())
+        index = json.loads(index_file.read_text())
+        assert init_file in index["support_files"]
+        assert (
+            str((COOKBOOKS_BASE_PATH / "cookbooks" / "group1" / "cookbook1.py").absolute())
+            not in index["support_files"]
+        )
+        assert (
+            str((COOKBOOKS_BASE_PATH / "cookbooks" / "__do_not_add_init_py_file_here__").absolute())
+            not in index["support_files"]
+        )
+
+        index["support_files"][init_file] -= 1
+        index_file.write_text(json.dumps(index))
+        with mock.patch("spicerack._cookbook.import_module", wraps=_cookbook.import_module) as mocked_import:
+            _cookbook.CookbookCollection(
+                base_dirs=COOKBOOKS_BASE_PATHS,
+                args=[],
+                spicerack=self.spicerack,
+                path_filter="group1",
+                index_file=index_file,
+            )
+
+        mocked_import.assert_any_call("cookbooks.group1.cookbook1")
+        assert json.loads(index_file.read_text())["support_files"][init_file] == index["support_files"][init_file] + 1
+
+    def test_cookbooks_index_lazy_run(self, monkeypatch, tmp_path):
+        """A cookbook collected from the index should import its module and run when selected."""
+        monkeypatch.syspath_prepend(COOKBOOKS_BASE_PATH)
+        index_file = tmp_path / "index.json"
+        for _ in range(2):
+            cookbooks = _cookbook.CookbookCollection(
+                base_dirs=COOKBOOKS_BASE_PATHS,
+                args=[],
+                spicerack=self.spicerack,
+                path_filter="class_api.multiple.CookbookB",
+                index_file=index_file,
+            )
+
+        item = cookbooks.get_item("class_api.multiple.CookbookB")
+        assert item.instance.__class__.__module__ == "cookbooks.class_api.multiple"
+        assert item.owner_team == "team2"
+        with mock.patch("spicerack._cookbook.import_module", wraps=_cookbook.import_module) as mocked_import:
+            assert item.run() == 0
+
+        mocked_import.assert_called_once_with("cookbooks.class_api.multiple")
+
+    def test_cookbooks_index_lazy_run_missing_cookbook(self, monkeypatch, tmp_path, caplog):
+        """A cookbook collected from the index that is not anymore in its module should fail to run."""
+        monkeypatch.syspath_prepend(COOKBOOKS_BASE_PATH)
+        cookbooks = _cookbook.CookbookCollection(
+            base_dirs=COOKBOOKS_BASE_PATHS, args=[], spicerack=self.spicerack, path_filter="root"
+        )
+        entry = {
+            "class_name": "root",
+            "spicerack_path": "",
+            "spicerack_name": "missing",
+            "title": "Missing",
+            "owner_team": "unowned",
+        }
+        class_obj = cookbooks._get_lazy_cookbook_class("cookbooks.root", entry)  # pylint: disable=protected-access
+        item = _menu.CookbookItem(class_obj, [], self.spicerack)
+        assert item.title == "Missing"
+        with caplog.at_level(logging.ERROR):
+            assert item.run() == cookbook.GET_ARGS_PARSER_FAIL_RETCODE
+
+        assert "Unable to find cookbook missing in module cookbooks.root" in caplog.text
+
+    def test_cookbooks_index_outdated(self, monkeypatch, tmp_path):
+        """A module modified after being indexed should be imported again and its index entry updated."""
+        monkeypatch.syspath_prepend(COOKBOOKS_BASE_PATH)
+        index_file = tmp_path / "index.json"
+        index = _cookbook.CookbooksIndex(index_file)
+        filepath = COOKBOOKS_BASE_PATH / "cookbooks" / "root.py"
+        index.set(filepath, [])
+        index._modules[str(filepath.absolute())]["mtime"] -= 1  # pylint: disable=protected-access
+        index.save()
+
+        with mock.patch("spicerack._cookbook.import_module", wraps=_cookbook.import_module) as mocked_import:
+            cookbooks = _cookbook.CookbookCollection(
+                base_dirs=COOKBOOKS_BASE_PATHS,
+                args=[],
+                spicerack=self.spicerack,
+                path_filter="root",
+                index_file=index_file,
+            )
+
+        assert cookbooks.get_item("root") is not None
+        mocked_import.assert_any_call("cookbooks.root")
+        assert _cookbook.CookbooksIndex(index_file).get(filepath)[0]["spicerack_name"] == "root"
+
+    @pytest.mark.parametrize(
+        "content, message",
+        (
+            ("invalid", "Ignoring invalid cookbooks index"),
+            ('{"version": 0, "modules": {}}', ""),
+        ),
+    )
+    def test_cookbooks_index_invalid(self, tmp_path, caplog, content, message):
+        """An invalid index or one with a different version should be discarded."""
+        index_file = tmp_path / "index.json"
+        index_file.write_text(content)
+        with caplog.at_level(logging.WARNING):
+            index = _cookbook.CookbooksIndex(index_file)
+
+        assert index.get(COOKBOOKS_BASE_PATH / "cookbooks" / "root.py") is None
+        assert message in caplog.text
+
+    def test_cookbooks_index_save_fail(self, tmp_path, caplog):
+        """A failure to save the index should only be logged."""
+        index_dir = tmp_path / "index"
+        index_dir.write_text("not a directory")
+        index = _cookbook.CookbooksIndex(index_dir / "index.json")
+        index.set(COOKBOOKS_BASE_PATH / "cookbooks" / "root.py", [])
+        with caplog.at_level(logging.WARNING):
+            index.save()
+
+        assert "Unable to save the cookbooks index to" in caplog.text
+
+    def test_cookbooks_index_removed_files(self, tmp_path):
+        """The entries of the removed files should be dropped when saving."""
+        cookbook_file = tmp_path / "removed.py"
+        cookbook_file.write_text("")
+        index_file = tmp_path / "index.json"
+        index = _cookbook.CookbooksIndex(index_file)
+        index.set(cookbook_file, [])
+        index.save()
+        cookbook_file.unlink()
+
+        index = _cookbook.CookbooksIndex(index_file)
+        index.save()
+        assert '"modules": {}' in index_file.read_text()
+
     @pytest.mark.parametrize(
         "tty, answer, output",
         (
@@ -1,9 +1,13 @@
 """Confctl module tests."""
 
+import json
+import threading
 from unittest import mock
 
+import etcd
 import pytest
 from conftool import configuration
+from conftool.drivers import ObjectWireMetadata, ObjectWireRepresentation
 from conftool.tests.unit import MockBackend
 
 from spicerack import confctl
@@ -17,6 +21,11 @@ class TestConfctl:
         """Setup a Confctl instance with a mocked conftool backend and driver."""
         # pylint: disable=attribute-defined-outside-init
         self.conftool_backend = MockBackend({})
+        self.conftool_backend.driver.client = mock.MagicMock()
+        # The written objects as returned by etcd
+        self.conftool_backend.driver.write = mock.MagicMock(
+            return_value=ObjectWireRepresentation({"pooled": True}, ObjectWireMetadata(20))
+        )
         confctl.kvobject.Entity.backend = self.conftool_backend
         confctl.kvobject.Entity.config = configuration.Config(driver="")
         self.config = get_fixture_path("confctl", "config.yaml")
@@ -72,7 +81,7 @@ class TestConfctl:
 
     def test_update_dry_run(self):
         """Calling update() in dry_run mode should not update the objects matched by the tags."""
-        list(self.discovery_dry_run.get(dnsdisc="test"))[0].update = mock.MagicMock(side_effect=Exception("test"))
+        list(self.discovery_dry_run.get(dnsdisc="test"))[0].write = mock.MagicMock(side_effect=Exception("test"))
         self.discovery_dry_run.update({"pooled": True}, dnsdisc="test")
 
     @pytest.mark.parametrize(
@@ -84,22 +93,28 @@ class TestConfctl:
     )
     def test_update_errors(self, exc_class, message):
         """Calling update() should raise ConfctlError if there is an error in the backend."""
-        list(self.discovery.get(dnsdisc="test"))[0].update = mock.MagicMock(side_effect=exc_class("test"))
+        list(self.discovery.get(dnsdisc="test"))[0].write = mock.MagicMock(side_effect=exc_class("test"))
 
         with pytest.raises(confctl.ConfctlError, match=message):
             self.discovery.update({"pooled": True}, dnsdisc="test")
 
     def test_set_and_verify_ok(self):
-        """It should update the objects matched by the tags and check them."""
+        """It should update the objects matched by the tags and check them in the result of each write."""
         self.discovery.set_and_verify("pooled", True, dnsdisc="test")
+        self.entity.query.assert_called_once()
+        self.conftool_backend.driver.write.assert_called_once_with("discovery/test/dnsdisc", mock.ANY)
+        self.conftool_backend.driver.client.read.assert_not_called()
         assert list(self.discovery.get(dnsdisc="test"))[0].pooled
 
     def test_set_and_verify_fail(self):
         """It should raise ConfctlError if failing to check the modified objects."""
-        list(self.discovery.get(dnsdisc="test"))[0].update = mock.MagicMock()  # Don't allow to update the record
+        # The record was not updated
+        self.conftool_backend.driver.write.return_value = ObjectWireRepresentation(
+            {"pooled": False}, ObjectWireMetadata(20)
+        )
         with pytest.raises(
-            confctl.ConfctlError,
-            match="Conftool key pooled has value 'False', expecting 'True'",
+            confctl.ConfctlUpdateError,
+            match="test/dnsdisc: Conftool key pooled has value 'False', expecting 'True'",
         ):
             self.discovery.set_and_verify("pooled", True, dnsdisc="test")
 
@@ -173,11 +188,58 @@ class TestConfctl:
     )
     def test_update_objects_fail(self, generated_entities, exc_class, message):
         """An error in the backend should raise an exception."""
-        generated_entities[1].update = mock.MagicMock(side_effect=exc_class(message))
-        with pytest.raises(confctl.ConfctlError):
+        generated_entities[0].write = mock.MagicMock(side_effect=exc_class(message))
+        with pytest.raises(
+            confctl.ConfctlUpdateError, match=f"Failed to update 1 of 2 conftool objects: test/foo: {message}"
+        ):
             self.discovery.update_objects({"pooled": False}, generated_entities)
-        # Warning: the first object was updated
-        assert generated_entities[0].pooled is False
+        # All the other objects were updated anyway
+        assert generated_entities[1].pooled is False
+
+    @pytest.mark.parametrize(
+        "generated_entities",
+        [{f"foo{i}": {"pooled": True} for i in range(4)}],
+        indirect=True,
+    )
+    def test_update_objects_concurrent(self, generated_entities):
+        """The objects should be written concurrently up to max_workers."""
+        barrier = threading.Barrier(2, timeout=5)
+        for obj in generated_entities:
+            obj.write = mock.MagicMock(side_effect=barrier.wait)
+
+        self.discovery.update_objects({"pooled": False}, generated_entities, max_workers=2)  # Fails if sequential
+        for obj in generated_entities:
+            obj.write.assert_called_once_with()
+            assert obj.pooled is False
+
+    def test_update_and_write_matches_conftool_update(self):
+        """It should update and write the object exactly as conftool's Entity.update() does, returning the result."""
+        values = {"pooled": False, "ttl": 300, "not_in_schema": "value"}
+        expected = self.entity("test", "dnsdisc")
+        expected.update(values)
+        expected_write = self.conftool_backend.driver.write.call_args
+
+        obj = self.entity("test", "dnsdisc")
+        written = confctl.ConftoolEntity._update_and_write(obj, values)  # pylint: disable=protected-access
+
+        assert written is self.conftool_backend.driver.write.return_value
+        assert self.conftool_backend.driver.write.call_args == expected_write
+        assert obj._to_net() == expected._to_net()  # pylint: disable=protected-access
+
+    def test_update_and_write_fallback(self):
+        """If conftool's Entity internals are missing it should fall back to update() and read the written object."""
+        obj = mock.MagicMock(spec=["update", "backend", "key"])
+        written = confctl.ConftoolEntity._update_and_write(obj, {"pooled": False})  # pylint: disable=protected-access
+
+        obj.update.assert_called_once_with({"pooled": False})
+        obj.backend.driver.read.assert_called_once_with(obj.key)
+        assert written is obj.backend.driver.read.return_value
+
+    def test_update_objects_verify_no_result(self):
+        """It should raise ConfctlUpdateError if the etcd write doesn't return the written object."""
+        self.conftool_backend.driver.write.return_value = None
+        with pytest.raises(confctl.ConfctlUpdateError, match="No result from etcd for the write of discovery/test/"):
+            self.discovery.set_and_verify("pooled", True, dnsdisc="test")
 
     @pytest.mark.parametrize(
         "generated_entities",
@@ -203,3 +265,201 @@ class TestConfctl:
             assert pooled[0].name == "foo"
             assert pooled[0].pooled is False
         assert pooled[0].pooled is True
+
+    @pytest.mark.parametrize(
+        "generated_entities",
+        [{"foo": {"pooled": True}, "bar": {"pooled": True}}],
+        indirect=True,
+    )
+    def test_change_and_revert_fail(self, generated_entities):
+        """It should revert the objects that were changed if others failed, without executing the block."""
+        self.entity.query.return_value = generated_entities
+        generated_entities[0].write = mock.MagicMock(side_effect=confctl.BackendError("failed"))
+        with pytest.raises(confctl.ConfctlUpdateError, match="Failed to update 1 of 2 conftool objects"):
+            with self.discovery.change_and_revert("pooled", True, False, name="foo|bar"):
+                raise AssertionError("should not be executed")
+
+        generated_entities[0].write.assert_called_once_with()
+        assert generated_entities[1].pooled is True
+
+
+def _etcd_node(dnsdisc, *, value=None, index=10, action="get", is_dir=False):
+    """Return a mocked etcd result node for the discovery object with the given tag."""
+    return mock.MagicMock(
+        key="/base_path/v2/discovery" + (f"/{dnsdisc}/dnsdisc" if dnsdisc else ""),
+        value=json.dumps(value) if value is not None else None,
+        modifiedIndex=index,
+        action=action,
+        dir=is_dir,
+    )
+
+
+class TestEntitySnapshot:
+    """Test class for the cached ConftoolEntity and the EntitySnapshot class."""
+
+    def setup_method(self):
+        """Setup a cached ConftoolEntity with a mocked conftool backend and etcd client."""
+        # pylint: disable=attribute-defined-outside-init
+        self.conftool_backend = MockBackend({})
+        self.conftool_backend.driver.client = mock.MagicMock()
+        self.client = self.conftool_backend.driver.client
+        confctl.kvobject.Entity.backend = self.conftool_backend
+        confctl.kvobject.Entity.config = configuration.Config(driver="")
+        with mock.patch("spicerack.confctl.kvobject.Entity.setup"):
+            self.confctl = confctl.Confctl(
+                config=get_fixture_path("confctl", "config.yaml"),
+                schema=get_fixture_path("confctl", "schema.yaml"),
+                dry_run=False,
+            )
+            self.discovery = self.confctl.entity("discovery", cache=True)
+
+        self.entity = self.discovery._entity  # pylint: disable=protected-access
+        self.entity.query = mock.MagicMock(side_effect=AssertionError("should not be called"))
+        self.snapshot = self.discovery._snapshot  # pylint: disable=protected-access
+        self.tree = mock.MagicMock(
+            etcd_index=20,
+            leaves=[
+                _etcd_node("", is_dir=True),
+                _etcd_node("test1", value={"pooled": True, "ttl": 300}, index=11),
+                _etcd_node("test2", value={"pooled": False, "ttl": 300}, index=12),
+            ],
+        )
+        self.client.read.return_value = self.tree
+
+    @mock.patch("spicerack.confctl.EntitySnapshot._watch")
+    def test_get(self, mocked_watch):
+        """It should load the whole tree once and answer all the selections from memory."""
+        assert [obj.tags["dnsdisc"] for obj in self.discovery.get(dnsdisc="test.*")] == ["test1", "test2"]
+        assert [obj.pooled for obj in self.discovery.filter_objects({"pooled": True}, dnsdisc="test.*")] == [True]
+        with pytest.raises(confctl.ConfctlError, match="No match found"):
+            list(self.discovery.get(dnsdisc="test"))
+
+        self.client.read.assert_called_once_with("/base_path/v2/discovery", recursive=True)
+        self.snapshot._watcher.join()  # pylint: disable=protected-access
+        mocked_watch.assert_called_once_with()
+
+    @mock.patch("spicerack.confctl.EntitySnapshot._watch")
+    def test_get_invalid_tag(self, _mocked_watch):
+        """It should raise ValueError if the selection has non-existent tags, like Conftool."""
+        with pytest.raises(ValueError, match="The query includes non-existent tags: invalid"):
+            list(self.discovery.get(invalid="test"))
+
+    @mock.patch("spicerack.confctl.EntitySnapshot._watch")
+    def test_load_error(self, _mocked_watch):
+        """It should raise ConfctlError if unable to read the tree from etcd."""
+        self.client.read.side_effect = etcd.EtcdConnectionFailed("failed")
+        with pytest.raises(confctl.ConfctlError, match="Error reading /base_path/v2/discovery from etcd"):
+            list(self.discovery.get(dnsdisc="test1"))
+
+    @mock.patch("spicerack.confctl.EntitySnapshot._watch")
+    def test_load_empty(self, _mocked_watch):
+        """It should not match anything if the tree doesn't exist."""
+        self.client.read.side_effect = etcd.EtcdKeyNotFound("missing")
+        with pytest.raises(confctl.ConfctlError, match="No match found"):
+            list(self.discovery.get(dnsdisc="test1"))
+
+    @mock.patch("spicerack.confctl.EntitySnapshot._watch")
+    def test_read_your_writes(self, _mocked_watch):
+        """The updated objects should be visible immediately and not reverted by older changes from the watch."""
+        self.client.read.return_value = self.tree
+        self.conftool_backend.driver.write = mock.MagicMock(
+            return_value=ObjectWireRepresentation({"pooled": True, "ttl": 300}, ObjectWireMetadata(30))
+        )
+        self.discovery.set_and_verify("pooled", True, dnsdisc="test2")
+        # An older change from another client arriving from the watch after the write
+        self.snapshot._apply(  # pylint: disable=protected-access
+            _etcd_node("test2", value={"pooled": False, "ttl": 300}, index=25, action="set")
+        )
+        assert next(self.discovery.get(dnsdisc="test2")).pooled is True
+        self.client.read.assert_called_once()
+
+    def test_watch(self):
+        """The watch should apply the changes until it fails, then the snapshot should be reloaded."""
+        new_tree = mock.MagicMock(
+            etcd_index=40, leaves=[_etcd_node("test1", value={"pooled": False, "ttl": 300}, index=35)]
+        )
+        self.client.read.side_effect = [
+            self.tree,
+            _etcd_node("test1", value={"pooled": False, "ttl": 10}, index=21, action="set"),
+            etcd.EtcdWatchTimedOut("timeout"),
+            _etcd_node("test3", value={"pooled": True, "ttl": 300}, index=22, action="create"),
+            _etcd_node("test2", index=23, action="delete"),
+            _etcd_node("test1", value={"pooled": True, "ttl": 300}, index=11, action="set"),  # Old, discarded
+            etcd.EtcdEventIndexCleared("cleared"),
+            new_tree,
+            etcd.EtcdException("failed"),
+        ]
+        with mock.patch("spicerack.confctl.EntitySnapshot._watch"):
+            list(self.discovery.get(dnsdisc="test1"))
+
+        self.snapshot._watcher.join()  # pylint: disable=protected-access
+        self.snapshot._watch()  # pylint: disable=protected-access
+        assert self.client.read.call_args_list[1] == mock.call(
+            "/base_path/v2/discovery", recursive=True, wait=True, waitIndex=21, timeout=confctl.SNAPSHOT_WATCH_TIMEOUT
+        )
+        assert self.client.read.call_args_list[6].kwargs["waitIndex"] == 24
+        assert not self.snapshot._loaded  # pylint: disable=protected-access
+
+        with mock.patch("spicerack.confctl.EntitySnapshot._watch") as mocked_watch:
+            assert [obj.tags["dnsdisc"] for obj in self.discovery.get(dnsdisc="test.*")] == ["test1"]
+
+        self.snapshot._watcher.join()  # pylint: disable=protected-access
+        mocked_watch.assert_called_once_with()
+
+    def test_watch_applied(self):
+        """The watch should update, add and remove the objects in the snapshot."""
+        self.client.read.side_effect = [
+            self.tree,
+            _etcd_node("test1", value={"pooled": False, "ttl": 10}, index=21, action="set"),
+            _etcd_node("test3", value={"pooled": True, "ttl": 300}, index=22, action="create"),
+            _etcd_node("test2", index=23, action="delete"),
+            _etcd_node("invalid/nested", value={"pooled": True}, index=24, action="set"),
+            etcd.EtcdException("failed"),
+        ]
+        with mock.patch("spicerack.confctl.EntitySnapshot._watch"):
+            list(self.discovery.get(dnsdisc="test1"))
+
+        self.snapshot._watch()  # pylint: disable=protected-access
+        self.snapshot._loaded = True  # pylint: disable=protected-access
+        objects = {obj.tags["dnsdisc"]: (obj.pooled, obj.ttl) for obj in self.discovery.get(dnsdisc="test.*")}
+
+        assert objects == {"test1": (False, 10), "test3": (True, 300)}
+
+    def test_watch_closed(self):
+        """The watch should not start or should stop once the entity is closed."""
+        self.discovery.close()
+        with mock.patch("spicerack.confctl.EntitySnapshot._watch") as mocked_watch:
+            list(self.discovery.get(dnsdisc="test1"))
+
+        self.snapshot._watch()  # pylint: disable=protected-access
+
+        assert self.snapshot._watcher is None  # pylint: disable=protected-access
+        mocked_watch.assert_not_called()
+        self.client.read.assert_called_once()
+
+    def test_context_manager(self):
+        """Using the entity as a context manager should stop the watch on exit."""
+        with mock.patch("spicerack.confctl.EntitySnapshot._watch"):
+            with self.discovery as discovery:
+                assert discovery is self.discovery
+                list(discovery.get(dnsdisc="test1"))
+
+        self.snapshot._watcher.join()  # pylint: disable=protected-access
+        self.snapshot._watch()  # pylint: disable=protected-access
+        self.client.read.assert_called_once()
+
+    @mock.patch("spicerack.confctl.EntitySnapshot._watch")
+    def test_get_copies(self, _mocked_watch):
+        """The selected objects should be copies, modifying them should not affect the snapshot."""
+        obj = next(self.discovery.get(dnsdisc="test1"))
+        obj.pooled = False
+        assert next(self.discovery.get(dnsdisc="test1")).pooled is True
+        assert next(self.discovery.get(dnsdisc="test1")) is not next(self.discovery.get(dnsdisc="test1"))
+
+    @mock.patch("spicerack.confctl.EntitySnapshot._watch")
+    def test_updated_error(self, _mocked_watch):
+        """It should raise ConfctlError if the etcd write doesn't return the updated object."""
+        self.client.read.return_value = self.tree
+        self.conftool_backend.driver.write = mock.MagicMock(return_value=None)
+        with pytest.raises(confctl.ConfctlError, match="No result from etcd for the write of discovery/test1/dnsdisc"):
+            self.discovery.update({"pooled": False}, dnsdisc="test1")
@@ -64,8 +64,9 @@ def get_mocked_dns_query_message(fail: bool) -> dns.message.Message:
 class MockedQuery:
     """Class to mock a return object from a call to dns.resolver.query()."""
 
-    def __init__(self, record):
+    def __init__(self, record, lifetime=None):
         """Initialize it with the query."""
+        self.lifetime = lifetime
         if record == "fail.svc.eqiad.wmnet":
             self.address = "10.1.1.1"
             self.ttl = 600
@@ -100,6 +101,14 @@ class MockDnsResult:
         self.minimum_ttl = 10
 
 
+def udp_failing_on(query: dns.message.Message, record: str) -> tuple[dns.message.Message, bool]:
+    """Side effect for udp_with_fallback() mocks that fails all the queries for the given record."""
+    if str(query.question[0].name).startswith(f"{record}."):
+        raise ValueError("timeout")
+
+    return get_mocked_dns_query_message(fail=False), False
+
+
 class TestDiscovery:
     """Discovery class tests."""
 
@@ -195,6 +204,33 @@ class TestDiscovery:
             for _ in self.discovery.resolve(name="raise"):
                 pass
 
+    def test_resolve_all(self):
+        """Calling resolve_all() should return the answers of all the records grouped by nameserver."""
+        answers = self.discovery.resolve_all(timeout=5.0)
+        assert list(answers.keys()) == list(self.authdns_servers.keys())
+        for nameserver_answers in answers.values():
+            assert list(nameserver_answers.keys()) == self.records
+            for answer in nameserver_answers.values():
+                assert answer[0].address == "10.0.0.1"
+                assert answer.lifetime == pytest.approx(5.0)
+
+    def test_resolve_all_default_timeout(self):
+        """Calling resolve_all() without a timeout should use the default lifetime of the resolvers."""
+        for nameserver_answers in self.discovery.resolve_all().values():
+            for answer in nameserver_answers.values():
+                assert answer.lifetime is None
+
+    def test_resolve_all_failures(self):
+        """Calling resolve_all() should perform all the queries and report all the failed ones."""
+        with pytest.raises(
+            DiscoveryError,
+            match=(
+                r"Failed 2 of 4 DNS queries: Unable to resolve raise.discovery.wmnet from authdns1001.example.org; "
+                r"Unable to resolve raise.discovery.wmnet from authdns2001.example.org"
+            ),
+        ):
+            self.discovery.resolve_all(["record1", "raise"])
+
     @pytest.mark.parametrize("func, value", (("pool", True), ("depool", False)))
     def test_pool(self, func, value):
         """Calling pool() should update the pooled value of the conftool objects to True."""
@@ -296,3 +332,54 @@ class TestDiscovery:
             mock_query.return_value = (get_mocked_dns_query_message(fail=True), False)
             with pytest.raises(DiscoveryError, match="Unable to resolve record1.discovery.wmnet"):
                 self.discovery_single.resolve_with_client_ip("record1", ip_address("10.24.1.0"))
+
+    def test_resolve_with_client_ips(self):
+        """It should resolve all the records with all the client IPs on all the nameservers."""
+        client_ips = {"dcA": ip_address("10.24.1.0"), "dcB": ip_address("10.48.1.0")}
+        with mock.patch("dns.query.udp_with_fallback") as mock_query:
+            mock_query.return_value = (get_mocked_dns_query_message(fail=False), False)
+            matrix = self.discovery.resolve_with_client_ips(
+                {"record1": client_ips, "record2": {"dcA": client_ips["dcA"]}}
+            )
+
+        expected_ips = {name: ip_address("10.10.10.10") for name in self.authdns_servers}
+        assert matrix == {
+            "record1": {"dcA": expected_ips, "dcB": expected_ips},
+            "record2": {"dcA": expected_ips},
+        }
+        assert mock_query.call_count == 6
+        assert all(call.kwargs["timeout"] == pytest.approx(2.0) for call in mock_query.call_args_list)
+
+    def test_resolve_with_client_ips_failures(self):
+        """It should raise reporting all the failed queries after all of them have completed."""
+        client_ips = {"dcA": ip_address("10.24.1.0")}
+        with mock.patch("dns.query.udp_with_fallback") as mock_query:
+            mock_query.side_effect = lambda query, *_, **__: udp_failing_on(query, "record2")
+            with pytest.raises(DiscoveryError, match="Failed 2 of 4 DNS queries"):
+                self.discovery.resolve_with_client_ips({"record1": client_ips, "record2": client_ips})
+
+    def test_resolve_with_client_ips_collect_failures(self):
+        """If failures is set it should collect the failures per record and return only the resolved records."""
+        client_ips = {"dcA": ip_address("10.24.1.0")}
+        failures: dict[str, list[str]] = {}
+        with mock.patch("dns.query.udp_with_fallback") as mock_query:
+            mock_query.side_effect = lambda query, *_, **__: udp_failing_on(query, "record2")
+            matrix = self.discovery.resolve_with_client_ips(
+                {"record1": client_ips, "record2": client_ips}, failures=failures
+            )
+
+        expected_ips = {name: ip_address("10.10.10.10") for name in self.authdns_servers}
+        assert matrix == {"record1": {"dcA": expected_ips}}
+        assert failures == {
+            "record2": [f"Unable to resolve record2.discovery.wmnet from {name}" for name in self.authdns_servers]
+        }
+
+    def test_resolve_with_client_ips_bad_record(self):
+        """Requesting records that are not present will raise a DiscoveryError without making any query."""
+        with mock.patch("dns.query.udp_with_fallback") as mock_query:
+            with pytest.raises(DiscoveryError, match="Records 'nope', 'other' not found"):
+                self.discovery.resolve_with_client_ips(
+                    {"record1": {"dcA": ip_address("10.24.1.0")}, "nope": {}, "other": {}}
+                )
+
+        assert not mock_query.called
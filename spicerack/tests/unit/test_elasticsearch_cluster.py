@@ -2,6 +2,7 @@
 
 import itertools
 import logging
+import threading
 from datetime import UTC, datetime, timedelta
 from unittest import mock
 
@@ -257,118 +258,188 @@ class TestElasticsearchClusters:
             ),
         ]
 
+    @staticmethod
+    def _mock_shards_api(cluster, shards, allocation, reroute_side_effect=None):
+        """Mock the cluster API calls used to plan and force the allocation of the unassigned shards."""
+        reroute = mock.Mock(side_effect=reroute_side_effect)
+
+        def make_api_call(route, params, http_method, body, timeout):  # pylint: disable=unused-argument
+            if route == "/_cat/shards":
+                return shards
+            if route == "/_cat/allocation":
+                return allocation
+            return reroute(route=route, params=params, http_method=http_method, body=body, timeout=timeout)
+
+        cluster.make_api_call = mock.Mock(side_effect=make_api_call)
+        return reroute
+
     def test_when_all_shards_are_assigned_no_allocation_is_performed(self):
         """Test that shard allocation is not performed when all shards have been assigned on all clusters."""
-        self.cluster1.get_nodes = mock.Mock(return_value={"ELASTIC1": {"name": "el1-alpha"}})
-        self.cluster2.get_nodes = mock.Mock(return_value={"ELASTIC7": {"name": "el1-beta"}})
-        self.cluster1._get_unassigned_shards = mock.Mock(return_value=[])  # pylint: disable=protected-access
-        self.cluster2._get_unassigned_shards = mock.Mock(return_value=[])  # pylint: disable=protected-access
+        shards = [{"index": "index1", "shard": "0", "prirep": "r", "state": "STARTED", "node": "el1"}]
+        allocation = [{"node": "el1", "shards": "1", "disk.percent": "10"}]
+        reroute1 = self._mock_shards_api(self.cluster1, shards, allocation)
+        reroute2 = self._mock_shards_api(self.cluster2, [], allocation)
         elasticsearch_clusters = self.default_elasticsearch_clusters()
         elasticsearch_clusters.force_allocation_of_all_unassigned_shards()
-        self.cluster1.make_api_call.assert_not_called()
-        self.cluster2.make_api_call.assert_not_called()
+        reroute1.assert_not_called()
+        reroute2.assert_not_called()
 
     def test_force_allocation_of_all_unassigned_shards(self):
-        """Test that elasticsearch performs cluster reroute with with unassigned shards on all clusters."""
-        self.cluster1.get_nodes = mock.Mock(return_value={"ELASTIC1": {"name": "el1-alpha"}})
-        self.cluster2.get_nodes = mock.Mock(return_value={"ELASTIC7": {"name": "el1-beta"}})
-        self.cluster1._get_unassigned_shards = mock.Mock(  # pylint: disable=protected-access
-            return_value=[
-                {"index": "index1", "shard": 2, "state": "UNASSIGNED"},
-            ]
+        """Test that elasticsearch performs a single cluster reroute with all the planned shards on all clusters."""
+        self._mock_shards_api(
+            self.cluster1,
+            [
+                {"index": "index1", "shard": "2", "prirep": "p", "state": "STARTED", "node": "el1-alpha"},
+                {"index": "index1", "shard": "2", "prirep": "r", "state": "UNASSIGNED", "node": None},
+                {"index": "index2", "shard": "0", "prirep": "r", "state": "UNASSIGNED", "node": None},
+            ],
+            [
+                {"node": "el1-alpha", "shards": "10", "disk.percent": "50"},
+                {"node": "el2-alpha", "shards": "10", "disk.percent": "40"},
+                {"node": "UNASSIGNED", "shards": "2", "disk.percent": None},
+            ],
         )
-        self.cluster2._get_unassigned_shards = mock.Mock(  # pylint: disable=protected-access
-            return_value=[
-                {"index": "index4", "shard": 7, "state": "UNASSIGNED"},
-            ]
+        reroute2 = self._mock_shards_api(
+            self.cluster2,
+            [{"index": "index4", "shard": "7", "prirep": "r", "state": "UNASSIGNED", "node": None}],
+            [{"node": "el1-beta", "shards": "3", "disk.percent": "20"}],
         )
         elasticsearch_clusters = self.default_elasticsearch_clusters()
         elasticsearch_clusters.force_allocation_of_all_unassigned_shards()
-        self.cluster1.make_api_call.assert_called_once_with(
+        assert self.cluster1.make_api_call.call_count == 3  # shards, allocation, a single reroute
+        self.cluster1.make_api_call.assert_called_with(
             route="/_cluster/reroute",
             params={"retry_failed": True},
             http_method="POST",
-            body={"commands": {"allocate_replica": {"index": "index1", "shard": 2, "node": "el1-alpha"}}},
+            body={
+                "commands": [
+                    {"allocate_replica": {"index": "index1", "shard": "2", "node": "el2-alpha"}},
+                    {"allocate_replica": {"index": "index2", "shard": "0", "node": "el1-alpha"}},
+                ]
+            },
             timeout=30,
         )
-        self.cluster2.make_api_call.assert_called_once_with(
+        reroute2.assert_called_once_with(
             route="/_cluster/reroute",
             params={"retry_failed": True},
             http_method="POST",
-            body={"commands": {"allocate_replica": {"index": "index4", "shard": 7, "node": "el1-beta"}}},
+            body={"commands": [{"allocate_replica": {"index": "index4", "shard": "7", "node": "el1-beta"}}]},
             timeout=30,
         )
 
-    def test_force_allocation_of_shards_with_failed_node(self, caplog):
-        """Test that shard allocation command was called twice after it fails on the first node."""
+    @mock.patch("spicerack.elasticsearch_cluster.REROUTE_BATCH_SIZE", 2)
+    def test_force_allocation_of_all_unassigned_shards_batches(self):
+        """Test that the planned commands are split in batches of at most REROUTE_BATCH_SIZE commands."""
+        shards = [
+            {"index": f"index{i}", "shard": "0", "prirep": "r", "state": "UNASSIGNED", "node": None} for i in range(5)
+        ]
+        allocation = [
+            {"node": "el1", "shards": "0", "disk.percent": "10"},
+            {"node": "el2", "shards": "0", "disk.percent": "10"},
+        ]
+        reroute = self._mock_shards_api(self.cluster1, shards, allocation)
+        self.cluster1.force_allocation_of_all_unassigned_shards()
+        assert [len(call.kwargs["body"]["commands"]) for call in reroute.call_args_list] == [2, 2, 1]
+        nodes = [
+            command["allocate_replica"]["node"]
+            for call in reroute.call_args_list
+            for command in call.kwargs["body"]["commands"]
+        ]
+        assert nodes == ["el1", "el2", "el1", "el2", "el1"]
+
+    def test_plan_allocation_of_unassigned_shards(self, caplog):
+        """It should skip primaries, nodes above the disk watermark and nodes that already hold a copy."""
         caplog.set_level(logging.WARNING)
-        self.cluster1.get_nodes = mock.Mock(
-            return_value={
-                "ELASTIC1": {"name": "el1-alpha"},
-                "ELASTIC3": {"name": "el2-alpha"},
-            }
-        )
-        self.cluster2.get_nodes = mock.Mock(
-            return_value={
-                "ELASTIC7": {"name": "el1-beta"},
-                "ELASTIC4": {"name": "el2-beta"},
-            }
-        )
-        self.cluster1._get_unassigned_shards = mock.Mock(  # pylint: disable=protected-access
-            return_value=[
-                {"index": "index1", "shard": 2, "state": "UNASSIGNED"},
-            ]
+        self._mock_shards_api(
+            self.cluster1,
+            [
+                {"index": "index1", "shard": "0", "prirep": "p", "state": "STARTED", "node": "el1"},
+                {"index": "index1", "shard": "0", "prirep": "r", "state": "UNASSIGNED", "node": None},
+                {"index": "index1", "shard": "0", "prirep": "r", "state": "UNASSIGNED", "node": None},
+                {"index": "index2", "shard": "0", "prirep": "p", "state": "UNASSIGNED", "node": None},
+            ],
+            [
+                {"node": "el1", "shards": "0", "disk.percent": "10"},
+                {"node": "el2", "shards": "5", "disk.percent": "20"},
+                {"node": "el3", "shards": "0", "disk.percent": "90"},
+            ],
         )
-        self.cluster2._get_unassigned_shards = mock.Mock(  # pylint: disable=protected-access
-            return_value=[
-                {"index": "index4", "shard": 7, "state": "UNASSIGNED"},
-            ]
+        assert self.cluster1.plan_allocation_of_unassigned_shards() == [
+            {"allocate_replica": {"index": "index1", "shard": "0", "node": "el2"}},
+        ]
+        assert caplog.record_tuples == [
+            (
+                "spicerack.elasticsearch_cluster",
+                logging.WARNING,
+                "Could not find any node to allocate shard [index1:0] on endpoint:9201",
+            ),
+            (
+                "spicerack.elasticsearch_cluster",
+                logging.WARNING,
+                "Unassigned primary shard [index2:0] can't be allocated",
+            ),
+        ]
+
+    def test_force_allocation_of_all_unassigned_shards_dry_run(self, caplog):
+        """In DRY-RUN mode it should only log the plan."""
+        caplog.set_level(logging.INFO)
+        cluster = ec.ElasticsearchCluster("endpoint:9203", None, dry_run=True)
+        reroute = self._mock_shards_api(
+            cluster,
+            [{"index": "index1", "shard": "0", "prirep": "r", "state": "UNASSIGNED", "node": None}],
+            [{"node": "el1", "shards": "0", "disk.percent": "10"}],
         )
-        self.cluster1.make_api_call = mock.Mock(side_effect=APIClientError("test"))
-        self.cluster2.make_api_call = mock.Mock(side_effect=APIClientError("test"))
-        elasticsearch_clusters = self.default_elasticsearch_clusters()
-        elasticsearch_clusters.force_allocation_of_all_unassigned_shards()
-        self.cluster1.make_api_call.assert_has_calls(
-            calls=[
-                mock.call(
-                    route="/_cluster/reroute",
-                    params={"retry_failed": True},
-                    http_method="POST",
-                    body={"commands": {"allocate_replica": {"index": "index1", "shard": 2, "node": "el1-alpha"}}},
-                    timeout=30,
-                ),
-                mock.call(
-                    route="/_cluster/reroute",
-                    params={"retry_failed": True},
-                    http_method="POST",
-                    body={"commands": {"allocate_replica": {"index": "index1", "shard": 2, "node": "el2-alpha"}}},
-                    timeout=30,
-                ),
+        cluster.force_allocation_of_all_unassigned_shards()
+        reroute.assert_not_called()
+        assert "Would allocate 1 unassigned shards on endpoint:9203" in caplog.text
+
+    def test_force_allocation_of_shards_with_failed_batch(self, caplog):
+        """Test that when a batch is rejected its shards are allocated one at a time trying all the nodes."""
+        caplog.set_level(logging.WARNING)
+        reroute = self._mock_shards_api(
+            self.cluster1,
+            [{"index": "index1", "shard": "2", "prirep": "r", "state": "UNASSIGNED", "node": None}],
+            [
+                {"node": "el1-alpha", "shards": "1", "disk.percent": "10"},
+                {"node": "el2-alpha", "shards": "2", "disk.percent": "10"},
             ],
-            any_order=True,  # we shuffle the nodes
+            reroute_side_effect=APIClientError("test"),
         )
-        self.cluster2.make_api_call.assert_has_calls(
+        self.cluster1.force_allocation_of_all_unassigned_shards()
+        assert reroute.call_args_list[0] == mock.call(
+            route="/_cluster/reroute",
+            params={"retry_failed": True},
+            http_method="POST",
+            body={"commands": [{"allocate_replica": {"index": "index1", "shard": "2", "node": "el1-alpha"}}]},
+            timeout=30,
+        )
+        reroute.assert_has_calls(
             calls=[
                 mock.call(
                     route="/_cluster/reroute",
                     params={"retry_failed": True},
                     http_method="POST",
-                    body={"commands": {"allocate_replica": {"index": "index4", "shard": 7, "node": "el1-beta"}}},
+                    body={"commands": {"allocate_replica": {"index": "index1", "shard": "2", "node": "el1-alpha"}}},
                     timeout=30,
                 ),
                 mock.call(
                     route="/_cluster/reroute",
                     params={"retry_failed": True},
                     http_method="POST",
-                    body={"commands": {"allocate_replica": {"index": "index4", "shard": 7, "node": "el2-beta"}}},
+                    body={"commands": {"allocate_replica": {"index": "index1", "shard": "2", "node": "el2-alpha"}}},
                     timeout=30,
                 ),
             ],
             any_order=True,  # we shuffle the nodes
         )
+        assert reroute.call_count == 3
         assert caplog.record_tuples == [
+            (
+                "spicerack.elasticsearch_cluster",
+                logging.WARNING,
+                "Could not allocate a batch of 1 shards on endpoint:9201, falling back to one shard at a time: test",
+            ),
             ("spicerack.elasticsearch_cluster", logging.WARNING, "Could not reallocate shard [index1:2] on any node"),
-            ("spicerack.elasticsearch_cluster", logging.WARNING, "Could not reallocate shard [index4:7] on any node"),
         ]
 
     def test_stopped_replication(self):
@@ -629,12 +700,11 @@ class TestElasticsearchClusters:
         self.cluster1.make_api_call = mock.Mock(side_effect=[APIClientError("test"), None])
         self.cluster2.make_api_call = mock.Mock(side_effect=[APIClientError("test"), None])
         elasticsearch_clusters = self.default_elasticsearch_clusters()
-        with pytest.raises(ec.ElasticsearchClusterCheckError):
-            elasticsearch_clusters.wait_for_green(timedelta(seconds=20))
+        elasticsearch_clusters.wait_for_green(timedelta(seconds=20))
 
         mocked_sleep.assert_called_once_with(10.0)
         assert self.cluster1.make_api_call.call_count == 2  # fail, ok
-        assert self.cluster2.make_api_call.call_count == 1  # not called, ok
+        assert self.cluster2.make_api_call.call_count == 2  # fail, ok
 
     def test_wait_for_yellow_w_no_moving_shards_on_all_clusters_elastisearch_call(self):
         """Makes sure the call to elasticsearch.cluster.health is placed for each cluster."""
@@ -671,12 +741,92 @@ class TestElasticsearchClusters:
         self.cluster1.make_api_call = mock.Mock(side_effect=[APIClientError("test"), None])
         self.cluster2.make_api_call = mock.Mock(side_effect=[APIClientError("test"), None])
         elasticsearch_clusters = self.default_elasticsearch_clusters()
-        with pytest.raises(ec.ElasticsearchClusterCheckError):
-            elasticsearch_clusters.wait_for_yellow_w_no_moving_shards(timedelta(seconds=20))
-            assert mocked_sleep.called
+        elasticsearch_clusters.wait_for_yellow_w_no_moving_shards(timedelta(seconds=20))
 
+        mocked_sleep.assert_called_once_with(10.0)
         assert self.cluster1.make_api_call.call_count == 2  # fail, ok
-        assert self.cluster2.make_api_call.call_count == 1  # not called, ok
+        assert self.cluster2.make_api_call.call_count == 2  # fail, ok
+
+    @mock.patch("wmflib.decorators.time.sleep", return_value=None)
+    def test_wait_for_green_fail_aggregates_errors(self, mocked_sleep):
+        """It should retry and then raise a single check error reporting all the failed clusters."""
+        self.cluster1.make_api_call = mock.Mock(side_effect=APIClientError("test"))
+        self.cluster2.make_api_call = mock.Mock(side_effect=APIClientError("test"))
+        elasticsearch_clusters = self.default_elasticsearch_clusters()
+        with pytest.raises(
+            ec.ElasticsearchClusterCheckError,
+            match="Failed on 2 clusters: endpoint:9201: Error while waiting for green; endpoint:9202:",
+        ):
+            elasticsearch_clusters.wait_for_green(timedelta(seconds=20))
+
+        mocked_sleep.assert_called_once_with(10.0)
+        assert self.cluster1.make_api_call.call_count == 2
+        assert self.cluster2.make_api_call.call_count == 2
+
+    def test_wait_for_green_single_failure_is_raised_as_is(self):
+        """It should re-raise the original exception if only one cluster failed."""
+        self.cluster2.make_api_call = mock.Mock(side_effect=APIClientError("test"))
+        elasticsearch_clusters = self.default_elasticsearch_clusters()
+        with pytest.raises(ec.ElasticsearchClusterCheckError, match="^Error while waiting for green$"):
+            elasticsearch_clusters.wait_for_green(timedelta(seconds=5))
+
+        self.cluster1.make_api_call.assert_called_once()
+
+    def test_wait_for_green_timeout(self):
+        """It should not wait for a cluster that doesn't reply within the timeout, nor block the exit on its call."""
+        event = threading.Event()
+        self.cluster1.make_api_call = mock.Mock(side_effect=lambda **_: event.wait(5))
+        elasticsearch_clusters = self.default_elasticsearch_clusters()
+        try:
+            with mock.patch("spicerack.elasticsearch_cluster.CLUSTER_CHECK_TIMEOUT", timedelta(seconds=0.1)):
+                with pytest.raises(
+                    ec.ElasticsearchClusterCheckError, match="Timed out after 0:00:00.100000 waiting for endpoint:9201"
+                ):
+                    elasticsearch_clusters.wait_for_green(timedelta(seconds=5))
+
+            stuck = [thread for thread in threading.enumerate() if thread.name == "elasticsearch-0"]
+            assert stuck
+            assert all(thread.daemon for thread in stuck)  # Doesn't prevent the process from exiting
+        finally:
+            event.set()
+
+        self.cluster2.make_api_call.assert_called_once()
+
+    @mock.patch("wmflib.decorators.time.sleep", return_value=None)
+    def test_wait_for_green_timeout_retry(self, mocked_sleep):
+        """It should not call again a cluster while its previous timed out call is still running."""
+        event = threading.Event()
+        self.cluster1.make_api_call = mock.Mock(side_effect=lambda **_: event.wait(5))
+        self.cluster2.make_api_call = mock.Mock(side_effect=APIClientError("test"))
+        elasticsearch_clusters = self.default_elasticsearch_clusters()
+        try:
+            with mock.patch("spicerack.elasticsearch_cluster.CLUSTER_CHECK_TIMEOUT", timedelta(seconds=0.1)):
+                with pytest.raises(
+                    ec.ElasticsearchClusterCheckError,
+                    match="A previous timed out call is still running on endpoint:9201",
+                ):
+                    elasticsearch_clusters.wait_for_green(timedelta(seconds=30))
+        finally:
+            event.set()
+
+        assert mocked_sleep.call_count == 2
+        self.cluster1.make_api_call.assert_called_once()
+        assert self.cluster2.make_api_call.call_count == 3
+
+        elasticsearch_clusters._pending[0].result()  # pylint: disable=protected-access
+        self.cluster2.make_api_call = mock.Mock()
+        elasticsearch_clusters.wait_for_green(timedelta(seconds=5))
+        assert self.cluster1.make_api_call.call_count == 2
+
+    def test_mixed_failures_are_aggregated_as_cluster_error(self):
+        """It should raise an ElasticsearchClusterError if not all the failures are check errors."""
+        self.cluster1.make_api_call = mock.Mock(side_effect=APIClientError("test"))
+        self.cluster2.make_api_call = mock.Mock(side_effect=ValueError("unexpected"))
+        elasticsearch_clusters = self.default_elasticsearch_clusters()
+        with pytest.raises(ec.ElasticsearchClusterError, match="Failed on 2 clusters") as exc_info:
+            elasticsearch_clusters.wait_for_green(timedelta(seconds=5))
+
+        assert not isinstance(exc_info.value, ec.ElasticsearchClusterCheckError)
 
     def test_reset_read_only_is_sent_to_all_clusters(self):
         """Reset read only status should be sent to all clusters."""
@@ -1,8 +1,10 @@
 """Icinga module tests."""
 
+import json
 import logging
 import re
 import shlex
+import subprocess
 from collections.abc import Sequence
 from datetime import timedelta
 from unittest import mock
@@ -30,13 +32,19 @@ def set_mocked_icinga_host_outputs(mocked_icinga_host, outputs):
     mocked_icinga_host.run_sync.side_effect = [iter([(nodeset("icinga-host"), out)]) for out in outs]
 
 
+def get_command_file_write(*lines: str) -> str:
+    """Return the expected command to write the given lines into the Icinga command file."""
+    printfs = "".join(f'printf "%s\\n" {shlex.quote(line)}; ' for line in lines)
+    return "bash -c " + shlex.quote(f"{{ {printfs}}} > /var/lib/icinga/rw/icinga.cmd")
+
+
 def get_default_downtime_outputs():
     """Return the outputs suitable for set_mocked_icinga_host_outputs()."""
     with open(get_fixture_path("icinga", "status_valid.json")) as f:
         before = f.read()
     with open(get_fixture_path("icinga", "status_downtimed.json")) as f:
         after = f.read()
-    return [before, "", "", after, ""]
+    return [before, "", after, ""]
 
 
 def assert_has_downtime_calls(
@@ -49,22 +57,11 @@ def assert_has_downtime_calls(
     """Assert that the mocked icinga_host was called correctly to downtime the given hosts."""
     end = start + duration
     args = f"{start};{end};1;0;{duration};{reason.owner};{reason.reason}"
-    downtime_calls = [
-        [
-            "bash -c "
-            + shlex.quote(f'echo -n "[{start}] SCHEDULE_HOST_DOWNTIME;{host};{args}" > /var/lib/icinga/rw/icinga.cmd ')
-            for host in hosts
-        ],
-        [
-            "bash -c "
-            + shlex.quote(
-                f'echo -n "[{start}] SCHEDULE_HOST_SVC_DOWNTIME;{host};{args}" > /var/lib/icinga/rw/icinga.cmd '
-            )
-            for host in hosts
-        ],
+    lines = [f"[{start}] SCHEDULE_HOST_DOWNTIME;{host};{args}" for host in hosts] + [
+        f"[{start}] SCHEDULE_HOST_SVC_DOWNTIME;{host};{args}" for host in hosts
     ]
     mocked_icinga_host.run_sync.assert_has_calls(
-        [mock.call(*call, print_output=False, print_progress_bars=False) for call in downtime_calls]
+        [mock.call(get_command_file_write(*lines), print_output=False, print_progress_bars=False)]
     )
 
 
@@ -78,15 +75,9 @@ def assert_has_service_downtime_calls(
     """Assert that the mocked icinga_host was called correctly to downtime the given services."""
     end = start + duration
     args = f"{start};{end};1;0;{duration};{reason.owner};{reason.reason}"
-    downtime_calls = [
-        [
-            f'bash -c \'echo -n "[{start}] SCHEDULE_SVC_DOWNTIME;{host};{service};{args}" '
-            f"> /var/lib/icinga/rw/icinga.cmd '"
-            for host, service in host_services
-        ],
-    ]
+    lines = [f"[{start}] SCHEDULE_SVC_DOWNTIME;{host};{service};{args}" for host, service in host_services]
     mocked_icinga_host.run_sync.assert_has_calls(
-        [mock.call(*call, print_output=False, print_progress_bars=False) for call in downtime_calls]
+        [mock.call(get_command_file_write(*lines), print_output=False, print_progress_bars=False)]
     )
 
 
@@ -161,6 +152,152 @@ def test_status_not_found_error_multiple_hosts():
     assert str(e) == "Hosts host1, host2, host3 were not found in Icinga status"
 
 
+def get_status_output(*hostnames: str, missing: Sequence[str] = ()) -> str:
+    """Return an icinga-status output with all the given hosts in optimal state and the missing ones as null."""
+    status = {
+        hostname: {
+            "name": hostname,
+            "state": "UP",
+            "optimal": True,
+            "downtimed": False,
+            "notifications_enabled": True,
+            "failed_services": [],
+        }
+        for hostname in hostnames
+    }
+    status.update(dict.fromkeys(missing))
+    return json.dumps(status)
+
+
+def get_status_command(hosts: str) -> mock._Call:  # pylint: disable=protected-access
+    """Return the expected run_sync call to get the status of the given hosts."""
+    return mock.call(
+        Command(f'/usr/local/bin/icinga-status -j "{hosts}"', ok_codes=[]),
+        is_safe=True,
+        print_output=False,
+        print_progress_bars=False,
+    )
+
+
+class TestStatusCache:
+    """Test class for the StatusCache class."""
+
+    def setup_method(self):
+        """Setup the test environment."""
+        # pylint: disable=attribute-defined-outside-init
+        icinga.CommandFile.clear_cache()
+        self.mocked_icinga_host = mock.MagicMock(spec_set=RemoteHosts)
+        self.mocked_icinga_host.__len__.return_value = 1
+        set_mocked_icinga_host_output(self.mocked_icinga_host, "/var/lib/icinga/rw/icinga.cmd")
+        self.status_cache = icinga.StatusCache(self.mocked_icinga_host)
+        self.host1 = self._icinga_hosts("host1")
+        self.host2 = self._icinga_hosts("host2")
+        self.mocked_icinga_host.reset_mock()
+
+    def _icinga_hosts(self, host):
+        """Return an IcingaHosts instance for the given host sharing the status cache."""
+        return icinga.IcingaHosts(self.mocked_icinga_host, [host], dry_run=False, status_cache=self.status_cache)
+
+    def test_get_status_shared(self):
+        """It should share the status fetched by another instance for the same hosts."""
+        set_mocked_icinga_host_outputs(self.mocked_icinga_host, [get_status_output("host1")])
+        other = self._icinga_hosts("host1")
+        status = self.host1.get_status()
+        assert other.get_status()["host1"] is status["host1"]
+        self.mocked_icinga_host.run_sync.assert_called_once()
+
+    def test_get_status_not_shared_by_default(self):
+        """It should not share the status with instances that have not been given the same status cache."""
+        set_mocked_icinga_host_outputs(self.mocked_icinga_host, [get_status_output("host1")] * 2)
+        self.host1.get_status()
+        icinga.IcingaHosts(self.mocked_icinga_host, ["host1"], dry_run=False).get_status()
+        assert self.mocked_icinga_host.run_sync.call_count == 2
+
+    def test_get_status_polling(self):
+        """It should never return the same status twice to the same instance."""
+        set_mocked_icinga_host_outputs(self.mocked_icinga_host, [get_status_output("host1")] * 2)
+        self.host1.get_status()
+        self.host1.get_status()
+        assert self.mocked_icinga_host.run_sync.call_count == 2
+
+    def test_get_status_piggyback(self):
+        """It should fetch also the hosts recently requested by others, sharing the fetch with them."""
+        set_mocked_icinga_host_outputs(
+            self.mocked_icinga_host, [get_status_output("host1"), get_status_output("host1", "host2")]
+        )
+        self.host1.get_status()
+        assert list(self.host2.get_status()) == ["host2"]
+        assert list(self.host1.get_status()) == ["host1"]
+        assert self.mocked_icinga_host.run_sync.call_args_list == [
+            get_status_command("host1"),
+            get_status_command("host[1-2]"),
+        ]
+
+    @mock.patch("spicerack.icinga.time.monotonic")
+    def test_get_status_expired(self, mocked_monotonic):
+        """It should not use a cached status older than the TTL nor fetch hosts not requested within the TTL."""
+        mocked_monotonic.side_effect = [100.0, 106.0, 106.0]
+        outputs = [get_status_output("host1"), get_status_output("host2"), get_status_output("host1")]
+        set_mocked_icinga_host_outputs(self.mocked_icinga_host, outputs)
+        self.host1.get_status()
+        self.host2.get_status()
+        other = self._icinga_hosts("host1")
+        other.get_status()
+        assert self.mocked_icinga_host.run_sync.call_args_list == [
+            get_status_command("host1"),
+            get_status_command("host2"),
+            get_status_command("host[1-2]"),
+        ]
+
+    def test_get_status_invalidated_by_commands(self):
+        """It should not use the cached status of the hosts after writing Icinga commands for them."""
+        set_mocked_icinga_host_outputs(
+            self.mocked_icinga_host, [get_status_output("host1"), "", get_status_output("host1")]
+        )
+        self.host1.get_status()
+        self.host1.remove_downtime()
+        self._icinga_hosts("host1").get_status()
+        assert self.mocked_icinga_host.run_sync.call_count == 3
+
+    def test_get_status_new_instance(self):
+        """It should not return to a new instance a status fetched before its creation."""
+        set_mocked_icinga_host_outputs(self.mocked_icinga_host, [get_status_output("host1")] * 2)
+        self.host1.get_status()
+        self._icinga_hosts("host1").get_status()
+        assert self.mocked_icinga_host.run_sync.call_count == 2
+
+    def test_get_status_fetch_unlocked(self):
+        """It should fetch the status without holding the lock and not cache it if invalidated in the meanwhile."""
+        cache = self.status_cache
+        other = self._icinga_hosts("host1")
+
+        def fetch(*_args, **_kwargs):
+            """Invalidate the status while fetching it, that requires the lock."""
+            assert not cache._lock.locked()  # pylint: disable=protected-access
+            cache.invalidate(nodeset("host1"))
+            return [(nodeset("icinga-host"), MsgTreeElem(get_status_output("host1").encode(), parent=MsgTreeElem()))]
+
+        self.mocked_icinga_host.run_sync.side_effect = fetch
+        self.host1.get_status()
+        other.get_status()
+        assert self.mocked_icinga_host.run_sync.call_count == 2
+
+    def test_get_status_missing_other_hosts(self):
+        """It should raise only for the missing hosts that were requested, not for the ones of others."""
+        set_mocked_icinga_host_outputs(
+            self.mocked_icinga_host,
+            [
+                get_status_output("host1"),
+                get_status_output("host2", missing=["host1"]),
+                get_status_output(missing=["host1"]),
+            ],
+        )
+        self.host1.get_status()
+        assert list(self.host2.get_status()) == ["host2"]
+        with pytest.raises(icinga.IcingaStatusNotFoundError, match="Host host1 was not found in Icinga status"):
+            self.host1.get_status()
+
+
 class TestIcingaHosts:
     """Test class for the IcingaHosts class."""
 
@@ -195,12 +332,9 @@ class TestIcingaHosts:
         """It should init the target hosts according to the input and verbatim option."""
         instance = icinga.IcingaHosts(self.mocked_icinga_host, target_hosts, verbatim_hosts=verbatim_hosts)
         instance.run_icinga_command("TEST_COMMAND", "arg1", "arg2")
-        calls = [
-            f"bash -c 'echo -n \"[1514764800] TEST_COMMAND;{host};arg1;arg2\" > /var/lib/icinga/rw/icinga.cmd '"
-            for host in effective_hosts
-        ]
+        call = get_command_file_write(*[f"[1514764800] TEST_COMMAND;{host};arg1;arg2" for host in effective_hosts])
 
-        self.mocked_icinga_host.run_sync.assert_called_once_with(*calls, print_output=False, print_progress_bars=False)
+        self.mocked_icinga_host.run_sync.assert_called_once_with(call, print_output=False, print_progress_bars=False)
         assert mocked_time.called
 
     @mock.patch("spicerack.icinga.time.time", return_value=1514764800)
@@ -214,8 +348,7 @@ class TestIcingaHosts:
         self.mocked_icinga_host.run_sync.assert_has_calls(
             [
                 mock.call(
-                    'bash -c \'echo -n "[1514764800] DEL_DOWNTIME_BY_HOST_NAME;host1" > '
-                    "/var/lib/icinga/rw/icinga.cmd '",
+                    get_command_file_write("[1514764800] DEL_DOWNTIME_BY_HOST_NAME;host1"),
                     print_output=False,
                     print_progress_bars=False,
                 )
@@ -258,7 +391,7 @@ class TestIcingaHosts:
         """It should not raise and just log a warning if unable to verify if the downtime was applied."""
         with open(get_fixture_path("icinga", "status_valid.json")) as f:
             not_downtimed = f.read()
-        set_mocked_icinga_host_outputs(self.mocked_icinga_host, [not_downtimed, "", ""] + [not_downtimed] * 13)
+        set_mocked_icinga_host_outputs(self.mocked_icinga_host, [not_downtimed, ""] + [not_downtimed] * 13)
         with caplog.at_level(logging.INFO):
             self.icinga_hosts.downtime(self.reason)
         assert_has_downtime_calls(self.mocked_icinga_host, ["host1"], self.reason)
@@ -342,10 +475,10 @@ class TestIcingaHosts:
             self.mocked_icinga_host.run_sync.reset_mock()
 
         self.mocked_icinga_host.run_sync.assert_called_with(
-            'bash -c \'echo -n "[1514764800] DEL_DOWNTIME_BY_HOST_NAME;host1;service1" > '
-            "/var/lib/icinga/rw/icinga.cmd '",
-            'bash -c \'echo -n "[1514764800] DEL_DOWNTIME_BY_HOST_NAME;host1;service2" > '
-            "/var/lib/icinga/rw/icinga.cmd '",
+            get_command_file_write(
+                "[1514764800] DEL_DOWNTIME_BY_HOST_NAME;host1;service1",
+                "[1514764800] DEL_DOWNTIME_BY_HOST_NAME;host1;service2",
+            ),
             print_output=False,
             print_progress_bars=False,
         )
@@ -426,31 +559,59 @@ class TestIcingaHosts:
     def test_run_icinga_command(self, mocked_time):
         """It should run the specified command for all the hosts on the Icinga server."""
         self.icinga_hosts.run_icinga_command("TEST_COMMAND", "arg1", "arg2")
-        call = "bash -c 'echo -n \"[1514764800] TEST_COMMAND;host1;arg1;arg2\" > /var/lib/icinga/rw/icinga.cmd '"
+        call = get_command_file_write("[1514764800] TEST_COMMAND;host1;arg1;arg2")
 
         self.mocked_icinga_host.run_sync.assert_called_once_with(call, print_output=False, print_progress_bars=False)
         assert mocked_time.called
 
+    @mock.patch("spicerack.icinga.MAX_COMMANDS_WRITE_SIZE", 200)
+    @mock.patch("spicerack.icinga.time.time", return_value=1514764800)
+    def test_run_icinga_command_split(self, mocked_time, caplog):
+        """It should split the writes into multiple remote commands if they exceed the maximum size."""
+        instance = icinga.IcingaHosts(self.mocked_icinga_host, nodeset("host[1-5]"), verbatim_hosts=True)
+        with caplog.at_level(logging.INFO):
+            instance.run_icinga_command("TEST_COMMAND", "arg1", "arg2")
+
+        lines = [f"[1514764800] TEST_COMMAND;host{i};arg1;arg2" for i in range(1, 6)]
+        self.mocked_icinga_host.run_sync.assert_called_once_with(
+            get_command_file_write(*lines[:3]),
+            get_command_file_write(*lines[3:]),
+            print_output=False,
+            print_progress_bars=False,
+        )
+        assert "Writing 5 Icinga commands (210 bytes) to the command file on" in caplog.text
+        assert "with 2 remote commands" in caplog.text
+        assert mocked_time.called
+
+    def test_write_commands_empty(self):
+        """It should not execute anything if there are no command lines to write."""
+        self.icinga_hosts._write_commands([])  # pylint: disable=protected-access
+        assert not self.mocked_icinga_host.run_sync.called
+
+    @mock.patch("spicerack.icinga.time.time", return_value=1514764800)
+    def test_run_icinga_command_shell(self, mocked_time, tmp_path):
+        """The generated command should write one line per Icinga command, preserving any quote in the arguments."""
+        command_file = tmp_path / "icinga.cmd"
+        with mock.patch.object(self.icinga_hosts, "_command_file", str(command_file)):
+            self.icinga_hosts.run_icinga_command("TEST_COMMAND", "it's", 'a "quoted" $value')
+
+        command = self.mocked_icinga_host.run_sync.call_args.args[0]
+        subprocess.run(shlex.split(command), check=True)
+        assert command_file.read_text() == "[1514764800] TEST_COMMAND;host1;it's;a \"quoted\" $value\n"
+        assert mocked_time.called
+
     @mock.patch("spicerack.icinga.time.time", return_value=1514764800)
     def test_recheck_all_services(self, mocked_time):
         """It should force a recheck of all services for the hosts on the Icinga server."""
         self.icinga_hosts.recheck_all_services()
 
-        self.mocked_icinga_host.run_sync.assert_has_calls(
-            [
-                mock.call(
-                    'bash -c \'echo -n "[1514764800] SCHEDULE_FORCED_HOST_SVC_CHECKS;host1;1514764800" > '
-                    "/var/lib/icinga/rw/icinga.cmd '",
-                    print_output=False,
-                    print_progress_bars=False,
-                ),
-                mock.call(
-                    'bash -c \'echo -n "[1514764800] SCHEDULE_FORCED_HOST_CHECK;host1;1514764800" > '
-                    "/var/lib/icinga/rw/icinga.cmd '",
-                    print_output=False,
-                    print_progress_bars=False,
-                ),
-            ]
+        self.mocked_icinga_host.run_sync.assert_called_once_with(
+            get_command_file_write(
+                "[1514764800] SCHEDULE_FORCED_HOST_SVC_CHECKS;host1;1514764800",
+                "[1514764800] SCHEDULE_FORCED_HOST_CHECK;host1;1514764800",
+            ),
+            print_output=False,
+            print_progress_bars=False,
         )
 
         assert mocked_time.called
@@ -463,10 +624,11 @@ class TestIcingaHosts:
 
         self.icinga_hosts.recheck_failed_services()
         self.mocked_icinga_host.run_sync.assert_called_with(
-            'bash -c \'echo -n "[1514764800] SCHEDULE_FORCED_SVC_CHECK;host2;check_name1;1514764800" > '
-            "/var/lib/icinga/rw/icinga.cmd '",
-            'bash -c \'echo -n "[1514764800] SCHEDULE_FORCED_SVC_CHECK;host2;check_name2;1514764800" > '
-            "/var/lib/icinga/rw/icinga.cmd '",
+            get_command_file_write(
+                "[1514764800] SCHEDULE_FORCED_HOST_CHECK;host1;1514764800",
+                "[1514764800] SCHEDULE_FORCED_SVC_CHECK;host2;check_name1;1514764800",
+                "[1514764800] SCHEDULE_FORCED_SVC_CHECK;host2;check_name2;1514764800",
+            ),
             print_output=False,
             print_progress_bars=False,
         )
@@ -605,7 +767,7 @@ class TestIcingaHosts:
         """It should remove the downtime for the hosts on the Icinga server."""
         self.icinga_hosts.remove_downtime()
         self.mocked_icinga_host.run_sync.assert_called_once_with(
-            "bash -c 'echo -n \"[1514764800] DEL_DOWNTIME_BY_HOST_NAME;host1\" > /var/lib/icinga/rw/icinga.cmd '",
+            get_command_file_write("[1514764800] DEL_DOWNTIME_BY_HOST_NAME;host1"),
             print_output=False,
             print_progress_bars=False,
         )
@@ -618,11 +780,9 @@ class TestIcingaHosts:
             set_mocked_icinga_host_outputs(self.mocked_icinga_host, [f.read(), "", "", ""])
         self.icinga_hosts.remove_service_downtimes(r"service\d")
         self.mocked_icinga_host.run_sync.assert_called_with(
-            *[
-                f'bash -c \'echo -n "[1514764800] DEL_DOWNTIME_BY_HOST_NAME;host1;{service}" '
-                f"> /var/lib/icinga/rw/icinga.cmd '"
-                for service in ["service1", "service2"]
-            ],
+            get_command_file_write(
+                *[f"[1514764800] DEL_DOWNTIME_BY_HOST_NAME;host1;{service}" for service in ["service1", "service2"]]
+            ),
             print_output=False,
             print_progress_bars=False,
         )
@@ -1,5 +1,6 @@
 """Initialization tests."""
 
+import argparse
 import logging
 import sys
 from collections import namedtuple
@@ -19,7 +20,7 @@ from wmflib.phabricator import Phabricator
 from wmflib.prometheus import Prometheus, Thanos
 
 from spicerack import Spicerack
-from spicerack._cookbook import get_cookbook_callback
+from spicerack._cookbook import CookbookCollection, get_cookbook_callback
 from spicerack.administrative import Reason
 from spicerack.alerting import AlertingHosts
 from spicerack.alertmanager import Alertmanager, AlertmanagerHosts
@@ -41,11 +42,11 @@ from spicerack.kafka import Kafka
 from spicerack.locking import Lock, NoLock
 from spicerack.mediawiki import MediaWiki
 from spicerack.mysql import Mysql
-from spicerack.netbox import Netbox, NetboxServer
+from spicerack.netbox import Netbox, NetboxError, NetboxServer
 from spicerack.orchestrator import Orchestrator
 from spicerack.peeringdb import PeeringDB
 from spicerack.puppet import PuppetHosts, PuppetServer
-from spicerack.redfish import RedfishDell, RedfishSupermicro
+from spicerack.redfish import RedfishDell, RedfishFleet, RedfishSupermicro
 from spicerack.redis_cluster import RedisCluster
 from spicerack.remote import Remote, RemoteError, RemoteHosts
 from spicerack.reposync import RepoSync
@@ -80,6 +81,7 @@ def test_spicerack(mocked_dns_resolver, monkeypatch):
     assert isinstance(spicerack.actions, ActionsDict)
     assert isinstance(spicerack.remote(), Remote)
     assert isinstance(spicerack.remote(installer=True), Remote)
+    assert spicerack.remote(cache_ttl=30)._cache_ttl == 30  # pylint: disable=protected-access
     assert isinstance(spicerack.confctl("discovery"), ConftoolEntity)
     assert isinstance(spicerack.confctl("mwconfig"), ConftoolEntity)
     assert isinstance(spicerack.dbctl(), Dbctl)
@@ -154,8 +156,15 @@ def test_spicerack_icinga(mocked_command_file, mocked_remote_query, mocked_dns,
     spicerack = Spicerack(verbose=True, dry_run=False, **SPICERACK_TEST_PARAMS)
 
     assert spicerack.icinga_master_host().hosts == "icinga-server.example.com"
-    assert isinstance(spicerack.icinga_hosts(["host1", "host2"]), IcingaHosts)
+    icinga_hosts = spicerack.icinga_hosts(["host1", "host2"])
+    assert isinstance(icinga_hosts, IcingaHosts)
+    # The Icinga status cache is shared among all the instances of the same Spicerack instance only
     mocked_hostname.assert_called_once_with()
+    other_icinga_hosts = spicerack.icinga_hosts(["host3"])
+    other_spicerack_icinga_hosts = Spicerack(dry_run=False, **SPICERACK_TEST_PARAMS).icinga_hosts(["host1"])
+    # pylint: disable=protected-access
+    assert other_icinga_hosts._status_cache is icinga_hosts._status_cache
+    assert other_spicerack_icinga_hosts._status_cache is not icinga_hosts._status_cache
 
 
 @mock.patch("spicerack.get_ca_via_srv_record", return_value="puppetserver1001.example.org")
@@ -216,6 +225,91 @@ def test_spicerack_redfish_not_physical(mocked_netbox):
     assert mocked_netbox.called
 
 
+def _mock_netbox_fleet(mocked_netbox, devices, ips, roles=None):
+    """Mock the bulk Netbox queries used to resolve a RedfishFleet."""
+    roles = roles or {}
+    device_records = []
+    for name, manufacturer in devices.items():
+        device = mock.MagicMock()
+        device.name = name
+        device.role.slug = roles.get(name, "server")
+        device.device_type.manufacturer.slug = manufacturer
+        device_records.append(device)
+
+    ip_records = []
+    for name, address in ips.items():
+        netbox_ip = mock.MagicMock()
+        netbox_ip.assigned_object.device.name = name
+        netbox_ip.address = address
+        ip_records.append(netbox_ip)
+
+    mocked_netbox.return_value.api.dcim.devices.filter.return_value = device_records
+    mocked_netbox.return_value.api.ipam.ip_addresses.filter.return_value = ip_records
+
+
+@mock.patch("spicerack.Netbox")
+def test_spicerack_redfish_fleet(mocked_netbox):
+    """It should resolve all the hosts with bulk Netbox queries and return a RedfishFleet instance."""
+    _mock_netbox_fleet(
+        mocked_netbox,
+        {"host1001": "dell", "host1002": "supermicro"},
+        {"host1002": "10.0.0.2/16", "host1001": "10.0.0.1/16"},
+    )
+    spicerack = Spicerack(verbose=True, dry_run=False, **SPICERACK_TEST_PARAMS)
+
+    fleet = spicerack.redfish_fleet(["host1001", "host1002", "host1001"])
+    assert isinstance(fleet, RedfishFleet)
+    assert fleet.hostnames == ["host1001", "host1002"]
+    assert isinstance(fleet["host1001"], RedfishDell)
+    assert isinstance(fleet["host1002"], RedfishSupermicro)
+    assert str(fleet["host1002"].interface.ip) == "10.0.0.2"
+    mocked_netbox.return_value.api.dcim.devices.filter.assert_called_once_with(name=["host1001", "host1002"])
+    mocked_netbox.return_value.api.ipam.ip_addresses.filter.assert_called_once_with(
+        device=["host1001", "host1002"], interface="mgmt"
+    )
+
+
+@pytest.mark.parametrize(
+    "devices, ips, message",
+    (
+        ({"host1001": "dell"}, {"host1001": "10.0.0.1/16"}, "Physical servers, Redfish is not supported: host1002"),
+        (
+            {"host1001": "dell", "host1002": "dell"},
+            {"host1001": "10.0.0.1/16"},
+            "Unable to find the management IP in Netbox for hosts: host1002",
+        ),
+        (
+            {"host1001": "dell", "host1002": "fancy"},
+            {"host1001": "10.0.0.1/16", "host1002": "10.0.0.2/16"},
+            "The manufacturer fancy set in Netbox for host1002 is not supported",
+        ),
+    ),
+)
+@mock.patch("spicerack.Netbox")
+def test_spicerack_redfish_fleet_fail(mocked_netbox, devices, ips, message):
+    """It should raise a SpicerackError if any host can't be managed via Redfish."""
+    _mock_netbox_fleet(mocked_netbox, devices, ips)
+    spicerack = Spicerack(verbose=True, dry_run=False, **SPICERACK_TEST_PARAMS)
+
+    with pytest.raises(SpicerackError, match=message):
+        spicerack.redfish_fleet(["host1001", "host1002"], password="other_password")
+
+
+@mock.patch("spicerack.Netbox")
+def test_spicerack_redfish_fleet_invalid_role(mocked_netbox):
+    """It should raise a NetboxError if any device doesn't have the server role."""
+    _mock_netbox_fleet(
+        mocked_netbox,
+        {"host1001": "dell", "host1002": "dell"},
+        {"host1001": "10.0.0.1/16", "host1002": "10.0.0.2/16"},
+        roles={"host1002": "pdu"},
+    )
+    spicerack = Spicerack(verbose=True, dry_run=False, **SPICERACK_TEST_PARAMS)
+
+    with pytest.raises(NetboxError, match=r"Devices with invalid role, only server is allowed: host1002 \(pdu\)"):
+        spicerack.redfish_fleet(["host1001", "host1002"], password="other_password")
+
+
 def test_spicerack_management_password_from_config():
     """Should return the management password set in the management.yaml configuration file."""
     spicerack = Spicerack(verbose=True, dry_run=False, **SPICERACK_TEST_PARAMS)
@@ -313,8 +407,9 @@ def test_run_cookbook_no_callback():
         spicerack.run_cookbook("class_api.example", [])
 
 
-def test_run_cookbook_raise():
+def test_run_cookbook_raise(monkeypatch):
     """It should raise a RunCookbookError if raises is set to True and the cookbook raises an exception."""
+    monkeypatch.syspath_prepend(get_fixture_path("cookbook"))
     get_cookbook = get_cookbook_callback([get_fixture_path("cookbook")])
     spicerack = Spicerack(verbose=True, dry_run=False, get_cookbook_callback=get_cookbook, **SPICERACK_TEST_PARAMS)
     with pytest.raises(
@@ -325,8 +420,9 @@ def test_run_cookbook_raise():
 
 
 @mock.patch("wmflib.interactive.ask_input", return_value="abort")
-def test_run_cookbook_confirm(mocked_ask_input):
+def test_run_cookbook_confirm(mocked_ask_input, monkeypatch):
     """It should ask the user confirmation if confirm is set to True and the cookbook raises an exception."""
+    monkeypatch.syspath_prepend(get_fixture_path("cookbook"))
     get_cookbook = get_cookbook_callback([get_fixture_path("cookbook")])
     spicerack = Spicerack(verbose=True, dry_run=False, get_cookbook_callback=get_cookbook, **SPICERACK_TEST_PARAMS)
     with pytest.raises(AbortError, match="Task manually aborted"):
@@ -335,6 +431,47 @@ def test_run_cookbook_confirm(mocked_ask_input):
     mocked_ask_input.assert_called_once()
 
 
+def test_run_cookbook_memoized(capsys, monkeypatch):
+    """It should collect the cookbook only once and use the given arguments at each call."""
+    monkeypatch.syspath_prepend(get_fixture_path("cookbook"))
+    get_cookbook = get_cookbook_callback([get_fixture_path("cookbook")])
+    spicerack = Spicerack(verbose=True, dry_run=False, get_cookbook_callback=get_cookbook, **SPICERACK_TEST_PARAMS)
+    with mock.patch("spicerack._cookbook.CookbookCollection", wraps=CookbookCollection) as mocked_collection:
+        assert spicerack.run_cookbook("group3.argparse_ok", []) == 0
+        assert spicerack.run_cookbook("group3.argparse_ok", ["--invalid"]) == 2
+        assert spicerack.run_cookbook("group3.argparse_ok", []) == 0
+
+    mocked_collection.assert_called_once()
+    _, err = capsys.readouterr()
+    assert "unrecognized arguments: --invalid" in err
+
+
+def test_run_cookbook_memoized_spicerack(monkeypatch):
+    """It should run the memoized cookbook with the Spicerack instance of each call."""
+    monkeypatch.syspath_prepend(get_fixture_path("cookbook"))
+    get_cookbook = get_cookbook_callback([get_fixture_path("cookbook")])
+    first = Spicerack(verbose=True, dry_run=False, get_cookbook_callback=get_cookbook, **SPICERACK_TEST_PARAMS)
+    second = Spicerack(verbose=True, dry_run=True, get_cookbook_callback=get_cookbook, **SPICERACK_TEST_PARAMS)
+    get_cookbook(first, "group3.argparse_ok", [])
+    item = get_cookbook(second, "group3.argparse_ok", [])
+
+    assert item.instance.get_runner(argparse.Namespace()).spicerack is second
+
+
+def test_get_cookbook_callback_memoized_items(monkeypatch):
+    """It should return a new item at each call preserving the inherited owner team, not memoizing menus."""
+    monkeypatch.syspath_prepend(get_fixture_path("cookbook"))
+    get_cookbook = get_cookbook_callback([get_fixture_path("cookbook")])
+    spicerack = Spicerack(verbose=True, dry_run=False, **SPICERACK_TEST_PARAMS)
+    first = get_cookbook(spicerack, "group3.raise_exception", ["a"])
+    second = get_cookbook(spicerack, "group3.raise_exception", ["b"])
+    assert first is not second
+    assert (first.args, second.args) == (["a"], ["b"])
+    assert first.owner_team == second.owner_team == "team3"
+    assert get_cookbook(spicerack, "group3", []) is not get_cookbook(spicerack, "group3", [])
+    assert get_cookbook(spicerack, "non_existent", []) is None
+
+
 @mock.patch("spicerack.Path.is_dir")
 @mock.patch("spicerack.Repo")
 def test_reposync(mocked_repo, mocked_is_dir):
@@ -1,5 +1,6 @@
 """k8s module tests."""
 
+import threading
 from http import HTTPStatus
 from unittest import mock
 
@@ -213,6 +214,27 @@ class TestKubernetesApiFactory:
         self._api.configuration = mock.MagicMock(return_value=kubernetes.client.Configuration())
         assert isinstance(self._api.batch(), kubernetes.client.BatchV1Api)
 
+    def test_api_client_shared(self):
+        """The same API client is shared by all the APIs for the same user."""
+        self._api.configuration = mock.MagicMock(side_effect=lambda _: kubernetes.client.Configuration())
+        api_client = self._api.core().api_client
+        assert self._api.core().api_client is api_client
+        assert self._api.batch().api_client is api_client
+        assert self._api.core(user="other").api_client is not api_client
+        assert self._api.configuration.call_count == 2
+
+    def test_close(self):
+        """Closing the factory closes all the API clients and their connections, new ones are created if needed."""
+        self._api.configuration = mock.MagicMock(return_value=kubernetes.client.Configuration())
+        api_client = self._api.core().api_client
+        with mock.patch.object(api_client.rest_client, "pool_manager") as mocked_pool_manager:
+            kube = k8s.Kubernetes("group", "cluster")
+            kube.api = self._api
+            kube.close()
+
+        mocked_pool_manager.clear.assert_called_once_with()
+        assert self._api.core().api_client is not api_client
+
 
 class TestKubernetesNode(KubeTestBase):
     """Test the KubernetesNode class."""
@@ -378,29 +400,98 @@ class TestKubernetesNode(KubeTestBase):
 
     @pytest.mark.parametrize("label", ["unschedulable"])
     def test_drain_eventually_successful(self, node):
-        """Test that retrying can eventually succeed."""
+        """Test that watching the node's pods detects when the evicted ones are gone, without sleeping."""
         before_drain = mock.MagicMock()
         before_drain.items = [self.pod_from_test_case(label) for label in ["replicaset", "daemonset"]]
         # After draining, we expect the remaining pods to just be the unevictable ones.
         after_drain = mock.MagicMock()
         after_drain.items = [self.pod_from_test_case(label) for label in ["daemonset"]]
-        self._coreapi.list_pod_for_all_namespaces.side_effect = [before_drain, before_drain, before_drain, after_drain]
-        with mock.patch("spicerack.k8s.time.sleep") as sl:
+        self._coreapi.list_pod_for_all_namespaces.side_effect = [before_drain, before_drain, after_drain]
+        events = [
+            {"type": "MODIFIED", "object": self.pod_from_test_case("daemonset")},
+            {"type": "MODIFIED", "object": self.pod_from_test_case("replicaset")},
+            {"type": "DELETED", "object": self.pod_from_test_case("replicaset")},
+            {"type": "ADDED", "object": self.pod_from_test_case("daemonset")},  # Not consumed
+        ]
+        with mock.patch("spicerack.k8s.time.sleep") as sl, mock.patch("spicerack.k8s.watch.Watch") as mocked_watch:
+            mocked_watch.return_value.stream.return_value = iter(events)
             node.drain()
-            # expect sleep to be called once for max_grace_period (30s) and once from @retry (3s)
-            assert sl.call_args_list == [((30,),), ((3,),)]
+            sl.assert_not_called()
+
+        mocked_watch.return_value.stream.assert_called_once_with(
+            self._coreapi.list_pod_for_all_namespaces,
+            field_selector="spec.nodeName=node2",
+            resource_version=before_drain.metadata.resource_version,
+            timeout_seconds=121,
+        )
+        mocked_watch.return_value.stop.assert_called_once_with()
+        assert self._coreapi.list_pod_for_all_namespaces.call_count == 3
+
+    @pytest.mark.parametrize("label", ["unschedulable"])
+    def test_drain_watch_expired(self, node):
+        """If the watch resource version is expired, the pods are listed again and the watch restarted."""
+        before_drain = mock.MagicMock()
+        before_drain.items = [self.pod_from_test_case("replicaset")]
+        after_drain = mock.MagicMock()
+        after_drain.items = [self.pod_from_test_case("finished")]
+        self._coreapi.list_pod_for_all_namespaces.side_effect = [before_drain, before_drain, after_drain]
+        with mock.patch("spicerack.k8s.watch.Watch") as mocked_watch:
+            mocked_watch.return_value.stream.side_effect = kubernetes.client.exceptions.ApiException(status=410)
+            node.drain(timeout=10)
+
+        assert self._coreapi.list_pod_for_all_namespaces.call_count == 3
+
+    @pytest.mark.parametrize("label", ["unschedulable"])
+    def test_drain_watch_error(self, node):
+        """If the watch fails, an api error is raised."""
+        pods = mock.MagicMock()
+        pods.items = [self.pod_from_test_case("replicaset")]
+        self._coreapi.list_pod_for_all_namespaces.return_value = pods
+        with mock.patch("spicerack.k8s.watch.Watch") as mocked_watch:
+            mocked_watch.return_value.stream.side_effect = kubernetes.client.exceptions.ApiException(status=500)
+            with pytest.raises(k8s.KubernetesApiError, match="Failed to watch pods running on node node2"):
+                node.drain()
+
+        mocked_watch.return_value.stop.assert_called_once_with()
 
     @pytest.mark.parametrize("label", ["unschedulable"])
     def test_drain_leftover(self, node):
-        """If there are leftover pods an exception is raised."""
+        """If there are leftover pods after the timeout an exception is raised."""
         # Now assume we weren't able to evict anything
         before_drain = mock.MagicMock()
         before_drain.items = [self.pod_from_test_case(label) for label in ["replicaset", "daemonset"]]
         self._coreapi.list_pod_for_all_namespaces.return_value = before_drain
-        with pytest.raises(k8s.KubernetesCheckError, match="still has 2 pods"):
-            with mock.patch("spicerack.k8s.time.sleep", return_value=None) as sl:
-                node.drain()
-                sl.assert_called_once_with(1)
+        with mock.patch("spicerack.k8s.watch.Watch") as mocked_watch:
+            mocked_watch.return_value.stream.return_value = iter([])
+            with mock.patch("spicerack.k8s.time.monotonic", side_effect=[0, 5, 11]):
+                with pytest.raises(k8s.KubernetesCheckError, match="still has 1 evicted pods running: bar/foo"):
+                    node.drain(timeout=10)
+
+        mocked_watch.return_value.stream.assert_called_once()
+        assert mocked_watch.return_value.stream.call_args.kwargs["timeout_seconds"] == 5
+
+    @pytest.mark.parametrize("label", ["unschedulable"])
+    def test_drain_concurrent(self, node):
+        """The pods are evicted concurrently up to max_workers."""
+        pods = []
+        for name in ("foo1", "foo2", "foo3", "foo4"):
+            obj = self.pod_from_test_case("replicaset")
+            obj.metadata.name = name
+            pods.append(k8s.KubernetesPod("bar", name, self._api, dry_run=False, init_obj=obj))
+        node.get_pods = mock.MagicMock(return_value=pods)
+        node._list_pods = mock.MagicMock(return_value=mock.MagicMock(items=[]))  # pylint: disable=protected-access
+        barrier = threading.Barrier(2, timeout=5)
+        self._coreapi.create_namespaced_pod_eviction.side_effect = lambda *_: barrier.wait()
+
+        node.drain(max_workers=2)  # Would fail with sequential evictions
+
+        assert self._coreapi.create_namespaced_pod_eviction.call_count == 4
+
+    @pytest.mark.parametrize("label", ["unschedulable"])
+    def test_drain_invalid_max_workers(self, node):
+        """An invalid max_workers raises an exception."""
+        with pytest.raises(k8s.KubernetesError, match="The max_workers must be a positive integer, got 0"):
+            node.drain(max_workers=0)
 
     @mock.patch("wmflib.decorators.time.sleep", return_value=None)
     @pytest.mark.parametrize("label", ["unschedulable"])
@@ -553,3 +644,40 @@ class TestKubernetesPod(KubeTestBase):
         assert mocked_wmflib_sleep.call_count == 4
         # Also test dry run. It won't raise an exception
         k8s.KubernetesPod("bar", "foo", self._api, init_obj=self.pod_from_test_case("replicaset")).evict()
+
+    def test_evict_retry_after(self):
+        """When a pod eviction returns 429 with a Retry-After header, wait for it before retrying."""
+        self._coreapi.create_namespaced_pod_eviction.side_effect = [
+            kubernetes.client.exceptions.ApiException(
+                http_resp=mock.MagicMock(status=429, getheaders=mock.MagicMock(return_value={"Retry-After": "10"}))
+            ),
+            kubernetes.client.exceptions.ApiException(
+                http_resp=mock.MagicMock(status=429, getheaders=mock.MagicMock(return_value={"Retry-After": "600"}))
+            ),
+            None,
+        ]
+        with mock.patch("wmflib.decorators.time.sleep") as mocked_sleep:
+            k8s.KubernetesPod(
+                "bar", "foo", self._api, dry_run=False, init_obj=self.pod_from_test_case("replicaset")
+            ).evict()
+
+        # The Retry-After header replaces the exponential backoff of the @retry decorator
+        assert mocked_sleep.call_args_list == [mock.call(10.0), mock.call(60.0)]
+
+    @mock.patch("wmflib.decorators.time.sleep", return_value=None)
+    def test_evict_retry_after_missing(self, mocked_sleep):
+        """When a pod eviction returns 429 without a Retry-After header after one with it, use the backoff again."""
+        self._coreapi.create_namespaced_pod_eviction.side_effect = [
+            kubernetes.client.exceptions.ApiException(
+                http_resp=mock.MagicMock(status=429, getheaders=mock.MagicMock(return_value={"Retry-After": "10"}))
+            ),
+            kubernetes.client.exceptions.ApiException(
+                http_resp=mock.MagicMock(status=429, getheaders=mock.MagicMock(return_value={}))
+            ),
+            None,
+        ]
+        k8s.KubernetesPod(
+            "bar", "foo", self._api, dry_run=False, init_obj=self.pod_from_test_case("replicaset")
+        ).evict()
+
+        assert mocked_sleep.call_args_list == [mock.call(10.0), mock.call(9.0)]
@@ -16,7 +16,7 @@ OFFSET = 2
 
 TIMESTAMP = 12323847623
 
-SimpleMessage = namedtuple("SimpleMessage", "timestamp offset")
+SimpleMessage = namedtuple("SimpleMessage", "topic partition timestamp offset")
 
 test_data = [
     (
@@ -42,14 +42,10 @@ test_data = [
             ConsumerDefinition("eqiad", "main", "consumer_main_2"),
         ),
         [
-            ({TopicPartition(topic="eqiad.wikidata", partition=0): OffsetAndMetadata((TIMESTAMP - DELTA) - 100, None)}),
-            (
-                {
-                    TopicPartition(topic="eqiad.mediainfo", partition=0): OffsetAndMetadata(
-                        (TIMESTAMP - DELTA) - 100, None
-                    )
-                }
-            ),
+            {
+                TopicPartition(topic=f"eqiad.{topic}", partition=0): OffsetAndMetadata((TIMESTAMP - DELTA) - 100, None)
+                for topic in ("wikidata", "mediainfo")
+            },
         ],
     ),
     (
@@ -71,6 +67,23 @@ def _answer_partitions_for_topic(topic) -> Union[list[int], None]:
     return [0] if topic.startswith(("eqiad.", "codfw.")) else []
 
 
+def _answer_list_consumer_group_offsets(_group_id, partitions):
+    return {tp: OffsetAndMetadata(OFFSET, "") for tp in partitions}
+
+
+def _answer_next(consumer_mock):
+    """Return a side effect for next() that returns a message for each assigned partition not yet paused."""
+
+    def next_message():
+        paused = {call.args[0] for call in consumer_mock.pause.call_args_list}
+        for tp in consumer_mock.assign.call_args.args[0]:
+            if tp not in paused:
+                return SimpleMessage(tp.topic, tp.partition, TIMESTAMP, OFFSET)
+        return None
+
+    return next_message
+
+
 @mock.patch("ssl.SSLContext.load_verify_locations")
 @mock.patch("spicerack.kafka.KafkaConsumer", autospec=True)
 class TestKafka:
@@ -81,6 +94,13 @@ class TestKafka:
         # pylint: disable=attribute-defined-outside-init
         self.kafka = Kafka(kafka_config=load_yaml_config(get_fixture_path("kafka", "config.yaml")), dry_run=False)
 
+    @pytest.fixture(autouse=True)
+    def admin_patch(self):
+        """Patch the KafkaAdminClient used to fetch the committed offsets."""
+        with mock.patch("spicerack.kafka.KafkaAdminClient", autospec=True) as admin_patch:
+            admin_patch.return_value.list_consumer_group_offsets.side_effect = _answer_list_consumer_group_offsets
+            yield admin_patch
+
     @pytest.mark.parametrize("func_arguments,expected_commit_params", test_data)
     def test_offset_transfer(self, consumer_patch, load_verify_locations_patch, func_arguments, expected_commit_params):
         """It should correctly transfer offsets between consumer groups."""
@@ -105,9 +125,12 @@ class TestKafka:
         kafka.transfer_consumer_position(*func_arguments[0])
         assert not to_consumer_mock.commit.called
 
-    def test_no_source_offset(self, consumer_patch, _):
+    def test_no_source_offset(self, consumer_patch, _, admin_patch):
         """It should raise an exception with specific message if no source offset available."""
         TestKafka._setup_empty_consumer_mocks(consumer_patch)
+        admin_patch.return_value.list_consumer_group_offsets.side_effect = lambda _, partitions: {
+            tp: OffsetAndMetadata(-1, "") for tp in partitions
+        }
         with pytest.raises(
             expected_exception=KafkaError, match="Offset not found for topic eqiad.wikidata, partition 0."
         ):
@@ -154,24 +177,14 @@ class TestKafka:
             ConsumerDefinition("eqiad", "main", "consumer-group"), {"wikidata": TIMESTAMP, "mediainfo": TIMESTAMP + 10}
         )
 
-        assert consumer_mock.commit.call_count == 2
-        consumer_mock.commit.assert_has_calls(
-            [
-                mock.call(
-                    {
-                        TopicPartition(topic="eqiad.wikidata", partition=0): OffsetAndMetadata(
-                            (TIMESTAMP - DELTA) - 100, None
-                        )
-                    }
+        consumer_mock.offsets_for_times.assert_called_once()
+        consumer_mock.commit.assert_called_once_with(
+            {
+                TopicPartition(topic="eqiad.wikidata", partition=0): OffsetAndMetadata((TIMESTAMP - DELTA) - 100, None),
+                TopicPartition(topic="eqiad.mediainfo", partition=0): OffsetAndMetadata(
+                    (TIMESTAMP - DELTA + 10) - 100, None
                 ),
-                mock.call(
-                    {
-                        TopicPartition(topic="eqiad.mediainfo", partition=0): OffsetAndMetadata(
-                            (TIMESTAMP - DELTA + 10) - 100, None
-                        )
-                    }
-                ),
-            ]
+            }
         )
 
     def test_no_topic_partitions(self, consumer_patch, _):
@@ -186,6 +199,44 @@ class TestKafka:
                 ConsumerDefinition("eqiad", "jumbo", "consumer_jumbo_2"),
             )
 
+    def test_offset_transfer_many_partitions(self, consumer_patch, _, admin_patch):
+        """It should read and write the offsets of all the partitions with a single request each."""
+        to_consumer_mock = self._setup_consumer_mocks(
+            consumer_patch, answer_for_partition_for_topic=lambda _: [0, 1, 2]
+        )
+        self.kafka.transfer_consumer_position(
+            ["wikidata", "mediainfo"],
+            ConsumerDefinition("eqiad", "jumbo", "consumer_jumbo_1"),
+            ConsumerDefinition("eqiad", "jumbo", "consumer_jumbo_2"),
+        )
+
+        expected_tps = [TopicPartition(f"eqiad.{topic}", p) for topic in ("wikidata", "mediainfo") for p in range(3)]
+        admin_patch.return_value.list_consumer_group_offsets.assert_called_once_with(
+            "consumer_jumbo_1", partitions=expected_tps
+        )
+        admin_patch.return_value.close.assert_called_once_with()
+        to_consumer_mock.assign.assert_called_once_with(expected_tps)
+        to_consumer_mock.commit.assert_called_once_with({tp: OffsetAndMetadata(OFFSET, None) for tp in expected_tps})
+
+    def test_timestamp_transfer_many_partitions(self, consumer_patch, _):
+        """It should consume one message per partition with a single assignment and approximate all at once."""
+        self._setup_consumer_mocks(consumer_patch, answer_for_partition_for_topic=lambda _: [0, 1, 2])
+        from_consumer_mock, to_consumer_mock = consumer_patch.side_effect
+        consumer_patch.side_effect = [from_consumer_mock, to_consumer_mock]
+        self.kafka.transfer_consumer_position(
+            ["wikidata"],
+            ConsumerDefinition("eqiad", "jumbo", "consumer_jumbo_1"),
+            ConsumerDefinition("eqiad", "main", "consumer_main_2"),
+        )
+
+        expected_tps = [TopicPartition("eqiad.wikidata", p) for p in range(3)]
+        from_consumer_mock.assign.assert_called_once_with(expected_tps)
+        assert from_consumer_mock.pause.call_args_list == [mock.call(tp) for tp in expected_tps]
+        to_consumer_mock.offsets_for_times.assert_called_once_with(dict.fromkeys(expected_tps, TIMESTAMP - DELTA))
+        to_consumer_mock.commit.assert_called_once_with(
+            {tp: OffsetAndMetadata((TIMESTAMP - DELTA) - 100, None) for tp in expected_tps}
+        )
+
     @staticmethod
     def _setup_empty_consumer_mocks(consumer_patch):
         from_consumer_mock = mock.MagicMock(spec_set=KafkaConsumer)
@@ -203,12 +254,9 @@ class TestKafka:
     ):
         from_consumer_mock = mock.MagicMock(spec_set=KafkaConsumer)
         from_consumer_mock.partitions_for_topic.side_effect = answer_for_partition_for_topic
-        from_consumer_mock.__next__.return_value = SimpleMessage(timestamp=TIMESTAMP, offset=OFFSET)
-        from_consumer_mock.committed.return_value = OFFSET
+        from_consumer_mock.__next__.side_effect = _answer_next(from_consumer_mock)
         to_consumer_mock = mock.MagicMock(spec_set=KafkaConsumer)
-        to_consumer_mock.partitions_for_topic.side_effect = lambda topic: (
-            [0] if topic.startswith(("eqiad.", "codfw.")) else []
-        )
+        to_consumer_mock.partitions_for_topic.side_effect = answer_for_partition_for_topic
         to_consumer_mock.offsets_for_times.side_effect = offset_for_times_answer
         consumer_patch.side_effect = [from_consumer_mock, to_consumer_mock]
         return to_consumer_mock
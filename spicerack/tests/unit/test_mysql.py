@@ -9,8 +9,8 @@ from unittest import mock
 
 import pytest
 from ClusterShell.MsgTree import MsgTreeElem
-from cumin import Config, nodeset
-from cumin.transports import Command
+from cumin import Config, nodeset, nodeset_fromlist
+from cumin.transports import Command, Target
 from pymysql.cursors import DictCursor
 
 from spicerack import mysql
@@ -50,6 +50,17 @@ class TestInstance:
         self.multi_instance = mysql.Instance(multi, name="instance1")
         self.single_instance_dry_run = mysql.Instance(single_dry_run)
 
+    def test_close(self):
+        """It should close the pooled connections of the instance."""
+        self.single_instance.close()
+        self.mocked_pymysql.close.assert_called_once_with()
+
+    @mock.patch("spicerack.mysql.MysqlClient", autospec=True)
+    def test_init_pool(self, mocked_mysql_client):
+        """It should create a pooled MysqlClient if requested."""
+        mysql.Instance(RemoteHosts(self.config, nodeset("single1"), dry_run=False), pool=True)
+        mocked_mysql_client.assert_called_once_with(dry_run=False, pool=True)
+
     def test_init_raise(self):
         """It should raise a NotImplementedError exception if more than one host is passed to the constructor."""
         with pytest.raises(NotImplementedError, match="Only single hosts are currently supported"):
@@ -650,6 +661,56 @@ class TestMysqlRemoteHosts:
             print_output=False,
         )
 
+    def test_run_query_on_instances(self, caplog):
+        """It should run the query on all the instances of all hosts, parse the results and log hosts without any."""
+        output_multi = (
+            b"### spicerack-mysql-instance: /run/mysqld/mysqld.s1.sock\n"
+            b"Slave_IO_Running\tLast_Error\tAuto_Position\n"
+            b"Yes\tsome\\nmulti-line\\terror\tNULL\n"
+            b"### spicerack-mysql-instance: /run/mysqld/mysqld.s2.sock\n"
+        )
+        output_single = b"### spicerack-mysql-instance: /run/mysqld/mysqld.sock\nSlave_IO_Running\nNo"
+        self.mocked_run_sync.return_value = [
+            (nodeset("host[1-2]"), MsgTreeElem(output_multi, parent=MsgTreeElem())),
+            (nodeset("host3"), MsgTreeElem(output_single, parent=MsgTreeElem())),
+        ]
+        with caplog.at_level(logging.WARNING):
+            results = self.mysql_remote_hosts.run_query_on_instances("SHOW SLAVE STATUS", is_safe=True)
+
+        assert "No running MariaDB instances found on 6 hosts: host[4-9]" in caplog.text
+        row = {"Slave_IO_Running": "Yes", "Last_Error": "some\nmulti-line\terror", "Auto_Position": None}
+        assert results == {
+            ("host1", "s1"): [row],
+            ("host1", "s2"): [],
+            ("host2", "s1"): [row],
+            ("host2", "s2"): [],
+            ("host3", ""): [{"Slave_IO_Running": "No"}],
+        }
+        assert results[("host1", "s1")][0] is not results[("host2", "s1")][0]
+        command = self.mocked_run_sync.call_args.args[0]
+        assert command.startswith("for sock in /run/mysqld/mysqld*.sock; do")
+        assert '/usr/local/bin/mysql --socket "${sock}" --batch -e "SHOW SLAVE STATUS" ||' in command
+        assert self.mocked_run_sync.call_args.kwargs == {
+            "is_safe": True,
+            "print_progress_bars": False,
+            "print_output": False,
+        }
+
+    def test_run_query_on_instances_fail(self):
+        """It should raise MysqlError if the query failed on any instance."""
+        output = (
+            b"### spicerack-mysql-instance: /run/mysqld/mysqld.s1.sock\n"
+            b"ERROR 1064 (42000): You have an error in your SQL syntax\n"
+            b"### spicerack-mysql-error: 1\n"
+            b"### spicerack-mysql-instance: /run/mysqld/mysqld.s2.sock\n"
+            b"a\n1"
+        )
+        self.mocked_run_sync.return_value = [(nodeset("host1"), MsgTreeElem(output, parent=MsgTreeElem()))]
+        with pytest.raises(mysql.MysqlError, match=r"Failed to run 'SELECT a' on instances: host1 \(s1\)$"):
+            self.mysql_remote_hosts.run_query_on_instances("SELECT a", "mydb")
+
+        assert '--batch -e "SELECT a" mydb ||' in self.mocked_run_sync.call_args.args[0]
+
     def test_list_host_instances_no_instance(self):
         """It should return an empty list if there are no instances on the host."""
         self.mocked_run_sync.side_effect = [
@@ -682,6 +743,14 @@ class TestMysqlRemoteHosts:
         assert instances[0].name == "instance1"
         assert instances[1].name == "instance2"
 
+    @mock.patch("spicerack.mysql.MysqlClient", autospec=True)
+    def test_list_host_instances_pool(self, mocked_mysql_client):
+        """It should create the instances with connection pooling if requested."""
+        self.mocked_run_sync.side_effect = [[], []]  # Empty ls and successful grep -q
+        instances = self.mysql_remote_host.list_hosts_instances(pool=True)
+        assert len(instances) == 1
+        mocked_mysql_client.assert_called_once_with(dry_run=False, pool=True)
+
     def test_list_host_instances_not_single_host(self):
         """It should raise a NotImplementedError if the MysqlRemoteHosts instance has multiple hosts."""
         with pytest.raises(NotImplementedError, match="Only single host are supported at this time"):
@@ -875,6 +944,161 @@ class TestMysql:
 
         assert mocked_sleep.called
 
+    def _mock_core_masters_query(self, hosts, sections=mysql.CORE_SECTIONS, times=1):
+        """Mock the Remote queries to resolve the master of each section and then all of them at once."""
+        masters = dict(zip(mysql.CORE_SECTIONS, nodeset(hosts), strict=True))
+        queries = [RemoteHosts(self.config, nodeset(masters[section])) for section in sections]
+        queries.append(RemoteHosts(self.config, nodeset_fromlist([masters[section] for section in sections])))
+        self.mocked_remote.query.side_effect = queries * times
+
+    @staticmethod
+    def _heartbeats_output(hosts, timestamp, sections=mysql.CORE_SECTIONS):
+        """Return the mocked outputs of the heartbeat query for the masters of the given sections."""
+        masters = dict(zip(mysql.CORE_SECTIONS, nodeset(hosts), strict=True))
+        return [(masters[section], f"{section}\t{timestamp}".encode()) for section in sections]
+
+    @staticmethod
+    def _core_masters_queries(datacenter, sections, hosts):
+        """Return the expected Remote queries to resolve the masters of the given sections."""
+        queries = [
+            mock.call(f"A:db-core and A:{datacenter} and A:db-section-{section} and A:db-role-master")
+            for section in sections
+        ]
+        queries.append(mock.call(f"D{{{hosts}}}"))
+        return queries
+
+    @mock.patch("wmflib.decorators.time.sleep", return_value=None)
+    def test_check_core_masters_in_sync_parallel_ok(self, mocked_sleep):
+        """Should check that all core masters are in sync resolving them from each section and checking them at once."""
+        hosts = nodeset(EQIAD_CORE_MASTERS_QUERY)
+        self._mock_core_masters_query(hosts, times=2)
+        retvals = [self._heartbeats_output(hosts, "2018-09-06T10:00:00.000000")]  # first heartbeat
+        retvals.append(self._heartbeats_output(hosts, "2018-09-06T10:00:01.000000"))  # second heartbeat
+        mock_cumin(self.mocked_transports, 0, retvals=retvals)
+        self.mysql.check_core_masters_in_sync_parallel("eqiad", "codfw")
+
+        assert not mocked_sleep.called
+        assert self.mocked_remote.query.call_args_list == self._core_masters_queries(
+            "eqiad", mysql.CORE_SECTIONS, hosts
+        ) + self._core_masters_queries("codfw", mysql.CORE_SECTIONS, hosts)
+        assert self.mocked_transports.clustershell.ClusterShellWorker.execute.call_count == 2
+
+    @mock.patch("wmflib.decorators.time.sleep", return_value=None)
+    def test_check_core_masters_heartbeats_parallel_retry_pending(self, mocked_sleep):
+        """Should poll again only the masters of the sections not yet in sync."""
+        hosts = nodeset(EQIAD_CORE_MASTERS_QUERY)
+        self._mock_core_masters_query(hosts, sections=("s6", "s5"))
+        heartbeats = {
+            "s6": datetime(2018, 9, 6, 10, 0, 0, tzinfo=UTC),
+            "s5": datetime(2018, 9, 6, 10, 0, 0, tzinfo=UTC),
+        }
+        retvals = [
+            [("db1001", b"s6\t2018-09-06T10:00:01.000000"), ("db1002", b"s5\t2018-09-06T10:00:00.000000")],
+            [("db1002", b"s5\t2018-09-06T10:00:00.000000")],
+            [("db1002", b"s5\t2018-09-06T10:00:01.000000")],
+        ]
+        mock_cumin(self.mocked_transports, 0, retvals=retvals)
+        with mock.patch("spicerack.remote.transports.Target", wraps=Target) as mocked_target:
+            self.mysql.check_core_masters_heartbeats_parallel("eqiad", "codfw", heartbeats)
+
+        assert mocked_sleep.call_count == 1
+        assert [call.args[0] for call in mocked_target.call_args_list] == [
+            nodeset("db10[01-02]"),
+            nodeset("db1002"),
+            nodeset("db1002"),
+        ]
+        assert self.mocked_remote.query.call_args_list == self._core_masters_queries(
+            "eqiad", ("s6", "s5"), "db[1001-1002]"
+        )
+
+    def test_check_core_masters_heartbeats_parallel_in_sync(self):
+        """Should query only the masters of the given sections and not poll again if they are in sync."""
+        hosts = nodeset(EQIAD_CORE_MASTERS_QUERY)
+        self._mock_core_masters_query(hosts, sections=("s1",))
+        mock_cumin(
+            self.mocked_transports,
+            0,
+            retvals=[self._heartbeats_output(hosts, "2018-09-06T10:00:01.000000", sections=("s1",))],
+        )
+        with mock.patch.object(
+            mysql.MysqlRemoteHosts, "run_query", autospec=True, side_effect=mysql.MysqlRemoteHosts.run_query
+        ) as mocked_run_query:
+            self.mysql.check_core_masters_heartbeats_parallel(
+                "eqiad", "codfw", {"s1": datetime(2018, 9, 6, 10, 0, 0, tzinfo=UTC)}
+            )
+
+        assert self.mocked_transports.clustershell.ClusterShellWorker.execute.call_count == 1
+        assert self.mocked_remote.query.call_args_list == self._core_masters_queries("eqiad", ("s1",), "db1008")
+        assert "shard IN ('s1')" in mocked_run_query.call_args.args[1]
+
+    @mock.patch("wmflib.decorators.time.sleep", return_value=None)
+    def test_check_core_masters_heartbeats_parallel_not_in_sync(self, mocked_sleep):
+        """Should raise MysqlError if a master is still not in sync after all the retries."""
+        hosts = nodeset(EQIAD_CORE_MASTERS_QUERY)
+        self._mock_core_masters_query(hosts, sections=("s1",))
+        retvals = [[("db1008", b"s1\t2018-09-06T10:00:00.000000")]] * 4
+        mock_cumin(self.mocked_transports, 0, retvals=retvals)
+        with pytest.raises(mysql.MysqlError, match=r"Heartbeat from core masters not yet in sync for sections: s1:"):
+            self.mysql.check_core_masters_heartbeats_parallel(
+                "eqiad", "codfw", {"s1": datetime(2018, 9, 6, 10, 0, 0, tzinfo=UTC)}
+            )
+
+        assert mocked_sleep.call_count == 2
+
+    def test_check_core_masters_heartbeats_parallel_invalid(self):
+        """Should raise MysqlError if the heartbeats include invalid sections."""
+        with pytest.raises(mysql.MysqlError, match=r"Got invalid sections \['s99'\]"):
+            self.mysql.check_core_masters_heartbeats_parallel("eqiad", "codfw", {"s99": datetime.now(UTC)})
+
+        assert not self.mocked_remote.query.called
+
+    def test_check_core_masters_heartbeats_parallel_empty(self):
+        """Should not query any master if there are no heartbeats to check."""
+        self.mysql.check_core_masters_heartbeats_parallel("eqiad", "codfw", {})
+        assert not self.mocked_remote.query.called
+
+    def test_get_core_masters_heartbeats_parallel_missing(self):
+        """Should raise MysqlError if unable to get the heartbeat of any section."""
+        hosts = nodeset(EQIAD_CORE_MASTERS_QUERY)
+        self._mock_core_masters_query(hosts)
+        retvals = [self._heartbeats_output(hosts, "2018-09-06T10:00:00.000000")[1:]]
+        mock_cumin(self.mocked_transports, 0, retvals=retvals)
+        with pytest.raises(mysql.MysqlError, match=r"Unable to get heartbeat from masters .* for sections: s6"):
+            self.mysql.get_core_masters_heartbeats_parallel("eqiad", "codfw")
+
+    def test_get_core_masters_heartbeats_parallel_other_section(self):
+        """Should ignore the heartbeat rows of other sections returned by a master."""
+        hosts = nodeset(EQIAD_CORE_MASTERS_QUERY)
+        self._mock_core_masters_query(hosts)
+        retvals = self._heartbeats_output(hosts, "2018-09-06T10:00:00.000000")
+        retvals[0] = ("db1001", b"s6\t2018-09-06T10:00:00.000000\ns5\t2018-09-06T09:00:00.000000")
+        mock_cumin(self.mocked_transports, 0, retvals=[retvals])
+        heartbeats = self.mysql.get_core_masters_heartbeats_parallel("eqiad", "codfw")
+
+        assert heartbeats["s5"] == datetime(2018, 9, 6, 10, 0, 0, tzinfo=UTC)
+
+    def test_get_core_masters_heartbeats_parallel_wrong_data(self):
+        """Should raise MysqlError if unable to convert the heartbeat into a datetime."""
+        hosts = nodeset(EQIAD_CORE_MASTERS_QUERY)
+        self._mock_core_masters_query(hosts)
+        retvals = [[("db1001", b"s6\t2018-09-06-10:00:00.000000")]]
+        mock_cumin(self.mocked_transports, 0, retvals=retvals)
+        with pytest.raises(mysql.MysqlError, match="Unable to convert heartbeat '2018-09-06-10:00:00.000000' for s"):
+            self.mysql.get_core_masters_heartbeats_parallel("eqiad", "codfw")
+
+
+def _mock_session_settings(mocked_connection, **kwargs):
+    """Set the session settings that pymysql stores in the connection instance, not known by autospec."""
+    settings = {
+        "charset": "utf8mb4",
+        "collation": None,
+        "sql_mode": None,
+        "init_command": None,
+        "autocommit_mode": False,
+        **kwargs,
+    }
+    mocked_connection.return_value.configure_mock(**settings)
+
 
 class TestMysqlClient:
     """MysqlClient class tests."""
@@ -952,3 +1176,144 @@ class TestMysqlClient:
                 execute.assert_called_once_with("SET SESSION TRANSACTION READ ONLY")
             else:
                 execute.assert_not_called()
+
+    @mock.patch("spicerack.mysql.Connection", autospec=True)
+    def test_connect_pool_reuse(self, mocked_pymsql_connection):
+        """It should reuse the idle pooled connection with the same parameters, resetting its session."""
+        _mock_session_settings(mocked_pymsql_connection)
+        my = mysql.MysqlClient(dry_run=False, pool=True)
+        with my.connect(host="db1001") as conn:
+            conn.cursor.return_value.__enter__.return_value.fetchone.return_value = (None,)
+
+        conn.close.assert_not_called()  # pylint: disable=maybe-no-member
+        conn._execute_command.assert_called_once_with(  # pylint: disable=maybe-no-member,protected-access
+            mysql.COM_RESET_CONNECTION, b""
+        )
+        conn._read_ok_packet.assert_called_once_with()  # pylint: disable=maybe-no-member,protected-access
+        conn.set_character_set.assert_called_once_with("utf8mb4", None)  # pylint: disable=maybe-no-member
+        conn.autocommit.assert_called_once_with(False)  # pylint: disable=maybe-no-member
+        conn.cursor.return_value.__enter__.return_value.execute.assert_called_once_with("SELECT DATABASE()")
+        with my.connect(host="db1001") as conn2:
+            assert conn2 is conn
+
+        conn.ping.assert_called_once_with(reconnect=False)  # pylint: disable=maybe-no-member
+        assert mocked_pymsql_connection.call_count == 1
+
+        my.close()
+        conn.close.assert_called_once_with()  # pylint: disable=maybe-no-member
+
+    @pytest.mark.parametrize("kwargs", ({"database": "enwiki"}, {"db": "enwiki"}))
+    @mock.patch("spicerack.mysql.Connection", autospec=True)
+    def test_connect_pool_reset_database(self, mocked_pymsql_connection, kwargs):
+        """It should select again the database passed as parameter and set again the read-only mode after the reset."""
+        _mock_session_settings(mocked_pymsql_connection)
+        my = mysql.MysqlClient(dry_run=False, pool=True)
+        with my.connect(read_only=True, **kwargs) as conn:
+            execute = conn.cursor.return_value.__enter__.return_value.execute
+            execute.assert_called_once_with("SET SESSION TRANSACTION READ ONLY")
+
+        conn.select_db.assert_called_once_with("enwiki")  # pylint: disable=maybe-no-member
+        assert execute.call_args_list == [mock.call("SET SESSION TRANSACTION READ ONLY")] * 2
+        with my.connect(read_only=True, **kwargs) as conn2:
+            assert conn2 is conn
+
+        assert mocked_pymsql_connection.call_count == 1
+
+    @mock.patch("spicerack.mysql.Connection", autospec=True)
+    def test_connect_pool_reset_session_settings(self, mocked_pymsql_connection):
+        """It should initialize again the session settings of the connection after the reset, in pymysql's order."""
+        _mock_session_settings(
+            mocked_pymsql_connection, collation="utf8mb4_bin", sql_mode="TRADITIONAL", init_command="SET @a = 1"
+        )
+        my = mysql.MysqlClient(dry_run=False, pool=True)
+        with my.connect(database="enwiki") as conn:
+            pass
+
+        assert conn.method_calls[-7:] == [  # pylint: disable=maybe-no-member
+            mock.call._execute_command(mysql.COM_RESET_CONNECTION, b""),  # pylint: disable=protected-access
+            mock.call._read_ok_packet(),  # pylint: disable=protected-access
+            mock.call.set_character_set("utf8mb4", "utf8mb4_bin"),
+            mock.call.cursor(mysql.Cursor),
+            mock.call.cursor(mysql.Cursor),
+            mock.call.autocommit(False),
+            mock.call.select_db("enwiki"),
+        ]
+        execute = conn.cursor.return_value.__enter__.return_value.execute
+        assert execute.call_args_list == [mock.call("SET sql_mode=%s", ("TRADITIONAL",)), mock.call("SET @a = 1")]
+        conn.autocommit.assert_called_once_with(False)  # pylint: disable=maybe-no-member
+
+    @mock.patch("spicerack.mysql.Connection", autospec=True)
+    def test_connect_pool_reset_database_changed(self, mocked_pymsql_connection):
+        """It should not pool the connection if a database is left selected and none was passed as parameter."""
+        mocked_pymsql_connection.side_effect = lambda **_: mock.MagicMock()
+        my = mysql.MysqlClient(dry_run=False, pool=True)
+        with my.connect() as conn:
+            conn.cursor.return_value.__enter__.return_value.fetchone.return_value = ("enwiki",)
+
+        conn.close.assert_called_once_with()
+        with my.connect() as conn2:
+            assert conn2 is not conn
+
+    @mock.patch("spicerack.mysql.Connection", autospec=True)
+    def test_connect_pool_partitioned(self, mocked_pymsql_connection):
+        """It should not share pooled connections with different parameters or read-only mode."""
+        mocked_pymsql_connection.side_effect = lambda **_: mock.MagicMock()
+        my = mysql.MysqlClient(dry_run=False, pool=True)
+        connections = []
+        for kwargs in ({"host": "db1001"}, {"host": "db1002"}, {"host": "db1001", "read_only": True}):
+            with my.connect(**kwargs) as conn:
+                connections.append(conn)
+
+        assert len({id(conn) for conn in connections}) == 3
+        read_only_execute = connections[2].cursor.return_value.__enter__.return_value.execute
+        assert read_only_execute.call_args_list[0] == mock.call("SET SESSION TRANSACTION READ ONLY")
+
+    @mock.patch("spicerack.mysql.monotonic")
+    @mock.patch("spicerack.mysql.Connection", autospec=True)
+    def test_connect_pool_evict(self, mocked_pymsql_connection, mocked_monotonic):
+        """It should close and replace the pooled connections that are expired or fail the health check."""
+        mocked_pymsql_connection.side_effect = lambda **_: mock.MagicMock()
+        mocked_monotonic.side_effect = [100.0, 500.0, 510.0, 520.0, 530.0]
+        my = mysql.MysqlClient(dry_run=False, pool=True, max_idle=300)
+        with my.connect() as expired:
+            pass
+        with my.connect() as dead:
+            assert dead is not expired
+        expired.close.assert_called_once_with()
+
+        dead.ping.side_effect = mysql.MySQLError("gone")
+        with my.connect() as conn:
+            assert conn is not dead
+        dead.close.assert_called_once_with()
+        assert mocked_pymsql_connection.call_count == 3
+
+    @mock.patch("spicerack.mysql.Connection", autospec=True)
+    def test_connect_pool_error(self, mocked_pymsql_connection):
+        """It should close and discard the pooled connections on error or if the session reset fails."""
+        mocked_pymsql_connection.side_effect = lambda **_: mock.MagicMock()
+        my = mysql.MysqlClient(dry_run=False, pool=True)
+        with pytest.raises(ValueError, match="error"), my.connect() as failed:
+            raise ValueError("error")
+        failed.close.assert_called_once_with()
+
+        with my.connect() as broken:
+            assert broken is not failed
+            broken._execute_command.side_effect = mysql.MySQLError("gone")  # pylint: disable=protected-access
+            broken.close.side_effect = mysql.MySQLError("gone")
+
+        with my.connect() as conn:
+            assert conn is not broken
+        assert mocked_pymsql_connection.call_count == 3
+
+    @mock.patch("spicerack.mysql.Connection", autospec=True)
+    def test_connect_pool_no_reset_api(self, mocked_pymsql_connection, caplog):
+        """It should close the connection instead of pooling it if pymysql's private reset API is not available."""
+        mocked_pymsql_connection.side_effect = lambda **_: mock.MagicMock(spec=["close", "cursor", "ping"])
+        my = mysql.MysqlClient(dry_run=False, pool=True)
+        with caplog.at_level(logging.WARNING), my.connect() as conn:
+            pass
+
+        conn.close.assert_called_once_with()
+        assert "Unable to reset the MySQL session, not pooling the connection" in caplog.text
+        with my.connect() as conn2:
+            assert conn2 is not conn
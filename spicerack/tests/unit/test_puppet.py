@@ -1,6 +1,9 @@
 """Puppet module tests."""
 
 import json
+import logging
+import shlex
+import threading
 from collections import namedtuple
 from datetime import UTC, datetime, timedelta
 from unittest import mock
@@ -8,6 +11,7 @@ from unittest import mock
 import pytest
 from ClusterShell.MsgTree import MsgTreeElem
 from cumin import nodeset
+from wmflib.prometheus import Prometheus, PrometheusError
 
 from spicerack import puppet
 from spicerack.administrative import Reason
@@ -196,13 +200,16 @@ class TestPuppetHosts:
             ({"attempts": 5}, "--attempts 5"),
         ),
     )
-    def test_run_ok(self, kwargs, expected):
+    def test_run_ok(self, kwargs, expected, caplog):
         """It should run Puppet with the specified arguments."""
-        self.puppet_hosts.run(**kwargs)
+        with caplog.at_level(logging.INFO):
+            self.puppet_hosts.run(**kwargs)
+
         self.mocked_remote_hosts.run_sync.assert_called_once_with(
             puppet.Command(f"run-puppet-agent {expected}".strip(), timeout=300.0),
             batch_size=10,
         )
+        assert f"Running Puppet with args '{expected}' on 1 hosts" in caplog.text
 
     def test_run_timeout(self):
         """It should run Puppet with the customized timeout."""
@@ -211,6 +218,160 @@ class TestPuppetHosts:
             puppet.Command("run-puppet-agent ", timeout=30.0), batch_size=10
         )
 
+    def _mock_hosts(self, n_hosts, *, run_sync=None):
+        """Mock the hosts and the single host subsets on which Puppet is run, returning the list of the subsets."""
+        self.mocked_remote_hosts.hosts = nodeset(f"host[1-{n_hosts}]")
+        subsets = []
+
+        def get_subset(subset):
+            """Return a new mocked instance for each host."""
+            mocked_subset = mock.MagicMock(spec_set=RemoteHosts)
+            mocked_subset.hosts = subset
+            mocked_subset.run_sync.return_value = iter([(subset, MsgTreeElem(b"ok", parent=MsgTreeElem()))])
+            if run_sync is not None:
+                mocked_subset.run_sync.side_effect = lambda *_, **__: run_sync(str(subset))
+
+            subsets.append(mocked_subset)
+            return mocked_subset
+
+        self.mocked_remote_hosts.get_subset.side_effect = get_subset
+        return subsets
+
+    def test_run_adaptive_ok(self, caplog):
+        """It should run Puppet separately on each host without printing Cumin's output."""
+        subsets = self._mock_hosts(20)
+        concurrency = puppet.AdaptiveConcurrency(floor=2, initial=4, ceiling=8, increase=2)
+        with caplog.at_level(logging.INFO):
+            used = self.puppet_hosts.run_adaptive(concurrency=concurrency, quiet=True)
+
+        assert used[0] == 4
+        assert all(2 <= size <= 8 for size in used)
+        assert sorted(str(subset.hosts) for subset in subsets) == sorted(f"host{i}" for i in range(1, 21))
+        for subset in subsets:
+            subset.run_sync.assert_called_once_with(
+                puppet.Command("run-puppet-agent --quiet", timeout=300.0), print_output=False, print_progress_bars=False
+            )
+
+        self.mocked_remote_hosts.run_sync.assert_not_called()
+        assert f"Puppet runs performed with concurrency: {used}" in caplog.text
+
+    def test_run_adaptive_sliding_window(self):
+        """It should start a new Puppet run as soon as any run completes, without waiting for the slower ones."""
+        released = threading.Event()
+
+        def run_sync(host):
+            """Keep the run on host1 in flight until the one on host3, started after host2 completed, runs."""
+            if host == "host1":
+                assert released.wait(timeout=5), "host3 was not started while host1 was still running"
+            elif host == "host3":
+                released.set()
+
+            return iter(())
+
+        self._mock_hosts(3, run_sync=run_sync)
+        concurrency = puppet.AdaptiveConcurrency(floor=2, initial=2, ceiling=2)
+        assert self.puppet_hosts.run_adaptive(concurrency=concurrency) == [2]
+        assert released.is_set()
+
+    @pytest.mark.parametrize("max_failures, expected_hosts", ((0, 1), (1, 5)))
+    def test_run_adaptive_failure(self, max_failures, expected_hosts, caplog):
+        """It should stop starting new Puppet runs when too many hosts failed, raising at the end."""
+
+        def run_sync(host):
+            """Fail on the first host."""
+            if host == "host1":
+                raise RemoteExecutionError(1, "failed", iter(()))
+
+            return iter(())
+
+        subsets = self._mock_hosts(5, run_sync=run_sync)
+        concurrency = puppet.AdaptiveConcurrency(floor=1, initial=1, ceiling=1)
+        with pytest.raises(puppet.RemoteClusterExecutionError) as excinfo:
+            self.puppet_hosts.run_adaptive(concurrency=concurrency, max_failures=max_failures)
+
+        assert len(excinfo.value.failures) == 1
+        assert len(subsets) == expected_hosts
+        assert "Puppet run failed on host1" in caplog.text
+        assert ("Too many failed hosts (1), not starting any other Puppet run" in caplog.text) is (max_failures == 0)
+
+    @mock.patch("spicerack.puppet.time.monotonic", return_value=0)
+    def test_adaptive_window_grow(self, _mocked_monotonic):
+        """It should increase the concurrency after as many successful runs as the concurrency, up to the ceiling."""
+        window = puppet._AdaptiveWindow(  # pylint: disable=protected-access
+            puppet.AdaptiveConcurrency(floor=2, initial=2, ceiling=5, increase=2)
+        )
+        for _ in range(7):
+            window.completed(0, 10, failed=False)
+
+        assert window.size == 5
+        assert window.sizes == [2, 4, 5]
+
+    @mock.patch("spicerack.puppet.time.monotonic", return_value=0)
+    def test_adaptive_window_slowdown(self, _mocked_monotonic, caplog):
+        """It should halve the concurrency when the median duration is slower than the previous runs by the factor."""
+        window = puppet._AdaptiveWindow(  # pylint: disable=protected-access
+            puppet.AdaptiveConcurrency(floor=2, initial=4, ceiling=8, increase=4)
+        )
+        with caplog.at_level(logging.INFO):
+            for duration in (10, 10, 12, 100):  # A single slow run doesn't reduce the concurrency
+                window.completed(0, duration, failed=False)
+            for duration in (10, 20, 20, 20, 20, 30, 40, 50):
+                window.completed(0, duration, failed=False)
+
+        assert window.sizes == [4, 8, 4]
+        assert "Puppet runs took 20.0 seconds (median), previously 11.0, changing the Puppet runs concurrency" in (
+            caplog.text
+        )
+
+    @mock.patch("spicerack.puppet.time.monotonic")
+    def test_adaptive_window_failure(self, mocked_monotonic, caplog):
+        """It should halve the concurrency when too many runs failed, ignoring the runs started before the change."""
+        mocked_monotonic.return_value = 0
+        window = puppet._AdaptiveWindow(  # pylint: disable=protected-access
+            puppet.AdaptiveConcurrency(floor=2, initial=4, ceiling=8, increase=4, max_failure_rate=0.25)
+        )
+        mocked_monotonic.return_value = 100
+        with caplog.at_level(logging.INFO):
+            for failed in (True, False, False, False):  # A single failure within the rate doesn't reduce it
+                window.completed(0, 10, failed=failed)
+            for failed in (True, True, False, False):
+                window.completed(50, 1, failed=failed)  # Started before the previous change
+            for failed in (True, True, True, False, False, False, False, False):
+                window.completed(100, 10, failed=failed)
+
+        assert window.sizes == [4, 8, 4]
+        assert "3 of 8 Puppet runs failed, changing the Puppet runs concurrency from 8 to 4" in caplog.text
+
+    @mock.patch("spicerack.puppet.time.monotonic", return_value=0)
+    def test_adaptive_window_load(self, _mocked_monotonic, caplog):
+        """It should halve the concurrency instead of increasing it if the puppetservers load is too high."""
+        load = mock.Mock(side_effect=[0.9, 0.5])
+        window = puppet._AdaptiveWindow(  # pylint: disable=protected-access
+            puppet.AdaptiveConcurrency(floor=2, initial=4, ceiling=8, increase=4, load=load)
+        )
+        with caplog.at_level(logging.INFO):
+            for _ in range(6):
+                window.completed(0, 10, failed=False)
+
+        assert window.sizes == [4, 2, 6]
+        assert "Puppetservers load is 0.90, changing the Puppet runs concurrency from 4 to 2" in caplog.text
+
+    @pytest.mark.parametrize(
+        "kwargs, message",
+        (
+            ({"floor": 0}, "must be 0 < floor <= initial <= ceiling, got floor=0, initial=10, ceiling=50"),
+            ({"initial": 60}, "must be 0 < floor <= initial <= ceiling, got floor=5, initial=60, ceiling=50"),
+            ({"increase": 0}, "increase must be >= 1 and slowdown_factor >= 1.0, got increase=0"),
+            ({"slowdown_factor": 0.5}, "got increase=5, slowdown_factor=0.5"),
+            ({"max_failure_rate": 1.5}, "got max_failure_rate=1.5, history=50"),
+            ({"history": 0}, "got max_failure_rate=0.2, history=0"),
+        ),
+    )
+    def test_adaptive_concurrency_invalid(self, kwargs, message):
+        """It should raise PuppetHostsError if the adaptive concurrency parameters are invalid."""
+        with pytest.raises(puppet.PuppetHostsError, match=message):
+            puppet.AdaptiveConcurrency(**kwargs)
+
     def test_first_run(self):
         """It should enable and Puppet with a very long timeout without using custom wrappers."""
         self.puppet_hosts.first_run()
@@ -542,6 +703,137 @@ class TestPuppetServer:
             "puppet node clean test.example.com", "puppet node deactivate test.example.com", print_progress_bars=False
         )
 
+    def _set_ca_list(self, *listings):
+        """Set the outputs of the Puppet CA listings of all the certificates, interleaved with empty outputs."""
+        side_effects = []
+        for listing in listings:
+            if listing is None:  # Non-listing command
+                side_effects.append(iter(()))
+                continue
+
+            output = {}
+            for name, state in listing.items():
+                output.setdefault(state, []).append(
+                    {"name": name, "state": state, "fingerprint": f"00:{name[:4].upper()}", "dns_alt_names": []}
+                )
+            message = MsgTreeElem(json.dumps(output).encode(), parent=MsgTreeElem())
+            side_effects.append(iter([(nodeset("puppetserver.example.com"), message)]))
+
+        self.mocked_server_host.run_sync.side_effect = side_effects
+
+    def test_get_certificates_metadata(self):
+        """It should return the metadata of the certificates of the given hosts found with a single listing."""
+        self._set_ca_list(
+            {"host1.example.com": "signed", "host2.example.com": "requested", "other.example.com": "signed"}
+        )
+        certificates = self.puppet_server.get_certificates_metadata(
+            ["host1.example.com", "host2.example.com", "host3.example.com"]
+        )
+        assert {name: cert["state"] for name, cert in certificates.items()} == {
+            "host1.example.com": "signed",
+            "host2.example.com": "requested",
+        }
+        self.mocked_server_host.run_sync.assert_called_once_with(
+            "puppetserver ca list --all --format json", is_safe=True, print_output=False, print_progress_bars=False
+        )
+
+    def test_get_certificates_metadata_invalid(self):
+        """It should raise PuppetServerError if the listing is not a dictionary."""
+        self.mocked_server_host.run_sync.return_value = iter(
+            [(nodeset("puppetserver.example.com"), MsgTreeElem(b"[]", parent=MsgTreeElem()))]
+        )
+        with pytest.raises(puppet.PuppetServerError, match="Expected a dict from Puppet CA, got: "):
+            self.puppet_server.get_certificates_metadata(["host1.example.com"])
+
+    def test_delete_hosts(self):
+        """It should delete all the hosts from Puppet master and PuppetDB with one command per action."""
+        self.puppet_server.delete_hosts(["host1.example.com", "host2.example.com"])
+        self.puppet_server.delete_hosts([])
+        self.mocked_server_host.run_sync.assert_called_once_with(
+            "puppet node clean host1.example.com host2.example.com",
+            "puppet node deactivate host1.example.com host2.example.com",
+            print_progress_bars=False,
+        )
+
+    def test_destroy_certificates(self, caplog):
+        """It should clean all the existing certificates with a single command, skipping the missing ones."""
+        self._set_ca_list({"host1.example.com": "signed", "host3.example.com": "requested"}, None)
+        with caplog.at_level(logging.INFO):
+            self.puppet_server.destroy_certificates(["host1.example.com", "host2.example.com", "host3.example.com"])
+
+        assert "The certificates for host2.example.com do not exist" in caplog.text
+        self.mocked_server_host.run_sync.assert_called_with(
+            "puppetserver ca clean --certname host1.example.com,host3.example.com", print_progress_bars=False
+        )
+
+    def test_destroy_certificates_all_missing(self):
+        """It should not clean anything if all the certificates are already missing."""
+        self._set_ca_list({})
+        self.puppet_server.destroy_certificates(["host1.example.com"])
+        self.mocked_server_host.run_sync.assert_called_once()
+
+    def test_sign_certificates(self):
+        """It should sign all the CSRs with a single command, checking them with a listing before and after."""
+        hosts = {"host1.example.com": "00:HOST", "host2.example.com": "00:HOST"}
+        self._set_ca_list(dict.fromkeys(hosts, "requested"), None, dict.fromkeys(hosts, "signed"))
+        self.puppet_server.sign_certificates(hosts)
+        assert self.mocked_server_host.run_sync.call_count == 3
+        assert self.mocked_server_host.run_sync.call_args_list[1] == mock.call(
+            "puppetserver ca sign --certname host1.example.com,host2.example.com",
+            print_output=False,
+            print_progress_bars=False,
+        )
+
+    def test_sign_certificates_invalid(self):
+        """It should raise PuppetServerError with all the problems found without signing anything."""
+        self._set_ca_list({"host1.example.com": "signed", "host2.example.com": "requested"})
+        with pytest.raises(
+            puppet.PuppetServerError,
+            match=(
+                "Unable to sign the certificates: certificate for host1.example.com not in requested state, got: "
+                "signed; CSR fingerprint 00:HOST for host2.example.com does not match provided fingerprint 00:BB; "
+                "no CSR found for host3.example.com"
+            ),
+        ):
+            self.puppet_server.sign_certificates(
+                {"host1.example.com": "00:HOST", "host2.example.com": "00:BB", "host3.example.com": "00:HOST"}
+            )
+
+        self.mocked_server_host.run_sync.assert_called_once()
+
+    def test_sign_certificates_not_signed(self):
+        """It should raise PuppetServerError if any certificate is not signed after signing."""
+        hosts = {"host1.example.com": "00:HOST", "host2.example.com": "00:HOST"}
+        self._set_ca_list(dict.fromkeys(hosts, "requested"), None, {"host1.example.com": "signed"})
+        with pytest.raises(
+            puppet.PuppetServerError, match="Expected certificates to be signed, got: {'host2.example.com': 'missing'}"
+        ):
+            self.puppet_server.sign_certificates(hosts)
+
+    def test_sign_certificates_empty(self):
+        """It should do nothing if there are no certificates to sign."""
+        self.puppet_server.sign_certificates({})
+        self.mocked_server_host.run_sync.assert_not_called()
+
+    @mock.patch("wmflib.decorators.time.sleep", return_value=None)
+    def test_wait_for_csrs(self, mocked_sleep):
+        """It should poll with a single listing per try until all the CSRs are present."""
+        self._set_ca_list(
+            {"host1.example.com": "requested"}, {"host1.example.com": "requested", "host2.example.com": "requested"}
+        )
+        self.puppet_server.wait_for_csrs(["host1.example.com", "host2.example.com"])
+        assert self.mocked_server_host.run_sync.call_count == 2
+        assert mocked_sleep.call_count == 1
+
+    def test_wait_for_csrs_wrong_state(self):
+        """It should raise PuppetServerError if any certificate is not in requested state."""
+        self._set_ca_list({"host1.example.com": "signed"})
+        with pytest.raises(
+            puppet.PuppetServerError,
+            match="Expected certificates in requested state, got: {'host1.example.com': 'signed'}",
+        ):
+            self.puppet_server.wait_for_csrs(["host1.example.com", "host2.example.com"])
+
     def test_destroy_ok(self):
         """It should delete the certificate of the host in the Puppet CA."""
         results = [
@@ -880,3 +1172,144 @@ class TestPuppetServer:
             print_output=False,
             print_progress_bars=False,
         )
+
+    def _set_hiera_lookups_output(self, *values, return_codes=None):
+        """Set the output of a batched Hiera lookup with the given values."""
+        if return_codes is None:
+            return_codes = [0] * len(values)
+        lines = []
+        for index, (value, return_code) in enumerate(zip(values, return_codes, strict=True)):
+            lines += ["", puppet.HIERA_LOOKUP_MARKER.format(index=index, return_code=return_code), *value.splitlines()]
+
+        message = MsgTreeElem()
+        for line in lines:
+            message = message.append(line.encode())
+        self.mocked_server_host.run_sync.return_value = iter([(nodeset("puppetserver.example.com"), message)])
+
+    def test_hiera_lookups(self):
+        """It should lookup all the keys for all the hosts in a single command, a process for each host."""
+        self._set_hiera_lookups_output("---\nmisc", "eqiad", "---\nother", "codfw")
+        values = self.puppet_server.hiera_lookups(["host1.example.com", "host2.example.com"], ["cluster", "site"])
+        assert values == {
+            "host1.example.com": {"cluster": "---\nmisc", "site": "eqiad"},
+            "host2.example.com": {"cluster": "---\nother", "site": "codfw"},
+        }
+        self.mocked_server_host.run_sync.assert_called_once()
+        command = self.mocked_server_host.run_sync.call_args.args[0]
+        assert command.startswith("bash -c ")
+        script = shlex.split(command)[2]
+        assert script.count("throttle; ( ") == 2
+        assert script.count(") 2>/dev/null & ") == 2
+        assert f'-ge {puppet.HIERA_LOOKUP_MAX_PARALLEL} ]; do wait -n; done; }}' in script
+        assert (
+            '( puppet lookup --render-as s --compile --node host1.example.com cluster > "$d/0" 2> "$d/0.err"; '
+            'echo $? > "$d/0.rc"; puppet lookup --render-as s --compile --node host1.example.com site > "$d/1" '
+            '2> "$d/1.err"; echo $? > "$d/1.rc" )'
+        ) in script
+        assert "for i in $(seq 0 3); do" in script
+        assert 'if [ "$rc" = "0" ]; then cat "$d/$i"; else cat "$d/$i.err"; fi; done' in script
+
+    def test_hiera_lookups_cached(self):
+        """It should lookup only the values not already cached by the same instance for the same format."""
+        self._set_hiera_lookups_output("misc")
+        assert self.puppet_server.hiera_lookups(["host1.example.com"], ["cluster"]) == {
+            "host1.example.com": {"cluster": "misc"}
+        }
+        self._set_hiera_lookups_output("other")
+        assert self.puppet_server.hiera_lookups(["host1.example.com", "host2.example.com"], ["cluster"]) == {
+            "host1.example.com": {"cluster": "misc"},
+            "host2.example.com": {"cluster": "other"},
+        }
+        assert "host1.example.com" not in self.mocked_server_host.run_sync.call_args.args[0]
+        self._set_hiera_lookups_output('"misc"')
+        assert self.puppet_server.hiera_lookups(["host1.example.com"], ["cluster"], fmt="json") == {
+            "host1.example.com": {"cluster": '"misc"'}
+        }
+        self._set_hiera_lookups_output("new")
+        assert puppet.PuppetServer(self.mocked_server_host).hiera_lookups(["host1.example.com"], ["cluster"]) == {
+            "host1.example.com": {"cluster": "new"}
+        }
+        assert self.mocked_server_host.run_sync.call_count == 4
+
+    def test_hiera_lookups_clear_cache(self):
+        """It should lookup again the values after clearing the cache."""
+        self._set_hiera_lookups_output("misc")
+        self.puppet_server.hiera_lookups(["host1.example.com"], ["cluster"])
+        self.puppet_server.clear_hiera_cache()
+        self._set_hiera_lookups_output("other")
+        assert self.puppet_server.hiera_lookups(["host1.example.com"], ["cluster"]) == {
+            "host1.example.com": {"cluster": "other"}
+        }
+        assert self.mocked_server_host.run_sync.call_count == 2
+
+    def test_hiera_lookups_failed(self):
+        """It should raise PuppetServerError with all the failed lookups and their error output, caching nothing."""
+        self._set_hiera_lookups_output("Error: Could not find node\n", "eqiad", "", return_codes=[1, 0, ""])
+        with pytest.raises(
+            puppet.PuppetServerError,
+            match=r"Failed Hiera lookups: cluster on host1.example.com \(rc: 1\): Error: Could not find node; cluster "
+            r"on host2.example.com \(rc: unknown\): no error output$",
+        ):
+            self.puppet_server.hiera_lookups(["host1.example.com", "host2.example.com"], ["cluster", "site"])
+
+        assert not self.puppet_server._hiera_cache  # pylint: disable=protected-access
+
+    def test_hiera_lookups_missing(self):
+        """It should raise PuppetServerError if the output doesn't have the results for all the lookups."""
+        self._set_hiera_lookups_output("misc")
+        with pytest.raises(puppet.PuppetServerError, match="Expected 2 Hiera lookups results, got 1"):
+            self.puppet_server.hiera_lookups(["host1.example.com"], ["cluster", "site"])
+
+    @mock.patch("spicerack.puppet.HIERA_LOOKUP_MAX_HOSTS", 1)
+    def test_hiera_lookups_split(self):
+        """It should split the hosts in multiple executions and limit the parallel processes to max_parallel."""
+        self._set_hiera_lookups_output("misc", "eqiad")
+        first = self.mocked_server_host.run_sync.return_value
+        self._set_hiera_lookups_output("other", "codfw")
+        self.mocked_server_host.run_sync.side_effect = [first, self.mocked_server_host.run_sync.return_value]
+        values = self.puppet_server.hiera_lookups(
+            ["host1.example.com", "host2.example.com"], ["cluster", "site"], max_parallel=2
+        )
+        assert values == {
+            "host1.example.com": {"cluster": "misc", "site": "eqiad"},
+            "host2.example.com": {"cluster": "other", "site": "codfw"},
+        }
+        assert self.mocked_server_host.run_sync.call_count == 2
+        script = shlex.split(self.mocked_server_host.run_sync.call_args.args[0])[2]
+        assert "host1.example.com" not in script
+        assert "-ge 2 ]; do wait -n; done; }" in script
+
+    def test_hiera_lookups_invalid_max_parallel(self):
+        """It should raise PuppetServerError if max_parallel is not positive."""
+        with pytest.raises(puppet.PuppetServerError, match="must be positive, got 0"):
+            self.puppet_server.hiera_lookups(["host1.example.com"], ["cluster"], max_parallel=0)
+
+    def test_hiera_lookups_empty(self):
+        """It should not run anything if there are no lookups to perform."""
+        assert self.puppet_server.hiera_lookups([], ["cluster"]) == {}
+        self.mocked_server_host.run_sync.assert_not_called()
+
+
+class TestPuppetserverLoad:
+    """Test class for the PuppetserverLoad class."""
+
+    def test_call(self, caplog):
+        """It should return the highest load among all the sites, skipping the ones that failed."""
+        mocked_prometheus = mock.MagicMock(spec_set=Prometheus)
+        mocked_prometheus.query.side_effect = [
+            [{"metric": {}, "value": [1636569623.988, "0.25"]}, {"metric": {}, "value": [1636569623.988, "0.5"]}],
+            PrometheusError("unavailable"),
+        ]
+        load = puppet.PuppetserverLoad(mocked_prometheus, ["eqiad", "codfw"], query="some_query")
+        with caplog.at_level(logging.WARNING):
+            assert load() == 0.5
+
+        assert "Unable to get the puppetservers load in codfw from Prometheus: unavailable" in caplog.text
+        mocked_prometheus.query.assert_has_calls([mock.call("some_query", "eqiad"), mock.call("some_query", "codfw")])
+
+    def test_call_no_metrics(self):
+        """It should return zero if there are no metrics."""
+        mocked_prometheus = mock.MagicMock(spec_set=Prometheus)
+        mocked_prometheus.query.return_value = []
+        assert puppet.PuppetserverLoad(mocked_prometheus, ["eqiad"])() == 0.0
+        mocked_prometheus.query.assert_called_once_with(puppet.PUPPETSERVER_JRUBY_LOAD_QUERY, "eqiad")
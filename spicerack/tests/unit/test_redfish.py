@@ -1,7 +1,9 @@
 """Redfish module tests."""
 
 import ipaddress
+import json
 import logging
+import threading
 from copy import deepcopy
 from datetime import UTC, datetime
 from io import BytesIO
@@ -473,6 +475,8 @@ class TestRedfish:
         self.redfish = RedfishTest("test01", interface, "root", "mysecret", dry_run=False)
         self.redfish_dry_run = RedfishTest("test01", interface, "root", "mysecret", dry_run=True)
         self.requests_mock = requests_mock
+        with mock.patch.dict(redfish.LOG_QUERY_SUPPORT, clear=True):
+            yield
 
     def test_property_magic_str(self):
         """It should equal the fqdn."""
@@ -508,11 +512,105 @@ class TestRedfish:
     def test_wait_reboot_since_to_early(self, _mocked_sleep):
         """It should raise an error if the reboot time is to early."""
         self.requests_mock.get("/redfish", json={"v1": "/redfish/v1/"})
+        self.requests_mock.get(self.redfish.oob_manager, json=MANAGER_RESPONSE)
         self.requests_mock.get(self.redfish.log_entries, json=LCLOG_RESPONSE_NO_MESSAGE)
         since = datetime.fromisoformat("2022-01-01T00:05:00-00:00")
         with pytest.raises(redfish.RedfishError, match="no new reboot detected"):
             self.redfish.wait_reboot_since(since)
 
+    def test_last_reboot_incremental(self):
+        """It should fetch only the new log entries, following the pagination, if the query is supported."""
+        newer_entry = deepcopy(LCLOG_RESPONSE["Members"][2])
+        newer_entry["Created"] = "2022-06-22T17:30:00-05:00"
+        newest_entry = deepcopy(LCLOG_RESPONSE["Members"][2])
+        newest_entry["Created"] = "2022-06-22T17:45:00-05:00"
+        self.requests_mock.get(self.redfish.oob_manager, json=MANAGER_RESPONSE)
+        self.requests_mock.get(
+            self.redfish.log_entries,
+            [
+                {"json": LCLOG_RESPONSE},  # Initial full scan
+                {"json": {"Members": []}},  # Query support probe in the future
+                {"json": {"Members": LCLOG_RESPONSE["Members"][:1]}},  # Query support probe of the seen entries
+                {"json": {"Members": [newer_entry], "Members@odata.nextLink": f"{self.redfish.log_entries}?$skip=1"}},
+                {"json": {"Members": [newest_entry]}},
+            ],
+        )
+
+        assert self.redfish.last_reboot() == datetime.fromisoformat("2022-06-22T16:42:55-05:00")
+        assert self.redfish.last_reboot() == datetime.fromisoformat("2022-06-22T17:45:00-05:00")
+        assert redfish.LOG_QUERY_SUPPORT == {("RedfishTest", "6.0.30.0"): True}
+        assert self.requests_mock.request_history[-4].qs["$filter"][0].startswith("created ge '")
+        assert self.requests_mock.request_history[-3].qs["$filter"] == ["created ge '2022-06-22t17:01:17-05:00'"]
+        query = self.requests_mock.request_history[-2].qs
+        assert query["$filter"] == ["created ge '2022-06-22t17:01:17-05:00'"]  # requests_mock lowercases the values
+        assert "$filter" not in self.requests_mock.request_history[-1].qs
+
+    def test_last_reboot_incremental_same_second(self):
+        """It should include the log entries created in the same second of the most recent one, skipping the seen."""
+        same_second_reboot = deepcopy(LCLOG_RESPONSE["Members"][2])
+        same_second_reboot["Id"] = "1736"
+        same_second_reboot["Created"] = LCLOG_RESPONSE["Members"][0]["Created"]
+        self.requests_mock.get(self.redfish.oob_manager, json=MANAGER_RESPONSE)
+        self.requests_mock.get(
+            self.redfish.log_entries,
+            [
+                {"json": LCLOG_RESPONSE},  # Initial full scan
+                {"json": {"Members": []}},  # Query support probe in the future
+                {"json": {"Members": LCLOG_RESPONSE["Members"][:1]}},  # Query support probe of the seen entries
+                {"json": {"Members": [LCLOG_RESPONSE["Members"][0], same_second_reboot]}},
+                {"json": {"Members": [LCLOG_RESPONSE["Members"][0], same_second_reboot]}},
+            ],
+        )
+
+        assert self.redfish.last_reboot() == datetime.fromisoformat("2022-06-22T16:42:55-05:00")
+        assert self.redfish.last_reboot() == datetime.fromisoformat("2022-06-22T17:01:17-05:00")
+        assert self.redfish.last_reboot() == datetime.fromisoformat("2022-06-22T17:01:17-05:00")
+        assert self.redfish._log_cursor_ids == {"1735", "1736"}  # pylint: disable=protected-access
+        query = self.requests_mock.request_history[-1].qs
+        assert query["$filter"] == ["created ge '2022-06-22t17:01:17-05:00'"]
+
+    def test_last_reboot_incremental_too_many_pages(self):
+        """It should fall back to scan the most recent log entries if the filtered query returns too many pages."""
+        page = {
+            "Members": LCLOG_RESPONSE["Members"][:1],
+            "Members@odata.nextLink": f"{self.redfish.log_entries}?$skip=1",
+        }
+        self.requests_mock.get(self.redfish.oob_manager, json=MANAGER_RESPONSE)
+        self.requests_mock.get(
+            self.redfish.log_entries,
+            [{"json": LCLOG_RESPONSE}, {"json": {"Members": []}}, {"json": page}]
+            + [{"json": page}] * redfish.LOG_QUERY_MAX_PAGES
+            + [{"json": LCLOG_RESPONSE_NO_MESSAGE}],
+        )
+
+        assert self.redfish.last_reboot() == datetime.fromisoformat("2022-06-22T16:42:55-05:00")
+        assert self.redfish.last_reboot() == datetime.fromisoformat("2022-06-22T16:42:55-05:00")
+        assert redfish.LOG_QUERY_SUPPORT == {("RedfishTest", "6.0.30.0"): False}
+        log_requests = [r for r in self.requests_mock.request_history if r.path == self.redfish.log_entries.lower()]
+        assert len(log_requests) == redfish.LOG_QUERY_MAX_PAGES + 4
+        assert self.requests_mock.request_history[-1].qs == {}
+
+    @pytest.mark.parametrize(
+        "probes",
+        (
+            [{"status_code": 400, "json": {"error": {"message": "Querying is not supported by the implementation"}}}],
+            [{"json": LCLOG_RESPONSE}],  # $filter ignored
+            [{"json": {"Members": []}}, {"json": {"Members": []}}],  # $filter never matching
+            [{"json": {"Members": []}}, {"json": {"Members": LCLOG_RESPONSE["Members"][1:]}}],  # Seen entries missing
+        ),
+    )
+    def test_last_reboot_query_not_supported(self, probes):
+        """It should scan again the most recent log entries and keep the most recent reboot ever seen."""
+        self.requests_mock.get(self.redfish.oob_manager, json=MANAGER_RESPONSE)
+        self.requests_mock.get(
+            self.redfish.log_entries, [{"json": LCLOG_RESPONSE}, *probes, {"json": LCLOG_RESPONSE_NO_MESSAGE}]
+        )
+
+        assert self.redfish.last_reboot() == datetime.fromisoformat("2022-06-22T16:42:55-05:00")
+        assert self.redfish.last_reboot() == datetime.fromisoformat("2022-06-22T16:42:55-05:00")
+        assert redfish.LOG_QUERY_SUPPORT == {("RedfishTest", "6.0.30.0"): False}
+        assert self.requests_mock.request_history[-1].qs == {}
+
     def test_property_system_info(self):
         """It should return the firmware."""
         self.requests_mock.get(self.redfish.system_manager, json=SYSTEM_MANAGER_RESPONSE)
@@ -1112,8 +1210,81 @@ class TestDellSCP:
 
     def test_empty_components(self):
         """It should empty the components of the current configuration."""
+        self.config.set("Some.Component.1", "Some.Attribute.1", "new value")
         self.config.empty_components()
         assert self.config.components == {}
+        assert self.config.changes == {}
+
+    def test_changes(self):
+        """It should return only the attributes changed or added, in the same format of the components."""
+        self.config_allow_new.update(
+            {
+                "Some.Component.2": {"Some.Attribute.2": "new value", "Some.Attribute.1": "value"},
+                "Some.Component.1": {"New.Attribute.1": "new value"},
+            }
+        )
+        assert self.config_allow_new.changes == {
+            "Some.Component.1": {"New.Attribute.1": "new value"},
+            "Some.Component.2": {"Some.Attribute.2": "new value"},
+        }
+
+    def test_diff(self):
+        """It should return the subset of the desired configuration that differs, without changing the config."""
+        desired = {
+            "Some.Component.1": {"Some.Attribute.1": "value", "New.Attribute.1": "value"},
+            "Some.Component.2": {"Some.Attribute.2": "new value"},
+            "List.Component.1": {"Comma.Separated.List.1": "value1, value2"},
+            "New.Component.1": {"Some.Attribute.1": "value"},
+        }
+        assert self.config.diff(desired) == {
+            "Some.Component.1": {"New.Attribute.1": "value"},
+            "Some.Component.2": {"Some.Attribute.2": "new value"},
+            "New.Component.1": {"Some.Attribute.1": "value"},
+        }
+        assert self.config.config == DELL_SCP
+        assert self.config.changes == {}
+
+    def test_minimal(self):
+        """It should return a new configuration with only the changed attributes and the rest of the config."""
+        self.config.update(
+            {
+                "Some.Component.2": {"Some.Attribute.1": "new value", "Some.Attribute.2": "value"},
+                "List.Component.1": {"Comma.Separated.List.1": "value3"},
+            }
+        )
+        minimal = self.config.minimal()
+        assert minimal.target is redfish.DellSCPTargetPolicy.ALL
+        assert minimal.service_tag == "12ABC34"
+        assert minimal.comments == ["First comment"]
+        assert minimal.config["SystemConfiguration"]["Components"] == [
+            {
+                "FQDD": "List.Component.1",
+                "Attributes": [
+                    {
+                        "Comment": "Read and Write",
+                        "Name": "Comma.Separated.List.1",
+                        "Set On Import": "True",
+                        "Value": "value3",
+                    }
+                ],
+            },
+            {
+                "FQDD": "Some.Component.2",
+                "Attributes": [
+                    {
+                        "Comment": "Read and Write",
+                        "Name": "Some.Attribute.1",
+                        "Set On Import": "True",
+                        "Value": "new value",
+                    }
+                ],
+            },
+        ]
+        assert len(self.config.config["SystemConfiguration"]["Components"]) == 3
+
+    def test_minimal_no_changes(self):
+        """It should return a configuration without components if nothing was changed."""
+        assert self.config.minimal().components == {}
 
 
 class TestRedfishDell:
@@ -1297,6 +1468,41 @@ class TestRedfishDell:
         assert mocked_sleep.called
         assert self.requests_mock.request_history[0].json()["ShareParameters"] == expected_params
 
+    @mock.patch("wmflib.decorators.time.sleep", return_value=None)
+    def test_scp_push_only_changes(self, _mocked_sleep):
+        """It should push only the changed attributes if only_changes is set."""
+        expected = deepcopy(DELL_TASK_REPONSE)
+        expected["EndTime"] = "2021-12-09T14:39:29-06:00"
+        self.requests_mock.get("/redfish/v1/Managers/iDRAC.Embedded.1", json={"Model": "16G Monolithic"})
+        self.requests_mock.post(
+            "/redfish/v1/Managers/iDRAC.Embedded.1/Actions/Oem/EID_674_Manager.ImportSystemConfigurationPreview",
+            headers={"Location": "/redfish/v1/TaskService/Tasks/JID_1234567890"},
+            status_code=202,
+        )
+        self.requests_mock.get(
+            "/redfish/v1/TaskService/Tasks/JID_1234567890",
+            [{"status_code": 202, "json": DELL_TASK_REPONSE}, {"status_code": 200, "json": expected}],
+        )
+        self.redfish._hw_model = 9  # pylint: disable=protected-access
+        scp = redfish.DellSCP(deepcopy(DELL_SCP), redfish.DellSCPTargetPolicy.ALL)
+        scp.set("Some.Component.1", "Some.Attribute.1", "new value")
+
+        assert self.redfish.scp_push(scp, only_changes=True) == expected
+        post = next(request for request in self.requests_mock.request_history if request.method == "POST")
+        pushed = json.loads(post.json()["ImportBuffer"])
+        assert redfish.DellSCP(pushed, redfish.DellSCPTargetPolicy.ALL).components == {
+            "Some.Component.1": {"Some.Attribute.1": "new value"}
+        }
+
+    def test_scp_push_only_changes_no_changes(self, caplog):
+        """It should not push anything if only_changes is set and there are no changes."""
+        scp = redfish.DellSCP(deepcopy(DELL_SCP), redfish.DellSCPTargetPolicy.ALL)
+        with caplog.at_level(logging.INFO):
+            assert self.redfish.scp_push(scp, only_changes=True) == {}
+
+        assert "no changes in the SCP configuration, skipping the push" in caplog.text
+        assert not self.requests_mock.request_history
+
     def test_get_power_state(self):
         """It should return the current power state of the device."""
         self.requests_mock.get("/redfish/v1/Chassis/System.Embedded.1", json={"PowerState": "On"})
@@ -1571,3 +1777,101 @@ class TestRedfishSupermicro:
 
         with pytest.raises(redfish.RedfishError, match=error_msg):
             self.redfish.get_primary_mac()
+
+
+class TestRedfishFleet:
+    """Tests for the RedfishFleet class."""
+
+    def setup_method(self):
+        """Initialize the test instance."""
+        # pylint: disable=attribute-defined-outside-init
+        self.dell = mock.MagicMock(spec_set=redfish.RedfishDell)
+        self.dell.hostname = "host1001"
+        self.supermicro = mock.MagicMock(spec_set=redfish.RedfishSupermicro)
+        self.supermicro.hostname = "host1002"
+        self.fleet = redfish.RedfishFleet([self.dell, self.supermicro], max_workers=2)
+
+    def test_init_invalid_max_workers(self):
+        """It should raise a RedfishError if max_workers is not positive."""
+        with pytest.raises(redfish.RedfishError, match="The max_workers must be a positive integer, got 0"):
+            redfish.RedfishFleet([self.dell], max_workers=0)
+
+    def test_init_duplicated_hosts(self):
+        """It should raise a RedfishError if multiple instances belong to the same host."""
+        with pytest.raises(redfish.RedfishError, match="must belong to different hosts"):
+            redfish.RedfishFleet([self.dell, self.dell])
+
+    def test_properties(self):
+        """It should expose the hosts of the fleet."""
+        assert len(self.fleet) == 2
+        assert self.fleet.hostnames == ["host1001", "host1002"]
+        assert self.fleet["host1002"] is self.supermicro
+
+    def test_run_concurrently(self):
+        """It should run the function on the hosts concurrently and report the result of each host."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def func(instance):
+            barrier.wait()  # Would break if the hosts were not processed concurrently
+            if instance.hostname == "host1002":
+                raise redfish.RedfishError("failed")
+            return instance.hostname
+
+        results = self.fleet.run(func)
+        assert list(results) == ["host1001", "host1002"]
+        assert results["host1001"] == redfish.RedfishFleetResult(hostname="host1001", result="host1001")
+        assert results["host1001"].success
+        assert not results["host1002"].success
+        assert str(results["host1002"].error) == "failed"
+
+    def test_run_unknown_hosts(self):
+        """It should raise a RedfishError if any of the hostnames is not part of the fleet."""
+        with pytest.raises(redfish.RedfishError, match="Hosts not part of the fleet: host2001"):
+            self.fleet.run(lambda _: None, hostnames=["host1001", "host2001"])
+
+    def test_upload_file(self):
+        """It should upload the file to all the hosts and return the job IDs."""
+        self.dell.upload_file.return_value = "/task/1"
+        self.supermicro.upload_file.return_value = "/task/2"
+        results = self.fleet.upload_file(Path("firmware.bin"), reboot=True)
+        assert {hostname: result.result for hostname, result in results.items()} == {
+            "host1001": "/task/1",
+            "host1002": "/task/2",
+        }
+        self.dell.upload_file.assert_called_once_with(Path("firmware.bin"), reboot=True)
+
+    def test_poll_task(self):
+        """It should poll the task of each given host only."""
+        self.dell.poll_task.return_value = {"TaskState": "Completed"}
+        results = self.fleet.poll_task({"host1001": "/task/1"})
+        assert list(results) == ["host1001"]
+        assert results["host1001"].result == {"TaskState": "Completed"}
+        self.dell.poll_task.assert_called_once_with("/task/1")
+        self.supermicro.poll_task.assert_not_called()
+
+    def test_scp_push(self):
+        """It should push the same SCP to all the hosts, reporting the non-Dell ones as failed."""
+        scp = redfish.DellSCP(deepcopy(DELL_SCP), redfish.DellSCPTargetPolicy.ALL)
+        results = self.fleet.scp_push(scp, preview=False)
+        assert results["host1001"].success
+        assert "SCP is supported only on Dell hosts, host1002 is not" in str(results["host1002"].error)
+        self.dell.scp_push.assert_called_once_with(
+            scp,
+            reboot=redfish.DellSCPRebootPolicy.NO_REBOOT,
+            power_state=redfish.DellSCPPowerStatePolicy.ON,
+            preview=False,
+        )
+
+    def test_scp_push_per_host(self):
+        """It should push to each host its own SCP, targeting only the given hosts."""
+        scp = redfish.DellSCP(deepcopy(DELL_SCP), redfish.DellSCPTargetPolicy.ALL)
+        results = self.fleet.scp_push({"host1001": scp})
+        assert list(results) == ["host1001"]
+        assert self.dell.scp_push.call_args.args == (scp,)
+
+    def test_chassis_reset(self):
+        """It should reset the chassis of all the hosts."""
+        results = self.fleet.chassis_reset(redfish.ChassisResetPolicy.GRACEFUL_RESTART)
+        assert all(result.success for result in results.values())
+        self.dell.chassis_reset.assert_called_once_with(redfish.ChassisResetPolicy.GRACEFUL_RESTART)
+        self.supermicro.chassis_reset.assert_called_once_with(redfish.ChassisResetPolicy.GRACEFUL_RESTART)
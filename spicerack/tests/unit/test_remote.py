@@ -1,13 +1,16 @@
 """Interactive module tests."""
 
+import logging
 import re
+import time
+from contextlib import contextmanager
 from datetime import UTC, datetime, timedelta
 from unittest import mock
 
 import pytest
 from ClusterShell.MsgTree import MsgTreeElem
 from cumin import Config, nodeset
-from cumin.transports import Target, clustershell
+from cumin.transports import Command, NoProgress, Target, clustershell
 
 from spicerack import confctl, remote
 from spicerack.tests import get_fixture_path
@@ -40,6 +43,26 @@ def mock_cumin(mocked_transports, retcode, retvals=None):
     mocked_transports.Target = Target
 
 
+@mock.patch("spicerack.remote.time.sleep", return_value=None)
+@mock.patch("spicerack.remote.task_terminate")
+def test_run_sliding_window(mocked_task_terminate, mocked_sleep):
+    """It should call the function on each item, sleeping between them, until the completed callback stops it."""
+    outcomes = []
+
+    def completed(outcome):
+        """Stop the scheduling after the third item."""
+        outcomes.append(outcome)
+        return outcome != 30
+
+    remote.run_sliding_window(
+        lambda item: item * 10, range(1, 10), size=lambda: 1, completed=completed, max_workers=1, sleep=5
+    )
+
+    assert outcomes == [10, 20, 30]
+    assert mocked_task_terminate.call_count == 3
+    assert mocked_sleep.call_count == 2
+
+
 class TestRemoteHostsAdapter:
     """Test class for the RemoteHostsAdapter class."""
 
@@ -201,6 +224,121 @@ class TestLBRemoteCluster:
             )
             assert ts.call_count == 4
 
+    @pytest.mark.parametrize("size", [0, 10])
+    def test_run_rolling_wrong_max_depooled(self, size):
+        """It should raise RemoteError if max_depooled is not smaller than the number of hosts."""
+        with pytest.raises(remote.RemoteError, match="Values for max_depooled"):
+            self.lbcluster.run_rolling("some command", svc_to_depool=["service1"], max_depooled=size)
+
+    @pytest.mark.parametrize("threshold", [-0.1, 1.1])
+    def test_run_rolling_wrong_success_threshold(self, threshold):
+        """It should raise RemoteError if success_threshold is not valid."""
+        with pytest.raises(remote.RemoteError, match="Values for success_threshold"):
+            self.lbcluster.run_rolling("some command", svc_to_depool=["service1"], success_threshold=threshold)
+
+    @mock.patch("spicerack.remote.time.sleep", return_value=None)
+    @mock.patch("spicerack.remote.RemoteHosts.run_async", autospec=True)
+    def test_run_rolling_ok(self, run_async, mocked_sleep):
+        """It should depool, run the commands and repool each host, sleeping only between hosts."""
+        run_async.side_effect = lambda remote_hosts, *_, **__: [(remote_hosts.hosts, None)]
+        res = self.lbcluster.run_rolling(
+            "test -d /tmp", svc_to_depool=["service1", "service2"], max_depooled=3, host_sleep=5
+        )
+
+        assert run_async.call_count == 10
+        assert sorted(str(hosts) for hosts, _ in res) == sorted(self.hosts.striter())
+        assert self.conftool.change_and_revert.call_count == 10
+        self.conftool.change_and_revert.assert_any_call(
+            "pooled", "yes", "no", service="service1|service2", name="host10"
+        )
+        assert mocked_sleep.call_count == 7  # No sleep for the first window of hosts
+        assert run_async.call_args.kwargs["print_output"] is False  # Hosts in parallel, don't interleave the output
+        assert run_async.call_args.kwargs["print_progress_bars"] is False
+
+    @pytest.mark.parametrize("print_kwargs, expected", (({}, True), ({"print_output": False}, False)))
+    @mock.patch("spicerack.remote.task_terminate")
+    @mock.patch("spicerack.remote.RemoteHosts.run_async", autospec=True)
+    def test_run_rolling_single(self, run_async, mocked_task_terminate, print_kwargs, expected):
+        """It should print the output by default with one host at a time and release each ClusterShell task."""
+        run_async.side_effect = lambda remote_hosts, *_, **__: [(remote_hosts.hosts, None)]
+        self.lbcluster.run_rolling("test -d /tmp", svc_to_depool=["service1"], **print_kwargs)
+
+        assert run_async.call_args.kwargs["print_output"] is expected
+        assert run_async.call_args.kwargs["print_progress_bars"] is True
+        assert mocked_task_terminate.call_count == 10
+
+    @mock.patch("spicerack.remote.RemoteHosts.run_async", autospec=True)
+    def test_run_rolling_max_depooled(self, run_async):
+        """It should never have more than max_depooled hosts depooled at the same time."""
+        lock = remote.threading.Lock()
+        counters = {"current": 0, "max": 0}
+
+        @contextmanager
+        def change_and_revert(*_, **__):
+            with lock:
+                counters["current"] += 1
+                counters["max"] = max(counters["max"], counters["current"])
+            yield []
+            with lock:
+                counters["current"] -= 1
+
+        def run(remote_hosts, *_, **__):
+            time.sleep(0.01)
+            return [(remote_hosts.hosts, None)]
+
+        run_async.side_effect = run
+        self.conftool.change_and_revert.side_effect = change_and_revert
+        self.lbcluster.run_rolling("test -d /tmp", svc_to_depool=["service1"], max_depooled=2)
+
+        assert run_async.call_count == 10
+        assert counters["max"] == 2
+
+    @mock.patch("spicerack.remote.RemoteHosts.run_async", autospec=True)
+    def test_run_rolling_failure(self, run_async):
+        """It should stop scheduling new hosts when the success threshold cannot be met anymore."""
+        run_async.side_effect = remote.RemoteExecutionError(
+            message="foobar!", retcode=10, results=iter([(nodeset("host1"), "output")])
+        )
+        with pytest.raises(remote.RemoteClusterExecutionError, match="1 hosts have failed execution") as err:
+            self.lbcluster.run_rolling("test -d /tmp", svc_to_depool=["service1"])
+
+        assert err.value.results == [(nodeset("host1"), "output")]
+        assert run_async.call_count == 1
+        # The host is repooled anyway
+        assert self.conftool.change_and_revert.return_value.__exit__.call_args == mock.call(None, None, None)
+
+    @mock.patch("spicerack.remote.RemoteHosts.run_async", autospec=True)
+    def test_run_rolling_failure_threshold(self, run_async, caplog):
+        """It should keep scheduling new hosts and succeed while the success threshold is met."""
+
+        def run(remote_hosts, *_, **__):
+            if str(remote_hosts) in ("host1", "host2"):
+                raise remote.RemoteExecutionError(message="foobar!", retcode=10, results=iter(()))
+            return [(remote_hosts.hosts, None)]
+
+        run_async.side_effect = run
+        with caplog.at_level(logging.WARNING):
+            res = self.lbcluster.run_rolling("test -d /tmp", svc_to_depool=["service1"], success_threshold=0.8)
+
+        assert len(res) == 8
+        assert run_async.call_count == 10
+        assert "2 hosts have failed execution, within the success threshold" in caplog.text
+
+    @mock.patch("spicerack.remote.RemoteHosts.run_async", autospec=True)
+    def test_run_rolling_failure_over_threshold(self, run_async):
+        """It should raise RemoteClusterExecutionError if the success threshold is not met."""
+
+        def run(remote_hosts, *_, **__):
+            if str(remote_hosts) in ("host8", "host9", "host10"):
+                raise remote.RemoteExecutionError(message="foobar!", retcode=10, results=iter(()))
+            return [(remote_hosts.hosts, None)]
+
+        run_async.side_effect = run
+        with pytest.raises(remote.RemoteClusterExecutionError, match="3 hosts have failed execution") as err:
+            self.lbcluster.run_rolling("test -d /tmp", svc_to_depool=["service1"], success_threshold=0.8)
+
+        assert len(err.value.results) == 7
+
     def test_reload_services(self):
         """Test a service reload."""
         self.lbcluster.run = mock.MagicMock(return_value="foobar")
@@ -266,6 +404,75 @@ class TestRemote:
         with pytest.raises(remote.RemoteError, match="Failed to execute Cumin query"):
             self.remote.query("or invalid")
 
+    @mock.patch("spicerack.remote.query.Query")
+    def test_query_no_cache(self, mocked_query):
+        """Calling query() without the cache enabled should always execute the query."""
+        mocked_query.return_value.execute.return_value = nodeset("host[1-9]")
+        self.remote.query("A:alias")
+        self.remote.query("A:alias")
+
+        assert mocked_query.return_value.execute.call_count == 2
+        assert self.remote.cache_stats == {"hits": 0, "misses": 0, "size": 0}
+
+    @mock.patch("spicerack.remote.time.monotonic")
+    @mock.patch("spicerack.remote.query.Query")
+    def test_query_cache(self, mocked_query, mocked_monotonic):
+        """Calling query() with the cache enabled should execute the query only once within the cache TTL."""
+        mocked_query.return_value.execute.return_value = nodeset("host[1-9]")
+        mocked_monotonic.side_effect = [100.0, 110.0, 161.0]
+        cached_remote = remote.Remote(get_fixture_path("remote", "config.yaml"), cache_ttl=60)
+
+        first = cached_remote.query("A:alias  and\tA:other")
+        second = cached_remote.query("A:alias and A:other", use_sudo=True)
+        assert second.hosts == first.hosts
+        assert second._use_sudo  # pylint: disable=protected-access
+        assert cached_remote.cache_stats == {"hits": 1, "misses": 1, "size": 1}
+        mocked_query.return_value.execute.assert_called_once_with("A:alias  and\tA:other")
+
+        cached_remote.query("A:alias and A:other")  # Expired
+        assert cached_remote.cache_stats == {"hits": 1, "misses": 2, "size": 1}
+        assert mocked_query.return_value.execute.call_count == 2
+
+    @mock.patch("spicerack.remote.query.Query")
+    def test_query_cache_quoted_values(self, mocked_query):
+        """The whitespaces within quoted values should be preserved both in the cache key and in the query."""
+        mocked_query.return_value.execute.return_value = nodeset("host[1-9]")
+        cached_remote = remote.Remote(get_fixture_path("remote", "config.yaml"), cache_ttl=60)
+
+        cached_remote.query(' P{R:Class%title = "a  b"}  and A:alias')
+        cached_remote.query("P{R:Class%title = 'a b'} and A:alias")
+        cached_remote.query('P{R:Class%title  =  "a  b"} and A:alias')
+        assert cached_remote.cache_stats == {"hits": 1, "misses": 2, "size": 2}
+        assert mocked_query.return_value.execute.call_args_list == [
+            mock.call(' P{R:Class%title = "a  b"}  and A:alias'),
+            mock.call("P{R:Class%title = 'a b'} and A:alias"),
+        ]
+
+    @mock.patch("spicerack.remote.query.Query")
+    def test_query_cache_invalidate(self, mocked_query):
+        """Calling invalidate_cache() should remove the given query or all the queries from the cache."""
+        mocked_query.return_value.execute.return_value = nodeset("host[1-9]")
+        cached_remote = remote.Remote(get_fixture_path("remote", "config.yaml"), cache_ttl=60)
+        cached_remote.query("A:alias")
+        cached_remote.query("A:other")
+        assert cached_remote.cache_stats["size"] == 2
+
+        cached_remote.invalidate_cache(" A:alias ")
+        assert cached_remote.cache_stats["size"] == 1
+        cached_remote.invalidate_cache()
+        assert cached_remote.cache_stats["size"] == 0
+
+        cached_remote.query("A:alias")
+        assert mocked_query.return_value.execute.call_count == 3
+
+    def test_query_cache_invalid(self):
+        """Calling query() with an invalid query should raise RemoteError and not cache anything."""
+        cached_remote = remote.Remote(get_fixture_path("remote", "config.yaml"), cache_ttl=60)
+        with pytest.raises(remote.RemoteError, match="Failed to execute Cumin query"):
+            cached_remote.query("or invalid")
+
+        assert cached_remote.cache_stats == {"hits": 0, "misses": 1, "size": 0}
+
     def test_query_confctl_ok(self):
         """Succesful query_confctl() should return the correct lbremotehosts instance."""
         conftool = mock.MagicMock(spec=confctl.ConftoolEntity)
@@ -479,6 +686,154 @@ class TestRemoteHosts:
         with pytest.raises(remote.RemoteError, match="Unable to extract data with <lambda> for host1"):
             self.remote_hosts.uptime()
 
+    @mock.patch("spicerack.remote.RemoteHosts._get_worker")
+    def test_stream_async_ok(self, mocked_get_worker):
+        """It should yield the results of each host as they are published by the event handler."""
+
+        def execute():
+            handler = mocked_get_worker.call_args.kwargs["handler"]
+            handler.results.put(remote.RemoteHostResult(host="host1", exit_code=0, output="output1"))
+            handler.results.put(remote.RemoteHostResult(host="host2", exit_code=0, output="output2"))
+            return 0
+
+        mocked_get_worker.return_value.execute.side_effect = execute
+        results = list(self.remote_hosts.stream_async("command1", batch_size=2))
+
+        assert [result.host for result in results] == ["host1", "host2"]
+        assert all(result.success for result in results)
+        assert mocked_get_worker.call_args.args == (["command1"],)
+        assert mocked_get_worker.call_args.kwargs["batch_size"] == 2
+
+    @mock.patch("spicerack.remote.RemoteHosts._get_worker")
+    def test_stream_async_fail(self, mocked_get_worker):
+        """It should raise RemoteExecutionError after yielding all the results if the execution fails."""
+
+        def execute():
+            handler = mocked_get_worker.call_args.kwargs["handler"]
+            handler.results.put(remote.RemoteHostResult(host="host1", exit_code=1, output="error"))
+            return 2
+
+        mocked_get_worker.return_value.execute.side_effect = execute
+        results = []
+        with pytest.raises(remote.RemoteExecutionError, match=r"Cumin execution failed \(exit_code=2\)"):
+            for result in self.remote_hosts.stream_async("command1"):
+                results.append(result)
+
+        assert results == [remote.RemoteHostResult(host="host1", exit_code=1, output="error")]
+        assert not results[0].success
+
+    @mock.patch("spicerack.remote.RemoteHosts._get_worker")
+    def test_stream_async_error(self, mocked_get_worker):
+        """It should raise RemoteError if the execution raises any exception."""
+        mocked_get_worker.return_value.execute.side_effect = ValueError("some error")
+        with pytest.raises(remote.RemoteError, match="Cumin streaming execution failed"):
+            list(self.remote_hosts.stream_async("command1"))
+
+    @mock.patch("spicerack.remote.RemoteHosts._get_worker")
+    def test_stream_async_stop(self, mocked_get_worker):
+        """It should stop the scheduling of new hosts when the iteration is stopped early."""
+        handlers = []
+
+        def execute():
+            handler = mocked_get_worker.call_args.kwargs["handler"]
+            handlers.append(handler)
+            handler.results.put(remote.RemoteHostResult(host="host1", exit_code=1, output="error"))
+            assert handler.stopped.wait(timeout=5)
+            return 0
+
+        mocked_get_worker.return_value.execute.side_effect = execute
+        for _ in self.remote_hosts.stream_async("command1"):
+            break
+
+        assert handlers[0].stopped.is_set()
+
+    @mock.patch("spicerack.remote.RemoteHosts._get_worker")
+    def test_stream_async_dry_run_unsafe(self, mocked_get_worker):
+        """In dry_run mode it should not run the given commands, considered unsafe by default."""
+        assert list(self.remote_hosts_dry_run.stream_async("command1")) == []
+        mocked_get_worker.assert_called_once()  # To log the commands that would have been executed
+        assert not mocked_get_worker.return_value.execute.called
+
+    def test_streaming_event_handler(self):
+        """The streaming event handler should publish each host result once it has executed all the commands."""
+        results = remote.queue.Queue()
+        stopped = remote.threading.Event()
+        handler_class = type(
+            "TestHandler", (remote._StreamingEventHandler,), {"results": results, "stopped": stopped}
+        )  # pylint: disable=protected-access
+        commands = [Command("command1"), Command("command2")]
+        handler = handler_class(
+            Target(nodeset("host[1-2]")), commands, reporter=clustershell.NullReporter(), progress_bars=NoProgress()
+        )
+        worker = mock.MagicMock()
+        for index, command in enumerate(commands):
+            worker.command = command.command
+            handler.ev_pickup(worker, "host1")
+            handler.ev_read(worker, "host1", "stdout", f"output{index}".encode())
+            handler.ev_hup(worker, "host1", 0)
+            if index == 0:
+                assert results.empty()
+
+        worker.command = "command1"
+        handler.ev_pickup(worker, "host2")
+        handler.ev_hup(worker, "host2", 1)
+
+        assert results.get_nowait() == remote.RemoteHostResult(host="host1", exit_code=0, output="output0\noutput1")
+        assert results.get_nowait() == remote.RemoteHostResult(host="host2", exit_code=1, output="")
+        assert results.empty()
+
+    def test_streaming_event_handler_ok_codes(self):
+        """The streaming event handler should continue with the next command if the exit code is in its ok_codes."""
+        results = remote.queue.Queue()
+        stopped = remote.threading.Event()
+        handler_class = type(
+            "TestHandler", (remote._StreamingEventHandler,), {"results": results, "stopped": stopped}
+        )  # pylint: disable=protected-access
+        commands = [Command("command1", ok_codes=[0, 1]), Command("command2")]
+        handler = handler_class(
+            Target(nodeset("host1")), commands, reporter=clustershell.NullReporter(), progress_bars=NoProgress()
+        )
+        worker = mock.MagicMock()
+        worker.command = "command1"
+        handler.ev_pickup(worker, "host1")
+        handler.ev_hup(worker, "host1", 1)
+        assert results.empty()
+
+        worker.command = "command2"
+        handler.ev_pickup(worker, "host1")
+        handler.ev_read(worker, "host1", "stdout", b"output")
+        handler.ev_hup(worker, "host1", 0)
+        assert results.get_nowait() == remote.RemoteHostResult(host="host1", exit_code=0, output="output")
+
+    def test_streaming_event_handler_timeout(self):
+        """The streaming event handler should publish the hosts that timed out and stop scheduling when stopped."""
+        results = remote.queue.Queue()
+        stopped = remote.threading.Event()
+        handler_class = type(
+            "TestHandler", (remote._StreamingEventHandler,), {"results": results, "stopped": stopped}
+        )  # pylint: disable=protected-access
+        handler = handler_class(
+            Target(nodeset("host[1-2]")),
+            [Command("command1")],
+            reporter=clustershell.NullReporter(),
+            progress_bars=NoProgress(),
+        )
+        worker = mock.MagicMock()
+        worker.command = "command1"
+        handler.ev_pickup(worker, "host1")
+        worker.task.iter_keys_timeout.return_value = ["host1"]
+        handler.ev_close(worker, False)
+        assert results.empty()
+        handler.ev_close(worker, True)
+        handler.ev_close(worker, True)  # The timed out hosts are reported by all the workers of the task
+        assert results.get_nowait() == remote.RemoteHostResult(host="host1", exit_code=None, output="")
+        assert results.empty()
+
+        timer = mock.MagicMock()
+        stopped.set()
+        handler.ev_timer(timer)
+        assert not timer.eh.called
+
     def test_results_to_list_callback(self):
         """It should return the output string coverted by the callback."""
         results = (item for item in [(self.hosts, MsgTreeElem(b"test", parent=MsgTreeElem()))])
@@ -1,5 +1,6 @@
 """Service Module Tests."""
 
+from copy import deepcopy
 from ipaddress import ip_address
 from unittest import mock
 
@@ -33,6 +34,14 @@ class TestCatalog:
         self.catalog = service.Catalog(
             catalog, alertmanager=alertmanager, confctl=self.mocked_confctl, authdns_servers=self.authdns_servers
         )
+        self.catalog_rw = service.Catalog(
+            catalog,
+            alertmanager=alertmanager,
+            confctl=self.mocked_confctl,
+            authdns_servers=self.authdns_servers,
+            dry_run=False,
+        )
+        self.subnets = {"eqiad": ip_address("10.10.0.1"), "codfw": ip_address("10.20.0.1")}
 
     def test_init(self):
         """It should instantiate a Catalog instance properly."""
@@ -59,6 +68,170 @@ class TestCatalog:
         """It should return the number of services in the catalog."""
         assert len(self.catalog) == 5
 
+    @mock.patch("wmflib.decorators.time.sleep")
+    @mock.patch("spicerack.service.Discovery.resolve_with_client_ips")
+    @mock.patch("spicerack.service.Discovery.active_datacenters", new_callable=mock.PropertyMock)
+    def test_check_dns_state_all(self, mocked_active_dcs, mocked_resolve, mocked_sleep):
+        """It should read the conftool state once and retry only the records that are still inconsistent."""
+        mocked_active_dcs.return_value = {
+            "service1": ["codfw", "eqiad"],
+            "service3_a": ["codfw"],
+            "service3_b": ["codfw"],
+        }
+        codfw, eqiad = ip_address("10.2.1.1"), ip_address("10.2.2.1")
+        # Each record resolves to the IP of the given datacenter when queried from eqiad, always to codfw from codfw
+        answers = [{"service1": eqiad, "service3_a": codfw, "service3_b": eqiad}, {"service3_b": codfw}]
+
+        def resolve(queries, failures):  # pylint: disable=unused-argument
+            from_eqiad = answers.pop(0)
+            return {
+                record: {
+                    dc: dict.fromkeys(self.authdns_servers, from_eqiad[record] if dc == "eqiad" else codfw)
+                    for dc in client_ips
+                }
+                for record, client_ips in queries.items()
+            }
+
+        mocked_resolve.side_effect = resolve
+        report = self.catalog_rw.check_dns_state_all(self.subnets, services=["service1", "service2", "service3"])
+
+        assert report.is_consistent
+        assert report.consistent == [
+            "service1.discovery.wmnet",
+            "service3_a.discovery.wmnet",
+            "service3_b.discovery.wmnet",
+        ]
+        mocked_active_dcs.assert_called_once_with()
+        assert mocked_resolve.call_args_list == [
+            mock.call(dict.fromkeys(("service1", "service3_a", "service3_b"), self.subnets), failures={}),
+            mock.call({"service3_b": self.subnets}, failures={}),
+        ]
+        assert mocked_sleep.call_count == 1
+
+    @mock.patch("wmflib.decorators.time.sleep")
+    @mock.patch("spicerack.service.Discovery.resolve_with_client_ips")
+    @mock.patch("spicerack.service.Discovery.active_datacenters", new_callable=mock.PropertyMock)
+    def test_check_dns_state_all_inconsistent(self, mocked_active_dcs, mocked_resolve, mocked_sleep):
+        """It should report the records still inconsistent after all the tries without raising."""
+        mocked_active_dcs.return_value = {"service1": ["codfw"]}
+        mocked_resolve.side_effect = lambda queries, failures: {  # noqa: ARG005
+            record: {dc: {ns: ip_address("10.2.2.1") for ns in self.authdns_servers} for dc in client_ips}
+            for record, client_ips in queries.items()
+        }
+        report = self.catalog_rw.check_dns_state_all(self.subnets, services=["service1"], tries=3)
+
+        assert not report.is_consistent
+        assert report.consistent == []
+        pooled_error = "Error checking auth dns for service1.discovery.wmnet from codfw: nameserver {ns} resolved to "
+        depooled_error = "Error checking auth dns for service1.discovery.wmnet in eqiad: resolved to 10.2.2.1"
+        errors = report.inconsistent["service1.discovery.wmnet"]
+        assert list(report.inconsistent.keys()) == ["service1.discovery.wmnet"]
+        assert len(errors) == 4
+        for error, ns in zip(errors[:2], self.authdns_servers, strict=True):
+            assert error == pooled_error.format(ns=ns) + "10.2.2.1, expected: 10.2.1.1"
+        assert all(error.startswith(depooled_error) for error in errors[2:])
+        assert mocked_resolve.call_count == 3
+        assert mocked_sleep.call_count == 2
+
+    @mock.patch("wmflib.decorators.time.sleep")
+    @mock.patch("spicerack.service.Discovery.resolve_with_client_ips")
+    @mock.patch("spicerack.service.Discovery.active_datacenters", new_callable=mock.PropertyMock)
+    def test_check_dns_state_all_resolve_error(self, mocked_active_dcs, mocked_resolve, _mocked_sleep):
+        """It should report the resolution errors for all the pending records."""
+        mocked_active_dcs.return_value = {"service1": ["codfw"]}
+        mocked_resolve.side_effect = DiscoveryError("pinkunicorn")
+        report = self.catalog.check_dns_state_all(self.subnets, services=["service1", "service4"], tries=1)
+
+        assert report.inconsistent == {
+            "service1.discovery.wmnet": ["pinkunicorn"],
+            "service4.discovery.wmnet": ["pinkunicorn"],
+        }
+
+    @mock.patch("wmflib.decorators.time.sleep")
+    @mock.patch("spicerack.service.Discovery.resolve_with_client_ips")
+    @mock.patch("spicerack.service.Discovery.active_datacenters", new_callable=mock.PropertyMock)
+    def test_check_dns_state_all_partial_resolve_error(self, mocked_active_dcs, mocked_resolve, mocked_sleep):
+        """It should keep pending and retry only the records that failed to resolve."""
+        mocked_active_dcs.return_value = {
+            "service1": ["codfw", "eqiad"],
+            "service3_a": ["codfw"],
+            "service3_b": ["codfw"],
+        }
+        codfw, eqiad = ip_address("10.2.1.1"), ip_address("10.2.2.1")
+        from_eqiad = {"service1": eqiad, "service3_a": codfw, "service3_b": codfw}
+        matrix = {
+            record: {dc: dict.fromkeys(self.authdns_servers, codfw if dc == "codfw" else ip) for dc in self.subnets}
+            for record, ip in from_eqiad.items()
+        }
+        tries = iter((True, False))
+
+        def resolve(queries, failures):
+            if next(tries):
+                failures["service3_a"] = ["timeout"]
+            return {record: matrix[record] for record in queries if record not in failures}
+
+        mocked_resolve.side_effect = resolve
+        report = self.catalog_rw.check_dns_state_all(self.subnets, services=["service1", "service3"])
+
+        assert report.is_consistent
+        assert mocked_resolve.call_args_list[1] == mock.call({"service3_a": self.subnets}, failures=mock.ANY)
+        assert mocked_resolve.call_count == 2
+        assert mocked_sleep.call_count == 1
+
+    def _catalog_with_shared_record(self, **overrides):
+        """Return a catalog where service_shared has the same DNS Discovery record of service1."""
+        catalog = load_yaml_config(get_fixture_path("service", "service.yaml"))
+        catalog["service_shared"] = {**deepcopy(catalog["service1"]), **overrides}
+        return service.Catalog(
+            catalog,
+            alertmanager=Alertmanager(alertmanager_urls=("https://alertmanager-eqiad.wikimedia.example",)),
+            confctl=self.mocked_confctl,
+            authdns_servers=self.authdns_servers,
+            dry_run=False,
+        )
+
+    @mock.patch("spicerack.service.Discovery.resolve_with_client_ips")
+    @mock.patch("spicerack.service.Discovery.active_datacenters", new_callable=mock.PropertyMock)
+    def test_check_dns_state_all_shared_record(self, mocked_active_dcs, mocked_resolve):
+        """It should check and report only once a record shared by multiple services."""
+        mocked_active_dcs.return_value = {"service1": ["codfw", "eqiad"]}
+        ips = {"codfw": ip_address("10.2.1.1"), "eqiad": ip_address("10.2.2.1")}
+        mocked_resolve.side_effect = lambda queries, failures: {  # noqa: ARG005
+            record: {dc: dict.fromkeys(self.authdns_servers, ips[dc]) for dc in client_ips}
+            for record, client_ips in queries.items()
+        }
+        catalog = self._catalog_with_shared_record()
+        report = catalog.check_dns_state_all(self.subnets, services=["service1", "service_shared"])
+
+        assert report.is_consistent
+        assert report.consistent == ["service1.discovery.wmnet"]
+        mocked_resolve.assert_called_once_with({"service1": self.subnets}, failures={})
+
+    @mock.patch("spicerack.service.Discovery.resolve_with_client_ips")
+    def test_check_dns_state_all_shared_record_conflict(self, mocked_resolve):
+        """It should raise ServiceError if services sharing a record have a different configuration for it."""
+        catalog = self._catalog_with_shared_record(ip={"codfw": {"default": "10.2.1.2"}})
+        with pytest.raises(
+            service.ServiceError,
+            match="Services service1 and service_shared share the DNS Discovery record service1 with a different",
+        ):
+            catalog.check_dns_state_all(self.subnets, services=["service1", "service_shared"])
+
+        assert not mocked_resolve.called
+
+    @mock.patch("spicerack.service.Discovery.resolve_with_client_ips")
+    def test_check_dns_state_all_no_discovery(self, mocked_resolve):
+        """It should return an empty report if there are no records to check."""
+        report = self.catalog.check_dns_state_all(self.subnets, services=["service2"])
+        assert report.is_consistent
+        assert report.consistent == []
+        assert not mocked_resolve.called
+
+    def test_check_dns_state_all_wrong_tries(self):
+        """It should raise a ValueError if a wrong tries value is passed."""
+        with pytest.raises(ValueError, match="The tries argument must be a positive integer"):
+            self.catalog.check_dns_state_all(self.subnets, tries=0)
+
 
 class TestService:
     """Test class for the Service class."""